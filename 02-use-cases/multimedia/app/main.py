@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests
+import asyncio
+import hashlib
 import json
-import traceback
 import logging
-import time
 import os
+import time
+import traceback
+from typing import Optional
+
+import aiohttp
 
 test_dict = {
     "local": "http://localhost:8004/{}",  # 0: do not use
@@ -26,21 +30,66 @@ test_dict = {
 # 全局变量，用于存储 URL 模板
 url_template = test_dict["local"]
 
+# 单次 run_sse 超时（秒）
+RUN_SSE_TIMEOUT = 6000
+
+# SSE 响应按块读取的大小（单行可能包含 base64 图片等大负载，不受该值限制）
+SSE_CHUNK_SIZE = 64 * 1024
+
+# 步骤缓存目录：同一输入的步骤直接复用上次结果，失败后重跑即可从断点继续
+cache_dir = os.getenv("PIPELINE_CACHE_DIR", "tmp-json/cache/")
+
+# 同时进行的分镜流水线数（评估图片 → 生成视频 → 评估视频）
+shot_concurrency = int(os.getenv("PIPELINE_SHOT_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+
 
 def save_result(result, filename):
     with open(filename, "w", encoding="utf-8") as f:
         json.dump(result, f, ensure_ascii=False, indent=4)
 
 
-def create_session(app_name, user_id):
-    url = url_template.format(f"apps/{app_name}/users/{user_id}/sessions")
+class StepCache:
+    """按 (步骤名, 输入文本) 的哈希缓存每一步的输出"""
+
+    def __init__(self, directory: str, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, step: str, text: str) -> str:
+        key = hashlib.sha1(f"{step}\n{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{step}-{key[:16]}.json")
+
+    def get(self, step: str, text: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(step, text), encoding="utf-8") as f:
+                return json.load(f)["output"]
+        except (OSError, KeyError, json.JSONDecodeError):
+            return None
+
+    def put(self, step: str, text: str, output: str):
+        if not self.enabled:
+            return
+        path = self._path(step, text)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"step": step, "input": text, "output": output}, f, ensure_ascii=False
+            )
+        os.replace(tmp_path, path)
 
-    payload = {}
-    headers = {}
 
-    response = requests.request("POST", url, headers=headers, data=payload)
+async def create_session(http: aiohttp.ClientSession, app_name, user_id):
+    url = url_template.format(f"apps/{app_name}/users/{user_id}/sessions")
 
-    session_id = json.loads(response.text)["id"]
+    async with http.post(url) as response:
+        response.raise_for_status()
+        session_id = (await response.json(content_type=None))["id"]
     logger.info(f"main output: session_id: {session_id}")
     return session_id
 
@@ -88,69 +137,199 @@ def pick_best_video(evaluate_video_result):
     return best_video_list
 
 
-def run_sse(app_name, user_id, session_id, text):
+async def iter_sse_lines(response: aiohttp.ClientResponse):
+    """按块读取 SSE 响应并自行拆行，避免 aiohttp 逐行读取时单行超过 128 KiB 报错"""
+    buffer = bytearray()
+    async for chunk in response.content.iter_chunked(SSE_CHUNK_SIZE):
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            buffer += chunk[start:end]
+            yield bytes(buffer)
+            buffer.clear()
+            start = end + 1
+        buffer += chunk[start:]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def run_sse(http: aiohttp.ClientSession, app_name, user_id, session_id, text):
+    """流式消费 SSE 事件，返回最后一个事件的文本内容"""
     url = url_template.format("run_sse")
-    # logger.info(f"main output: run_sse url: {url}")
-    payload = json.dumps(
-        {
-            "app_name": app_name,
-            "user_id": user_id,
-            "session_id": session_id,
-            "new_message": {"role": "user", "parts": [{"text": text}]},
-        }
-    )
-    headers = {"Content-Type": "application/json"}
+    payload = {
+        "app_name": app_name,
+        "user_id": user_id,
+        "session_id": session_id,
+        "new_message": {"role": "user", "parts": [{"text": text}]},
+    }
 
     try:
-        # ❶ 去掉 stream=True，直接等完整响应
-        response = requests.post(url, headers=headers, data=payload, timeout=6000)
-        response.raise_for_status()  # 如果返回 4xx / 5xx，会抛出异常
-        logger.info(f"原始响应: {response.text[:500]}...")  # 打印前500字符防止太长
-
-        # ❷ 按行解析最后一个 data: 块（因为服务器仍返回 SSE 格式）
-        data_lines = [
-            line for line in response.text.splitlines() if line.startswith("data: ")
-        ]
-        if not data_lines:
+        async with http.post(
+            url,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=RUN_SSE_TIMEOUT),
+        ) as response:
+            response.raise_for_status()  # 如果返回 4xx / 5xx，会抛出异常
+
+            # 按行解析 data: 块，事件到达即记录进度，只保留最后一个事件
+            event = None
+            event_count = 0
+            async for raw_line in iter_sse_lines(response):
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])  # 去掉 'data: ' 前缀
+                event_count += 1
+                logger.debug(
+                    f"main output: session {session_id} 事件 #{event_count} "
+                    f"author={event.get('author')}"
+                )
+
+        if event is None:
             logger.warning("未找到任何 data: 块")
             return None
-
-        last_data = data_lines[-1][6:]  # 去掉 'data: ' 前缀
-        event = json.loads(last_data)
         logger.info(
             f"最后一个 event: {json.dumps(event, ensure_ascii=False, indent=2)}"
         )
 
-        # ❸ 提取最终内容（如果结构固定）
+        # 提取最终内容（如果结构固定）
         return event["content"]["parts"][0]["text"]
 
-    except requests.exceptions.Timeout:
-        logger.error("请求超时（超过6000秒）")
-    except requests.exceptions.RequestException as e:
+    except asyncio.TimeoutError:
+        logger.error(f"请求超时（超过{RUN_SSE_TIMEOUT}秒）")
+    except aiohttp.ClientError as e:
         logger.error(f"请求失败: {e}")
-    except (KeyError, json.JSONDecodeError) as e:
+    except (KeyError, ValueError) as e:
         logger.error(f"解析响应失败: {e}")
 
     return None
 
 
-def main(user_need):
-    # step 0: create session
-    try:
-        logger.info("main output: 0. 创建 session...")
-        session_id = create_session("demo_app", "user")
-        save_result(session_id, tmp_json_dir + "0_session_id.json")
-    except Exception as e:
-        logger.info(f"main output: 0. create session failed: {e}")
-        traceback.print_exc()
-        return
+class Pipeline:
+    """
+    广告视频生成流水线：
+    - 每一步的输出按输入哈希写入 StepCache，重跑时命中缓存的步骤不再调用服务；
+    - 分镜图片生成后，每个分镜独立执行 评估图片 → 选最佳 → 生成视频 → 评估视频 → 选最佳，
+      某个分镜选出最佳图片后立即开始生成其视频，不等待其他分镜。
+    """
+
+    def __init__(
+        self,
+        http: aiohttp.ClientSession,
+        cache: StepCache,
+        app_name: str = "demo_app",
+        user_id: str = "user",
+    ):
+        self.http = http
+        self.cache = cache
+        self.app_name = app_name
+        self.user_id = user_id
+        self.session_id = None
+        self.shot_semaphore = asyncio.Semaphore(max(shot_concurrency, 1))
+
+    async def new_session(self):
+        return await create_session(self.http, self.app_name, self.user_id)
+
+    async def main_session(self):
+        """主流程 session（首次需要调用服务时才创建）"""
+        if self.session_id is None:
+            self.session_id = await self.new_session()
+            save_result(self.session_id, tmp_json_dir + "0_session_id.json")
+        return self.session_id
+
+    async def step(self, name, text, get_session=None, is_json=True):
+        """执行一步（命中缓存时直接返回，不创建 session），只缓存可解析的结果"""
+        output = self.cache.get(name, text)
+        if output is not None:
+            logger.info(f"main output: {name} 命中缓存，跳过")
+            return output
+
+        session_id = await (get_session or self.main_session)()
+        output = await run_sse(self.http, self.app_name, self.user_id, session_id, text)
+        if output is None:
+            raise RuntimeError(f"{name} 未返回结果")
+        if is_json:
+            json.loads(output)
+        self.cache.put(name, text, output)
+        return output
+
+    async def run_shot(self, shot, extra_params=None):
+        """
+        单个分镜：评估图片 → 选最佳图片 → 生成视频 → 评估视频 → 选最佳视频。
+        分镜使用独立 session，没有主流程的对话历史，视频参数 extra_params 需显式传入。
+        """
+        shot_id = shot.get("shot_id")
+        async with self.shot_semaphore:
+            # 各分镜并发执行，使用独立 session 避免同一 session 并发运行
+            session_id = None
+
+            async def shot_session():
+                nonlocal session_id
+                if session_id is None:
+                    session_id = await self.new_session()
+                return session_id
+
+            evaluate_image_list_input = (
+                "请根据如下分镜图片列表image_list，评估分镜图片的质量\n\n"
+                + json.dumps({"image_list": [shot]}, ensure_ascii=False)
+            )
+            evaluate_image_result = await self.step(
+                "4_evaluate_image", evaluate_image_list_input, shot_session
+            )
+            logger.info(f"main output: 4. shot {shot_id} 图片评估完成")
+            scored_images = json.loads(evaluate_image_result)["scored_image_list"]
+            best_image = pick_best_image(json.loads(evaluate_image_result))
+            logger.info(f"main output: 4.1 shot {shot_id} best_image: {best_image}")
+
+            generate_video_list_input = (
+                "请根据如下image_list，生成分镜视频、每个shot生成4个视频\n\n"
+                + str(best_image)
+            )
+            if extra_params:
+                generate_video_list_input = (
+                    "请根据如下image_list和视频参数extra_params，生成分镜视频："
+                    "视频比例使用ratio、分辨率使用resolution，"
+                    f"每个shot生成{extra_params.get('numbers') or 4}个视频\n\n"
+                    f"extra_params: {json.dumps(extra_params, ensure_ascii=False)}\n\n"
+                    f"image_list: {best_image}"
+                )
+            video_list = await self.step(
+                "5_video", generate_video_list_input, shot_session
+            )
+            logger.info(f"main output: 5. shot {shot_id} 视频生成完成")
+
+            evaluate_video_list_input = (
+                "请根据如下分镜视频列表video_list，评估分镜视频的质量\n\n"
+                + str(video_list)
+            )
+            evaluate_video_result = await self.step(
+                "6_evaluate_video", evaluate_video_list_input, shot_session
+            )
+            scored_videos = json.loads(evaluate_video_result)["scored_video_list"]
+            best_video = pick_best_video(json.loads(evaluate_video_result))
+            logger.info(f"main output: 6.1 shot {shot_id} best_video: {best_video}")
+
+        return {
+            "scored_images": scored_images,
+            "best_image": best_image,
+            "videos": json.loads(video_list)["video_list"],
+            "scored_videos": scored_videos,
+            "best_video": best_video,
+        }
+
+
+async def main(user_need, use_cache=True):
+    async with aiohttp.ClientSession() as http:
+        pipeline = Pipeline(http, StepCache(cache_dir, enabled=use_cache))
+        await run_pipeline(pipeline, user_need)
 
+
+async def run_pipeline(pipeline: Pipeline, user_need):
     # step 1: generate video config
     try:
         logger.info("main output: 1. 生成视频配置...")
         generate_video_config_input = user_need + "\n生成视频配置"
-        video_config = run_sse(
-            "demo_app", "user", session_id, generate_video_config_input
+        video_config = await pipeline.step(
+            "1_video_config", generate_video_config_input
         )
         logger.info(f"main output: 1. video_config: {video_config}")
         save_result(json.loads(video_config), tmp_json_dir + "1_video_config.json")
@@ -162,8 +341,8 @@ def main(user_need):
     # step 1.1: parse video_type
     try:
         logger.info("main output: 1.1 解析video_type...")
-        logger.info(f"main output: 1.1 video_config: {video_config}")
         video_type = json.loads(video_config)["video_type"]
+        extra_params = json.loads(video_config).get("extra_params") or {}
     except Exception as e:
         logger.info(f"main output: 1.1 get video_type failed: {e}")
         traceback.print_exc()
@@ -175,7 +354,7 @@ def main(user_need):
         generate_shot_list_input = (
             "请根据如下video_config，生成分镜脚本\n\n" + video_config
         )
-        shot_list = run_sse("demo_app", "user", session_id, generate_shot_list_input)
+        shot_list = await pipeline.step("2_shot_list", generate_shot_list_input)
         logger.info(f"main output: 2. shot_list: {shot_list}")
         save_result(json.loads(shot_list), tmp_json_dir + "2_shot_list.json")
     except Exception as e:
@@ -187,90 +366,51 @@ def main(user_need):
     try:
         logger.info("main output: 3. 生成分镜图片...")
         generate_image_list_input = "请根据如下shot_list，生成分镜图片\n\n" + shot_list
-        image_list = run_sse("demo_app", "user", session_id, generate_image_list_input)
+        image_list = await pipeline.step("3_image_list", generate_image_list_input)
         logger.info(f"main output: 3. image_list: {image_list}")
         save_result(json.loads(image_list), tmp_json_dir + "3_image_list.json")
+        shots = json.loads(image_list)["image_list"]
     except Exception as e:
         logger.info(f"main output: 3. run sse failed: {e}")
         traceback.print_exc()
         return
 
-    # step 4: evaluate image list
-    try:
-        logger.info("main output: 4. 评估分镜图片...")
-        evaluate_image_list_input = (
-            "请根据如下分镜图片列表image_list，评估分镜图片的质量\n\n" + image_list
-        )
-        evaluate_image_result = run_sse(
-            "demo_app", "user", session_id, evaluate_image_list_input
-        )
-        logger.info(f"main output: 4. evaluate_image_result: {evaluate_image_result}")
-        save_result(
-            json.loads(evaluate_image_result),
-            tmp_json_dir + "4_evaluate_image_list.json",
-        )
-    except Exception as e:
-        logger.info(f"main output: 4. run sse failed: {e}")
-        traceback.print_exc()
-        return
-
-    # step 4.1: pick best image
-    try:
-        logger.info("main output: 4.1 选择最佳分镜图片...")
-        best_image_list = pick_best_image(json.loads(evaluate_image_result))
-        save_result(best_image_list, tmp_json_dir + "4_1_selected_image_list.json")
-        logger.info(f"main output: 4.1 best_image_list: {best_image_list}")
-    except Exception as e:
-        logger.info(f"main output: 4.1 pick best image failed: {e}")
-        traceback.print_exc()
-        return
-
-    # step 5: generate video list
-    try:
-        logger.info("main output: 5. 生成分镜视频...")
-        generate_video_list_input = (
-            "请根据如下image_list，生成分镜视频、每个shot生成4个视频\n\n"
-            + str(best_image_list)
-        )
-        video_list = run_sse("demo_app", "user", session_id, generate_video_list_input)
-        logger.info(f"main output: 5. video_list: {video_list}")
-        save_result(json.loads(video_list), tmp_json_dir + "5_video_list.json")
-    except Exception as e:
-        logger.info(f"main output: 5. run sse failed: {e}")
-        traceback.print_exc()
-        return
-
-    # step 6: evaluate video list
-    try:
-        logger.info("main output: 6. 评估分镜视频...")
-        evaluate_video_list_input = (
-            "请根据如下分镜视频列表video_list，评估分镜视频的质量\n\n" + str(video_list)
-        )
-        logger.info(
-            f"main output: 6. evaluate_video_list_input: {evaluate_video_list_input}"
-        )
-        evaluate_video_result = run_sse(
-            "demo_app", "user", session_id, evaluate_video_list_input
-        )
-        logger.info(f"main output: 6. evaluate_video_result: {evaluate_video_result}")
-        save_result(
-            json.loads(evaluate_video_result),
-            tmp_json_dir + "6_evaluate_video_list.json",
-        )
-    except Exception as e:
-        logger.info(f"main output: 6. run sse failed: {e}")
-        traceback.print_exc()
-        return
+    # step 4 ~ 6: 每个分镜独立流水线（评估图片 → 选最佳 → 生成视频 → 评估视频 → 选最佳）
+    logger.info(f"main output: 4~6. 并行处理 {len(shots)} 个分镜...")
+    results = await asyncio.gather(
+        *[pipeline.run_shot(shot, extra_params) for shot in shots],
+        return_exceptions=True,
+    )
+    failed = [
+        (shot.get("shot_id"), res)
+        for shot, res in zip(shots, results)
+        if isinstance(res, Exception)
+    ]
+    for shot_id, e in failed:
+        logger.info(f"main output: 4~6. shot {shot_id} failed: {e}")
+        traceback.print_exception(e)
+
+    done = [res for res in results if not isinstance(res, Exception)]
+    save_result(
+        {"scored_image_list": [s for res in done for s in res["scored_images"]]},
+        tmp_json_dir + "4_evaluate_image_list.json",
+    )
+    best_image_list = [s for res in done for s in res["best_image"]]
+    save_result(best_image_list, tmp_json_dir + "4_1_selected_image_list.json")
+    save_result(
+        {"video_list": [v for res in done for v in res["videos"]]},
+        tmp_json_dir + "5_video_list.json",
+    )
+    save_result(
+        {"scored_video_list": [s for res in done for s in res["scored_videos"]]},
+        tmp_json_dir + "6_evaluate_video_list.json",
+    )
+    best_video_list = [s for res in done for s in res["best_video"]]
+    save_result(best_video_list, tmp_json_dir + "6_1_selected_video_list.json")
+    logger.info(f"main output: 6.1 best_video_list: {best_video_list}")
 
-    # step 6.1: pick best video
-    try:
-        logger.info("main output: 6.1 选择最佳分镜视频...")
-        best_video_list = pick_best_video(json.loads(evaluate_video_result))
-        save_result(best_video_list, tmp_json_dir + "6_1_selected_video_list.json")
-        logger.info(f"main output: 6.1 best_video_list: {best_video_list}")
-    except Exception as e:
-        logger.info(f"main output: 6.1 pick best video failed: {e}")
-        traceback.print_exc()
+    if failed:
+        logger.info(f"main output: {len(failed)} 个分镜失败，重新运行将从缓存断点继续")
         return
 
     # step 7: generate final video
@@ -279,14 +419,12 @@ def main(user_need):
         generate_final_video_input = f"进行{video_type}视频的合成\n\n" + str(
             best_video_list
         )
-
-        logger.info(f"main output: 7. session_id: {session_id}")
         logger.info(
             f"main output: 7. generate_final_video_input: {generate_final_video_input}"
         )
 
-        final_video = run_sse(
-            "demo_app", "user", session_id, generate_final_video_input
+        final_video = await pipeline.step(
+            "7_final_video", generate_final_video_input, is_json=False
         )
         logger.info(f"main output: 7. final_video: {final_video}")
         save_result(final_video, tmp_json_dir + "7_final_video.json")
@@ -325,5 +463,5 @@ if __name__ == "__main__":
     user_need = "帮我生成杨梅饮料的宣传视频（商品展示视频），图片素材为：https://ark-tutorial.tos-cn-beijing.volces.com/multimedia/%E6%9D%A8%E6%A2%85%E9%A5%AE%E6%96%99.jpg"
     logger.info(f"!!!! main output: test_type:{t_type}, url_template: {url_template}")
 
-    # 调用主函数
-    main(user_need)
+    # 调用主函数（PIPELINE_NO_CACHE=1 时忽略已有断点，全部重新生成）
+    asyncio.run(main(user_need, use_cache=os.getenv("PIPELINE_NO_CACHE") != "1"))
@@ -17,6 +17,7 @@ from contextlib import asynccontextmanager
 from typing import Callable
 
 from agent import agent_run_config
+from market_agent.tools.is_image import close_image_check_session
 from market_agent.tools.web_parser_local import _init_browser
 
 from fastapi import FastAPI
@@ -168,6 +169,7 @@ async def combined_lifespan(app: FastAPI):
     await _init_browser()
     async with mcp_app.lifespan(app):
         yield
+    await close_image_check_session()
 
 
 # Create main FastAPI app with combined lifespan
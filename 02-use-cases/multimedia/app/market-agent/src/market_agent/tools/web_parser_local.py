@@ -12,13 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import os
 import re
 import socket
+import time
 import warnings
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from urllib.parse import urljoin
 
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
 from playwright.async_api import async_playwright
 from veadk.utils.logger import get_logger
 
@@ -28,14 +32,65 @@ warnings.filterwarnings("ignore")
 # 日志配置
 logger = get_logger(__name__)
 
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# 响应体大小上限（DoS防护）
+MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB
+
 # 全局浏览器实例（复用避免重复启动，提升性能）
 _global_browser = None
+_browser_lock = asyncio.Lock()
+
+# 上下文池 / 解析结果缓存 / 进行中的解析（同一URL并发请求只解析一次）
+_context_pool = None
+_result_cache: "OrderedDict[tuple, tuple[float, list[str], str]]" = OrderedDict()
+_inflight: dict[tuple, asyncio.Future] = {}
+
+# 一次页面内执行完成全部提取：<img>属性、内联背景图、可见文本
+_EXTRACT_SCRIPT = """
+() => {
+    const imgs = [];
+    for (const img of document.querySelectorAll("img")) {
+        const src = img.getAttribute("src") || img.getAttribute("data-src")
+            || img.getAttribute("lazy-src") || img.getAttribute("data-lazy");
+        if (src) imgs.push(src);
+    }
+    const styles = [];
+    for (const el of document.querySelectorAll("[style]")) {
+        styles.push(el.getAttribute("style"));
+    }
+    const skip = new Set(["SCRIPT", "STYLE", "NOSCRIPT", "IFRAME", "HEADER", "FOOTER"]);
+    const parts = [];
+    const walker = document.createTreeWalker(
+        document.documentElement, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, {
+            acceptNode: (node) => node.nodeType === Node.ELEMENT_NODE
+                ? (skip.has(node.tagName) ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_SKIP)
+                : NodeFilter.FILTER_ACCEPT,
+        });
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        const text = node.nodeValue.trim();
+        if (text) parts.push(text);
+    }
+    return {imgs, styles, text: parts.join("")};
+}
+"""
+
+_BG_PATTERN = re.compile(r'background-image:\s*url\(["\']?(.*?)["\']?\)', re.I)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
 
 
 async def _init_browser():
     """初始化 Playwright 浏览器（全局复用）"""
     global _global_browser
-    if not _global_browser:
+    async with _browser_lock:
+        if _global_browser:
+            return
         try:
             playwright = await async_playwright().start()
             # 启动浏览器（根据系统环境自动选择）
@@ -46,7 +101,7 @@ async def _init_browser():
                     "--disable-dev-shm-usage",
                     "--disable-gpu",
                     "--disable-images",
-                    "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                    f"--user-agent={USER_AGENT}",
                 ],
             )
             logger.info("Chromium 浏览器初始化成功")
@@ -55,6 +110,82 @@ async def _init_browser():
             raise
 
 
+class BrowserContextPool:
+    """
+    预热浏览器上下文池：上下文按需创建、用后归还复用，
+    使用 max_uses 次后关闭重建，避免长时间运行的内存膨胀。
+    每个上下文拦截 blocked_resources 类型的请求（默认图片/媒体/字体），只加载 DOM 所需资源。
+    """
+
+    def __init__(self, size: int, max_uses: int, blocked_resources: set[str]):
+        self.size = max(size, 1)
+        self.max_uses = max(max_uses, 1)
+        self.blocked_resources = blocked_resources
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle: list = []
+        self._uses: dict = {}
+
+    async def _block_resources(self, route):
+        if route.request.resource_type in self.blocked_resources:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_context(self):
+        if not _global_browser:
+            await _init_browser()
+        context = await _global_browser.new_context(user_agent=USER_AGENT)
+        # 页面请求超时配置
+        context.set_default_timeout(15 * 1000)  # 15秒超时
+        if self.blocked_resources:
+            await context.route("**/*", self._block_resources)
+        self._uses[context] = 0
+        logger.debug("创建了新的浏览器上下文")
+        return context
+
+    async def _discard(self, context):
+        self._uses.pop(context, None)
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"关闭浏览器上下文失败: {e}")
+
+    @asynccontextmanager
+    async def lease(self):
+        """借出一个上下文，用完归还；浏览器断开或清理失败的上下文不再复用"""
+        async with self._slots:
+            context = self._idle.pop() if self._idle else await self._new_context()
+            try:
+                yield context
+            finally:
+                self._uses[context] = self._uses.get(context, 0) + 1
+                reusable = (
+                    self._uses[context] < self.max_uses
+                    and _global_browser is not None
+                    and _global_browser.is_connected()
+                )
+                if reusable:
+                    try:
+                        await context.clear_cookies()
+                        self._idle.append(context)
+                    except Exception:
+                        reusable = False
+                if not reusable:
+                    await self._discard(context)
+
+
+def _get_context_pool() -> BrowserContextPool:
+    global _context_pool
+    if _context_pool is None:
+        blocked = os.getenv("WEB_PARSER_BLOCK_RESOURCES", "image,media,font")
+        _context_pool = BrowserContextPool(
+            size=_env_int("WEB_PARSER_POOL_SIZE", 4),
+            max_uses=_env_int("WEB_PARSER_CONTEXT_MAX_USES", 50),
+            blocked_resources={r.strip() for r in blocked.split(",") if r.strip()},
+        )
+    return _context_pool
+
+
 def _is_public_ip(url: str) -> bool:
     """
     检查URL是否解析为公网IP地址，以防止SSRF攻击
@@ -70,145 +201,171 @@ def _is_public_ip(url: str) -> bool:
         return False
 
 
-async def parse_webpage_local(url: str, render_js: bool = True, delay: int = 5):
-    """
-    通用网页解析工具：提取网页的图片URL列表和纯文本内容（基于Playwright）
-    :param url: 目标网页地址
-    :param render_js: 是否渲染JS（处理动态页面，默认True）
-    :param delay: 渲染延迟（秒，默认5）
-    :return: (img_url_list, text_content)
-    """
-    global _global_browser
+async def _check_content_length(url: str):
+    """增加DoS防护：只读取响应头检查Content-Length，不下载正文"""
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                url,
+                timeout=aiohttp.ClientTimeout(total=10),
+                headers={"User-Agent": USER_AGENT},
+            ) as r:
+                content_length = r.headers.get("Content-Length")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"检查响应大小时出错: {e}")
+        raise ValueError("无法访问URL")
+    if content_length and int(content_length) > MAX_CONTENT_LENGTH:
+        raise ValueError("响应内容大于10MB，因安全保护拒绝解析")
 
-    logger.info(f"开始网页解析：{url}，render_js={render_js}，延迟={delay}秒")
 
-    # 初始化浏览器（如果尚未初始化）
-    if not _global_browser:
-        await _init_browser()
+def _collect_images(url: str, imgs: list[str], styles: list[str]) -> list[str]:
+    """把页面内提取的原始属性转为去重后的绝对图片URL列表"""
+    img_url_list = []
 
-    if not _global_browser:
-        logger.error("浏览器未初始化")
-        raise RuntimeError("浏览器未初始化")
+    # 1.1 <img>标签的图片（src/data-src/lazy-src等）
+    for img_src in imgs:
+        absolute_url = urljoin(url, img_src)
+        # 过滤无效链接
+        if (
+            not absolute_url.startswith(("data:", "svg:", "javascript:", "blob:"))
+            and "." in absolute_url.split("/")[-1]
+        ):
+            img_url_list.append(absolute_url)
+    logger.debug(f"从{len(imgs)}个img标签中提取了{len(img_url_list)}张有效图片")
 
-    page = None
-    try:
-        # 创建新页面
-        context = await _global_browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
-        logger.debug("创建了新的浏览器上下文和页面")
+    # 1.2 背景图片（style中的background-image）
+    bg_count = 0
+    for style in styles:
+        match = _BG_PATTERN.search(style or "")
+        if match:
+            absolute_bg_url = urljoin(url, match.group(1))
+            if not absolute_bg_url.startswith(("data:", "svg:", "blob:")):
+                img_url_list.append(absolute_bg_url)
+                bg_count += 1
+    logger.debug(f"检查了{len(styles)}个内联样式，提取了{bg_count}张背景图片")
 
-        # 页面请求超时配置
-        page.set_default_timeout(15 * 1000)  # 15秒超时
-        logger.debug("将页面超时设置为15秒")
+    # 1.3 去重（保持页面顺序）
+    img_url_list = list(dict.fromkeys(img_url_list))
+    logger.debug(f"去重后最终图片列表：{len(img_url_list)}张图片")
+    return img_url_list
 
-        # 增加DoS防护：检查Content-Length
-        try:
-            with requests.get(url, stream=True, timeout=10) as r:
-                content_length = r.headers.get("Content-Length")
-                if content_length and int(content_length) > 10 * 1024 * 1024:  # 10MB
-                    raise ValueError("响应内容大于10MB，因安全保护拒绝解析")
-        except requests.RequestException as e:
-            logger.error(f"检查响应大小时出错: {e}")
-            raise ValueError("无法访问URL")
-
-        # 访问目标URL
-        await page.goto(url, wait_until="domcontentloaded" if render_js else "commit")
-        logger.info(f"成功访问URL：{url}")
-
-        # 渲染JS（等待动态内容加载）
-        if render_js:
-            logger.info(f"等待{delay}秒进行JS渲染")
+
+async def _parse(url: str, render_js: bool, delay: int) -> tuple[list[str], str]:
+    pool = _get_context_pool()
+    # 大小检查与借出上下文并行进行
+    size_check = asyncio.create_task(_check_content_length(url))
+    try:
+        async with pool.lease() as context:
+            await size_check
+            page = await context.new_page()
             try:
-                await page.wait_for_load_state("networkidle", timeout=delay * 1000)
-            except Exception:
-                import asyncio
-
-                await asyncio.sleep(delay)  # 等待页面加载完成
-            logger.debug("JS渲染完成")
-
-        # 获取页面完整HTML
-        html_content = await page.content()
-        logger.debug(f"获取到页面HTML，长度：{len(html_content)}字符")
-
-        # 1. 提取所有图片URL
-        img_url_list = []
-
-        # 1.1 提取<img>标签的图片（src/data-src/lazy-src等）
-        # 方式1：通过Playwright选择器提取（更高效）
-        img_elements = await page.query_selector_all("img")
-        logger.debug(f"在页面上找到{len(img_elements)}个img标签")
-
-        for img_elem in img_elements:
-            # 获取图片属性
-            img_src = (
-                await img_elem.get_attribute("src")
-                or await img_elem.get_attribute("data-src")
-                or await img_elem.get_attribute("lazy-src")
-                or await img_elem.get_attribute("data-lazy")
-            )
-            if img_src:
-                absolute_url = urljoin(url, img_src)
-                # 过滤无效链接
-                if (
-                    not absolute_url.startswith(
-                        ("data:", "svg:", "javascript:", "blob:")
-                    )
-                    and "." in absolute_url.split("/")[-1]
-                ):
-                    img_url_list.append(absolute_url)
-        logger.debug(f"从img标签中提取了{len(img_url_list)}张有效图片")
-
-        # 1.2 提取背景图片（style中的background-image）
-        bg_pattern = re.compile(r'background-image:\s*url\(["\']?(.*?)["\']?\)', re.I)
-        # 获取所有元素的style属性
-        all_elements = await page.query_selector_all("*")
-        logger.debug(f"检查了{len(all_elements)}个元素的背景图片")
-
-        for elem in all_elements:
-            style = await elem.get_attribute("style") or ""
-            match = bg_pattern.search(style)
-            if match:
-                bg_img = match.group(1)
-                absolute_bg_url = urljoin(url, bg_img)
-                if (
-                    absolute_bg_url not in img_url_list
-                    and not absolute_bg_url.startswith(("data:", "svg:", "blob:"))
-                ):
-                    img_url_list.append(absolute_bg_url)
-        logger.debug(
-            f"从背景样式中提取了{len(img_url_list) - len(set(img_url_list))}张有效图片"
-        )
+                # 访问目标URL
+                await page.goto(
+                    url, wait_until="domcontentloaded" if render_js else "commit"
+                )
+                logger.info(f"成功访问URL：{url}")
 
-        # 1.3 去重
-        img_url_list = list(set(img_url_list))
-        logger.debug(f"去重后最终图片列表：{len(img_url_list)}张图片")
+                # 渲染JS（等待动态内容加载，最长 delay 秒）
+                if render_js:
+                    logger.info(f"最多等待{delay}秒进行JS渲染")
+                    try:
+                        await page.wait_for_load_state(
+                            "networkidle", timeout=delay * 1000
+                        )
+                    except Exception:
+                        logger.debug("等待网络空闲超时，使用当前DOM")
+                    logger.debug("JS渲染完成")
 
-        # 2. 提取纯文本内容
-        logger.debug("正在提取文本内容")
-        soup = BeautifulSoup(html_content, "html.parser")
-        # 移除无用标签
-        for useless_tag in soup(
-            ["script", "style", "noscript", "iframe", "header", "footer"]
-        ):
-            useless_tag.extract()
-        # 格式化文本
-        raw_text = soup.get_text(strip=True)
-        text_content = re.sub(r"\s+", " ", raw_text)
-        logger.debug(f"提取到文本内容，长度：{len(text_content)}字符")
+                extracted = await page.evaluate(_EXTRACT_SCRIPT)
+            finally:
+                await page.close()
+    finally:
+        if not size_check.done():
+            size_check.cancel()
+
+    # 1. 图片URL
+    img_url_list = _collect_images(url, extracted["imgs"], extracted["styles"])
+
+    # 2. 纯文本内容
+    text_content = re.sub(r"\s+", " ", extracted["text"])
+    logger.debug(f"提取到文本内容，长度：{len(text_content)}字符")
+    return img_url_list, text_content
+
+
+def _cache_get(key: tuple):
+    entry = _result_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, img_url_list, text_content = entry
+    if expires_at < time.monotonic():
+        del _result_cache[key]
+        return None
+    _result_cache.move_to_end(key)
+    return list(img_url_list), text_content
+
+
+def _cache_put(key: tuple, img_url_list: list[str], text_content: str):
+    ttl = _env_int("WEB_PARSER_CACHE_TTL", 600)
+    if ttl <= 0:
+        return
+    _result_cache[key] = (time.monotonic() + ttl, list(img_url_list), text_content)
+    _result_cache.move_to_end(key)
+    while len(_result_cache) > _env_int("WEB_PARSER_CACHE_MAX_ENTRIES", 256):
+        _result_cache.popitem(last=False)
 
+
+async def parse_webpage_local(url: str, render_js: bool = True, delay: int = 5):
+    """
+    通用网页解析工具：提取网页的图片URL列表和纯文本内容（基于Playwright）
+    :param url: 目标网页地址
+    :param render_js: 是否渲染JS（处理动态页面，默认True）
+    :param delay: 渲染延迟（秒，默认5，网络空闲后提前结束）
+    :return: (img_url_list, text_content)
+    """
+    key = (url, render_js)
+    cached = _cache_get(key)
+    if cached is not None:
+        logger.info(f"命中网页解析缓存：{url}")
+        return cached
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        logger.info(f"等待进行中的同一网页解析：{url}")
+        img_url_list, text_content = await asyncio.shield(inflight)
+        return list(img_url_list), text_content
+
+    logger.info(f"开始网页解析：{url}，render_js={render_js}，延迟={delay}秒")
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        img_url_list, text_content = await _parse(url, render_js, delay)
+        _cache_put(key, img_url_list, text_content)
+        future.set_result((img_url_list, text_content))
         logger.info(
             f"解析完成：找到 {len(img_url_list)} 张图片，文本长度 {len(text_content)} 字符"
         )
-        return img_url_list, text_content
+        return list(img_url_list), text_content
 
     except Exception as e:
         logger.error(f"解析网页失败: {e}", exc_info=True)
+        future.set_exception(e)
+        # 没有其他等待方时避免 "exception was never retrieved" 警告
+        future.exception()
         raise
     finally:
-        # 关闭页面和上下文，释放资源
-        if page:
-            await page.close()
-        if "context" in locals():
-            await context.close()
+        _inflight.pop(key, None)
+        if not future.done():
+            future.cancel()
+
+
+async def parse_webpages_local(
+    urls: list[str], render_js: bool = True, delay: int = 5
+) -> list:
+    """
+    并发解析多个网页（并发度受上下文池大小 WEB_PARSER_POOL_SIZE 限制）
+    :return: 与 urls 顺序一致的列表，元素为 (img_url_list, text_content) 或异常对象
+    """
+    return await asyncio.gather(
+        *[parse_webpage_local(url, render_js, delay) for url in urls],
+        return_exceptions=True,
+    )
@@ -0,0 +1,115 @@
+# Copyright (c) 2025 Beijing Volcano Engine Technology Co., Ltd. and/or its affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+短链服务压测：先生成一批短链，再以恒定速率请求跳转接口，统计延迟分位数。
+
+用法（需要 aiohttp）：
+    uvicorn app:app --port 8005 --workers 1
+    python load_test.py --base-url http://127.0.0.1:8005 --qps 200 500 1000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+
+async def create_links(session: aiohttp.ClientSession, base_url: str, count: int):
+    codes = []
+    for i in range(count):
+        async with session.post(
+            f"{base_url}/shorten",
+            json={"url": f"https://example.com/asset/{i}?sig=load-test"},
+        ) as response:
+            response.raise_for_status()
+            codes.append((await response.json())["short_code"])
+    return codes
+
+
+async def run_rate(
+    session: aiohttp.ClientSession,
+    base_url: str,
+    codes: list,
+    qps: float,
+    duration: float,
+) -> dict:
+    """以恒定速率发起跳转请求（按计划时间发出，不等待上一个请求返回）"""
+    latencies = []
+    errors = 0
+
+    async def one(code: str):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            async with session.get(f"{base_url}/t/image/{code}") as response:
+                await response.read()
+                errors += response.status != 200
+        except aiohttp.ClientError:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+
+    total = int(qps * duration)
+    tasks = []
+    start = time.perf_counter()
+    for i in range(total):
+        delay = start + i / qps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(random.choice(codes))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[max(int(p * len(latencies)) - 1, 0)] * 1000
+
+    return {
+        "qps": qps,
+        "requests": total,
+        "errors": errors,
+        "achieved_qps": round(total / elapsed),
+        "p50_ms": round(percentile(0.5), 2),
+        "p99_ms": round(percentile(0.99), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="短链服务压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8005")
+    parser.add_argument("--links", type=int, default=2000, help="预先生成的短链数")
+    parser.add_argument(
+        "--qps", type=float, nargs="+", default=[200, 500, 1000], help="目标速率"
+    )
+    parser.add_argument("--duration", type=float, default=5, help="每档持续秒数")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    connector = aiohttp.TCPConnector(limit=200)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        codes = await create_links(session, base_url, args.links)
+        for qps in args.qps:
+            result = await run_rate(session, base_url, codes, qps, args.duration)
+            print(
+                f"{result['qps']:.0f} QPS  requests={result['requests']}  "
+                f"errors={result['errors']}  achieved={result['achieved_qps']}/s  "
+                f"p50={result['p50_ms']}ms  p99={result['p99_ms']}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -14,18 +14,21 @@
 
 import asyncio
 import base64
-import concurrent.futures
-import contextvars
 import json
 import mimetypes
+import os
+import threading
+import time
 import traceback
-from typing import Dict
+import weakref
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
 
 from google.adk.tools import ToolContext
 from google.genai.types import Blob, Part
 from opentelemetry import trace
 from opentelemetry.trace import Span
-from volcenginesdkarkruntime import Ark
+from volcenginesdkarkruntime import AsyncArk
 from volcenginesdkarkruntime.types.images.images import SequentialImageGenerationOptions
 
 from veadk.config import getenv, settings
@@ -39,16 +42,144 @@ from veadk.version import VERSION
 
 logger = get_logger(__name__)
 
-client = Ark(
-    api_key=getenv(
-        "MODEL_IMAGE_API_KEY", getenv("MODEL_AGENT_API_KEY", settings.model.api_key)
-    ),
-    base_url=getenv("MODEL_IMAGE_API_BASE", DEFAULT_IMAGE_GENERATE_MODEL_API_BASE),
-)
-
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
 tracer = trace.get_tracer("veadk")
 
+# Streamed events of a sequential (group) image generation
+STREAM_EVENT_SUCCEEDED = "image_generation.partial_succeeded"
+STREAM_EVENT_FAILED = "image_generation.partial_failed"
+STREAM_EVENT_COMPLETED = "image_generation.completed"
+
+# AsyncArk clients and limiters hold loop-bound connections / primitives, so
+# keep one per event loop (dropped when the loop is garbage collected)
+_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_limiters: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_uploader: Optional["TosImageUploader"] = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _get_client() -> AsyncArk:
+    """AsyncArk client of the running loop, so its tasks share one connection pool."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncArk(
+            api_key=getenv(
+                "MODEL_IMAGE_API_KEY",
+                getenv("MODEL_AGENT_API_KEY", settings.model.api_key),
+            ),
+            base_url=getenv(
+                "MODEL_IMAGE_API_BASE", DEFAULT_IMAGE_GENERATE_MODEL_API_BASE
+            ),
+        )
+    return client
+
+
+class ImageRequestLimiter:
+    """Bounds in-flight image requests and spaces request starts to stay under RPM.
+
+    - concurrency: max requests in flight (IMAGE_GENERATE_CONCURRENCY)
+    - rpm: max requests started per minute, 0 disables (IMAGE_GENERATE_RPM)
+    """
+
+    def __init__(self, concurrency: int, rpm: int = 0):
+        self.concurrency = max(concurrency, 1)
+        self.rpm = max(rpm, 0)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._interval = 60.0 / self.rpm if self.rpm else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "ImageRequestLimiter":
+        await self._semaphore.acquire()
+        if self._interval:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self._interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._semaphore.release()
+
+
+def _get_limiter() -> ImageRequestLimiter:
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = _limiters[loop] = ImageRequestLimiter(
+            concurrency=_env_int("IMAGE_GENERATE_CONCURRENCY", 16),
+            rpm=_env_int("IMAGE_GENERATE_RPM", 0),
+        )
+        logger.debug(
+            f"Image generate limiter: concurrency={limiter.concurrency}, "
+            f"rpm={limiter.rpm or 'unlimited'}"
+        )
+    return limiter
+
+
+class TosImageUploader:
+    """Uploads generated images to TOS through one shared VeTOS client.
+
+    The TOS SDK is blocking, so uploads run in worker threads, bounded by
+    IMAGE_UPLOAD_CONCURRENCY to cap the decoded bytes held at once.
+    """
+
+    def __init__(self, bucket_name: Optional[str], concurrency: int):
+        self.bucket_name = bucket_name
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._ve_tos = None
+        self._init_lock = threading.Lock()
+
+    def _tos(self):
+        if self._ve_tos is None:
+            with self._init_lock:
+                if self._ve_tos is None:
+                    from veadk.integrations.ve_tos.ve_tos import VeTOS
+
+                    self._ve_tos = VeTOS()
+        return self._ve_tos
+
+    def _upload_sync(self, image_bytes: bytes, object_key: str) -> str:
+        ve_tos = self._tos()
+        tos_url = ve_tos.build_tos_signed_url(
+            object_key=object_key, bucket_name=self.bucket_name
+        )
+        ve_tos.upload_bytes(
+            data=image_bytes, object_key=object_key, bucket_name=self.bucket_name
+        )
+        return tos_url
+
+    async def upload_b64(self, b64: str, object_key: str) -> Optional[str]:
+        """Decode a base64 image and upload it; returns the signed URL or None."""
+        async with self._semaphore:
+            try:
+                timestamp: str = datetime.now().strftime("%Y%m%d%H%M%S%f")[:-3]
+                image_bytes = base64.b64decode(b64)
+                return await asyncio.to_thread(
+                    self._upload_sync, image_bytes, f"{timestamp}-{object_key}"
+                )
+            except Exception as e:
+                logger.error(f"Upload to TOS failed: {e}")
+                return None
+
+
+def _get_uploader() -> TosImageUploader:
+    global _uploader
+    if _uploader is None:
+        _uploader = TosImageUploader(
+            bucket_name=os.getenv("DATABASE_TOS_BUCKET"),
+            concurrency=_env_int("IMAGE_UPLOAD_CONCURRENCY", 4),
+        )
+    return _uploader
+
 
 def _build_input_parts(item: dict, task_type: str, image_field):
     input_part = {"role": "user"}
@@ -79,14 +210,79 @@ def _build_input_parts(item: dict, task_type: str, image_field):
     return input_part
 
 
-def handle_single_task_sync(
+def _image_stream_enabled() -> bool:
+    return os.getenv("IMAGE_GENERATE_STREAM", "true").lower() not in (
+        "false",
+        "0",
+        "no",
+    )
+
+
+async def _iter_images(
+    inputs: dict, max_images: Optional[int], usage: dict
+) -> AsyncIterator[tuple[int, object]]:
+    """Yield (image_index, image_data) as soon as each image is available.
+
+    With streaming enabled the images of a group arrive one event at a time;
+    otherwise each entry is detached from the response once yielded, so its
+    base64 payload can be freed right after upload.
+    """
+    kwargs = dict(
+        model=getenv("MODEL_IMAGE_NAME", DEFAULT_IMAGE_GENERATE_MODEL_NAME),
+        **inputs,
+        extra_headers={
+            "veadk-source": "veadk",
+            "veadk-version": VERSION,
+            "User-Agent": f"VeADK/{VERSION}",
+            "X-Client-Request-Id": getenv(
+                "MODEL_AGENT_CLIENT_REQ_ID", f"veadk/{VERSION}"
+            ),
+        },
+    )
+    if inputs.get("sequential_image_generation") == "auto" and max_images:
+        kwargs["sequential_image_generation_options"] = (
+            SequentialImageGenerationOptions(max_images=max_images)
+        )
+
+    client = _get_client()
+    if _image_stream_enabled():
+        events = await client.images.generate(**kwargs, stream=True)
+        yielded = 0
+        async for event in events:
+            event_type = getattr(event, "type", None)
+            if event_type in (STREAM_EVENT_SUCCEEDED, STREAM_EVENT_FAILED):
+                yielded += 1
+                yield getattr(event, "image_index", 0) or 0, event
+            elif event_type == STREAM_EVENT_COMPLETED:
+                event_usage = getattr(event, "usage", None)
+                usage["total_tokens"] = getattr(event_usage, "total_tokens", 0) or 0
+                usage["output_tokens"] = getattr(event_usage, "output_tokens", 0) or 0
+                error = getattr(event, "error", None)
+                if error and not yielded:
+                    # the request failed as a whole, same as response.error below
+                    raise RuntimeError(f"No images returned by model: {error}")
+                if error:
+                    logger.error(f"Image generation completed with error: {error}")
+        return
+
+    response = await client.images.generate(**kwargs)
+    if response.error:
+        raise RuntimeError(f"No images returned by model: {response.error}")
+    usage["total_tokens"] = getattr(response.usage, "total_tokens", 0) or 0
+    usage["output_tokens"] = getattr(response.usage, "output_tokens", 0) or 0
+    data = response.data
+    for i in range(len(data)):
+        image_data, data[i] = data[i], None
+        yield i, image_data
+
+
+async def handle_single_task(
     idx: int, item: dict, tool_context
 ) -> tuple[list[dict], list[str]]:
-    logger.debug(f"handle_single_task_sync item {idx}: {item}")
+    logger.debug(f"handle_single_task item {idx}: {item}")
     success_list: list[dict] = []
     error_list: list[str] = []
-    total_tokens = 0
-    output_tokens = 0
+    usage = {"total_tokens": 0, "output_tokens": 0}
     output_part = {"message.role": "model"}
 
     task_type = item.get("task_type", "text_to_single")
@@ -112,92 +308,52 @@ def handle_single_task_sync(
     if image_field is not None:
         inputs["image"] = [image_field]
 
+    def record(i: int, image_name: str, image_url: str) -> None:
+        tool_context.state[f"{image_name}_url"] = image_url
+        output_part[f"message.parts.{i}.type"] = "image_url"
+        output_part[f"message.parts.{i}.image_url.name"] = image_name
+        output_part[f"message.parts.{i}.image_url.url"] = image_url
+        logger.debug(f"Image {image_name} generated successfully: {image_url}")
+        success_list.append({image_name: image_url})
+
+    async def upload(i: int, image_name: str, b64: str) -> None:
+        image_url = await _get_uploader().upload_b64(b64, f"{image_name}.png")
+        if not image_url:
+            logger.error(f"Upload image to TOS failed: {image_name}")
+            error_list.append(image_name)
+            return
+        logger.debug(f"Image saved as ADK artifact: {image_name}")
+        record(i, image_name, image_url)
+
     with tracer.start_as_current_span(f"call_llm_task_{idx}") as span:
+        uploads: list[asyncio.Task] = []
         try:
-            if (
-                sequential_image_generation
-                and sequential_image_generation == "auto"
-                and max_images
-            ):
-                response = client.images.generate(
-                    model=getenv("MODEL_IMAGE_NAME", DEFAULT_IMAGE_GENERATE_MODEL_NAME),
-                    **inputs,
-                    sequential_image_generation_options=SequentialImageGenerationOptions(
-                        max_images=max_images
-                    ),
-                    extra_headers={
-                        "veadk-source": "veadk",
-                        "veadk-version": VERSION,
-                        "User-Agent": f"VeADK/{VERSION}",
-                        "X-Client-Request-Id": getenv(
-                            "MODEL_AGENT_CLIENT_REQ_ID", f"veadk/{VERSION}"
-                        ),
-                    },
-                )
-            else:
-                response = client.images.generate(
-                    model=getenv("MODEL_IMAGE_NAME", DEFAULT_IMAGE_GENERATE_MODEL_NAME),
-                    **inputs,
-                    extra_headers={
-                        "veadk-source": "veadk",
-                        "veadk-version": VERSION,
-                        "User-Agent": f"VeADK/{VERSION}",
-                        "X-Client-Request-Id": getenv(
-                            "MODEL_AGENT_CLIENT_REQ_ID", f"veadk/{VERSION}"
-                        ),
-                    },
-                )
-
-            if not response.error:
-                logger.debug(f"task {idx} Image generate response: {response}")
-
-                total_tokens += getattr(response.usage, "total_tokens", 0) or 0
-                output_tokens += getattr(response.usage, "output_tokens", 0) or 0
-
-                for i, image_data in enumerate(response.data):
+            async with _get_limiter():
+                async for i, image_data in _iter_images(inputs, max_images, usage):
                     image_name = f"task_{idx}_image_{i}"
-                    if "error" in image_data:
+                    if getattr(image_data, "error", None):
                         logger.error(f"Image {image_name} error: {image_data.error}")
                         error_list.append(image_name)
-                        continue
-
-                    if getattr(image_data, "url", None):
-                        image_url = image_data.url
-                    else:
-                        b64 = getattr(image_data, "b64_json", None)
-                        if not b64:
-                            logger.error(
-                                f"Image {image_name} missing data (no url/b64)"
+                    elif getattr(image_data, "url", None):
+                        record(i, image_name, image_data.url)
+                    elif getattr(image_data, "b64_json", None):
+                        # upload while the remaining images are still generating
+                        uploads.append(
+                            asyncio.create_task(
+                                upload(i, image_name, image_data.b64_json)
                             )
-                            error_list.append(image_name)
-                            continue
-                        image_bytes = base64.b64decode(b64)
-                        image_url = _upload_image_to_tos(
-                            image_bytes=image_bytes, object_key=f"{image_name}.png"
                         )
-                        if not image_url:
-                            logger.error(f"Upload image to TOS failed: {image_name}")
-                            error_list.append(image_name)
-                            continue
-                        logger.debug(f"Image saved as ADK artifact: {image_name}")
-
-                    tool_context.state[f"{image_name}_url"] = image_url
-                    output_part[f"message.parts.{i}.type"] = "image_url"
-                    output_part[f"message.parts.{i}.image_url.name"] = image_name
-                    output_part[f"message.parts.{i}.image_url.url"] = image_url
-                    logger.debug(
-                        f"Image {image_name} generated successfully: {image_url}"
-                    )
-                    success_list.append({image_name: image_url})
-            else:
-                logger.error(
-                    f"Task {idx} No images returned by model: {response.error}"
-                )
-                error_list.append(f"task_{idx}")
+                    else:
+                        logger.error(f"Image {image_name} missing data (no url/b64)")
+                        error_list.append(image_name)
+
+            await asyncio.gather(*uploads)
 
         except Exception as e:
             logger.error(f"Error in task {idx}: {e}")
             traceback.print_exc()
+            for task in uploads:
+                task.cancel()
             error_list.append(f"task_{idx}")
 
         finally:
@@ -206,8 +362,8 @@ def handle_single_task_sync(
                 tool_context,
                 input_part=input_part,
                 output_part=output_part,
-                output_tokens=output_tokens,
-                total_tokens=total_tokens,
+                output_tokens=usage["output_tokens"],
+                total_tokens=usage["total_tokens"],
                 request_model=getenv(
                     "MODEL_IMAGE_NAME", DEFAULT_IMAGE_GENERATE_MODEL_NAME
                 ),
@@ -325,19 +481,13 @@ async def image_generate(tasks: list[dict], tool_context) -> Dict:
     logger.debug(f"image_generate tasks: {tasks}")
 
     with tracer.start_as_current_span("image_generate"):
-        base_ctx = contextvars.copy_context()
-
-        def make_task(idx, item):
-            ctx = base_ctx.copy()
-            return lambda: ctx.run(handle_single_task_sync, idx, item, tool_context)
-
-        loop = asyncio.get_event_loop()
-        futures = [
-            loop.run_in_executor(executor, make_task(idx, item))
-            for idx, item in enumerate(tasks)
-        ]
-
-        results = await asyncio.gather(*futures, return_exceptions=True)
+        results = await asyncio.gather(
+            *[
+                handle_single_task(idx, item, tool_context)
+                for idx, item in enumerate(tasks)
+            ],
+            return_exceptions=True,
+        )
 
         for res in results:
             if isinstance(res, Exception):
@@ -436,29 +586,3 @@ def add_span_attributes(
 
     except Exception:
         traceback.print_exc()
-
-
-def _upload_image_to_tos(image_bytes: bytes, object_key: str) -> None:
-    try:
-        import os
-        from datetime import datetime
-
-        from veadk.integrations.ve_tos.ve_tos import VeTOS
-
-        timestamp: str = datetime.now().strftime("%Y%m%d%H%M%S%f")[:-3]
-        object_key = f"{timestamp}-{object_key}"
-        bucket_name = os.getenv("DATABASE_TOS_BUCKET")
-        ve_tos = VeTOS()
-
-        tos_url = ve_tos.build_tos_signed_url(
-            object_key=object_key, bucket_name=bucket_name
-        )
-
-        ve_tos.upload_bytes(
-            data=image_bytes, object_key=object_key, bucket_name=bucket_name
-        )
-
-        return tos_url
-    except Exception as e:
-        logger.error(f"Upload to TOS failed: {e}")
-        return None
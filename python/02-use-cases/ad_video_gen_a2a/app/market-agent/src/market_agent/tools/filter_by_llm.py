@@ -15,7 +15,7 @@
 import asyncio
 import json
 import os
-from typing import Any
+from typing import Any, AsyncIterable
 
 from openai import AsyncOpenAI
 from pydantic import BaseModel
@@ -59,8 +59,12 @@ def repair_image_input(image_list: list[str]) -> list[dict[str, Any]]:
     return result
 
 
-async def filter_images(image_list: list[str]) -> list[str]:
-    inputs = repair_image_input(image_list)
+async def filter_images(image_list: list[str] | AsyncIterable[str]) -> list[str]:
+    """
+    LLM 过滤商品图片；image_list 可以是异步迭代器（如 iter_valid_images），
+    每产出一个URL立即开始过滤，无需等待全部图片检测完成。
+    返回结果按输入（产出）顺序排列。
+    """
     client = AsyncOpenAI(
         base_url=os.getenv("MODEL_AGENT_API_BASE"),
         api_key=os.getenv("MODEL_AGENT_API_KEY"),
@@ -89,7 +93,18 @@ async def filter_images(image_list: list[str]) -> list[str]:
                 x = False
             return _input["image_url"] if x else None
 
-    result = await asyncio.gather(*(process_message(_input) for _input in inputs))
+    if isinstance(image_list, list):
+        tasks = [
+            asyncio.create_task(process_message(_input))
+            for _input in repair_image_input(image_list)
+        ]
+    else:
+        tasks = []
+        async for image in image_list:
+            for _input in repair_image_input([image]):
+                tasks.append(asyncio.create_task(process_message(_input)))
+
+    result = await asyncio.gather(*tasks)
     result = [r for r in result if r is not None]
     return result
 
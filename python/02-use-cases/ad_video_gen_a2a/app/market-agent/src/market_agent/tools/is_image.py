@@ -13,9 +13,16 @@
 # limitations under the License.
 
 import asyncio
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
 import aiohttp
 import requests
-from typing import List, Tuple
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
 
 # 图片魔数映射（前N字节特征）
 IMAGE_MAGIC_NUMBERS = {
@@ -28,9 +35,91 @@ IMAGE_MAGIC_NUMBERS = {
     b"\x3c\x73\x76\x67": "svg",  # SVG（文本开头<svg）
 }
 
+# 检测结果缓存：url -> (过期时间, 是否为图片, 验证依据)
+_verdict_cache: "OrderedDict[str, Tuple[float, bool, str]]" = OrderedDict()
+
+# 共享会话（aiohttp 按 host 维护 keep-alive 连接池，跨批次复用）
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _match_magic(header_bytes: bytes) -> bool:
+    """按文件头魔数判断是否为图片"""
+    for magic, _ in IMAGE_MAGIC_NUMBERS.items():
+        if header_bytes.startswith(magic):
+            # WebP特殊验证（RIFF后需包含WEBP）
+            if magic == b"\x52\x49\x46\x46" and b"WEBP" not in header_bytes:
+                continue
+            # SVG特殊验证（文本格式，需兼容大小写）
+            if magic == b"\x3c\x73\x76\x67" and not header_bytes.lower().startswith(
+                b"<svg"
+            ):
+                continue
+            return True
+    return False
+
+
+# ==================== 结果缓存 ====================
+
+
+def _cache_get(url: str) -> Optional[Tuple[bool, str]]:
+    entry = _verdict_cache.get(url)
+    if entry is None:
+        return None
+    expires_at, is_image, reason = entry
+    if expires_at < time.monotonic():
+        del _verdict_cache[url]
+        return None
+    _verdict_cache.move_to_end(url)
+    return is_image, reason
+
+
+def _cache_put(url: str, is_image: bool, reason: str):
+    """
+    图片结果长期缓存（IMAGE_CHECK_CACHE_TTL，默认1天）；
+    非图片与请求失败按 IMAGE_CHECK_NEGATIVE_TTL（默认10分钟）缓存，避免反复探测失效链接
+    """
+    if is_image:
+        ttl = _env_int("IMAGE_CHECK_CACHE_TTL", 86400)
+    else:
+        ttl = _env_int("IMAGE_CHECK_NEGATIVE_TTL", 600)
+    if ttl <= 0:
+        return
+    _verdict_cache[url] = (time.monotonic() + ttl, is_image, reason)
+    _verdict_cache.move_to_end(url)
+    while len(_verdict_cache) > _env_int("IMAGE_CHECK_CACHE_MAX_ENTRIES", 20000):
+        _verdict_cache.popitem(last=False)
+
+
+# ==================== 同步检测 ====================
+
 
 def is_image_resource(
     url: str, timeout: float = 3.0, allow_redirects: bool = True
+) -> Tuple[bool, str]:
+    """
+    同步判断单个URL是否为图片资源（非URL后缀，仅验证HTTP头/文件内容），结果与异步检测共用缓存
+    :param url: 待检测URL
+    :param timeout: 超时时间（秒）
+    :param allow_redirects: 是否允许重定向
+    :return: (是否为图片, 验证依据)
+    """
+    cached = _cache_get(url)
+    if cached is None:
+        cached = _is_image_resource_uncached(url, timeout, allow_redirects)
+        _cache_put(url, *cached)
+    return cached
+
+
+def _is_image_resource_uncached(
+    url: str, timeout: float = 3.0, allow_redirects: bool = True
 ) -> Tuple[bool, str]:
     """
     同步判断单个URL是否为图片资源（非URL后缀，仅验证HTTP头/文件内容）
@@ -73,18 +162,8 @@ def is_image_resource(
             # 读取前16字节（足够覆盖所有图片魔数）
             header_bytes = resp.raw.read(16) if resp.raw else b""
             # 匹配魔数
-            for magic, _ in IMAGE_MAGIC_NUMBERS.items():
-                if header_bytes.startswith(magic):
-                    # WebP特殊验证（RIFF后需包含WEBP）
-                    if magic == b"\x52\x49\x46\x46" and b"WEBP" not in header_bytes:
-                        continue
-                    # SVG特殊验证（文本格式，需兼容大小写）
-                    if (
-                        magic == b"\x3c\x73\x76\x67"
-                        and not header_bytes.lower().startswith(b"<svg")
-                    ):
-                        continue
-                    return True, "magic_number"
+            if _match_magic(header_bytes):
+                return True, "magic_number"
             return False, "content_type"
         finally:
             resp.close()  # 强制关闭连接，避免资源泄漏
@@ -94,11 +173,41 @@ def is_image_resource(
         return False, f"error: {str(e)[:50]}"
 
 
+# ==================== 异步批量检测 ====================
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """进程级会话：连接按 host 保持 keep-alive，单 host 并发受 IMAGE_CHECK_PER_HOST 限制"""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=0,  # 总连接数不限制（靠 semaphore 控制）
+                limit_per_host=_env_int("IMAGE_CHECK_PER_HOST", 6),
+                keepalive_timeout=30,
+                ttl_dns_cache=300,
+            ),
+            headers={"User-Agent": USER_AGENT},
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_image_check_session():
+    """关闭共享会话（应用退出时调用）"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
 async def async_is_image_resource(
     url: str, session: aiohttp.ClientSession, timeout: float = 3.0
 ) -> Tuple[str, bool, str]:
     """
-    异步判断单个URL是否为图片资源（批量场景首选）
+    异步判断单个URL是否为图片资源（不查缓存）
+    先发 HEAD；HEAD 失败或 Content-Type 无法判定时，用 Range 请求只取前16字节验证魔数
     :param url: 待检测URL
     :param session: aiohttp会话（复用连接，提升批量性能）
     :param timeout: 超时时间（秒）
@@ -106,38 +215,100 @@ async def async_is_image_resource(
     """
     timeout_obj = aiohttp.ClientTimeout(total=timeout)
     try:
-        # 1. 发起GET请求（aiohttp对HEAD支持较差，直接用GET+stream）
+        # 1. HEAD 请求（仅响应头）
+        try:
+            async with session.head(
+                url, timeout=timeout_obj, allow_redirects=True
+            ) as resp:
+                content_type = resp.headers.get("Content-Type", "").lower()
+                if resp.status == 200:
+                    if content_type.startswith("image/"):
+                        return url, True, "content_type"
+                    # 明确的文本类型无需再下载
+                    if content_type.startswith(("text/html", "application/json")):
+                        return url, False, "content_type"
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+        # 2. Range GET：只取前16字节
         async with session.get(
             url,
             timeout=timeout_obj,
             allow_redirects=True,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            },
+            headers={"Range": "bytes=0-15"},
         ) as resp:
-            # 2. 验证Content-Type
             content_type = resp.headers.get("Content-Type", "").lower()
             if content_type.startswith("image/"):
                 return url, True, "content_type"
 
             # 3. 验证魔数（仅读取前16字节）
             header_bytes = await resp.content.read(16)
-            for magic, _ in IMAGE_MAGIC_NUMBERS.items():
-                if header_bytes.startswith(magic):
-                    if magic == b"\x52\x49\x46\x46" and b"WEBP" not in header_bytes:
-                        continue
-                    if (
-                        magic == b"\x3c\x73\x76\x67"
-                        and not header_bytes.lower().startswith(b"<svg")
-                    ):
-                        continue
-                    return url, True, "magic_number"
+            if _match_magic(header_bytes):
+                return url, True, "magic_number"
             return url, False, "content_type"
 
     except Exception as e:
         return url, False, f"error: {str(e)[:50]}"
 
 
+async def iter_check_images(
+    urls: Iterable[str],
+    timeout: float = 3.0,
+    max_concurrency: int = 50,  # 并发数
+) -> AsyncIterator[Tuple[str, bool, str]]:
+    """
+    流式批量检测：缓存命中的结果立即返回，其余按完成顺序逐个产出
+    URL 按 host 分组，每个 host 最多 IMAGE_CHECK_PER_HOST 个请求并行，
+    同一 host 的请求复用 keep-alive 连接依次发出。
+    重复 URL 只检测、只产出一次。
+    :return: 异步迭代器，元素为(url, 是否为图片, 验证依据)
+    """
+    by_host: Dict[str, List[str]] = defaultdict(list)
+    for url in dict.fromkeys(urls):
+        cached = _cache_get(url)
+        if cached is not None:
+            yield (url, *cached)
+        else:
+            by_host[urlsplit(url).netloc].append(url)
+    if not by_host:
+        return
+
+    session = _get_session()
+    # 限制总并发数（防止请求过多被封禁）
+    semaphore = asyncio.Semaphore(max_concurrency)
+    per_host = _env_int("IMAGE_CHECK_PER_HOST", 6)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def host_worker(queue: List[str]):
+        while queue:
+            url = queue.pop()
+            async with semaphore:
+                result = await async_is_image_resource(url, session, timeout)
+            _cache_put(*result)
+            await results.put(result)
+
+    workers = [
+        asyncio.create_task(host_worker(queue))
+        for queue in by_host.values()
+        for _ in range(min(per_host, len(queue)))
+    ]
+    try:
+        for _ in range(sum(len(queue) for queue in by_host.values())):
+            yield await results.get()
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+
+async def iter_valid_images(
+    urls: Iterable[str], timeout: float = 3.0, max_concurrency: int = 50
+) -> AsyncIterator[str]:
+    """流式产出检测为图片的URL（供 filter_images 边检测边过滤）"""
+    async for url, is_image, _ in iter_check_images(urls, timeout, max_concurrency):
+        if is_image:
+            yield url
+
+
 async def batch_check_images(
     urls: List[str],
     timeout: float = 3.0,
@@ -148,18 +319,12 @@ async def batch_check_images(
     :param urls: URL列表
     :param timeout: 单URL超时时间
     :param max_concurrency: 最大并发数
-    :return: 列表，每个元素为(url, 是否为图片, 验证依据)
+    :return: 与 urls 顺序一致的列表，每个元素为(url, 是否为图片, 验证依据)
     """
-    # 限制并发数（防止请求过多被封禁）
-    semaphore = asyncio.Semaphore(max_concurrency)
-
-    async def bounded_check(url):
-        async with semaphore:
-            return await async_is_image_resource(url, session, timeout)
-
-    # 创建复用的aiohttp会话（提升性能）
-    connector = aiohttp.TCPConnector(limit=0)  # 连接池不限制（靠semaphore控制）
-    async with aiohttp.ClientSession(connector=connector) as session:
-        tasks = [bounded_check(url) for url in urls]
-        results = await asyncio.gather(*tasks)
-    return results
+    verdicts = {
+        url: (url, is_image, reason)
+        async for url, is_image, reason in iter_check_images(
+            urls, timeout, max_concurrency
+        )
+    }
+    return [verdicts[url] for url in urls]
@@ -12,11 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 from typing import Any
 from urllib.parse import urlparse
 
 from market_agent.tools.image_understand import comment_image
-from market_agent.tools.is_image import batch_check_images
+from market_agent.tools.is_image import batch_check_images, iter_valid_images
 from market_agent.tools.web_parse import parse_webpage
 from market_agent.tools.filter_by_llm import summarize_text, filter_images
 from veadk.utils.logger import get_logger
@@ -45,6 +46,18 @@ async def read_url_link(link_list: list[str]) -> str | list[dict[str, Any]]:
     logger.debug(f"开始解析链接：{link_list}")
     is_images_results = await batch_check_images(link_list)
     logger.debug(f"图片检测结果： {is_images_results}")
+    # 非图片链接并发解析（并发度由网页解析的浏览器上下文池控制）
+    page_links = [
+        link
+        for link, (_, is_image, _) in zip(link_list, is_images_results)
+        if not is_image
+    ]
+    parsed_pages = dict(
+        zip(
+            page_links,
+            await asyncio.gather(*[parse_webpage(link) for link in page_links]),
+        )
+    )
     result = []
     for i, link in enumerate(link_list):
         # try:
@@ -57,9 +70,11 @@ async def read_url_link(link_list: list[str]) -> str | list[dict[str, Any]]:
         else:
             # 调用 `LinkReader` 工具进行网页内容抓取与解析（避免控制台打印完整链接）
             logger.debug(f"调用parse_webpage解析链接域名：{urlparse(link).netloc}")
-            images, text = await parse_webpage(link)
-            # 过滤掉无效的图片链接
-            images = await filter_images(images)
+            images, text = parsed_pages[link]
+            # 过滤掉无效的图片链接（边检测是否为图片边交给LLM过滤），按页面顺序排列
+            page_order = {image: index for index, image in enumerate(images)}
+            images = await filter_images(iter_valid_images(images))
+            images.sort(key=page_order.__getitem__)
             # 对文本内容进行总结
             text = await summarize_text(text)
             logger.debug(
@@ -14,7 +14,13 @@
 
 import os
 import hashlib
+import heapq
+import json
 import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
@@ -23,6 +29,9 @@ SHORT_LINK_MODE = os.getenv(
     "SHORT_LINK_MODE", "dict"
 )  # 默认为字典模式，可选值: "redis", "dict"
 
+# 短链接有效期（秒）
+SHORT_LINK_TTL = int(os.getenv("SHORT_LINK_TTL", 24 * 3600))
+
 # 条件导入Redis
 if SHORT_LINK_MODE == "redis":
     try:
@@ -43,67 +52,6 @@ logger = logging.getLogger("short_link")
 if not logger.handlers:
     logging.basicConfig(level=logging.INFO)
 
-# 创建FastAPI应用
-app = FastAPI(
-    title="Short Link Service",
-    version="1.0.0",
-    docs_url=None,
-    redoc_url=None,
-    openapi_url=None,
-)
-
-# 存储后端初始化
-if SHORT_LINK_MODE == "redis" and REDIS_AVAILABLE:
-    # 连接Redis
-    storage_client = redis.Redis(
-        host=os.getenv("REDIS_HOST"),
-        port=int(os.getenv("REDIS_PORT", 6379)),
-        username=os.getenv("REDIS_USERNAME"),
-        password=os.getenv("REDIS_PASSWORD"),
-        db=int(os.getenv("REDIS_DB", 0)),
-        decode_responses=True,
-    )
-else:
-    # 使用字典作为存储后端
-    logger.info(f"使用字典模式存储短链接 (SHORT_LINK_MODE={SHORT_LINK_MODE})")
-    # 初始化字典存储
-    dict_storage = {
-        "auto_id_counter": 0,
-        "long_md5": {},  # long:md5:{md5} -> short_code
-        "short": {},  # short:{short_code} -> url
-    }
-
-    # 模拟Redis客户端的异步接口
-    class DictStorageClient:
-        def __init__(self, storage):
-            self.storage = storage
-
-        async def get(self, key: str):
-            if key.startswith("long:md5:"):
-                md5 = key.replace("long:md5:", "")
-                return self.storage["long_md5"].get(md5)
-            elif key.startswith("short:"):
-                short_code = key.replace("short:", "")
-                return self.storage["short"].get(short_code)
-            return None
-
-        async def setex(self, key: str, ttl: int, value: str):
-            # 字典模式不支持TTL，但保留接口兼容性
-            if key.startswith("long:md5:"):
-                md5 = key.replace("long:md5:", "")
-                self.storage["long_md5"][md5] = value
-            elif key.startswith("short:"):
-                short_code = key.replace("short:", "")
-                self.storage["short"][short_code] = value
-
-        async def incr(self, key: str):
-            if key == "auto_id:counter":
-                self.storage["auto_id_counter"] += 1
-                return self.storage["auto_id_counter"]
-            return 0
-
-    storage_client = DictStorageClient(dict_storage)
-
 # 进制转换字符集
 CHAR_SET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
 BASE = len(CHAR_SET)
@@ -124,6 +72,283 @@ def encode_id(unique_id: int) -> str:
     return "".join(reversed(short_code))
 
 
+def decode_id(short_code: str) -> int:
+    """短码还原为自增ID（encode_id 的逆运算）"""
+    unique_id = 0
+    for char in short_code:
+        unique_id = unique_id * BASE + CHAR_SET.index(char)
+    return unique_id
+
+
+class EmbeddedStorage:
+    """
+    进程内短链接存储（字典模式）
+    - 按短码哈希分片，每个分片维护 短码 -> (url, md5, 过期时间) 与 md5 -> 短码 两个映射；
+    - 每个分片一个按过期时间排序的小顶堆：写入时顺带清理已过期条目，读取时过期即视为不存在；
+    - 总条目数超过 max_entries 时按过期时间从早到晚淘汰；
+    - 可选追加写文件（AOF）：每次写入追加一行 JSON，重启时回放恢复，
+      文件行数超过存活条目 2 倍时重写压缩。
+    """
+
+    def __init__(
+        self,
+        shards: int = 16,
+        max_entries: int = 1_000_000,
+        aof_path: Optional[str] = None,
+    ):
+        self.shard_count = max(shards, 1)
+        self.max_entries = max(max_entries, 1)
+        self.aof_path = aof_path
+        self.counter = 0
+        self.size = 0
+        # 分片：{"codes": {短码: [url, md5, 过期时间]}, "md5": {md5: 短码}, "heap": [(过期时间, 短码)]}
+        self._shards = [
+            {"codes": {}, "md5": {}, "heap": []} for _ in range(self.shard_count)
+        ]
+        self._aof = None
+        self._aof_lines = 0
+        if aof_path:
+            self._load_aof()
+
+    def _shard(self, key: str) -> dict:
+        return self._shards[hash(key) % self.shard_count]
+
+    # ==================== 读写 ====================
+
+    def resolve(self, short_code: str) -> Optional[str]:
+        record = self._shard(short_code)["codes"].get(short_code)
+        if record is None or record[2] <= time.time():
+            return None
+        return record[0]
+
+    def lookup(self, url_md5: str) -> Optional[str]:
+        short_code = self._shard(url_md5)["md5"].get(url_md5)
+        if short_code is None or self.resolve(short_code) is None:
+            return None
+        return short_code
+
+    def shorten(self, url_md5: str, url: str, ttl: int) -> str:
+        """已存在的长URL返回原短码，否则分配新短码并写入"""
+        short_code = self.lookup(url_md5)
+        if short_code:
+            return short_code
+        self.counter += 1
+        short_code = encode_id(self.counter)
+        expires_at = time.time() + ttl
+        self._put(short_code, url, url_md5, expires_at)
+        self._append({"c": short_code, "u": url, "m": url_md5, "e": expires_at})
+        return short_code
+
+    def _put(self, short_code: str, url: str, url_md5: str, expires_at: float):
+        shard = self._shard(short_code)
+        if short_code not in shard["codes"]:
+            self.size += 1
+        shard["codes"][short_code] = [url, url_md5, expires_at]
+        self._shard(url_md5)["md5"][url_md5] = short_code
+        heapq.heappush(shard["heap"], (expires_at, short_code))
+        self._expire(shard, time.time())
+        if self.size > self.max_entries:
+            self._evict()
+
+    def _drop(self, shard: dict, short_code: str):
+        url, url_md5, _ = shard["codes"].pop(short_code)
+        md5_index = self._shard(url_md5)["md5"]
+        if md5_index.get(url_md5) == short_code:
+            del md5_index[url_md5]
+        self.size -= 1
+
+    def _expire(self, shard: dict, now: float):
+        heap = shard["heap"]
+        while heap and heap[0][0] <= now:
+            expires_at, short_code = heapq.heappop(heap)
+            record = shard["codes"].get(short_code)
+            # 堆中可能残留被覆盖写入前的旧条目，只删除过期时间一致的记录
+            if record is not None and record[2] == expires_at:
+                self._drop(shard, short_code)
+
+    def _evict(self):
+        """容量超限：淘汰全局最早过期的条目"""
+        while self.size > self.max_entries:
+            shard = min(
+                (s for s in self._shards if s["heap"]), key=lambda s: s["heap"][0][0]
+            )
+            expires_at, short_code = heapq.heappop(shard["heap"])
+            record = shard["codes"].get(short_code)
+            if record is not None and record[2] == expires_at:
+                self._drop(shard, short_code)
+
+    # ==================== 追加写文件 ====================
+
+    def _load_aof(self):
+        now = time.time()
+        if os.path.exists(self.aof_path):
+            with open(self.aof_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程异常退出时最后一行可能不完整
+                        continue
+                    self._aof_lines += 1
+                    if "counter" in record:
+                        self.counter = max(self.counter, record["counter"])
+                        continue
+                    self.counter = max(self.counter, decode_id(record["c"]))
+                    if record["e"] > now:
+                        self._put(record["c"], record["u"], record["m"], record["e"])
+            logger.info(
+                f"从 {self.aof_path} 恢复短链接 {self.size} 条，计数器 {self.counter}"
+            )
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.aof_path)), exist_ok=True)
+        self._aof = open(self.aof_path, "a", encoding="utf-8")
+
+    def _append(self, record: dict):
+        if self._aof is None:
+            return
+        self._aof.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._aof.flush()
+        self._aof_lines += 1
+        if self._aof_lines > max(2 * self.size, 1024):
+            self._rewrite_aof()
+
+    def _rewrite_aof(self):
+        """只保留存活条目重写 AOF（先写临时文件再替换）"""
+        now = time.time()
+        tmp_path = self.aof_path + ".tmp"
+        lines = 1
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"counter": self.counter}) + "\n")
+            for shard in self._shards:
+                for short_code, (url, url_md5, expires_at) in shard["codes"].items():
+                    if expires_at > now:
+                        record = {
+                            "c": short_code,
+                            "u": url,
+                            "m": url_md5,
+                            "e": expires_at,
+                        }
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        lines += 1
+        self._aof.close()
+        os.replace(tmp_path, self.aof_path)
+        self._aof = open(self.aof_path, "a", encoding="utf-8")
+        self._aof_lines = lines
+
+    def close(self):
+        if self._aof is not None:
+            self._aof.close()
+            self._aof = None
+
+
+class EmbeddedStorageClient:
+    """字典模式存储客户端（与 RedisStorageClient 接口一致）"""
+
+    def __init__(self, storage: EmbeddedStorage):
+        self.storage = storage
+
+    async def shorten(self, url_md5: str, url: str, ttl: int) -> str:
+        return self.storage.shorten(url_md5, url, ttl)
+
+    async def resolve(self, short_code: str) -> Optional[str]:
+        return self.storage.resolve(short_code)
+
+    async def close(self):
+        self.storage.close()
+
+
+# 查重 + 分配 id + 编码短码合并为一次往返；脚本只访问 KEYS 中声明的键，
+# 写入 short:<短码> 时短码尚未确定，无法事先声明，由随后的 pipeline 完成
+SHORTEN_SCRIPT = """
+local code = redis.call('GET', KEYS[1])
+if code then return {code, 0} end
+local id = redis.call('INCR', KEYS[2])
+local chars = ARGV[1]
+local base = string.len(chars)
+code = ''
+if id == 0 then code = string.sub(chars, 1, 1) end
+while id > 0 do
+    local r = id % base
+    code = string.sub(chars, r + 1, r + 1) .. code
+    id = math.floor(id / base)
+end
+return {code, 1}
+"""
+
+
+class RedisStorageClient:
+    """Redis 模式存储客户端：连接池 + Lua 脚本（EVALSHA），已有短链一次往返、新短链两次"""
+
+    def __init__(self, client):
+        self.client = client
+        self._shorten = client.register_script(SHORTEN_SCRIPT)
+
+    async def shorten(self, url_md5: str, url: str, ttl: int) -> str:
+        md5_key = f"long:md5:{url_md5}"
+        code, created = await self._shorten(
+            keys=[md5_key, "auto_id:counter"], args=[CHAR_SET]
+        )
+        if not created:
+            return code
+        # 先写短码 → URL 再写 MD5 → 短码，其他请求查到的短码总能解析；
+        # 并发生成同一 URL 时以先写入 MD5 映射的短码为准
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(f"short:{code}", url, ex=ttl)
+            pipe.set(md5_key, code, ex=ttl, nx=True)
+            pipe.get(md5_key)
+            _, _, winner = await pipe.execute()
+        return winner or code
+
+    async def resolve(self, short_code: str) -> Optional[str]:
+        return await self.client.get(f"short:{short_code}")
+
+    async def close(self):
+        # redis-py 5.x 提供 aclose，4.x 为 close
+        await (getattr(self.client, "aclose", None) or self.client.close)()
+
+
+# 存储后端初始化
+if SHORT_LINK_MODE == "redis" and REDIS_AVAILABLE:
+    # 连接Redis（连接池）
+    storage_client = RedisStorageClient(
+        redis.Redis(
+            host=os.getenv("REDIS_HOST"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            username=os.getenv("REDIS_USERNAME"),
+            password=os.getenv("REDIS_PASSWORD"),
+            db=int(os.getenv("REDIS_DB", 0)),
+            decode_responses=True,
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 64)),
+        )
+    )
+else:
+    logger.info(f"使用字典模式存储短链接 (SHORT_LINK_MODE={SHORT_LINK_MODE})")
+    storage_client = EmbeddedStorageClient(
+        EmbeddedStorage(
+            shards=int(os.getenv("SHORT_LINK_SHARDS", 16)),
+            max_entries=int(os.getenv("SHORT_LINK_MAX_ENTRIES", 1_000_000)),
+            aof_path=os.getenv("SHORT_LINK_AOF_PATH") or None,
+        )
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await storage_client.close()
+
+
+# 创建FastAPI应用
+app = FastAPI(
+    title="Short Link Service",
+    version="1.0.0",
+    docs_url=None,
+    redoc_url=None,
+    openapi_url=None,
+    lifespan=lifespan,
+)
+
+
 class URLRequest(BaseModel):
     url: str
     type: str = None
@@ -140,28 +365,8 @@ async def shorten_url(request: URLRequest):
     url = request.url
     url_md5 = hashlib.md5(url.encode()).hexdigest()
 
-    # 检查长URL是否已经生成过短码
-    existing_short_code = await storage_client.get(f"long:md5:{url_md5}")
-    if existing_short_code:
-        domain = os.getenv("SHORT_LINK_DOMAIN", "http://localhost:8005")
-        if request.type:
-            short_url = f"{domain}/t/{request.type}/{existing_short_code}"
-        else:
-            short_url = f"{domain}/t/{existing_short_code}"
-        return {
-            "short_code": existing_short_code,
-            "short_url": short_url,
-        }
-
-    # 获取自增ID
-    unique_id = await storage_client.incr("auto_id:counter")
-
-    # 将自增ID转换为短码
-    short_code = encode_id(unique_id)
-
-    # 存储三个核心映射
-    await storage_client.setex(f"long:md5:{url_md5}", 24 * 3600, short_code)
-    await storage_client.setex(f"short:{short_code}", 24 * 3600, url)
+    # 已生成过短码的长URL直接复用，否则分配新短码并写入映射
+    short_code = await storage_client.shorten(url_md5, url, SHORT_LINK_TTL)
 
     # 返回结果
     domain = os.getenv("SHORT_LINK_DOMAIN", "http://localhost:8005")
@@ -182,7 +387,7 @@ async def redirect_url(short_code: str, type: str = None):
     :return: 重定向到原始长URL
     """
     # 获取原始长URL
-    url = await storage_client.get(f"short:{short_code}")
+    url = await storage_client.resolve(short_code)
     if not url:
         raise HTTPException(status_code=404, detail="Short code not found")
     return url.strip('"')
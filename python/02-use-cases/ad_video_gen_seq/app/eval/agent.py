@@ -35,13 +35,14 @@ def get_eval_agent(eval_type: Literal["image", "video"]):
             "extra_body": {
                 "thinking": {"type": os.getenv("THINKING_EVALUATE_AGENT", "disabled")},
                 "caching": {
-                    "type": "disabled",
+                    "type": os.getenv("CACHING_EVALUATE_AGENT", "enabled"),
                 },
             }
         },
     )
     eval_agent.model = ArkLlm(
         model=f"{eval_agent.model_provider}/{eval_agent.model_name}",
+        cache_name=eval_agent.name,
         api_key=eval_agent.model_api_key,
         api_base=eval_agent.model_api_base,
         **eval_agent.model_extra_config,
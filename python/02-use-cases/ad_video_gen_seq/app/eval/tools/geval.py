@@ -13,9 +13,13 @@
 # limitations under the License.
 
 import asyncio
+import hashlib
 import json
 import os
-from typing import Any
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
 
 from openai import AsyncOpenAI
 from veadk.auth.veauth.ark_veauth import get_ark_token
@@ -31,14 +35,79 @@ logger = get_logger(__name__)
 evaluate_agent_instruction = PROMPT_EVALUATE_ITEM_AGENT
 
 
+# Query parameters that only carry a URL signature; dropped from cache keys so a
+# re-signed URL of the same object still hits the cache.
+_SIGNATURE_PARAMS = ("x-tos-", "x-amz-", "expires", "signature")
+
+# (media, references, model, instructions) -> {"scores", "reason"}
+_EVAL_CACHE: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+# Evaluations in flight, so concurrent calls for the same key share one request
+_EVAL_INFLIGHT: dict[str, asyncio.Future] = {}
+
+
+def _env_float(name: str) -> Optional[float]:
+    """Float env var; unset or invalid -> None"""
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return None
+
+
 def resolve_code2url(code: str) -> str:
     # return media_url
     return url_shortener.code2url(code)
 
 
-async def repair_evaluate_input(
+def _normalize_media_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(_SIGNATURE_PARAMS)
+    ]
+    return parts._replace(query=urlencode(query), fragment="").geturl()
+
+
+def _evaluation_key(media_type: str, media_url: str, references: list[str]) -> str:
+    payload = json.dumps(
+        [
+            os.getenv("MODEL_EVALUATE_NAME", "doubao-seed-1-6-251015"),
+            hashlib.sha1(evaluate_agent_instruction.encode("utf-8")).hexdigest(),
+            media_type,
+            _normalize_media_url(media_url),
+            [_normalize_media_url(ref) for ref in references],
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[dict]:
+    entry = _EVAL_CACHE.get(key)
+    if entry is None:
+        return None
+    expires_at, evaluation = entry
+    if expires_at < time.monotonic():
+        del _EVAL_CACHE[key]
+        return None
+    _EVAL_CACHE.move_to_end(key)
+    return evaluation
+
+
+def _cache_put(key: str, evaluation: dict):
+    ttl = int(os.getenv("GEVAL_CACHE_TTL", 24 * 3600))
+    if ttl <= 0:
+        return
+    _EVAL_CACHE[key] = (time.monotonic() + ttl, evaluation)
+    _EVAL_CACHE.move_to_end(key)
+    while len(_EVAL_CACHE) > int(os.getenv("GEVAL_CACHE_MAX_ENTRIES", 4096)):
+        _EVAL_CACHE.popitem(last=False)
+
+
+def _build_evaluate_jobs(
     media_list: list[dict[str, Any]], media_type: str = "image"
-) -> list[list[dict[str, Any]]]:
+) -> list[dict[str, Any]]:
+    """One job per media item: {shot_id, media_id, message, key}."""
     if media_type == "image":
         MEDIA_URL_FIELD = "image_url"
         MEDIA_TYPE_FIELD = "input_image"
@@ -47,7 +116,12 @@ async def repair_evaluate_input(
         MEDIA_URL_FIELD = "video_url"
         MEDIA_TYPE_FIELD = "input_video"
         MEDIA = "视频"
-    result = []
+
+    # Resolve every media code in one lookup
+    codes = [media["code"] for shot in media_list for media in shot.get("media", [])]
+    resolved = url_shortener.code2urls(codes)
+
+    jobs = []
     for shot in media_list:
         shot_id = shot.get("shot_id", "")
         reference_media_list = shot.get("reference", [])
@@ -67,7 +141,7 @@ async def repair_evaluate_input(
             reference_part_list.append(reference_part)
 
         for i, media_url in enumerate(media_url_list):
-            resolved_media_url = resolve_code2url(media_url)
+            resolved_media_url = resolved.get(media_url, media_url)
 
             text_part = {
                 "type": "input_text",
@@ -83,9 +157,132 @@ async def repair_evaluate_input(
             media_part = {"type": MEDIA_TYPE_FIELD, MEDIA_URL_FIELD: resolved_media_url}
             user_prompt["content"] = [text_part] + [media_part] + reference_part_list
 
-            result.append(user_prompt)
+            jobs.append(
+                {
+                    "shot_id": shot_id,
+                    "media_id": i,
+                    "message": user_prompt,
+                    "key": _evaluation_key(
+                        media_type,
+                        resolved_media_url,
+                        [part["image_url"] for part in reference_part_list],
+                    ),
+                }
+            )
+
+    return jobs
+
+
+async def repair_evaluate_input(
+    media_list: list[dict[str, Any]], media_type: str = "image"
+) -> list[list[dict[str, Any]]]:
+    return [job["message"] for job in _build_evaluate_jobs(media_list, media_type)]
+
+
+class EvaluationScheduler:
+    """
+    Runs evaluation jobs with bounded concurrency (GEVAL_CONCURRENCY).
+
+    - Results are cached by (media, references, model, instructions), and
+      identical jobs in flight share one request, so a media item that
+      appears in several shots is scored once.
+    - Early stop (GEVAL_EARLY_STOP_SCORE, off by default): candidates of a
+      shot are scored in waves of GEVAL_EARLY_STOP_BATCH; once one reaches
+      the threshold the remaining candidates of that shot are skipped.
+    """
+
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(int(os.getenv("GEVAL_CONCURRENCY", 8)))
+        self.early_stop_score = _env_float("GEVAL_EARLY_STOP_SCORE")
+        self.early_stop_batch = max(int(os.getenv("GEVAL_EARLY_STOP_BATCH", 2)), 1)
+        self.stats = {"requested": 0, "cached": 0, "shared": 0, "skipped": 0}
+
+    async def _request(self, msg) -> dict:
+        async with self.semaphore:
+            response = await self.client.responses.create(
+                model=os.getenv("MODEL_EVALUATE_NAME", "doubao-seed-1-6-251015"),
+                instructions=evaluate_agent_instruction,
+                input=[msg],
+                text={
+                    "format": {
+                        "type": "json_schema",
+                        "name": "EvaluationList",
+                        "schema": EvaluationList.model_json_schema(),
+                        "strict": True,
+                    }
+                },
+                extra_body={"thinking": {"type": "disabled"}},
+            )
+        return json.loads(response.output_text).get("evaluation", {})
 
-    return result
+    async def evaluate(self, job: dict) -> dict:
+        key = job["key"]
+        evaluation = _cache_get(key)
+        if evaluation is not None:
+            self.stats["cached"] += 1
+        elif key in _EVAL_INFLIGHT:
+            self.stats["shared"] += 1
+            evaluation = await asyncio.shield(_EVAL_INFLIGHT[key])
+        else:
+            self.stats["requested"] += 1
+            future = asyncio.get_running_loop().create_future()
+            _EVAL_INFLIGHT[key] = future
+            try:
+                evaluation = await self._request(job["message"])
+                _cache_put(key, evaluation)
+                future.set_result(evaluation)
+            except BaseException as e:
+                future.set_exception(e)
+                future.exception()  # mark retrieved when nobody else waits
+                raise
+            finally:
+                _EVAL_INFLIGHT.pop(key, None)
+        # ids come from the job, not the (possibly cached) model output
+        return {
+            **evaluation,
+            "shot_id": job["shot_id"],
+            "media_id": job["media_id"],
+        }
+
+    async def evaluate_shot(self, jobs: list[dict]) -> list[dict]:
+        if self.early_stop_score is None:
+            return list(await asyncio.gather(*(self.evaluate(job) for job in jobs)))
+
+        # Cached candidates are free; if one already wins, skip the rest
+        results = {}
+        for job in jobs:
+            evaluation = _cache_get(job["key"])
+            if evaluation is not None:
+                results[job["media_id"]] = await self.evaluate(job)
+
+        pending = [job for job in jobs if job["media_id"] not in results]
+        while pending and not self._has_winner(results.values()):
+            wave, pending = (
+                pending[: self.early_stop_batch],
+                pending[self.early_stop_batch :],
+            )
+            for result in await asyncio.gather(*(self.evaluate(job) for job in wave)):
+                results[result["media_id"]] = result
+
+        for job in pending:
+            self.stats["skipped"] += 1
+            results[job["media_id"]] = {
+                "shot_id": job["shot_id"],
+                "media_id": job["media_id"],
+                "scores": 0.0,
+                "reason": f"已有候选得分达到 {self.early_stop_score}，跳过评估",
+            }
+        return [results[job["media_id"]] for job in jobs]
+
+    def _has_winner(self, results) -> bool:
+        for result in results:
+            try:
+                if float(result.get("scores")) >= self.early_stop_score:
+                    return True
+            except (TypeError, ValueError):
+                continue
+        return False
 
 
 async def evaluate_media(
@@ -138,33 +335,24 @@ async def evaluate_media(
         ... ])
     """
     logger.debug(f"Start to evaluate {media_type} list: items={len(media_list)}")
-    m_content = await repair_evaluate_input(media_list, media_type=media_type)
-    logger.debug(f"Repaired {media_type} list: messages={len(m_content)}")
+    jobs = _build_evaluate_jobs(media_list, media_type=media_type)
+    logger.debug(f"Repaired {media_type} list: messages={len(jobs)}")
     logger.info(f"media_list: \n\n {media_list} \n\n")
     client = AsyncOpenAI(
         base_url=os.getenv("MODEL_AGENT_API_BASE") or DEFAULT_MODEL_AGENT_API_BASE,
         api_key=os.getenv("MODEL_AGENT_API_KEY") or get_ark_token(),
     )
-
-    async def process_message(msg):
-        response = await client.responses.create(
-            model=os.getenv("MODEL_EVALUATE_NAME", "doubao-seed-1-6-251015"),
-            instructions=evaluate_agent_instruction,
-            input=[msg],
-            text={
-                "format": {
-                    "type": "json_schema",
-                    "name": "EvaluationList",
-                    "schema": EvaluationList.model_json_schema(),
-                    "strict": True,
-                }
-            },
-            extra_body={"thinking": {"type": "disabled"}},
-        )
-        return json.loads(response.output_text).get("evaluation", {})
-
-    # Use asyncio.gather to process all messages concurrently
-    result = await asyncio.gather(*(process_message(msg) for msg in m_content))
+    scheduler = EvaluationScheduler(client)
+
+    # Shots are evaluated concurrently; the scheduler bounds the request count
+    jobs_by_shot: dict[str, list[dict]] = {}
+    for job in jobs:
+        jobs_by_shot.setdefault(job["shot_id"], []).append(job)
+    shot_results = await asyncio.gather(
+        *(scheduler.evaluate_shot(shot_jobs) for shot_jobs in jobs_by_shot.values())
+    )
+    result = [item for items in shot_results for item in items]
+    logger.info(f"Evaluate {media_type} list: {scheduler.stats}")
 
     logger.debug(f"Finish to evaluate {media_type} list: result_items={len(result)}")
     # Post-processing: Merge results by shot_id and ensure the order of media_id
@@ -35,13 +35,14 @@ def get_image_agent():
             "extra_body": {
                 "thinking": {"type": getenv("THINKING_IMAGE_AGENT", "disabled")},
                 "caching": {
-                    "type": "disabled",
+                    "type": getenv("CACHING_IMAGE_AGENT", "disabled"),
                 },
             }
         },
     )
     image_agent.model = ArkLlm(
         model=f"{image_agent.model_provider}/{image_agent.model_name}",
+        cache_name=image_agent.name,
         api_key=image_agent.model_api_key,
         api_base=image_agent.model_api_base,
         **image_agent.model_extra_config,
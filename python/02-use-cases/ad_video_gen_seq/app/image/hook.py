@@ -70,12 +70,17 @@ def hook_url_id_mapping(
             "\n✅首帧图生成任务已经完成，继续执行首帧图评估工作\n"
         )
         tool_context.state["cb_agent_output"] = get_callback_agent_output(success_list)
-        for data in success_list:
-            if isinstance(data, dict):
-                for key, value in data.items():
-                    if isinstance(value, str):
-                        value = url_id_mapping(url=value)
-                        data[key] = value
+        # shorten all urls in one store round-trip
+        slots = [
+            (data, key)
+            for data in success_list
+            if isinstance(data, dict)
+            for key, value in data.items()
+            if isinstance(value, str)
+        ]
+        codes = url_shortener.url2codes([data[key] for data, key in slots])
+        for (data, key), code in zip(slots, codes):
+            data[key] = code
         logger.debug(f"Shorten URL of `image_generate` successfully: {success_list}")
         return tool_response
     return None
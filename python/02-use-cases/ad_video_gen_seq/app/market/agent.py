@@ -34,13 +34,14 @@ def get_market_agent():
             "extra_body": {
                 "thinking": {"type": getenv("THINKING_MARKET_AGENT", "disabled")},
                 "caching": {
-                    "type": "disabled",
+                    "type": getenv("CACHING_MARKET_AGENT", "disabled"),
                 },
             }
         },
     )
     market_agent.model = ArkLlm(
         model=f"{market_agent.model_provider}/{market_agent.model_name}",
+        cache_name=market_agent.name,
         api_key=market_agent.model_api_key,
         api_base=market_agent.model_api_base,
         **market_agent.model_extra_config,
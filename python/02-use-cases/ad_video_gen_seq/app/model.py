@@ -14,12 +14,18 @@
 
 # adapted from Google ADK models adk-python/blob/main/src/google/adk/models/lite_llm.py at f1f44675e4a86b75e72cfd838efd8a0399f23e24 · google/adk-python
 
+import asyncio
 import base64
+import hashlib
 import json
+import os
 import time
+import weakref
+from dataclasses import dataclass
 from typing import Any, Dict, Union, AsyncGenerator, Tuple, List, Optional, Literal
 from typing_extensions import override
 
+import httpx
 from google.adk.models import LlmRequest, LlmResponse, Gemini
 from google.genai import types
 from pydantic import Field, BaseModel
@@ -631,6 +637,337 @@ def ark_response_to_generate_content_response(
     return llm_response
 
 
+# ---------------------------------------
+# pooled client & call metrics ----------
+# One long-lived AsyncArk per (api_base, api_key, event loop): every agent turn
+# reuses the same keep-alive connection pool instead of a fresh TLS handshake.
+# Keyed weakly by the loop object itself: an httpx pool is bound to the loop that
+# created it, and id(loop) can be reused by a new loop once the old one is gone.
+# loop -> {(api_base, api_key): AsyncArk}
+_ARK_CLIENTS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def get_ark_client(api_base: str, api_key: str) -> AsyncArk:
+    """
+    Return the pooled AsyncArk client for (api_base, api_key) on the running loop.
+
+    Pool limits: ARK_MAX_CONNECTIONS (20), ARK_MAX_KEEPALIVE (10),
+    ARK_KEEPALIVE_EXPIRY (60s).
+    """
+    clients = _ARK_CLIENTS.setdefault(asyncio.get_running_loop(), {})
+    key = (api_base, api_key)
+    client = clients.get(key)
+    if client is None:
+        limits = httpx.Limits(
+            max_connections=int(_env_number("ARK_MAX_CONNECTIONS", 20)),
+            max_keepalive_connections=int(_env_number("ARK_MAX_KEEPALIVE", 10)),
+            keepalive_expiry=_env_number("ARK_KEEPALIVE_EXPIRY", 60),
+        )
+        client = AsyncArk(
+            base_url=api_base,
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                limits=limits, timeout=httpx.Timeout(600, connect=10)
+            ),
+        )
+        clients[key] = client
+    return client
+
+
+async def close_ark_clients() -> None:
+    """Close the running loop's pooled clients (server shutdown / end of a debug run)."""
+    clients = _ARK_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close Ark client: {e}")
+    if _ARK_STATS:
+        logger.info(
+            f"Ark call metrics: {json.dumps(get_ark_metrics(), ensure_ascii=False)}"
+        )
+    if _PREFIX_PLANNER.metrics():
+        logger.info(
+            "Ark prefix cache metrics: "
+            f"{json.dumps(get_prefix_cache_metrics(), ensure_ascii=False)}"
+        )
+
+
+@dataclass
+class ArkCallStats:
+    """Accumulated latency / token usage for one model and turn type."""
+
+    calls: int = 0
+    errors: int = 0
+    latency_total: float = 0.0
+    ttft_total: float = 0.0
+    ttft_calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        succeeded = self.calls - self.errors
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_s": (
+                round(self.latency_total / succeeded, 3) if succeeded else None
+            ),
+            "avg_ttft_s": (
+                round(self.ttft_total / self.ttft_calls, 3) if self.ttft_calls else None
+            ),
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hit_ratio": (
+                round(self.cached_tokens / self.input_tokens, 3)
+                if self.input_tokens
+                else 0.0
+            ),
+        }
+
+
+# key: (model, "chained" | "fresh"); chained turns carry previous_response_id
+_ARK_STATS: Dict[Tuple[str, str], ArkCallStats] = {}
+
+
+def _record_ark_call(
+    model: str,
+    chained: bool,
+    latency: float,
+    ttft: Optional[float] = None,
+    usage: Any = None,
+    error: bool = False,
+) -> None:
+    turn = "chained" if chained else "fresh"
+    stats = _ARK_STATS.setdefault((model, turn), ArkCallStats())
+    stats.calls += 1
+    if error:
+        stats.errors += 1
+        return
+    stats.latency_total += latency
+    if ttft is not None:
+        stats.ttft_total += ttft
+        stats.ttft_calls += 1
+
+    cached = 0
+    if usage is not None:
+        details = getattr(usage, "input_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        stats.input_tokens += usage.input_tokens or 0
+        stats.output_tokens += usage.output_tokens or 0
+        stats.cached_tokens += cached
+    logger.debug(
+        f"Ark call model={model} turn={turn} latency={latency:.2f}s "
+        f"ttft={'-' if ttft is None else f'{ttft:.2f}s'} cached_tokens={cached}"
+    )
+
+
+def get_ark_metrics() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Per-model metrics split by turn type: {model: {"fresh": {...}, "chained": {...}}}"""
+    metrics: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for (model, turn), stats in _ARK_STATS.items():
+        metrics.setdefault(model, {})[turn] = stats.snapshot()
+    return metrics
+
+
+# ---------------------------------------
+# context cache planner -----------------
+@dataclass
+class PrefixCacheStats:
+    """Prefix-cache usage of one agent (ArkLlm.cache_name)."""
+
+    created: int = 0
+    reused: int = 0
+    failed: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        planned = self.created + self.reused
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "failed": self.failed,
+            "prefix_hit_rate": round(self.reused / planned, 3) if planned else 0.0,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "token_hit_ratio": (
+                round(self.cached_tokens / self.input_tokens, 3)
+                if self.input_tokens
+                else 0.0
+            ),
+        }
+
+
+class ContextCachePlanner:
+    """
+    Move the static prefix of a first turn (system prompt + tool declarations)
+    into an Ark prefix cache and send the turn itself as a follow-up on it.
+
+    Ark rejects `caching` together with `text` (output schema), and caching
+    conflicts with `instructions`, so without planning every schema-bearing
+    agent lost caching and re-sent its full system prompt on each first turn.
+    The prefix is created once per (endpoint, model, prefix content) with
+    caching.prefix=true; first turns then reference it via
+    previous_response_id and only the schema-bearing follow-up drops caching.
+    """
+
+    def __init__(self):
+        # key -> (prefix response id, expire_at)
+        self._prefixes: Dict[str, Tuple[str, int]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._stats: Dict[str, PrefixCacheStats] = {}
+
+    def stats(self, scope: str) -> PrefixCacheStats:
+        return self._stats.setdefault(scope, PrefixCacheStats())
+
+    def record_usage(self, scope: str, usage: Any) -> None:
+        if usage is None:
+            return
+        stats = self.stats(scope)
+        details = getattr(usage, "input_tokens_details", None)
+        stats.input_tokens += usage.input_tokens or 0
+        stats.cached_tokens += getattr(details, "cached_tokens", None) or 0
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {scope: stats.snapshot() for scope, stats in self._stats.items()}
+
+    @staticmethod
+    def _prefix_key(request_data: Dict, model: str) -> str:
+        thinking = (request_data.get("extra_body") or {}).get("thinking")
+        raw = _safe_json_serialize(
+            [
+                request_data.get("api_base"),
+                request_data.get("api_key"),
+                model,
+                thinking,
+                request_data.get("instructions"),
+                request_data.get("tools"),
+            ]
+        )
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    async def _create_prefix(
+        self, client: "ArkLlmClient", request_data: Dict, model: str
+    ) -> Tuple[str, int]:
+        expire_at = int(time.time()) + int(_env_number("ARK_PREFIX_CACHE_TTL", 3600))
+        extra_body: Dict[str, Any] = {
+            "caching": {"type": "enabled", "prefix": True},
+            "expire_at": expire_at,
+        }
+        thinking = (request_data.get("extra_body") or {}).get("thinking")
+        if thinking:
+            extra_body["thinking"] = thinking
+        prefix_args: Dict[str, Any] = {
+            "model": model,
+            "input": [
+                EasyInputMessageParam(
+                    role="system",
+                    type="message",
+                    content=[
+                        ResponseInputTextParam(
+                            type="input_text",
+                            text=request_data["instructions"],
+                        )
+                    ],
+                )
+            ],
+            "store": True,
+            "extra_body": extra_body,
+        }
+        if request_data.get("tools"):
+            prefix_args["tools"] = request_data["tools"]
+        for key in ("api_base", "api_key"):
+            if key in request_data:
+                prefix_args[key] = request_data[key]
+        response = await client.aresponse(**prefix_args)
+        return response.id, expire_at
+
+    async def plan(
+        self, client: "ArkLlmClient", request_data: Dict, scope: str
+    ) -> Dict:
+        """
+        Rewrite a first-turn request onto the cached prefix.
+
+        Returns request_data unchanged when it is not a cacheable first turn
+        (caching disabled, no system prompt, already chained) or when the
+        prefix cannot be created.
+        """
+        if (
+            request_data.get("previous_response_id")
+            or not request_data.get("instructions")
+            or not _is_caching_enabled(request_data)
+        ):
+            return request_data
+
+        model = get_model_without_provider({"model": request_data["model"]})["model"]
+        key = self._prefix_key(request_data, model)
+        now = time.time()
+        if self._failed_until.get(key, 0) > now:
+            return request_data
+
+        stats = self.stats(scope)
+        cached = self._prefixes.get(key)
+        if cached and cached[1] - now > 60:
+            prefix_id = cached[0]
+            stats.reused += 1
+        else:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = asyncio.ensure_future(
+                    self._create_prefix(client, request_data, model)
+                )
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._pending.pop(key, None))
+            try:
+                prefix_id, expire_at = await asyncio.shield(future)
+            except Exception as e:
+                if owner:
+                    stats.failed += 1
+                    retry_after = _env_number("ARK_PREFIX_CACHE_RETRY_AFTER", 600)
+                    self._failed_until[key] = now + retry_after
+                    logger.warning(
+                        f"Prefix cache for {scope} unavailable, "
+                        f"sending system prompt inline for {retry_after:.0f}s: {e}"
+                    )
+                return request_data
+            if owner:
+                self._prefixes[key] = (prefix_id, expire_at)
+                stats.created += 1
+                logger.info(f"Prefix cache created for {scope}: {prefix_id}")
+            else:
+                stats.reused += 1
+
+        planned = dict(request_data)
+        planned["previous_response_id"] = prefix_id
+        planned["instructions"] = None
+        planned["tools"] = None
+        if planned.get("text") is not None:
+            # [Note: Ark Limitations] caching and text
+            # The prefix already holds the cache; the schema-bearing turn must not ask for it.
+            _remove_caching(planned)
+        return planned
+
+
+_PREFIX_PLANNER = ContextCachePlanner()
+
+
+def get_prefix_cache_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-agent prefix cache metrics: {cache_name: {...}}"""
+    return _PREFIX_PLANNER.metrics()
+
+
 class ArkLlmClient:
     async def aresponse(
         self, **kwargs
@@ -639,11 +976,8 @@ class ArkLlmClient:
         api_base = kwargs.pop("api_base", DEFAULT_VIDEO_MODEL_API_BASE)
         api_key = kwargs.pop("api_key", settings.model.api_key)
 
-        # 2. Call openai responses
-        client = AsyncArk(
-            base_url=api_base,
-            api_key=api_key,
-        )
+        # 2. Call openai responses on the pooled client
+        client = get_ark_client(api_base, api_key)
 
         raw_response = await client.responses.create(**kwargs)
         return raw_response
@@ -652,6 +986,8 @@ class ArkLlmClient:
 class ArkLlm(Gemini):
     model: str
     llm_client: ArkLlmClient = Field(default_factory=ArkLlmClient)
+    # name used for prefix-cache metrics (agent name), defaults to the model
+    cache_name: Optional[str] = None
     _additional_args: Dict[str, Any] = None
     use_interactions_api: bool = True
 
@@ -670,6 +1006,7 @@ class ArkLlm(Gemini):
         self._additional_args.pop("messages", None)
         self._additional_args.pop("tools", None)
         self._additional_args.pop("stream", None)
+        self._additional_args.pop("cache_name", None)
         if drop_params is not None:
             self._additional_args["drop_params"] = drop_params
 
@@ -710,22 +1047,62 @@ class ArkLlm(Gemini):
         }
         # ------------------------------------------------------ #
         responses_args.update(self._additional_args)
+        # per-request copy: reorganization mutates extra_body (expire_at / caching)
+        if isinstance(responses_args.get("extra_body"), dict):
+            responses_args["extra_body"] = dict(responses_args["extra_body"])
 
         if generation_params:
             responses_args.update(generation_params)
 
+        cache_scope = self.cache_name or self.model
+        responses_args = await _PREFIX_PLANNER.plan(
+            self.llm_client, responses_args, cache_scope
+        )
         responses_args = request_reorganization_by_ark(responses_args)
 
+        model = responses_args["model"]
+        chained = bool(responses_args.get("previous_response_id"))
+        started = time.perf_counter()
         if stream:
             responses_args["stream"] = True
-            async for part in await self.llm_client.aresponse(**responses_args):
-                llm_response = event_to_generate_content_response(
-                    event=part, is_partial=True, model_version=self.model
-                )
-                if llm_response:
-                    yield llm_response
+            ttft = None
+            usage = None
+            try:
+                async for part in await self.llm_client.aresponse(**responses_args):
+                    if isinstance(part, ResponseCompletedEvent):
+                        usage = part.response.usage
+                        _PREFIX_PLANNER.record_usage(cache_scope, usage)
+                        _record_ark_call(
+                            model, chained, time.perf_counter() - started, ttft, usage
+                        )
+                    llm_response = event_to_generate_content_response(
+                        event=part, is_partial=True, model_version=self.model
+                    )
+                    if llm_response:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        yield llm_response
+            except Exception:
+                if usage is None:
+                    _record_ark_call(
+                        model, chained, time.perf_counter() - started, error=True
+                    )
+                raise
         else:
-            raw_response = await self.llm_client.aresponse(**responses_args)
+            try:
+                raw_response = await self.llm_client.aresponse(**responses_args)
+            except Exception:
+                _record_ark_call(
+                    model, chained, time.perf_counter() - started, error=True
+                )
+                raise
+            _record_ark_call(
+                model,
+                chained,
+                time.perf_counter() - started,
+                usage=raw_response.usage,
+            )
+            _PREFIX_PLANNER.record_usage(cache_scope, raw_response.usage)
             llm_response = ark_response_to_generate_content_response(raw_response)
             yield llm_response
 
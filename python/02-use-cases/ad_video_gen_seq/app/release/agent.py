@@ -34,7 +34,7 @@ def get_release_agent() -> Agent:
             "extra_body": {
                 "thinking": {"type": os.getenv("THINKING_RELEASE_AGENT", "disabled")},
                 "caching": {
-                    "type": "disabled",
+                    "type": os.getenv("CACHING_RELEASE_AGENT", "disabled"),
                 },
             }
         },
@@ -42,6 +42,7 @@ def get_release_agent() -> Agent:
 
     agent.model = ArkLlm(
         model=f"{agent.model_provider}/{agent.model_name}",
+        cache_name=agent.name,
         api_key=agent.model_api_key,
         api_base=agent.model_api_base,
         **agent.model_extra_config,
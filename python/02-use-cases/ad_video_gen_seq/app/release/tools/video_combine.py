@@ -12,16 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import urllib.parse
+import asyncio
 import os
-import random
+import re
+import subprocess
 import tempfile
+import time
+import urllib.parse
 import uuid
+from dataclasses import dataclass
 from typing import List
 from typing import Optional
 
 import aiohttp
-from moviepy import CompositeVideoClip, VideoFileClip
 from veadk.config import veadk_environments  # noqa
 from veadk.utils.logger import get_logger
 
@@ -29,11 +32,240 @@ from app.utils import url_shortener
 
 logger = get_logger(__name__)
 
+# 单个视频大小上限
+MAX_FILE_SIZE = 512 * 1024 * 1024  # 512MB
+
+# 本进程内观测到的重编码速度（内容时长 / 耗时，指数平均），用于估算 stream copy 节省的时间
+_reencode_speed: Optional[float] = None
+
 
 def resolve_short_url(code: str) -> str:
     return url_shortener.code2url(code)
 
 
+def _ffmpeg_exe() -> str:
+    """FFMPEG_BIN 优先，否则使用 imageio-ffmpeg 自带的二进制"""
+    ffmpeg_bin = os.getenv("FFMPEG_BIN")
+    if ffmpeg_bin:
+        return ffmpeg_bin
+    import imageio_ffmpeg
+
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+# --- 下载 ---
+async def _download_video(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    idx: int,
+    url: str,
+    temp_dir: str,
+) -> tuple[Optional[str], float]:
+    """
+    下载单个视频，返回 (本地路径, 下载耗时)；失败时路径为 None
+    """
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            async with session.get(url, allow_redirects=True) as response:
+                response.raise_for_status()
+                # 预检查内容大小，防止极端大文件下载
+                content_length = response.headers.get("content-length")
+                if content_length is not None:
+                    try:
+                        if int(content_length) > MAX_FILE_SIZE:
+                            logger.error(
+                                f"Video size {int(content_length)} exceeds limit {MAX_FILE_SIZE}."
+                            )
+                            return None, time.perf_counter() - started
+                    except ValueError:
+                        # 如果 content-length 无法解析，继续按流式大小校验
+                        pass
+
+                # 从content-type提取文件扩展名
+                content_type = response.headers.get("content-type", "")
+                file_extension = ".mp4"  # 默认扩展名
+                if "video" in content_type:
+                    for ext in ("webm", "ogg", "mov"):
+                        if ext in content_type:
+                            file_extension = f".{ext}"
+
+                # 按序号命名，保证合并顺序
+                temp_file_path = os.path.join(
+                    temp_dir, f"video_{idx:03d}{file_extension}"
+                )
+
+                # 按流式传输进行大小限制（兜底）
+                total_size = 0
+                with open(temp_file_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(1024 * 1024):
+                        total_size += len(chunk)
+                        if total_size > MAX_FILE_SIZE:
+                            logger.error(
+                                f"Video {idx + 1} exceeds {MAX_FILE_SIZE} bytes. Download stopped."
+                            )
+                            return None, time.perf_counter() - started
+                        f.write(chunk)
+        except Exception as e:
+            logger.error(f"Error downloading video {idx + 1} from {url}: {e}")
+            return None, time.perf_counter() - started
+
+    elapsed = time.perf_counter() - started
+    if total_size == 0:
+        logger.error(f"Failed to download video {idx + 1}: file is empty")
+        return None, elapsed
+    logger.info(
+        f"Downloaded video {idx + 1} to {temp_file_path}, "
+        f"size: {total_size / 1024 / 1024:.2f} MB, {elapsed:.1f}s"
+    )
+    return temp_file_path, elapsed
+
+
+# --- 探测 ---
+@dataclass(frozen=True)
+class ClipInfo:
+    duration: float
+    video_codec: str
+    width: int
+    height: int
+    fps: str
+    pix_fmt: str
+    audio_codec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[str] = None
+
+    def concat_signature(self) -> tuple:
+        """stream copy 拼接要求所有片段的编码参数完全一致"""
+        return (
+            self.video_codec,
+            self.width,
+            self.height,
+            self.fps,
+            self.pix_fmt,
+            self.audio_codec,
+            self.sample_rate,
+            self.channels,
+        )
+
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO_RE = re.compile(
+    r"Stream #\S+.*?: Video: (\w+).*?, (\w+)(?:\([^)]*\))?, (\d+)x(\d+).*?, ([\d.]+) fps"
+)
+_AUDIO_RE = re.compile(r"Stream #\S+.*?: Audio: (\w+).*?, (\d+) Hz, ([^,]+)")
+
+
+def probe_clip(ffmpeg_bin: str, path: str) -> Optional[ClipInfo]:
+    """解析 `ffmpeg -i` 输出获取编码参数（imageio-ffmpeg 不附带 ffprobe）"""
+    result = subprocess.run(
+        [ffmpeg_bin, "-hide_banner", "-i", path], capture_output=True, text=True
+    )
+    output = result.stderr
+    duration = _DURATION_RE.search(output)
+    video = _VIDEO_RE.search(output)
+    if not duration or not video:
+        logger.error(f"Failed to probe {path}: {output[-500:]}")
+        return None
+    hours, minutes, seconds = duration.groups()
+    audio = _AUDIO_RE.search(output)
+    return ClipInfo(
+        duration=int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        video_codec=video.group(1),
+        pix_fmt=video.group(2),
+        width=int(video.group(3)),
+        height=int(video.group(4)),
+        fps=video.group(5),
+        audio_codec=audio.group(1) if audio else None,
+        sample_rate=int(audio.group(2)) if audio else None,
+        channels=audio.group(3).strip() if audio else None,
+    )
+
+
+# --- 合并 ---
+def _concat_copy(ffmpeg_bin: str, files: List[str], output_path: str) -> None:
+    """所有片段参数一致：concat demuxer + stream copy，不解码不重编码"""
+    list_path = os.path.join(os.path.dirname(output_path), "concat_list.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for file_path in files:
+            escaped = os.path.abspath(file_path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    subprocess.run(
+        [
+            ffmpeg_bin,
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-c",
+            "copy",
+            "-movflags",
+            "+faststart",
+            output_path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+
+def _concat_reencode(
+    ffmpeg_bin: str, files: List[str], infos: List[ClipInfo], output_path: str
+) -> None:
+    """
+    片段参数不一致：单次 filter graph 统一分辨率 / 帧率 / 像素格式 / 音频后拼接编码。
+    画布与帧率取第一个片段（与原 CompositeVideoClip 的画布一致），缺音轨的片段补静音。
+    """
+    target = infos[0]
+    cmd = [ffmpeg_bin, "-y", "-v", "error"]
+    for file_path in files:
+        cmd += ["-i", file_path]
+
+    filters = []
+    concat_inputs = []
+    for i, info in enumerate(infos):
+        filters.append(
+            f"[{i}:v]scale={target.width}:{target.height}:force_original_aspect_ratio=decrease,"
+            f"pad={target.width}:{target.height}:(ow-iw)/2:(oh-ih)/2,"
+            f"setsar=1,fps={target.fps},format=yuv420p[v{i}]"
+        )
+        if info.audio_codec:
+            filters.append(
+                f"[{i}:a]aresample=44100,aformat=channel_layouts=stereo[a{i}]"
+            )
+        else:
+            filters.append(
+                f"anullsrc=channel_layout=stereo:sample_rate=44100,"
+                f"atrim=duration={info.duration:.3f}[a{i}]"
+            )
+        concat_inputs.append(f"[v{i}][a{i}]")
+    filters.append(f"{''.join(concat_inputs)}concat=n={len(files)}:v=1:a=1[v][a]")
+
+    cmd += [
+        "-filter_complex",
+        ";".join(filters),
+        "-map",
+        "[v]",
+        "-map",
+        "[a]",
+        "-c:v",
+        "libx264",
+        "-preset",
+        os.getenv("VIDEO_COMBINE_PRESET", "veryfast"),
+        "-crf",
+        "20",
+        "-c:a",
+        "aac",
+        "-movflags",
+        "+faststart",
+        output_path,
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
 async def video_combine(video_codes: List[str]) -> Optional[str]:
     """
     合并多个视频URL为一个视频文件
@@ -44,6 +276,8 @@ async def video_combine(video_codes: List[str]) -> Optional[str]:
     Returns:
         合并后的视频文件路径，如果合并失败则返回None
     """
+    global _reencode_speed
+    job_started = time.perf_counter()
 
     # 获取项目根目录
     current_dir = os.path.abspath(__file__)
@@ -68,149 +302,91 @@ async def video_combine(video_codes: List[str]) -> Optional[str]:
             continue
         resolved_urls.append(resolved_url)
 
-    # 下载视频文件
-    downloaded_files = []
+    if not resolved_urls:
+        logger.error("No videos were successfully downloaded")
+        return None
 
+    # 并发下载视频文件（VIDEO_COMBINE_DOWNLOAD_CONCURRENCY 控制并发上限）
+    semaphore = asyncio.Semaphore(
+        max(1, int(os.getenv("VIDEO_COMBINE_DOWNLOAD_CONCURRENCY", "4")))
+    )
+    download_started = time.perf_counter()
     async with aiohttp.ClientSession() as session:
-        for idx, code in enumerate(resolved_urls):
-            try:
-                # 下载视频
-                logger.info(
-                    f"Downloading video {idx + 1}/{len(resolved_urls)} from {code}"
-                )
-
-                async with session.get(code, allow_redirects=True) as response:
-                    response.raise_for_status()
-                    # 预检查内容大小，防止极端大文件下载
-                    content_length = response.headers.get("content-length")
-                    max_file_size = 512 * 1024 * 1024  # 512MB 上限
-                    if content_length is not None:
-                        try:
-                            if int(content_length) > max_file_size:
-                                logger.error(
-                                    f"Video size {int(content_length)} exceeds limit {max_file_size}."
-                                )
-                                return None
-                        except Exception:
-                            # 如果 content-length 无法解析，继续按流式大小校验
-                            pass
-
-                    # 从content-type提取文件扩展名
-                    content_type = response.headers.get("content-type", "")
-                    file_extension = ".mp4"  # 默认扩展名
-                    if "video" in content_type:
-                        if "mp4" in content_type:
-                            file_extension = ".mp4"
-                        elif "webm" in content_type:
-                            file_extension = ".webm"
-                        elif "ogg" in content_type:
-                            file_extension = ".ogg"
-                        elif "mov" in content_type:
-                            file_extension = ".mov"
-
-                    # 生成简单的随机文件名
-                    temp_file_path = os.path.join(
-                        temp_dir,
-                        f"video_{random.randint(100000, 999999)}{file_extension}",
-                    )
-
-                    # 按流式传输进行大小限制（兜底）
-                    max_file_size = 512 * 1024 * 1024  # 512MB
-                    total_size = 0
-
-                    with open(temp_file_path, "wb") as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            if chunk:
-                                total_size += len(chunk)
-                                if total_size > max_file_size:
-                                    logger.error(
-                                        "Video size exceeds 10GB. Download stopped."
-                                    )
-                                    return None
-                                f.write(chunk)
-
-                if (
-                    os.path.exists(temp_file_path)
-                    and os.path.getsize(temp_file_path) > 0
-                ):
-                    downloaded_files.append(temp_file_path)
-                    logger.info(
-                        f"Successfully downloaded video {idx + 1} to {temp_file_path}, size: {total_size / 1024 / 1024:.2f} MB"
-                    )
-                else:
-                    logger.error(
-                        f"Failed to download video {idx + 1}: file is empty or doesn't exist"
-                    )
-                    return None
-
-            except Exception as e:
-                logger.error(f"Error downloading video {idx + 1} from {code}: {e}")
-                return None
-
-    if not downloaded_files:
-        logger.error("No videos were successfully downloaded")
+        results = await asyncio.gather(
+            *[
+                _download_video(session, semaphore, idx, url, temp_dir)
+                for idx, url in enumerate(resolved_urls)
+            ]
+        )
+    download_wall = time.perf_counter() - download_started
+    download_serial = sum(elapsed for _, elapsed in results)
+
+    downloaded_files = [path for path, _ in results]
+    if not all(downloaded_files):
+        # 与原行为一致：任一分镜下载失败则放弃合并，避免成片缺镜头
         return None
 
     try:
-        # 合并视频
-        logger.info(f"Starting to merge {len(downloaded_files)} videos")
-
-        # 加载所有视频片段
-        video_clips = []
-        start_times = []
-        clip_start_time = 0.0
-
-        try:
-            for file_path in downloaded_files:
-                start_times.append(clip_start_time)
-
-                clip = VideoFileClip(file_path)
-                video_clips.append(clip)
-
-                clip_start_time += clip.duration
-
-            clips = []
-            for video_clip, start_time in zip(video_clips, start_times):
-                positioned_clip = video_clip.with_start(start_time).with_position(
-                    "center"
-                )
-                clips.append(positioned_clip)
-            final_clip = CompositeVideoClip(clips)
-
-            output_file_name = f"merged_video_{uuid.uuid4()}.mp4"
-            output_file_path = os.path.join(temp_dir, output_file_name)
+        ffmpeg_bin = _ffmpeg_exe()
+        infos = await asyncio.gather(
+            *[asyncio.to_thread(probe_clip, ffmpeg_bin, f) for f in downloaded_files]
+        )
+        if not all(infos):
+            return None
 
-            logger.info(f"Saving merged video to {output_file_path}")
-            final_clip.write_videofile(
-                output_file_path, codec="libx264", audio_codec="aac", threads=4
+        output_file_path = os.path.join(temp_dir, f"merged_video_{uuid.uuid4()}.mp4")
+        content_duration = sum(info.duration for info in infos)
+        stream_copy = len({info.concat_signature() for info in infos}) == 1
+
+        logger.info(
+            f"Starting to merge {len(downloaded_files)} videos "
+            f"({'stream copy' if stream_copy else 're-encode'})"
+        )
+        merge_started = time.perf_counter()
+        if stream_copy:
+            await asyncio.to_thread(
+                _concat_copy, ffmpeg_bin, downloaded_files, output_file_path
             )
-        finally:
-            for clip in video_clips:
-                try:
-                    if hasattr(clip, "reader") and clip.reader:
-                        clip.reader.close()
-                    if hasattr(clip, "audio_reader") and clip.audio_reader:
-                        clip.audio_reader.close_proc()
-                        clip.audio_reader.close()
-                    clip.close()
-                except Exception as e:
-                    logger.error(f"Error closing video clip: {e}")
-            if "final_clip" in locals():
-                try:
-                    if hasattr(final_clip, "close"):
-                        final_clip.close()
-                except Exception as e:
-                    logger.error(f"Error closing final clip: {e}")
-
-        if os.path.exists(output_file_path) and os.path.getsize(output_file_path) > 0:
-            logger.info(f"Successfully merged video to local path: {output_file_path}")
-            return output_file_path
         else:
+            await asyncio.to_thread(
+                _concat_reencode, ffmpeg_bin, downloaded_files, infos, output_file_path
+            )
+        merge_elapsed = time.perf_counter() - merge_started
+
+        if not (
+            os.path.exists(output_file_path) and os.path.getsize(output_file_path) > 0
+        ):
             logger.error(
                 f"Merged video file is empty or doesn't exist: {output_file_path}"
             )
             return None
 
+        # 节省时间：并发下载相对串行下载 + stream copy 相对重编码（按本进程观测的重编码速度估算）
+        download_saved = max(download_serial - download_wall, 0.0)
+        merge_saved = None
+        if not stream_copy and merge_elapsed > 0:
+            speed = content_duration / merge_elapsed
+            _reencode_speed = (
+                speed
+                if _reencode_speed is None
+                else 0.7 * _reencode_speed + 0.3 * speed
+            )
+        elif _reencode_speed:
+            merge_saved = max(content_duration / _reencode_speed - merge_elapsed, 0.0)
+        logger.info(
+            f"Video combine job: {len(infos)} clips, {content_duration:.1f}s content, "
+            f"mode={'stream_copy' if stream_copy else 'reencode'}, "
+            f"download {download_wall:.1f}s (serial {download_serial:.1f}s, saved {download_saved:.1f}s), "
+            f"merge {merge_elapsed:.1f}s"
+            + (f" (est. saved {merge_saved:.1f}s vs re-encode)" if merge_saved else "")
+            + f", total {time.perf_counter() - job_started:.1f}s"
+        )
+        logger.info(f"Successfully merged video to local path: {output_file_path}")
+        return output_file_path
+
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error merging videos: {e.stderr.decode(errors='ignore')[-500:]}")
+        return None
     except Exception as e:
         logger.error(f"Error merging videos: {e}")
         return None
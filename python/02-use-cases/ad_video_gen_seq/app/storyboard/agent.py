@@ -36,7 +36,7 @@ def get_storyboard_agent():
             "extra_body": {
                 "thinking": {"type": getenv("THINKING_STORYBOARD_AGENT", "disabled")},
                 "caching": {
-                    "type": "disabled",
+                    "type": getenv("CACHING_STORYBOARD_AGENT", "enabled"),
                 },
             }
         },
@@ -44,6 +44,7 @@ def get_storyboard_agent():
 
     storyboard_agent.model = ArkLlm(
         model=f"{storyboard_agent.model_provider}/{storyboard_agent.model_name}",
+        cache_name=storyboard_agent.name,
         api_key=storyboard_agent.model_api_key,
         api_base=storyboard_agent.model_api_base,
         **storyboard_agent.model_extra_config,
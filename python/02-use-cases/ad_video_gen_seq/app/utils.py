@@ -13,8 +13,13 @@
 # limitations under the License.
 
 import os
-from datetime import datetime
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
 import threading
 import re
 
@@ -33,6 +38,203 @@ def callback_for_debug(callback_context: CallbackContext) -> Optional[LlmRespons
     pass
 
 
+# --- Short Code Stores ---
+class ShortCodeStore:
+    """
+    短码存储后端：每个 URL 分配自增整数 id，短码即 id 的 62 进制编码，
+    因此 code → url 是按主键查找，url → code 走唯一索引，百万级条目下仍为常数级开销。
+    """
+
+    def assign_ids(self, urls: list[str], expires_at: list[float]) -> list[int]:
+        """为一批 URL 分配（或复用）id，并把过期时间延长到不早于 expires_at"""
+        raise NotImplementedError
+
+    def lookup_urls(self, ids: list[int]) -> dict[int, str]:
+        """批量按 id 查找未过期的 URL"""
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """删除已过期条目，返回删除数"""
+        raise NotImplementedError
+
+
+class MemoryShortCodeStore(ShortCodeStore):
+    """进程内存储：条目数超过 max_entries 时淘汰最早分配的条目"""
+
+    def __init__(self, max_entries: int = 100000):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._current_id = 0
+        self._by_id: OrderedDict[int, tuple[str, float]] = OrderedDict()
+        self._by_url: dict[str, int] = {}
+
+    def assign_ids(self, urls: list[str], expires_at: list[float]) -> list[int]:
+        ids = []
+        with self._lock:
+            for url, expires in zip(urls, expires_at):
+                url_id = self._by_url.get(url)
+                if url_id is None:
+                    self._current_id += 1
+                    url_id = self._current_id
+                    self._by_url[url] = url_id
+                else:
+                    expires = max(expires, self._by_id[url_id][1])
+                self._by_id[url_id] = (url, expires)
+                ids.append(url_id)
+            while len(self._by_id) > self._max_entries:
+                _, (url, _) = self._by_id.popitem(last=False)
+                self._by_url.pop(url, None)
+        return ids
+
+    def lookup_urls(self, ids: list[int]) -> dict[int, str]:
+        now = time.time()
+        found = {}
+        for url_id in ids:
+            entry = self._by_id.get(url_id)
+            if entry and entry[1] > now:
+                found[url_id] = entry[0]
+        return found
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [i for i, (_, exp) in self._by_id.items() if exp <= now]
+            for url_id in expired:
+                url, _ = self._by_id.pop(url_id)
+                self._by_url.pop(url, None)
+        return len(expired)
+
+
+class SqliteShortCodeStore(ShortCodeStore):
+    """
+    SQLite 存储（WAL + mmap），同一主机上的多个 worker 进程共享同一份映射，
+    重启后短码仍可解析；id 使用 AUTOINCREMENT，淘汰后的短码不会被复用。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS short_urls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL UNIQUE,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_short_urls_expires ON short_urls (expires_at);
+    """
+    # SQLite default SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds
+    _CHUNK = 500
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        self._path = path
+        self._mmap_size = mmap_size
+        self._local = threading.local()
+        self._conn().executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets readers run alongside a writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+            self._local.conn = conn
+        return conn
+
+    def assign_ids(self, urls: list[str], expires_at: list[float]) -> list[int]:
+        conn = self._conn()
+        ids = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # SELECT + INSERT / UPDATE instead of UPSERT ... RETURNING, which needs
+            # SQLite >= 3.35; BEGIN IMMEDIATE already serializes writers
+            for url, expires in zip(urls, expires_at):
+                row = conn.execute(
+                    "SELECT id FROM short_urls WHERE url = ?", (url,)
+                ).fetchone()
+                if row is None:
+                    cursor = conn.execute(
+                        "INSERT INTO short_urls (url, expires_at) VALUES (?, ?)",
+                        (url, expires),
+                    )
+                    ids.append(cursor.lastrowid)
+                else:
+                    conn.execute(
+                        "UPDATE short_urls SET expires_at = max(expires_at, ?) "
+                        "WHERE id = ?",
+                        (expires, row[0]),
+                    )
+                    ids.append(row[0])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def lookup_urls(self, ids: list[int]) -> dict[int, str]:
+        conn = self._conn()
+        now = time.time()
+        found = {}
+        unique_ids = list(dict.fromkeys(ids))
+        for i in range(0, len(unique_ids), self._CHUNK):
+            chunk = unique_ids[i : i + self._CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT id, url FROM short_urls "
+                f"WHERE id IN ({placeholders}) AND expires_at > ?",
+                (*chunk, now),
+            )
+            found.update(rows)
+        return found
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM short_urls WHERE expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+
+def _url_expires_at(url: str, default_ttl: float) -> float:
+    """
+    推算 URL 的失效时间：TOS / S3 预签名 URL 按 X-Tos-Date(X-Amz-Date) + Expires 计算，
+    其余按 default_ttl（与 upload_file_to_tos 的 7 天签名有效期一致）
+    """
+    now = time.time()
+    if "?" not in url:
+        return now + default_ttl
+    params = {k.lower(): v for k, v in parse_qsl(urlsplit(url).query)}
+    signed_at = params.get("x-tos-date") or params.get("x-amz-date")
+    expires = params.get("x-tos-expires") or params.get("x-amz-expires")
+    if not (signed_at and expires):
+        return now + default_ttl
+    try:
+        start = datetime.strptime(signed_at, "%Y%m%dT%H%M%SZ").replace(
+            tzinfo=timezone.utc
+        )
+        return start.timestamp() + int(expires)
+    except ValueError:
+        return now + default_ttl
+
+
+def _create_short_code_store() -> ShortCodeStore:
+    """
+    按环境变量创建存储后端：
+      URL_SHORTENER_BACKEND      sqlite（默认，跨进程共享）| memory
+      URL_SHORTENER_DB_PATH      SQLite 文件路径，默认 <临时目录>/url_shortener.db
+      URL_SHORTENER_MAX_ENTRIES  memory 后端条目上限，默认 100000
+    """
+    backend = os.getenv("URL_SHORTENER_BACKEND", "sqlite").lower()
+    if backend == "sqlite":
+        path = os.getenv("URL_SHORTENER_DB_PATH") or os.path.join(
+            tempfile.gettempdir(), "url_shortener.db"
+        )
+        try:
+            return SqliteShortCodeStore(path)
+        except sqlite3.Error as e:
+            logger.warning(f"Short code store {path} unavailable, using memory: {e}")
+    return MemoryShortCodeStore(
+        max_entries=int(os.getenv("URL_SHORTENER_MAX_ENTRIES", "100000"))
+    )
+
+
 # --- URL Shortener Singleton ---
 class UrlShortener:
     _instance = None
@@ -43,6 +245,11 @@ class UrlShortener:
     BASE = len(CHAR_SET)
 
     PREFIX = "⌥"
+    # Pattern matches ⌥<code> where code is 5 characters
+    PATTERN = re.compile(r"⌥([0-9a-zA-Z]{5})")
+
+    # purge expired entries at most this often (seconds)
+    PURGE_INTERVAL = 600
 
     def __new__(cls):
         if not cls._instance:
@@ -53,10 +260,10 @@ class UrlShortener:
         return cls._instance
 
     def _initialize(self):
-        self._id_lock = threading.Lock()
-        self._current_id = 0
-        self._short_to_long = {}  # key: short_url, value: original_url
-        self._long_to_short = {}  # key: original_url, value: short_url
+        self._store = _create_short_code_store()
+        # TTL for URLs without a signature, aligned with upload_file_to_tos expiry
+        self._default_ttl = float(os.getenv("URL_SHORTENER_TTL", "604800"))
+        self._last_purge = time.time()
 
     def _encode(self, num: int) -> str:
         if num == 0:
@@ -71,70 +278,101 @@ class UrlShortener:
         # Pad to 5 characters
         return result.rjust(5, "0")
 
+    def _decode(self, code: str) -> int:
+        num = 0
+        for char in code:
+            num = num * self.BASE + self.CHAR_SET.index(char)
+        return num
+
+    def _maybe_purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        try:
+            removed = self._store.purge_expired()
+            if removed:
+                logger.info(f"Purged {removed} expired short codes")
+        except Exception as e:
+            logger.warning(f"Failed to purge expired short codes: {e}")
+
+    def url2codes(self, original_urls: list[str]) -> list[str]:
+        """
+        批量把 url 换成短ID（同一 url 始终得到同一短ID）
+        """
+        if not original_urls:
+            return []
+        try:
+            expires_at = [
+                _url_expires_at(url, self._default_ttl) for url in original_urls
+            ]
+            ids = self._store.assign_ids(list(original_urls), expires_at)
+        except Exception as e:
+            logger.warning(f"Failed to shorten urls: {e}")
+            return list(original_urls)
+        self._maybe_purge()
+        return [f"{self.PREFIX}{self._encode(url_id)}" for url_id in ids]
+
     def url2code(self, original_url: str) -> str:
         """
         输入一个url字符串，换出来一个短ID
         """
+        return self.url2codes([original_url])[0]
+
+    def code2urls(self, short_ids: list[str]) -> dict[str, str]:
+        """
+        批量把短ID换回原始url，返回 {短ID: url}（未知或已过期的短ID不在结果中）
+        """
+        ids = {}
+        for short_id in short_ids:
+            match = self.PATTERN.fullmatch(short_id)
+            if match:
+                ids[short_id] = self._decode(match.group(1))
+        if not ids:
+            return {}
         try:
-            # 1. Check if already exists (Deduplication)
-            with self._id_lock:
-                if original_url in self._long_to_short:
-                    return self._long_to_short[original_url]
-
-                # 2. Increment ID and Encode
-                self._current_id += 1
-                current_id = self._current_id
-                short_code = self._encode(current_id)
-
-            # 3. Construct short ID
-            short_id = f"{self.PREFIX}{short_code}"
-
-            # 4. Store mappings
-            with self._id_lock:
-                # Double check in case another thread inserted it
-                self._short_to_long[short_id] = original_url
-                self._long_to_short[original_url] = short_id
-
-            return short_id
-        except Exception:
-            return original_url
+            found = self._store.lookup_urls(list(ids.values()))
+        except Exception as e:
+            logger.warning(f"Failed to resolve short codes: {e}")
+            return {}
+        return {
+            short_id: found[url_id]
+            for short_id, url_id in ids.items()
+            if url_id in found
+        }
 
     def code2url(self, short_id: str) -> Optional[str]:
         """
         输入这个短ID，换出原始的url
         """
-        return self._short_to_long.get(short_id, short_id)
+        return self.code2urls([short_id]).get(short_id, short_id)
+
+    def replace_in_texts(self, texts: list[str]) -> list[str]:
+        """
+        批量处理多段文本：一次查询解析所有短ID，并无缝替换回原始URL
+        """
+        short_ids = {m.group(0) for text in texts for m in self.PATTERN.finditer(text)}
+        if not short_ids:
+            return list(texts)
+        mapping = self.code2urls(list(short_ids))
+        return [
+            self.PATTERN.sub(lambda m: mapping.get(m.group(0), m.group(0)), text)
+            for text in texts
+        ]
 
     def replace_in_text(self, text: str) -> str:
         """
         给你一个长字符串，提取短ID并无缝替换回原始URL
         """
-        # Pattern matches ⌥<code> where code is 5 characters
-        pattern = r"⌥([0-9a-zA-Z]{5})"
-
-        def replace_match(match):
-            full_short_id = match.group(0)
-            original_url = self.code2url(full_short_id)
-            return original_url if original_url != full_short_id else full_short_id
-
-        return re.sub(pattern, replace_match, text)
+        return self.replace_in_texts([text])[0]
 
     def extract_ids_to_urls(self, text: str) -> list[str]:
         """
         从字符串中提取所有短ID并转换为URL列表
         """
-        # Pattern matches ⌥<code> where code is 5 characters
-        pattern = r"⌥([0-9a-zA-Z]{5})"
-        matches = re.findall(pattern, text)
-
-        urls = []
-        for code in matches:
-            short_id = f"⌥{code}"
-            original_url = self.code2url(short_id)
-            if original_url != short_id:
-                urls.append(original_url)
-
-        return urls
+        short_ids = [m.group(0) for m in self.PATTERN.finditer(text)]
+        mapping = self.code2urls(short_ids)
+        return [mapping[short_id] for short_id in short_ids if short_id in mapping]
 
 
 # Global instance
@@ -40,13 +40,14 @@ def get_video_agent():
             "extra_body": {
                 "thinking": {"type": os.getenv("THINKING_VIDEO_AGENT", "disabled")},
                 "caching": {
-                    "type": "disabled",
+                    "type": os.getenv("CACHING_VIDEO_AGENT", "disabled"),
                 },
             },
         },
     )
     video_agent.model = ArkLlm(
         model=f"{video_agent.model_provider}/{video_agent.model_name}",
+        cache_name=video_agent.name,
         api_key=video_agent.model_api_key,
         api_base=video_agent.model_api_base,
         **video_agent.model_extra_config,
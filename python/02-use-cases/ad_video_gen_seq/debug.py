@@ -25,6 +25,7 @@ from google.genai import types
 from veadk import Runner
 from veadk.memory import ShortTermMemory
 
+from app.model import close_ark_clients, get_ark_metrics, get_prefix_cache_metrics
 from app.root import get_root_agent
 
 
@@ -112,6 +113,12 @@ async def main(prompt: types.Content, stream: bool = False):
                             print()
     end_time = time.time()
     print(f"Execution time: {end_time - start_time} seconds")
+    for model, turns in get_ark_metrics().items():
+        for turn, stats in turns.items():
+            print(f"Ark {model} [{turn}]: {stats}")
+    for agent_name, stats in get_prefix_cache_metrics().items():
+        print(f"Prefix cache {agent_name}: {stats}")
+    await close_ark_clients()
     # await export_session(runner.session_service, APP_NAME, USER_ID, SESSION_ID, "session.json")
 
 
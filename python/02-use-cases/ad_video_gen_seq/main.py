@@ -13,10 +13,12 @@
 # limitations under the License.
 
 import os
+from contextlib import asynccontextmanager
 
 from agentkit.apps import AgentkitAgentServerApp
 from veadk.memory import ShortTermMemory
 from app import root_agent
+from app.model import close_ark_clients
 
 short_term_memory = ShortTermMemory(backend="local")
 
@@ -26,6 +28,22 @@ agent_server_app = AgentkitAgentServerApp(
 )
 
 fastapi_app = getattr(agent_server_app, "app", None)
+if fastapi_app is not None:
+    # release pooled Ark connections and log per-model call metrics on shutdown;
+    # wrap the lifespan instead of add_event_handler("shutdown"), which Starlette
+    # skips when the app was built with its own lifespan
+    _inner_lifespan = fastapi_app.router.lifespan_context
+
+    @asynccontextmanager
+    async def _lifespan(app):
+        try:
+            async with _inner_lifespan(app) as state:
+                yield state
+        finally:
+            await close_ark_clients()
+
+    fastapi_app.router.lifespan_context = _lifespan
+
 if fastapi_app is not None and os.getenv("DISABLE_OPENAPI", "true").lower() in {
     "1",
     "true",
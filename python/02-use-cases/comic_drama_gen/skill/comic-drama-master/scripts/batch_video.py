@@ -2,21 +2,37 @@
 批量视频任务管理：提交和轮询。
 支持每段视频不同时长（智能时长模式）。
 智能时长模式：每个分镜根据场景复杂度动态分配 4s ~ 15s 时长。
+
+调度方式：
+- 提交与轮询共用一个带连接池的 requests.Session，同一轮到期的任务并发查询；
+- 感知排队上限：--max-in-flight（或 VIDEO_MAX_IN_FLIGHT）限制同时进行的任务数，
+  未配置时遇到 429 / 服务过载即以当前在途数作为上限，有任务完成后立即提交下一段；
+- 自适应轮询：刚提交时按 --min-interval 快速查询，状态未变化时按 1.5 倍放缓到 --interval，
+  状态变化时重置；
+- 断点续跑：任务 ID 与结果写入状态文件（默认与输入 JSON 同目录的 video_tasks_state.json），
+  重新执行 submit 时提示词未变的分镜复用已有任务，poll 时已完成的分镜不再查询。
+
 用法:
     python scripts/batch_video.py submit --prompts-file prompts.json [--first-frames-file frames.json] [--duration 10] [--durations-file durations.json]
     python scripts/batch_video.py poll --task-ids-file task_ids.json [--interval 30]
+    python scripts/batch_video.py run --prompts-file prompts.json [...]   # 提交并等待全部完成
 """
 
 import argparse
+import hashlib
 import json
 import logging
 import os
 import re
 import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +42,13 @@ _MODEL = os.environ.get("DEFAULT_VIDEO_MODEL_NAME") or os.environ.get(
     "MODEL_VIDEO_NAME"
 )
 
+_SUCCEEDED = ("success", "succeeded")
+_FAILED = ("failed", "cancelled", "expired")
+# 排队已满 / 限流：稍后重试，不计为提交失败
+_RETRYABLE_STATUS = (429, 503)
+_STATE_FILENAME = "video_tasks_state.json"
+_MAX_WORKERS = 8
+
 
 def _get_auth() -> str:
     api_key = os.environ.get("ARK_API_KEY", "") or os.environ.get(
@@ -52,20 +75,311 @@ def _build_content(prompt: str, first_frame_image_url: Optional[str]) -> list:
     return content
 
 
-def submit_video_tasks(
+def _payload_key(payload: dict) -> str:
+    # 首帧 URL 去掉签名参数，重新签名不影响复用
+    normalized = json.loads(json.dumps(payload))
+    for part in normalized.get("content", []):
+        if part.get("type") == "image_url":
+            part["image_url"]["url"] = part["image_url"]["url"].split("?", 1)[0]
+    raw = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _TaskState:
+    """任务状态文件：{"tasks": {scene_key: {"task_id", "key", "status", "video_url"/"error"}}}"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self.tasks: dict = {}
+        if self.path and self.path.exists():
+            try:
+                self.tasks = json.loads(self.path.read_text("utf-8")).get("tasks", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"failed to load state file {self.path}: {e}")
+
+    def update(self, scene_key: str, **fields):
+        self.tasks.setdefault(scene_key, {}).update(fields)
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"tasks": self.tasks}, ensure_ascii=False, indent=2), "utf-8"
+        )
+        os.replace(tmp, self.path)
+
+
+class VideoTaskScheduler:
+    """提交 / 轮询视频任务的调度器（单线程调度，HTTP 请求在线程池中并发）"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 0,
+        min_interval: Optional[float] = None,
+        max_interval: float = 30,
+        timeout: float = 1800,
+        state_file: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_in_flight: 同时进行的任务数上限，0 表示按服务端限流自动探测
+            min_interval: 最短轮询间隔（秒，默认 VIDEO_POLL_MIN_INTERVAL，5s）
+            max_interval: 最长轮询间隔（秒）
+            timeout: 单个任务最长等待时间（秒）
+            state_file: 状态文件路径，None 表示不持久化
+        """
+        if min_interval is None:
+            min_interval = float(os.environ.get("VIDEO_POLL_MIN_INTERVAL", 5))
+        self.max_in_flight = max_in_flight
+        self.min_interval = min(min_interval, max_interval)
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.state = _TaskState(state_file)
+
+        self.session = requests.Session()
+        self.session.headers.update(_get_headers())
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_MAX_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=_MAX_WORKERS)
+
+        # scene_key -> {"task_id", "interval", "next_poll", "deadline", "status"}
+        self.in_flight: dict = {}
+        self.completed: dict = {}
+        self.failed: dict = {}
+        self.errors: dict = {}
+        self.submitted: dict = {}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self) -> "VideoTaskScheduler":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ==================== 提交 ====================
+
+    def _submit_one(self, job: dict):
+        """Returns: ("ok", task_id) | ("retry", 等待秒数) | ("error", 错误信息)"""
+        try:
+            resp = self.session.post(_API_BASE, json=job["payload"], timeout=30)
+            if resp.status_code in _RETRYABLE_STATUS:
+                retry_after = resp.headers.get("Retry-After", "")
+                wait = (
+                    float(retry_after) if retry_after.isdigit() else self.min_interval
+                )
+                logger.warning(
+                    f"{job['scene_key']} rejected ({resp.status_code}): {resp.text[:200]}"
+                )
+                return "retry", wait
+            resp.raise_for_status()
+            task_id = resp.json().get("id")
+            if not task_id:
+                raise ValueError(f"no task_id in response: {resp.text[:200]}")
+            return "ok", task_id
+        except Exception as e:
+            return "error", str(e)
+
+    def _track(self, scene_key: str, task_id: str, poll_now: bool = False):
+        now = time.monotonic()
+        self.submitted[scene_key] = task_id
+        self.in_flight[scene_key] = {
+            "task_id": task_id,
+            "interval": self.min_interval,
+            "next_poll": now if poll_now else now + self.min_interval,
+            "deadline": now + self.timeout,
+            "status": None,
+        }
+
+    def _submit_ready(self, queue: deque) -> float:
+        """在空位内提交排队中的分镜，返回被限流时建议的等待秒数（0 表示未限流）"""
+        batch = []
+        while queue and (
+            not self.max_in_flight
+            or len(self.in_flight) + len(batch) < self.max_in_flight
+        ):
+            batch.append(queue.popleft())
+        if not batch:
+            return 0
+
+        backoff = 0
+        rejected = []
+        for job, (outcome, value) in zip(
+            batch, self.executor.map(self._submit_one, batch)
+        ):
+            scene_key = job["scene_key"]
+            if outcome == "ok":
+                self._track(scene_key, value)
+                self.state.update(
+                    scene_key, task_id=value, key=job["key"], status="queued"
+                )
+                logger.info(
+                    f"submitted {scene_key} task_id={value} duration={job['payload']['duration']}s"
+                )
+            elif outcome == "retry":
+                rejected.append(job)
+                backoff = max(backoff, value)
+            else:
+                self.errors[scene_key] = value
+                logger.error(f"failed to submit {scene_key}: {value}")
+
+        if rejected:
+            # 以当前在途数作为并发上限，有任务完成后再提交
+            if self.in_flight:
+                self.max_in_flight = len(self.in_flight)
+                logger.info(f"endpoint queue full, max_in_flight={self.max_in_flight}")
+            queue.extendleft(reversed(rejected))
+            return backoff if not self.in_flight else 0
+        return 0
+
+    # ==================== 轮询 ====================
+
+    def _query_one(self, task_id: str):
+        try:
+            resp = self.session.get(f"{_API_BASE}/{task_id}", timeout=30)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            return e
+
+    def _finish(self, scene_key: str, video_url: Optional[str], error: Optional[str]):
+        self.in_flight.pop(scene_key, None)
+        if video_url:
+            self.completed[scene_key] = video_url
+            self.state.update(scene_key, status="succeeded", video_url=video_url)
+            logger.info(f"{scene_key} done: {video_url[:80]}")
+        else:
+            self.failed[scene_key] = error
+            self.state.update(scene_key, status="failed", error=error)
+            logger.error(f"{scene_key} failed: {error}")
+
+    def _poll_due(self):
+        now = time.monotonic()
+        for scene_key, tracked in list(self.in_flight.items()):
+            if now >= tracked["deadline"]:
+                self._finish(scene_key, None, f"timeout after {self.timeout:.0f}s")
+        due = [
+            (scene_key, tracked)
+            for scene_key, tracked in self.in_flight.items()
+            if now >= tracked["next_poll"]
+        ]
+        if not due:
+            return
+
+        responses = self.executor.map(
+            self._query_one, [tracked["task_id"] for _, tracked in due]
+        )
+        now = time.monotonic()
+        for (scene_key, tracked), data in zip(due, responses):
+            if isinstance(data, Exception):
+                logger.warning(f"poll error for {scene_key}: {data}")
+                status = tracked["status"]
+            else:
+                status = data.get("status", "")
+                if status in _SUCCEEDED:
+                    video_url = _extract_video_url(data)
+                    if video_url:
+                        self._finish(scene_key, video_url, None)
+                    else:
+                        self._finish(
+                            scene_key, None, f"success but no video_url: {data}"
+                        )
+                    continue
+                if status in _FAILED:
+                    self._finish(scene_key, None, data.get("error") or status)
+                    continue
+
+            if status != tracked["status"]:
+                # 状态推进（queued → running）说明即将完成，回到快速轮询
+                tracked["status"] = status
+                tracked["interval"] = self.min_interval
+            else:
+                tracked["interval"] = min(tracked["interval"] * 1.5, self.max_interval)
+            tracked["next_poll"] = now + tracked["interval"]
+
+    def _sleep_until_due(self, at_least: float = 0):
+        if self.in_flight:
+            wake = min(
+                min(t["next_poll"], t["deadline"]) for t in self.in_flight.values()
+            )
+            wait = max(wake - time.monotonic(), at_least, 0.05)
+        else:
+            wait = at_least
+        time.sleep(wait)
+
+    # ==================== 调度 ====================
+
+    def run(self, jobs: list, wait: bool = True) -> None:
+        """
+        提交 jobs（[{"scene_key", "payload", "key"}]）并轮询在途任务。
+
+        Args:
+            wait: True 等待全部任务结束；False 全部提交后即返回（在途任务留待 poll）
+        """
+        queue = deque()
+        for job in jobs:
+            saved = self.state.tasks.get(job["scene_key"], {})
+            if saved.get("key") == job["key"] and saved.get("status") not in (
+                "failed",
+                None,
+            ):
+                # 断点续跑：提示词与首帧未变，复用已提交的任务
+                self.resume(job["scene_key"], saved["task_id"])
+            else:
+                queue.append(job)
+
+        progress = None
+        while queue or (wait and self.in_flight):
+            backoff = self._submit_ready(queue)
+            if not queue and not wait:
+                break
+            self._sleep_until_due(backoff)
+            self._poll_due()
+            counts = (
+                len(self.completed),
+                len(self.in_flight) + len(queue),
+                len(self.failed),
+            )
+            if counts != progress:
+                progress = counts
+                print(
+                    f"[poll] completed={counts[0]} pending={counts[1]} failed={counts[2]}",
+                    file=sys.stderr,
+                )
+        self.state.save()
+
+    def resume(self, scene_key: str, task_id: str):
+        """登记已提交的任务（状态文件中已完成的直接取结果）"""
+        saved = self.state.tasks.get(scene_key, {})
+        if saved.get("task_id") == task_id and saved.get("status") == "succeeded":
+            self.submitted[scene_key] = task_id
+            self.completed[scene_key] = saved["video_url"]
+            return
+        self._track(scene_key, task_id, poll_now=True)
+        if saved.get("task_id") != task_id:
+            self.state.tasks[scene_key] = {"task_id": task_id, "status": "queued"}
+
+
+def _default_state_file(input_file: Optional[str]) -> Optional[str]:
+    env_val = os.environ.get("BATCH_VIDEO_STATE_FILE")
+    if env_val is not None:
+        return env_val or None
+    if not input_file:
+        return None
+    return str(Path(input_file).resolve().parent / _STATE_FILENAME)
+
+
+def _build_jobs(
     prompts: list,
     duration_seconds: int = 10,
     first_frame_urls: Optional[list] = None,
     durations: Optional[list] = None,
-) -> dict:
-    """提交视频任务。支持统一时长或每段不同时长。
-
-    Args:
-        prompts: 提示词列表
-        duration_seconds: 统一时长（当 durations 未提供时使用）
-        first_frame_urls: 首帧 URL 列表（与 prompts 一一对应）
-        durations: 每段时长列表（与 prompts 一一对应，优先级高于 duration_seconds）
-    """
+) -> list:
     if not (4 <= duration_seconds <= 15):
         duration_seconds = 10
 
@@ -75,12 +389,8 @@ def submit_video_tasks(
     if durations and len(durations) != len(prompts):
         durations = None
 
-    headers = _get_headers()
-    task_ids = {}
-    errors = {}
-    logger.info(f"Using video generation model: {_MODEL}")
+    jobs = []
     for i, prompt in enumerate(prompts):
-        scene_key = f"scene_{i + 1:02d}"
         frame_url = first_frame_urls[i] if first_frame_urls else None
         # 使用每段独立时长或统一时长
         scene_duration = durations[i] if durations else duration_seconds
@@ -93,72 +403,84 @@ def submit_video_tasks(
             "duration": scene_duration,
             "watermark": False,
         }
-        try:
-            resp = requests.post(_API_BASE, json=payload, headers=headers, timeout=30)
-            resp.raise_for_status()
-            task_id = resp.json().get("id")
-            if not task_id:
-                raise ValueError(f"no task_id in response: {resp.text[:200]}")
-            task_ids[scene_key] = task_id
-            logger.info(
-                f"submitted {scene_key} task_id={task_id} duration={scene_duration}s"
-            )
-        except Exception as e:
-            errors[scene_key] = str(e)
-            logger.error(f"failed to submit {scene_key}: {e}")
-        # 提交间隔：避免触发 API 并发任务数限制（ep- endpoint 通常限制同时排队任务数）
-        time.sleep(2)
-
-    return {"submitted": task_ids, "errors": errors, "total": len(prompts)}
-
-
-def poll_video_tasks(task_ids: dict, poll_interval_seconds: int = 30) -> dict:
-    pending = dict(task_ids)
-    results = {}
-    failed = {}
-    max_rounds = 60
-    headers = _get_headers()
-
-    for round_num in range(max_rounds):
-        if not pending:
-            break
-        time.sleep(poll_interval_seconds)
-        still_pending = {}
-        for scene_key, task_id in pending.items():
-            try:
-                resp = requests.get(
-                    f"{_API_BASE}/{task_id}", headers=headers, timeout=30
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                status = data.get("status", "")
-                if status in ("success", "succeeded"):
-                    video_url = _extract_video_url(data)
-                    if video_url:
-                        results[scene_key] = video_url
-                        logger.info(f"{scene_key} done: {video_url[:80]}")
-                    else:
-                        failed[scene_key] = f"success but no video_url: {data}"
-                elif status == "failed":
-                    failed[scene_key] = data.get("error", "unknown failure")
-                    logger.error(f"{scene_key} failed: {failed[scene_key]}")
-                else:
-                    still_pending[scene_key] = task_id
-            except Exception as e:
-                still_pending[scene_key] = task_id
-                logger.warning(f"poll error for {scene_key}: {e}")
-        pending = still_pending
-        if pending:
-            print(
-                f"[poll round {round_num + 1}] completed={len(results)} pending={len(pending)} failed={len(failed)}",
-                file=sys.stderr,
-            )
+        jobs.append(
+            {
+                "scene_key": f"scene_{i + 1:02d}",
+                "payload": payload,
+                "key": _payload_key(payload),
+            }
+        )
+    return jobs
+
+
+def submit_video_tasks(
+    prompts: list,
+    duration_seconds: int = 10,
+    first_frame_urls: Optional[list] = None,
+    durations: Optional[list] = None,
+    max_in_flight: Optional[int] = None,
+    state_file: Optional[str] = None,
+    wait: bool = False,
+    poll_interval_seconds: int = 30,
+) -> dict:
+    """提交视频任务。支持统一时长或每段不同时长。
+
+    Args:
+        prompts: 提示词列表
+        duration_seconds: 统一时长（当 durations 未提供时使用）
+        first_frame_urls: 首帧 URL 列表（与 prompts 一一对应）
+        durations: 每段时长列表（与 prompts 一一对应，优先级高于 duration_seconds）
+        max_in_flight: 同时进行的任务数上限（默认 VIDEO_MAX_IN_FLIGHT，0 为自动探测）
+        state_file: 状态文件路径（断点续跑）
+        wait: 是否等待全部任务完成（返回值额外包含 poll 的结果字段）
+        poll_interval_seconds: 最长轮询间隔
+    """
+    if max_in_flight is None:
+        max_in_flight = int(os.environ.get("VIDEO_MAX_IN_FLIGHT", 0))
+
+    jobs = _build_jobs(prompts, duration_seconds, first_frame_urls, durations)
+    logger.info(f"Using video generation model: {_MODEL}")
+    with VideoTaskScheduler(
+        max_in_flight=max_in_flight,
+        max_interval=poll_interval_seconds,
+        state_file=state_file,
+    ) as scheduler:
+        scheduler.run(jobs, wait=wait)
+
+    result = {
+        "submitted": dict(sorted(scheduler.submitted.items())),
+        "errors": scheduler.errors,
+        "total": len(prompts),
+    }
+    if wait:
+        result.update(
+            completed=dict(sorted(scheduler.completed.items())),
+            failed=scheduler.failed,
+            pending=sorted(scheduler.in_flight),
+        )
+    return result
 
-    if pending:
-        for scene_key in pending:
-            failed[scene_key] = "timeout after 30 minutes"
 
-    return {"completed": results, "failed": failed, "pending": list(pending.keys())}
+def poll_video_tasks(
+    task_ids: dict,
+    poll_interval_seconds: int = 30,
+    state_file: Optional[str] = None,
+    timeout: float = 1800,
+) -> dict:
+    with VideoTaskScheduler(
+        max_interval=poll_interval_seconds,
+        timeout=timeout,
+        state_file=state_file,
+    ) as scheduler:
+        for scene_key, task_id in task_ids.items():
+            scheduler.resume(scene_key, task_id)
+        scheduler.run([], wait=True)
+
+    return {
+        "completed": dict(sorted(scheduler.completed.items())),
+        "failed": scheduler.failed,
+        "pending": sorted(scheduler.in_flight),
+    }
 
 
 def _extract_video_url(data: dict) -> Optional[str]:
@@ -187,38 +509,62 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="批量视频任务管理")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
-    # submit 子命令
+    # submit / run 子命令
     submit_parser = subparsers.add_parser("submit", help="批量提交视频任务")
-    submit_parser.add_argument(
-        "--prompts-file", required=True, help="JSON 文件，包含 prompts 列表"
-    )
-    submit_parser.add_argument(
-        "--first-frames-file", default=None, help="JSON 文件，包含首帧 URL 列表"
-    )
-    submit_parser.add_argument(
-        "--duration",
-        type=int,
-        default=10,
-        help="统一视频时长（秒），当 --durations-file 未提供时使用",
-    )
-    submit_parser.add_argument(
-        "--durations-file",
-        default=None,
-        help="JSON 文件，包含每段时长列表（与 prompts 一一对应）",
+    run_parser = subparsers.add_parser("run", help="批量提交并等待全部任务完成")
+    for sub in (submit_parser, run_parser):
+        sub.add_argument(
+            "--prompts-file", required=True, help="JSON 文件，包含 prompts 列表"
+        )
+        sub.add_argument(
+            "--first-frames-file", default=None, help="JSON 文件，包含首帧 URL 列表"
+        )
+        sub.add_argument(
+            "--duration",
+            type=int,
+            default=10,
+            help="统一视频时长（秒），当 --durations-file 未提供时使用",
+        )
+        sub.add_argument(
+            "--durations-file",
+            default=None,
+            help="JSON 文件，包含每段时长列表（与 prompts 一一对应）",
+        )
+        sub.add_argument(
+            "--max-in-flight",
+            type=int,
+            default=None,
+            help="同时进行的任务数上限（默认 VIDEO_MAX_IN_FLIGHT，0 为按限流自动探测）",
+        )
+    run_parser.add_argument(
+        "--interval", type=int, default=30, help="最长轮询间隔（秒）"
     )
 
     # poll 子命令
     poll_parser = subparsers.add_parser("poll", help="轮询等待任务完成")
     poll_parser.add_argument(
         "--task-ids-file",
-        required=True,
-        help="JSON 文件，包含 {scene_key: task_id} 字典",
+        default=None,
+        help="JSON 文件，包含 {scene_key: task_id} 字典（省略时从状态文件读取）",
+    )
+    poll_parser.add_argument(
+        "--interval", type=int, default=30, help="最长轮询间隔（秒）"
     )
-    poll_parser.add_argument("--interval", type=int, default=30, help="轮询间隔（秒）")
+    poll_parser.add_argument(
+        "--timeout", type=int, default=1800, help="单个任务最长等待时间（秒）"
+    )
+
+    for sub in (submit_parser, run_parser, poll_parser):
+        sub.add_argument(
+            "--state-file",
+            default=None,
+            help=f"任务状态文件（默认与输入 JSON 同目录的 {_STATE_FILENAME}，"
+            "BATCH_VIDEO_STATE_FILE 为空字符串时不保存）",
+        )
 
     args = parser.parse_args()
 
-    if args.command == "submit":
+    if args.command in ("submit", "run"):
         with open(args.prompts_file, "r", encoding="utf-8") as f:
             prompts = json.load(f)
 
@@ -232,12 +578,29 @@ if __name__ == "__main__":
             with open(args.durations_file, "r", encoding="utf-8") as f:
                 durations = json.load(f)
 
-        result = submit_video_tasks(prompts, args.duration, first_frames, durations)
+        result = submit_video_tasks(
+            prompts,
+            args.duration,
+            first_frames,
+            durations,
+            max_in_flight=args.max_in_flight,
+            state_file=args.state_file or _default_state_file(args.prompts_file),
+            wait=args.command == "run",
+            poll_interval_seconds=getattr(args, "interval", 30),
+        )
         print(json.dumps(result, ensure_ascii=False, indent=2))
 
     elif args.command == "poll":
-        with open(args.task_ids_file, "r", encoding="utf-8") as f:
-            task_ids = json.load(f)
-
-        result = poll_video_tasks(task_ids, args.interval)
+        state_file = args.state_file or _default_state_file(args.task_ids_file)
+        if args.task_ids_file:
+            with open(args.task_ids_file, "r", encoding="utf-8") as f:
+                task_ids = json.load(f)
+        elif state_file and os.path.exists(state_file):
+            with open(state_file, "r", encoding="utf-8") as f:
+                saved = json.load(f).get("tasks", {})
+            task_ids = {k: v["task_id"] for k, v in saved.items() if v.get("task_id")}
+        else:
+            parser.error("poll 需要 --task-ids-file 或 --state-file")
+
+        result = poll_video_tasks(task_ids, args.interval, state_file, args.timeout)
         print(json.dumps(result, ensure_ascii=False, indent=2))
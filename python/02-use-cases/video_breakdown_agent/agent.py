@@ -12,6 +12,7 @@ Agent 定义位于 video_breakdown_agent/agent.py（veadk web 的唯一真相来
 import logging
 import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # 将当前目录和子包目录添加到 sys.path，增强部署时的路径兼容性
@@ -25,6 +26,10 @@ from agentkit.apps import AgentkitAgentServerApp  # noqa: E402
 
 # 从包中导入唯一的 root_agent 定义
 from video_breakdown_agent.agent import root_agent  # noqa: E402
+from video_breakdown_agent.sub_agents.video_recreation_agent.tools.video_task_tracker import (  # noqa: E402
+    mount_task_callback_route,
+)
+from video_breakdown_agent.utils.doubao_client import close_doubao_clients  # noqa: E402
 
 # ==================== 日志配置 ====================
 
@@ -90,5 +95,27 @@ agent_server_app = AgentkitAgentServerApp(
     short_term_memory=short_term_memory,
 )
 
+
+def _install_shutdown_hook(app) -> None:
+    """退出时关闭豆包长连接客户端（包装 lifespan：自带 lifespan 的应用不会执行 shutdown 事件）"""
+    inner_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app_):
+        try:
+            async with inner_lifespan(app_) as state:
+                yield state
+        finally:
+            await close_doubao_clients()
+
+    app.router.lifespan_context = lifespan
+
+
+fastapi_app = getattr(agent_server_app, "app", None)
+if fastapi_app is not None:
+    _install_shutdown_hook(fastapi_app)
+    # VIDEO_TASK_CALLBACK_URL 已配置时接收视频生成任务状态回调
+    mount_task_callback_route(fastapi_app)
+
 if __name__ == "__main__":
     agent_server_app.run(host="0.0.0.0", port=8000)
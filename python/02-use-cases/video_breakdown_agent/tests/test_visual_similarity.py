@@ -0,0 +1,89 @@
+"""
+visual_similarity 评分校准：无关画面应被判为差异较大，同一画面的轻微变化不应被误判
+
+运行：uv run pytest tests/test_visual_similarity.py
+"""
+
+import os
+import time
+
+import numpy as np
+
+from video_breakdown_agent.utils import visual_similarity as vs
+from video_breakdown_agent.utils.media_cache import prune_files
+
+
+def _scene(seed: int, count: int = 4) -> np.ndarray:
+    """平滑渐变背景 + 若干色块，近似自然画面的低频结构"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0 : vs.FRAME_SIZE, 0 : vs.FRAME_SIZE] / vs.FRAME_SIZE
+    frames = []
+    for _ in range(count):
+        base = rng.uniform(0, 255, 3)
+        slope = rng.uniform(-120, 120, (2, 3))
+        img = base + x[..., None] * slope[0] + y[..., None] * slope[1]
+        for _ in range(6):
+            cx, cy = rng.uniform(0, 1, 2)
+            radius = rng.uniform(0.08, 0.3)
+            mask = (x - cx) ** 2 + (y - cy) ** 2 < radius**2
+            img[mask] = rng.uniform(0, 255, 3)
+        frames.append(np.clip(img, 0, 255).astype(np.uint8))
+    return np.stack(frames)
+
+
+def _combined(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    scores = vs.compare_features(vs.frame_features(a), vs.frame_features(b))
+    return scores["combined"]
+
+
+def test_identical_frames_score_one():
+    frames = _scene(0)
+    assert np.allclose(_combined(frames, frames), 1.0)
+
+
+def test_unrelated_scenes_are_weak():
+    combined = np.concatenate(
+        [_combined(_scene(seed), _scene(seed + 100)) for seed in range(20)]
+    )
+    assert np.median(combined) < vs.WEAK_SEGMENT_SCORE
+    assert (combined < vs.WEAK_SEGMENT_SCORE).mean() >= 0.8
+
+
+def test_random_noise_pair_is_weak():
+    rng = np.random.default_rng(1)
+    shape = (8, vs.FRAME_SIZE, vs.FRAME_SIZE, 3)
+    a = rng.integers(0, 256, shape, dtype=np.uint8)
+    b = rng.integers(0, 256, shape, dtype=np.uint8)
+    assert (_combined(a, b) < vs.WEAK_SEGMENT_SCORE).all()
+
+
+def test_perturbed_scene_is_not_weak():
+    frames = _scene(2)
+    rng = np.random.default_rng(3)
+    noisy = frames.astype(np.int16) + 12 + rng.integers(-10, 11, frames.shape)
+    perturbed = np.clip(noisy, 0, 255).astype(np.uint8)
+    assert (_combined(frames, perturbed) >= vs.WEAK_SEGMENT_SCORE).all()
+
+
+def test_feature_memo_is_bounded(monkeypatch):
+    monkeypatch.setenv("SIMILARITY_MEMO_SIZE", "3")
+    monkeypatch.setattr(vs, "_FEATURE_MEMO", vs.OrderedDict())
+    for i in range(5):
+        vs._memo_put(f"k{i}", {})
+    assert list(vs._FEATURE_MEMO) == ["k2", "k3", "k4"]
+
+
+def test_prune_files_keeps_recent_within_limit(tmp_path):
+    now = time.time()
+    for i in range(4):
+        path = tmp_path / f"{i}.npz"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - 10 * (4 - i), now - 10 * (4 - i)))
+    stale = tmp_path / "stale.npz"
+    stale.write_bytes(b"x")
+    os.utime(stale, (now - 1000, now - 1000))
+
+    removed = prune_files(tmp_path, "*.npz", max_size_bytes=250, ttl_seconds=500)
+
+    assert removed == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["2.npz", "3.npz"]
@@ -15,6 +15,7 @@ import re
 from typing import Dict, Optional
 
 from google.adk.tools import ToolContext
+from video_breakdown_agent.utils.frame_store import is_frame_handle
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,8 @@ def _resolve_frame_url(
 
     处理三种情况：
     1. 合法 HTTP/HTTPS URL → 直接返回
-    2. base64 data URL（data:image/...） → 直接返回（后续由 _upload_base64_to_tos 处理）
+    2. base64 data URL（data:image/...）/ 本地帧句柄（frame://） → 直接返回
+       （后续由 generate_single_video 解析并经 _upload_base64_to_tos 上传）
     3. 占位符文字 / None / 空字符串 → 从 session.state["process_video_result"] 按
        segment_index 查找并返回第一帧真实 URL；若找不到则返回 None（退化为纯文生视频）
     """
@@ -38,6 +40,7 @@ def _resolve_frame_url(
         url.startswith("http://")
         or url.startswith("https://")
         or url.startswith("data:image/")
+        or is_frame_handle(url)
     ):
         logger.info(f"[_resolve_frame_url] 使用传入的有效帧 URL（前缀：{url[:30]}...）")
         return url
@@ -62,7 +65,12 @@ def _resolve_frame_url(
             valid = [
                 u
                 for u in frame_urls
-                if u and (u.startswith("http") or u.startswith("data:image/"))
+                if u
+                and (
+                    u.startswith("http")
+                    or u.startswith("data:image/")
+                    or is_frame_handle(u)
+                )
             ]
             if valid:
                 logger.info(
@@ -1,12 +1,18 @@
 """
 自动评估工具 - 评估复刻视频质量，对比原片数据
-复用现有的process_video和hook_analyzer_agent
+
+视觉相似度由本地 CPU 评分器计算（utils/visual_similarity：感知哈希 + 颜色 / 结构指标），
+原片关键帧特征有缓存，每轮评估只解码新生成的复刻视频，不调用 LLM。
+设置 EVAL_LLM_REANALYZE=true 时额外复用 process_video / analyze_segments_vision
+重新分析复刻视频，用于镜头类型匹配。
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Dict
+import os
+from typing import Dict, List, Optional
 
 from google.adk.tools import ToolContext
 
@@ -67,13 +73,126 @@ async def re_analyze_video(video_url: str, tool_context: ToolContext) -> Dict:
         return {}
 
 
-def calculate_similarity(original_data: Dict, recreated_data: Dict) -> float:
+def _original_segments(vision_result) -> List[Dict]:
+    """vision_analysis_result 以 list 存储；兼容旧格式（dict 包裹 segments 字段）"""
+    if isinstance(vision_result, list):
+        return vision_result
+    if isinstance(vision_result, dict):
+        return vision_result.get("segments", [])
+    return []
+
+
+def _generated_clip_urls(generated_videos) -> Dict[int, str]:
+    """generated_videos → {分镜序号: 片段URL}"""
+    clips = {}
+    for item in generated_videos if isinstance(generated_videos, list) else []:
+        if not isinstance(item, dict):
+            continue
+        url = next(
+            (
+                value
+                for key, value in item.items()
+                if key.startswith("segment_") and key != "segment_index"
+            ),
+            None,
+        )
+        if isinstance(url, str) and item.get("segment_index"):
+            clips[int(item["segment_index"])] = url
+    return clips
+
+
+async def score_visual_similarity(
+    original_segments: List[Dict],
+    generated_clips: Dict[int, str],
+    recreated_source: Optional[str],
+) -> Dict:
+    """
+    本地视觉相似度评分
+
+    优先逐分镜对比（原片关键帧 vs 对应的生成片段）；只有拼接整片时按时间比例映射对比。
+
+    Returns:
+        {"visual_score": 0-1 或 None, "segment_scores": {序号: 得分}, "total_duration": float}
+    """
+    from video_breakdown_agent.tools.process_video import _resolve_ffmpeg_paths
+    from video_breakdown_agent.utils import visual_similarity
+
+    ffmpeg_bin, _ = _resolve_ffmpeg_paths()
+    segment_scores: Dict[int, Dict] = {}
+    total_duration = 0.0
+
+    if generated_clips:
+        # 分镜序号与 generate_video_prompts 一致（原片分镜列表中的 1 起始位置）
+        pairs = [
+            (idx, original_segments[idx - 1].get("frame_urls") or [], url)
+            for idx, url in sorted(generated_clips.items())
+            if 0 < idx <= len(original_segments)
+        ]
+        results = await asyncio.gather(
+            *[
+                asyncio.to_thread(
+                    visual_similarity.score_segment, ffmpeg_bin, frames, url
+                )
+                for _, frames, url in pairs
+                if frames
+            ],
+            return_exceptions=True,
+        )
+        for (idx, _, _), result in zip([p for p in pairs if p[1]], results):
+            if isinstance(result, Exception):
+                logger.warning(f"分镜{idx}视觉对比失败: {result}")
+            elif result:
+                total_duration += result.pop("duration", 0.0)
+                segment_scores[idx] = result
+    elif recreated_source:
+        timeline = [
+            {
+                "frame_urls": s.get("frame_urls") or [],
+                "start": float(s.get("start", 0.0)),
+                "end": float(s.get("end", 0.0)),
+            }
+            for s in original_segments
+        ]
+        if all(seg["frame_urls"] for seg in timeline):
+            try:
+                result = await asyncio.to_thread(
+                    visual_similarity.score_timeline,
+                    ffmpeg_bin,
+                    timeline,
+                    recreated_source,
+                )
+            except Exception as e:
+                logger.warning(f"整片视觉对比失败: {e}")
+                result = None
+            if result:
+                segment_scores = result["segments"]
+                total_duration = result["duration"]
+
+    visual_score = None
+    if segment_scores:
+        visual_score = sum(s["combined"] for s in segment_scores.values()) / len(
+            segment_scores
+        )
+    return {
+        "visual_score": visual_score,
+        "segment_scores": segment_scores,
+        "total_duration": round(total_duration, 2),
+    }
+
+
+def calculate_similarity(
+    original_data: Dict, recreated_data: Dict, visual_score: Optional[float] = None
+) -> float:
     """
     计算相似度（0-100）
 
+    无法计算的维度（复刻分镜数未知 / 无视觉评分 / 复刻视频未做镜头类型分析）不计入，
+    其余维度按权重归一化到 100 分。
+
     Args:
         original_data: 原片分析数据
         recreated_data: 复刻视频分析数据
+        visual_score: 本地视觉相似度（0-1）
 
     Returns:
         相似度得分
@@ -88,16 +207,26 @@ def calculate_similarity(original_data: Dict, recreated_data: Dict) -> float:
 
     original_segments = original_data.get("segments", [])
     recreated_segments = recreated_data.get("segments", [])
+    original_count = original_data.get("segment_count") or len(original_segments)
+    recreated_count = recreated_data.get("segment_count") or len(recreated_segments)
+
+    if not recreated_count:
+        weights.pop("segment_count")
+    if visual_score is None:
+        weights.pop("visual_content")
+    if not any(s.get("shot_type") for s in recreated_segments):
+        weights.pop("shot_types")
 
     # 1. 分镜数量匹配
-    if len(original_segments) == len(recreated_segments):
-        similarity_score += weights["segment_count"]
-    elif len(recreated_segments) > 0:
-        # 部分匹配
-        ratio = min(len(recreated_segments), len(original_segments)) / max(
-            len(recreated_segments), len(original_segments)
-        )
-        similarity_score += weights["segment_count"] * ratio
+    if "segment_count" in weights:
+        if original_count == recreated_count:
+            similarity_score += weights["segment_count"]
+        else:
+            # 部分匹配
+            ratio = min(recreated_count, original_count) / max(
+                recreated_count, original_count
+            )
+            similarity_score += weights["segment_count"] * ratio
 
     # 2. 时长匹配
     original_duration = original_data.get("total_duration", 0)
@@ -110,7 +239,7 @@ def calculate_similarity(original_data: Dict, recreated_data: Dict) -> float:
         similarity_score += weights["duration_match"] * duration_ratio
 
     # 3. 镜头类型匹配
-    if original_segments and recreated_segments:
+    if "shot_types" in weights and original_segments:
         matched_shot_types = 0
         for i in range(min(len(original_segments), len(recreated_segments))):
             orig_shot = original_segments[i].get("shot_type", "")
@@ -122,13 +251,11 @@ def calculate_similarity(original_data: Dict, recreated_data: Dict) -> float:
             shot_match_ratio = matched_shot_types / len(original_segments)
             similarity_score += weights["shot_types"] * shot_match_ratio
 
-    # 4. 视觉内容相似度（简化版：基于关键词重叠）
-    # TODO: 更精细的评估可以使用视觉特征向量
-    similarity_score += (
-        weights["visual_content"] * 0.7
-    )  # 默认70%相似（因为是基于同一提示词生成）
+    # 4. 视觉内容相似度（本地帧特征对比）
+    if visual_score is not None:
+        similarity_score += weights["visual_content"] * visual_score
 
-    return round(similarity_score, 2)
+    return round(similarity_score * 100 / sum(weights.values()), 2)
 
 
 async def evaluate_recreated_video(tool_context: ToolContext) -> Dict:
@@ -136,7 +263,8 @@ async def evaluate_recreated_video(tool_context: ToolContext) -> Dict:
     自动评估工具
 
     评估复刻视频的质量，对比原片数据，生成对比报告。
-    复用现有的process_video和analyze_segments_vision工具。
+    视觉相似度在本地计算；EVAL_LLM_REANALYZE=true 时额外复用
+    process_video 和 analyze_segments_vision 重新分析复刻视频。
 
     Args:
         tool_context: 工具上下文
@@ -174,36 +302,62 @@ async def evaluate_recreated_video(tool_context: ToolContext) -> Dict:
         original_vision_result = tool_context.state.get("vision_analysis_result")
         original_hook_analysis = tool_context.state.get("hook_analysis_struct")
 
-        if not original_vision_result:
+        original_segments = _original_segments(original_vision_result)
+        if not original_segments:
             logger.warning("未找到原片分析数据，评估将受限")
             original_data = {}
         else:
             original_data = {
-                "segments": original_vision_result.get("segments", []),
+                "segments": original_segments,
                 "total_duration": sum(
-                    s.get("duration", 0)
-                    for s in original_vision_result.get("segments", [])
+                    s.get("duration") or (s.get("end", 0) - s.get("start", 0))
+                    for s in original_segments
                 ),
-                "segment_count": len(original_vision_result.get("segments", [])),
+                "segment_count": len(original_segments),
             }
 
-        # 重新分析复刻视频
-        recreated_data = await re_analyze_video(recreated_video_url, tool_context)
-
-        if not recreated_data:
-            return {
-                "status": "error",
-                "message": "复刻视频分析失败",
-                "overall_score": 0,
-                "similarity": 0.0,
-                "comparison_details": {},
-                "strengths": [],
-                "improvements": [],
-            }
+        # 本地视觉对比（不调用 LLM，原片特征有缓存）
+        generated_clips = _generated_clip_urls(
+            tool_context.state.get("generated_videos")
+        )
+        visual = {"visual_score": None, "segment_scores": {}, "total_duration": 0.0}
+        if original_segments:
+            visual = await score_visual_similarity(
+                original_segments,
+                generated_clips,
+                tool_context.state.get("recreated_video_path") or recreated_video_url,
+            )
+            logger.info(
+                f"本地视觉相似度: {visual['visual_score']}，"
+                f"分镜得分: {visual['segment_scores']}"
+            )
+
+        recreated_data = {
+            "segments": [],
+            "total_duration": visual["total_duration"],
+            # 只有拼接后的整片时分镜数未知（0），不计入分镜数量维度
+            "segment_count": len(generated_clips),
+        }
+        if os.getenv("EVAL_LLM_REANALYZE", "false").lower() in ("1", "true", "yes"):
+            # 重新分析复刻视频（LLM，耗时较长；用于镜头类型匹配）
+            reanalyzed = await re_analyze_video(recreated_video_url, tool_context)
+            if not reanalyzed:
+                return {
+                    "status": "error",
+                    "message": "复刻视频分析失败",
+                    "overall_score": 0,
+                    "similarity": 0.0,
+                    "comparison_details": {},
+                    "strengths": [],
+                    "improvements": [],
+                }
+            recreated_data = reanalyzed
 
         # 计算相似度
         if original_data:
-            similarity = calculate_similarity(original_data, recreated_data)
+            similarity = calculate_similarity(
+                original_data, recreated_data, visual["visual_score"]
+            )
         else:
             similarity = 0.0
             logger.warning("无原片数据，无法计算相似度")
@@ -229,6 +383,8 @@ async def evaluate_recreated_video(tool_context: ToolContext) -> Dict:
                 "hook_score": 0.0,  # TODO: 实际钩子评分
             },
             "similarity": similarity,
+            "visual_score": visual["visual_score"],
+            "segment_visual_scores": visual["segment_scores"],
         }
 
         # 生成优点和改进建议
@@ -251,6 +407,20 @@ async def evaluate_recreated_video(tool_context: ToolContext) -> Dict:
         else:
             improvements.append("建议调整提示词，提高与原片的相似度")
 
+        # 基于分镜视觉得分：指出与原片差异最大的分镜（得分已做机会校正，无关画面 ≈ 0）
+        from video_breakdown_agent.utils.visual_similarity import WEAK_SEGMENT_SCORE
+
+        weak_segments = [
+            idx
+            for idx, score in sorted(visual["segment_scores"].items())
+            if score["combined"] < WEAK_SEGMENT_SCORE
+        ]
+        if weak_segments:
+            improvements.append(
+                f"分镜{'、'.join(map(str, weak_segments))}画面与原片差异较大，"
+                "建议补充首帧参考图或细化画面描述"
+            )
+
         # 默认建议
         if not original_video_url or not original_data:
             improvements.append("建议提供原片URL以进行完整对比评估")
@@ -15,143 +15,22 @@ Skill方案：三阶段工作流（知识库作为可选参考）
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import os
-import random
+import time
 from typing import Dict, List, Optional
 
 from google.adk.tools import ToolContext
 
-logger = logging.getLogger(__name__)
-
-# ==================== Skill方案知识库 ====================
+from video_breakdown_agent.sub_agents.video_recreation_agent.utils.knowledge_store import (
+    KnowledgeStore,
+    get_knowledge_store,
+    knowledge_seed,
+)
 
-PROMPT_KNOWLEDGE_BASE = {
-    # 运镜描述库（基于阿里云指南 + 用户案例 + 搜索结果）
-    "camera_movements": {
-        "推进": [
-            "镜头从{起点}匀速推进至{焦点}，运动丝滑流畅，焦点精准跟随",
-            "推进镜头从{前景}过渡到{主体}，焦点从浅景深逐渐收缩，背景渐进式虚化",
-            "镜头缓慢向前推进，逐渐聚焦于{主体}细节，景深控制突出主体",
-        ],
-        "拉远": [
-            "镜头从{特写}匀速拉远至{全景}，展现完整空间关系和环境层次",
-            "缓慢拉开镜头，从局部过渡到全景，层次感清晰，视野逐渐开阔",
-        ],
-        "环绕": [
-            "镜头360度环绕{主体}旋转，展现全方位细节和质感",
-            "镜头从左侧缓慢环绕至右侧，角度从45度到135度匀速变化，流畅展示{主体}全貌",
-        ],
-        "跟拍": [
-            "镜头流畅跟随{主体}运动，保持画面稳定构图，动态节奏感强",
-            "手持跟拍，略带晃动增强真实感，视角贴近{主体}，代入感强",
-        ],
-        "固定": [
-            "固定机位，镜头稳定对准{主体}，构图居中，展现稳定画面",
-            "静态构图，{主体}位于画面{位置}，稳定展现细节，氛围克制",
-        ],
-        "一镜到底": [
-            "10秒一镜到底运镜，全程无剪辑断点，镜头从{起点}自然衔接慢拉，匀速穿过{过渡物}，顺滑过渡到{终点}，运镜丝滑连贯、速度均匀不卡顿",
-            "一镜到底长镜头，镜头从{场景A}流畅移动至{场景B}，中间经过{过渡元素}，全程运动连贯无停顿，氛围感拉满",
-        ],
-        "穿越": [
-            "镜头穿过{障碍物}（如门/窗/缝隙），自然衔接前后空间，过渡流畅无断点",
-            "镜头从{前景物}缝隙穿出，视角从封闭空间过渡到开阔场景，空间感递进",
-        ],
-        "摇移": [
-            "镜头无缝摇移至{目标}处，运动平稳流畅，视角自然切换",
-            "镜头从{起点}摇移到{终点}，速度均匀，画面连贯衔接",
-        ],
-        "升降": [
-            "镜头缓慢升降拍摄，视角从{低角度}过渡到{高角度}，展现空间纵深",
-            "升降镜头展现场景全貌，从近处升至远景，层次感丰富",
-        ],
-    },
-    # 打光描述库（按场景类型分类）
-    "lighting_setups": {
-        "产品展示_高端": [
-            "三点布光：主光源（左侧柔光箱，色温5500K），辅光（右侧反光板），轮廓光（顶部LED灯带），突出产品质感和高级感",
-            "侧光从45度照射，勾勒出{主体}轮廓和质感，柔光箱补光消除阴影，高光反射细腻精致",
-        ],
-        "产品展示_简约": [
-            "均匀顶光漫射，白色无缝背景，柔和自然光，无明显阴影，呈现简约高级感",
-            "环形光源包围{主体}，光线柔和均匀，呈现极简风格，画面干净纯粹",
-        ],
-        "生活场景_温馨": [
-            "自然光从窗户洒入，暖色调环境光（色温3200K），营造温馨亲切氛围",
-            "顶光柔和漫射，暖黄色调，光线柔和不刺眼，氛围温暖治愈，家的感觉",
-        ],
-        "生活场景_真实": [
-            "自然环境光，明暗对比自然，符合真实生活场景光线分布，质感真实",
-            "混合光源（自然光+室内灯光），光影层次丰富，真实感强，生活化气息浓厚",
-        ],
-        "动态场景": [
-            "侧逆光强化边缘轮廓，动态光影随运动变化，层次感强，视觉冲击力强",
-            "顶光+侧光组合，光影对比明显，突出动作冲击力和力量感",
-        ],
-        "节日喜庆": [
-            "暖色调主光（色温3000K），红色金色光效点缀，营造喜庆氛围，节日感拉满",
-            "环境光融入节日元素（灯笼、彩灯），暖光包裹画面，烘托浓厚节日氛围",
-        ],
-    },
-    # 景深与色调控制
-    "visual_aesthetics": {
-        "景深_浅": "浅景深虚化背景，焦点精准锁定{主体}，突出主体细节，层次分明",
-        "景深_深": "深景深保持前后景清晰，展现完整空间层次，环境信息丰富",
-        "色调_暖": "暖色调主导（橙黄色系），色温3000-3500K，营造温馨亲切感，情感温暖",
-        "色调_冷": "冷色调主导（蓝灰色系），色温5500-6500K，呈现高级质感，专业商务感",
-        "色调_高饱和": "高饱和度色彩，色彩鲜明跳跃，视觉冲击力强，活力四射",
-        "色调_低饱和": "低饱和度色彩，柔和淡雅，文艺质感，情绪克制",
-        "色调_新年": "红色金色主导，高饱和度，喜庆氛围，新年元素（红灯笼、福字）点缀",
-    },
-    # 音频描述模板
-    "audio_templates": {
-        "女声旁白": "女性旁白说道：「{content}」，语气{mood}，语速{speed}，声音{tone}",
-        "男声旁白": "男性旁白说道：「{content}」，语气{mood}，语速{speed}，声音{tone}",
-        "对话": "{角色}说道：「{content}」，{emotion}地说，语速{speed}，情绪真挚",
-        "BGM_轻快": "背景音乐为{style}，BPM {tempo}，{instruments}，节奏明快，烘托{atmosphere}氛围",
-        "BGM_舒缓": "背景音乐为{style}，节奏舒缓，{instruments}，营造{atmosphere}氛围，情绪沉浸",
-        "BGM_喜庆": "背景音乐为{style}，节奏欢快，传统乐器（锣鼓、唢呐），烘托喜庆节日氛围",
-        "环境音": "{environment}环境音，{specific_sounds}，增强场景真实感和代入感",
-        "音效": "{action}的音效，{sound_quality}，细节清晰，增强画面感染力",
-    },
-    # 阿里云典型案例片段（拆解为可复用的模式）
-    "aliyun_patterns": {
-        "新年一镜到底": {
-            "运镜": "10秒一镜到底运镜，全程无剪辑断点，新年喜庆氛围感拉满；镜头慢拉匀速穿过厨房门，顺滑过渡到客厅，无缝摇移至窗户处，紧接着慢推镜头从窗户向外穿出",
-            "氛围": "画面融入红灯笼、福字等新年元素，烘托浓厚过年氛围，节日感拉满",
-            "音频": "背景音乐喜庆欢快，背景语音为：「新春快乐，阖家幸福，马年吉祥」",
-        },
-        "产品特写递进": {
-            "运镜": "特写镜头从产品侧面匀速推进至正面，焦距从f/2.8逐渐收缩至f/1.4",
-            "景深": "景深控制使背景渐进式虚化，突出产品主体，细节清晰可见",
-        },
-        "场景穿梭": {
-            "运镜": "镜头从{场景A}穿梭至{场景B}，中间经过{过渡点}，运动连贯流畅",
-            "过渡": "自然衔接，无断点，速度均匀，空间感递进",
-        },
-    },
-    # 营销视频模板精华（从现有10个模板提取）
-    "marketing_essentials": {
-        "产品展示": {
-            "关键词": ["特写镜头", "环绕旋转", "侧光勾勒", "高级感", "产品质感"],
-            "运镜": "镜头缓慢环绕产品旋转，展现360度细节，突出质感和工艺",
-        },
-        "痛点场景": {
-            "关键词": ["快节奏切换", "功能特写", "生活化", "实用性"],
-            "运镜": "镜头快速推进到细节，突出功能亮点，节奏明快",
-        },
-        "情感共鸣": {
-            "关键词": ["暖光", "胶片质感", "虚化背景", "治愈系"],
-            "氛围": "暖色调柔光，营造温馨治愈氛围，情感共鸣",
-        },
-        "对比冲击": {
-            "关键词": ["分屏对比", "强对比光影", "快节奏", "视觉冲击"],
-            "运镜": "快速切换前后对比，视觉冲击力强，转化效果明显",
-        },
-    },
-}
+logger = logging.getLogger(__name__)
 
 # 保留原有的电影级提示词模板库（作为降级方案）
 CINEMATIC_TEMPLATES = {
@@ -461,76 +340,81 @@ async def extract_script_features(segment: Dict, bgm_info: Optional[Dict]) -> Di
 
 
 def retrieve_relevant_knowledge(
-    features: Dict, knowledge_base: Dict = PROMPT_KNOWLEDGE_BASE
+    features: Dict,
+    store: Optional[KnowledgeStore] = None,
+    seed: str = "",
 ) -> List[str]:
     """
     阶段2：根据特征检索知识库片段（纯函数，无LLM）
 
     注意：知识库仅作为可选参考，不强制匹配。如果没有匹配项，返回空列表。
+    知识库由 knowledge_store 按标签倒排索引检索，同一知识库版本、
+    PROMPT_KNOWLEDGE_SEED 与 seed 下结果固定，可复现。
 
     Args:
         features: 提取的特征
-        knowledge_base: 知识库
+        store: 知识库（默认进程级实例，见 get_knowledge_store）
+        seed: 调用方种子（如分镜序号），同一特征在不同分镜间取不同表述
 
     Returns:
         相关知识片段列表（可能为空）
     """
+    store = store or get_knowledge_store()
+    seed = f"{knowledge_seed()}|{seed}"
     knowledge_pieces = []
 
-    # 1. 检索运镜描述（宽松匹配）
+    def first_text(category: str, tags: Dict[str, float]) -> Optional[str]:
+        hits = store.query(category, tags, seed=seed)
+        return hits[0]["text"] if hits else None
+
+    # 1. 检索运镜描述（每种运镜取一条，按种子轮选避免重复）
     for movement in features.get("运镜类型", []):
-        if movement in knowledge_base["camera_movements"]:
-            # 随机选择一个描述（避免重复）
-            desc = random.choice(knowledge_base["camera_movements"][movement])
+        desc = first_text("camera_movements", {movement: 1.0})
+        if desc:
             knowledge_pieces.append(f"【运镜参考】{desc}")
 
     # 2. 检索打光描述（宽松匹配，允许不匹配）
+    # 优先级：营销重点_场景氛围 精确匹配 > 生活场景_场景氛围 > 产品展示默认打光
     scene_type = features.get("场景氛围", "")
     marketing_focus = features.get("营销重点", "")
-
-    # 尝试精确匹配
-    lighting_key = (
-        f"{marketing_focus}_{scene_type}" if marketing_focus and scene_type else None
-    )
-    if lighting_key and lighting_key in knowledge_base["lighting_setups"]:
-        desc = random.choice(knowledge_base["lighting_setups"][lighting_key])
-        knowledge_pieces.append(f"【打光参考】{desc}")
-    # 尝试场景类型匹配
-    elif scene_type in ["温馨", "真实", "喜庆"]:
-        key = f"生活场景_{scene_type}"
-        if key in knowledge_base["lighting_setups"]:
-            desc = random.choice(knowledge_base["lighting_setups"][key])
-            knowledge_pieces.append(f"【打光参考】{desc}")
-    # 尝试营销重点匹配（但不强制）
+    lighting_tags: Dict[str, float] = {}
+    if marketing_focus and scene_type:
+        lighting_tags[f"{marketing_focus}_{scene_type}"] = 3.0
+    if scene_type in ["温馨", "真实", "喜庆"]:
+        lighting_tags[f"生活场景_{scene_type}"] = 2.0
     elif marketing_focus == "产品展示":
-        key = "产品展示_高端"
-        if key in knowledge_base["lighting_setups"]:
-            desc = random.choice(knowledge_base["lighting_setups"][key])
-            knowledge_pieces.append(f"【打光参考】{desc}")
+        lighting_tags["产品展示_高端"] = 1.0
+    desc = first_text("lighting_setups", lighting_tags)
+    if desc:
+        knowledge_pieces.append(f"【打光参考】{desc}")
 
-    # 3. 检索视觉美学（仅在明确匹配时添加）
+    # 3. 检索视觉美学（仅在明确匹配时添加，视觉风格优先于场景氛围）
     visual_style = features.get("视觉风格", "")
     if visual_style:
-        for key, desc in knowledge_base["visual_aesthetics"].items():
-            if visual_style in key or (scene_type and scene_type in key):
-                knowledge_pieces.append(f"【视觉参考】{desc}")
-                break
+        visual_tags = {visual_style: 2.0}
+        if scene_type:
+            visual_tags.setdefault(scene_type, 1.0)
+        desc = first_text("visual_aesthetics", visual_tags)
+        if desc:
+            knowledge_pieces.append(f"【视觉参考】{desc}")
 
     # 4. 检索音频模板（宽松匹配）
     for audio_element in features.get("音频要素", []):
-        for template_key, template in knowledge_base["audio_templates"].items():
-            if audio_element in template_key:
-                knowledge_pieces.append(f"【音频参考】{template}")
-                break
+        template = first_text("audio_templates", {audio_element: 1.0})
+        if template:
+            knowledge_pieces.append(f"【音频参考】{template}")
 
     # 5. 检索营销模板精华（仅在明确匹配时添加）
-    if marketing_focus and marketing_focus in knowledge_base["marketing_essentials"]:
-        essentials = knowledge_base["marketing_essentials"][marketing_focus]
-        if "运镜" in essentials:
-            knowledge_pieces.append(f"【营销参考】{essentials['运镜']}")
+    if marketing_focus:
+        desc = first_text("marketing_essentials", {f"{marketing_focus}_运镜": 1.0})
+        if desc:
+            knowledge_pieces.append(f"【营销参考】{desc}")
 
     if knowledge_pieces:
-        logger.info(f"检索到{len(knowledge_pieces)}个相关知识片段作为参考")
+        logger.info(
+            f"检索到{len(knowledge_pieces)}个相关知识片段作为参考"
+            f"（知识库 v{store.version}）"
+        )
     else:
         logger.info("未找到匹配的知识片段，将完全基于原始脚本生成")
 
@@ -846,6 +730,135 @@ def build_cinematic_prompt(
     return cinematic_prompt
 
 
+# ==================== 分镜并行调度 ====================
+
+
+def _fill_visual_defaults(segment: Dict) -> None:
+    """向后兼容：为旧版数据（缺少增强视觉维度）补充默认值"""
+    visual = segment.get("视觉表现", {})
+    if "光影" not in visual:
+        visual["光影"] = {
+            "光源类型": "自然光",
+            "光源方向": "正面光",
+            "明暗对比": "中等",
+            "阴影风格": "柔和阴影",
+        }
+    if "色调" not in visual:
+        visual["色调"] = {
+            "主色调": "自然",
+            "饱和度": "中等",
+            "色彩氛围": "中性",
+            "滤镜效果": "无",
+        }
+    if "景深" not in visual:
+        visual["景深"] = {
+            "虚化程度": "中等虚化",
+            "焦点主体": "主体",
+            "景深范围": "中景深",
+        }
+    if "构图" not in visual:
+        visual["构图"] = {
+            "主体位置": "画面中心",
+            "构图法则": "中心构图",
+            "画面平衡": "对称",
+        }
+    if "运动" not in visual:
+        visual["运动"] = {"速度": "中速", "节奏感": "流畅", "特殊效果": "无"}
+    segment["视觉表现"] = visual
+
+
+async def _run_llm_chain(
+    idx: int,
+    segment: Dict,
+    bgm_result: Optional[Dict],
+    semaphore: asyncio.Semaphore,
+    progress: Dict,
+) -> None:
+    """
+    单个分镜的 LLM 降级链：Skill三阶段 → 单阶段LLM。
+
+    中间结果实时写入 progress（features / knowledge_pieces / prompt_text / method），
+    知识检索以分镜序号为种子，同一知识库版本下重复生成结果一致。
+    整体超时被取消时调用方仍可读取已完成的部分。每次 LLM 调用单独占用并发槽位，
+    不同分镜的阶段1与阶段3交错执行。
+    """
+    # 模式1：Skill三阶段
+    try:
+        # 阶段1：特征提取
+        async with semaphore:
+            features = await extract_script_features(segment, bgm_result)
+        progress["features"] = features
+
+        # 阶段2：知识检索
+        knowledge_pieces = retrieve_relevant_knowledge(features, seed=str(idx))
+        progress["knowledge_pieces"] = knowledge_pieces
+        progress["knowledge_version"] = get_knowledge_store().version
+
+        # 阶段3：组装生成
+        async with semaphore:
+            progress["prompt_text"] = await generate_final_prompt(
+                segment, bgm_result, features, knowledge_pieces
+            )
+        progress["method"] = "skill"
+        logger.info(f"分镜{idx}: Skill模式生成成功")
+        return
+    except Exception as e:
+        logger.warning(f"分镜{idx}: Skill模式失败，尝试降级 - {e}")
+
+    # 降级1：单阶段LLM（如果Skill失败）
+    try:
+        async with semaphore:
+            progress["prompt_text"] = await generate_single_stage_llm_prompt(
+                segment, bgm_result
+            )
+        progress["method"] = "llm_single"
+        logger.info(f"分镜{idx}: 单阶段LLM降级成功")
+    except Exception as e:
+        logger.warning(f"分镜{idx}: LLM降级失败 - {e}")
+
+
+async def _run_llm_chains(
+    targets: List[tuple],
+    bgm_result: Optional[Dict],
+) -> Dict[int, Dict]:
+    """
+    有界并发地为所有分镜执行 LLM 降级链。
+
+    并发数由 PROMPT_GEN_CONCURRENCY 控制（默认 4），整体超时由 PROMPT_GEN_TIMEOUT
+    控制（秒，默认 180）。超时后取消未完成的分镜，已完成分镜的结果保留。
+
+    Returns:
+        {分镜序号: progress}；未生成出提示词的分镜 progress 中没有 prompt_text
+    """
+    concurrency = max(1, int(os.getenv("PROMPT_GEN_CONCURRENCY", "4")))
+    timeout = float(os.getenv("PROMPT_GEN_TIMEOUT", "180"))
+    semaphore = asyncio.Semaphore(concurrency)
+    progress: Dict[int, Dict] = {idx: {} for idx, _ in targets}
+
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(
+            _run_llm_chain(idx, segment, bgm_result, semaphore, progress[idx])
+        )
+        for idx, segment in targets
+    ]
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        logger.warning(
+            f"提示词生成超时（{timeout:.0f}s），{len(pending)} 个分镜未完成，"
+            "保留已完成结果，其余使用函数模板"
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    logger.info(
+        f"LLM 提示词生成耗时 {time.perf_counter() - started:.1f}s "
+        f"（{len(targets)} 个分镜，并发 {concurrency}）"
+    )
+    return progress
+
+
 async def generate_video_prompts(
     tool_context: ToolContext,
     segment_indexes: str = "",  # 逗号分隔的分镜序号，如 "1" 或 "1,3"；空字符串=全部
@@ -862,6 +875,9 @@ async def generate_video_prompts(
     2. 单阶段LLM（降级1）：直接LLM生成
     3. 函数模板（降级2）：纯函数生成
 
+    各分镜的 LLM 调用有界并发执行（PROMPT_GEN_CONCURRENCY），输出顺序与分镜顺序一致；
+    降级按分镜独立进行，整体超时（PROMPT_GEN_TIMEOUT）时未完成的分镜回退函数模板。
+
     Args:
         tool_context: 工具上下文（包含session state）
         segment_indexes: 逗号分隔的分镜序号（如 "1" 或 "1,3"），空字符串表示生成全部分镜
@@ -928,82 +944,32 @@ async def generate_video_prompts(
         prompts = []
         prompts_debug = []  # 内部调试数据，不回传给 LLM
 
-        for idx, segment in enumerate(segments, start=1):
-            # 跳过未被指定的分镜
-            if filter_indexes and idx not in filter_indexes:
-                continue
-            # 向后兼容：为旧版数据（缺少增强视觉维度）补充默认值
-            visual = segment.get("视觉表现", {})
-            if "光影" not in visual:
-                visual["光影"] = {
-                    "光源类型": "自然光",
-                    "光源方向": "正面光",
-                    "明暗对比": "中等",
-                    "阴影风格": "柔和阴影",
-                }
-            if "色调" not in visual:
-                visual["色调"] = {
-                    "主色调": "自然",
-                    "饱和度": "中等",
-                    "色彩氛围": "中性",
-                    "滤镜效果": "无",
-                }
-            if "景深" not in visual:
-                visual["景深"] = {
-                    "虚化程度": "中等虚化",
-                    "焦点主体": "主体",
-                    "景深范围": "中景深",
-                }
-            if "构图" not in visual:
-                visual["构图"] = {
-                    "主体位置": "画面中心",
-                    "构图法则": "中心构图",
-                    "画面平衡": "对称",
-                }
-            if "运动" not in visual:
-                visual["运动"] = {"速度": "中速", "节奏感": "流畅", "特殊效果": "无"}
-            segment["视觉表现"] = visual
-
-            prompt_text = None
-            generation_method = "unknown"
-            features = None
-            knowledge_pieces = []
-
-            # 模式1：Skill三阶段
-            if use_skill_mode:
-                try:
-                    # 阶段1：特征提取
-                    features = await extract_script_features(segment, bgm_result)
-
-                    # 阶段2：知识检索
-                    knowledge_pieces = retrieve_relevant_knowledge(features)
-
-                    # 阶段3：组装生成
-                    prompt_text = await generate_final_prompt(
-                        segment, bgm_result, features, knowledge_pieces
-                    )
-                    generation_method = "skill"
-                    logger.info(f"分镜{idx}: Skill模式生成成功")
-
-                except Exception as e:
-                    logger.warning(f"分镜{idx}: Skill模式失败，尝试降级 - {e}")
-                    prompt_text = None
-
-            # 降级1：单阶段LLM（如果Skill失败）
-            if prompt_text is None and use_skill_mode:
-                try:
-                    prompt_text = await generate_single_stage_llm_prompt(
-                        segment, bgm_result
-                    )
-                    generation_method = "llm_single"
-                    logger.info(f"分镜{idx}: 单阶段LLM降级成功")
-                except Exception as e:
-                    logger.warning(f"分镜{idx}: LLM降级失败 - {e}")
-                    prompt_text = None
+        # 跳过未被指定的分镜
+        targets = [
+            (idx, segment)
+            for idx, segment in enumerate(segments, start=1)
+            if not filter_indexes or idx in filter_indexes
+        ]
+        for _, segment in targets:
+            _fill_visual_defaults(segment)
+
+        # 模式1 + 降级1：所有分镜的 LLM 链并行执行
+        progress: Dict[int, Dict] = {}
+        if use_skill_mode and targets:
+            progress = await _run_llm_chains(targets, bgm_result)
+
+        template_key = None
+        for idx, segment in targets:
+            result = progress.get(idx, {})
+            prompt_text = result.get("prompt_text")
+            generation_method = result.get("method", "unknown")
+            features = result.get("features")
+            knowledge_pieces = result.get("knowledge_pieces", [])
 
             # 降级2：函数模板（最终兜底）
             if prompt_text is None:
-                template_key = force_template or detect_video_type(segments)
+                if template_key is None:
+                    template_key = force_template or detect_video_type(segments)
                 prompt_text = build_cinematic_prompt(
                     segment=segment,
                     template_key=template_key,
@@ -1048,6 +1014,7 @@ async def generate_video_prompts(
             prompt_data_debug = dict(prompt_data)
             prompt_data_debug["extracted_features"] = features
             prompt_data_debug["knowledge_used"] = len(knowledge_pieces)
+            prompt_data_debug["knowledge_version"] = result.get("knowledge_version")
             prompt_data_debug["original_segment_data"] = segment
 
             prompts.append(prompt_data)
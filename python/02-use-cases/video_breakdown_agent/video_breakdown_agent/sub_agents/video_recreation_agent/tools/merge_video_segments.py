@@ -1,27 +1,63 @@
 """
 视频拼接工具 - 使用FFmpeg将多个分镜视频拼接为完整视频
+
+增量拼接（IncrementalMerger）：
+- video_generate 每完成一个分镜就交给拼接器，分镜在其余任务仍在生成时即开始下载
+  （共享 aiohttp 连接，MERGE_DOWNLOAD_CONCURRENCY 限制并发）；
+- 每个片段下载后探测编码参数，与基准参数（分镜顺序中第一个可用片段）一致时原样使用，
+  仅在编码 / 分辨率 / 帧率 / 像素格式 / 音轨不一致时转码归一化；
+- concat 列表按分镜顺序增量追加，最后一个片段落地后只需一次 -c copy 拼接；
+- 转场（MERGE_TRANSITION，如 fade / dissolve / wipeleft）使用 xfade/acrossfade 滤镜图，
+  滤镜图按片段时长缓存为脚本文件，拼接结果按「片段 URL + 转场参数」缓存，
+  同一组片段重复拼接时直接复用，不再重新编码；缓存每次写入后按
+  MERGE_CACHE_MAX_SIZE_MB / MEDIA_CACHE_TTL_DAYS 淘汰最久未使用的结果。
+- 未被 merge_segments 取用的增量拼接器超过 MERGE_STREAMING_TTL 后关闭并清理临时目录。
 """
 
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import json
 import logging
 import os
+import re
+import shutil
+import subprocess
 import tempfile
-from typing import Dict, List
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
 
 from google.adk.tools import ToolContext
 
+from video_breakdown_agent.utils.media_cache import (
+    cache_ttl_seconds,
+    media_temp_base,
+    normalize_url,
+    prune_files,
+)
+
 logger = logging.getLogger(__name__)
 
+# 可直接映射到编码器的视频编码；其他编码统一归一化为 H.264
+_VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+_AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus"}
+
+# 进行中的增量拼接器（按会话区分，由 video_generate 创建、merge_segments 取用）
+_STREAMING_MERGERS: Dict[str, "IncrementalMerger"] = {}
 
-async def download_video(url: str, save_path: str) -> bool:
+
+async def download_video(url: str, save_path: str, session=None) -> bool:
     """
     下载视频文件
 
     Args:
         url: 视频URL
         save_path: 保存路径
+        session: 复用的 aiohttp.ClientSession（可选，未提供时临时创建）
 
     Returns:
         是否下载成功
@@ -29,18 +65,21 @@ async def download_video(url: str, save_path: str) -> bool:
     try:
         import aiohttp
 
-        async with aiohttp.ClientSession() as session:
+        own_session = session is None
+        if own_session:
+            session = aiohttp.ClientSession()
+        try:
             async with session.get(
                 url, timeout=aiohttp.ClientTimeout(total=120)
             ) as response:
                 response.raise_for_status()
 
                 with open(save_path, "wb") as f:
-                    while True:
-                        chunk = await response.content.read(8192)
-                        if not chunk:
-                            break
+                    async for chunk in response.content.iter_chunked(256 * 1024):
                         f.write(chunk)
+        finally:
+            if own_session:
+                await session.close()
 
         logger.info(f"视频下载成功: {save_path}")
         return True
@@ -50,85 +89,636 @@ async def download_video(url: str, save_path: str) -> bool:
         return False
 
 
+# ==================== 片段参数探测 ====================
+
+
+@dataclass(frozen=True)
+class ClipParams:
+    """决定能否 stream copy 拼接的编码参数"""
+
+    vcodec: str
+    width: int
+    height: int
+    fps: str
+    pix_fmt: str
+    acodec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+
+
+def _resolve_ffmpeg_bins() -> Tuple[str, Optional[str]]:
+    from video_breakdown_agent.tools.process_video import _resolve_ffmpeg_paths
+
+    return _resolve_ffmpeg_paths()
+
+
+def _normalize_fps(raw: Optional[str]) -> str:
+    """'24/1' / '24' / '23.98' → 统一的帧率字符串"""
+    if not raw:
+        return "0"
+    if "/" in raw:
+        num, den = raw.split("/", 1)
+        value = float(num) / float(den) if float(den) else 0.0
+    else:
+        value = float(raw)
+    return f"{value:.3f}".rstrip("0").rstrip(".")
+
+
+def probe_clip(
+    ffmpeg_bin: str, ffprobe_bin: Optional[str], path: str
+) -> Tuple[ClipParams, float]:
+    """
+    探测片段编码参数和时长（ffprobe 优先，回退解析 ffmpeg -i 输出）
+
+    Raises:
+        ValueError: 无法识别视频流
+    """
+    if ffprobe_bin:
+        output = subprocess.run(
+            [
+                ffprobe_bin,
+                "-v",
+                "error",
+                "-print_format",
+                "json",
+                "-show_format",
+                "-show_streams",
+                path,
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        info = json.loads(output or "{}")
+        video = next(
+            (s for s in info.get("streams", []) if s.get("codec_type") == "video"),
+            None,
+        )
+        audio = next(
+            (s for s in info.get("streams", []) if s.get("codec_type") == "audio"),
+            None,
+        )
+        if video is None:
+            raise ValueError(f"未找到视频流: {path}")
+        params = ClipParams(
+            vcodec=video.get("codec_name", ""),
+            width=int(video.get("width") or 0),
+            height=int(video.get("height") or 0),
+            fps=_normalize_fps(video.get("r_frame_rate")),
+            pix_fmt=video.get("pix_fmt", ""),
+            acodec=audio.get("codec_name") if audio else None,
+            sample_rate=int(audio.get("sample_rate") or 0) if audio else None,
+            channels=int(audio.get("channels") or 0) if audio else None,
+        )
+        duration = float((info.get("format") or {}).get("duration") or 0)
+        return params, duration
+
+    stderr = subprocess.run(
+        [ffmpeg_bin, "-hide_banner", "-i", path], capture_output=True, text=True
+    ).stderr
+    video = re.search(
+        r"Video:\s*(\w+)[^,]*,\s*(\w+)[^,]*,.*?(\d{2,5})x(\d{2,5}).*?(\d+(?:\.\d+)?)\s+fps",
+        stderr,
+    )
+    if not video:
+        raise ValueError(f"未找到视频流: {path}")
+    audio = re.search(r"Audio:\s*(\w+)[^,]*,\s*(\d+)\s*Hz,\s*(\w+)", stderr)
+    channels = {"mono": 1}.get(audio.group(3), 2) if audio else None
+    params = ClipParams(
+        vcodec=video.group(1),
+        width=int(video.group(3)),
+        height=int(video.group(4)),
+        fps=_normalize_fps(video.group(5)),
+        pix_fmt=video.group(2),
+        acodec=audio.group(1) if audio else None,
+        sample_rate=int(audio.group(2)) if audio else None,
+        channels=channels,
+    )
+    dur = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", stderr)
+    duration = (
+        int(dur.group(1)) * 3600 + int(dur.group(2)) * 60 + float(dur.group(3))
+        if dur
+        else 0.0
+    )
+    return params, duration
+
+
+def _normalize_cmd(
+    ffmpeg_bin: str, src: str, dst: str, source: ClipParams, target: ClipParams
+) -> List[str]:
+    """把片段转码为基准参数（等比缩放 + 补边，补齐 / 去除音轨）"""
+    w, h = target.width, target.height
+    vf = (
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+        f"fps={target.fps},format={target.pix_fmt}"
+    )
+    cmd = [ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-y", "-i", src]
+    if target.acodec and not source.acodec:
+        # 基准片段有音轨而当前片段没有：补静音轨，否则 concat 后音画错位
+        layout = "mono" if target.channels == 1 else "stereo"
+        cmd += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"anullsrc=channel_layout={layout}:sample_rate={target.sample_rate}",
+            "-shortest",
+        ]
+    cmd += [
+        "-map",
+        "0:v:0",
+        "-vf",
+        vf,
+        "-c:v",
+        _VIDEO_ENCODERS.get(target.vcodec, "libx264"),
+        "-preset",
+        "veryfast",
+        "-crf",
+        "18",
+    ]
+    if target.acodec:
+        cmd += [
+            "-map",
+            "0:a:0" if source.acodec else "1:a:0",
+            "-c:a",
+            _AUDIO_ENCODERS.get(target.acodec, "aac"),
+            "-ar",
+            str(target.sample_rate),
+            "-ac",
+            str(target.channels),
+        ]
+    else:
+        cmd += ["-an"]
+    return cmd + ["-movflags", "+faststart", dst]
+
+
+# ==================== 转场滤镜图 ====================
+
+
+@lru_cache(maxsize=32)
+def build_transition_graph(
+    durations: Tuple[float, ...],
+    transition: str,
+    duration: float,
+    fps: str,
+    has_audio: bool,
+) -> str:
+    """
+    xfade / acrossfade 链式滤镜图（同样的片段时长与转场参数只构建一次）
+
+    第 k 个转场的 offset = 前 k 个片段总时长 - k × 转场时长
+    """
+    parts = [
+        f"[{i}:v]settb=AVTB,setpts=PTS-STARTPTS,fps={fps}[v{i}]"
+        for i in range(len(durations))
+    ]
+    prev_v, prev_a = "v0", "0:a"
+    elapsed = durations[0]
+    for i in range(1, len(durations)):
+        offset = max(elapsed - i * duration, 0)
+        out_v = "vout" if i == len(durations) - 1 else f"vx{i}"
+        parts.append(
+            f"[{prev_v}][v{i}]xfade=transition={transition}:"
+            f"duration={duration}:offset={offset:.3f}[{out_v}]"
+        )
+        prev_v = out_v
+        if has_audio:
+            out_a = "aout" if i == len(durations) - 1 else f"ax{i}"
+            parts.append(f"[{prev_a}][{i}:a]acrossfade=d={duration}[{out_a}]")
+            prev_a = out_a
+        elapsed += durations[i]
+    return ";\n".join(parts)
+
+
+def _merge_cache_key(urls: List[str], transition: str, duration: float) -> str:
+    raw = json.dumps(
+        [[normalize_url(u) for u in urls], transition, duration], ensure_ascii=False
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _merge_cache_dir() -> Path:
+    return Path(os.getenv("MERGE_CACHE_DIR") or media_temp_base() / "merged")
+
+
+def _prune_merge_cache(cache_dir: Path) -> None:
+    """拼接结果按 LRU（mtime）淘汰；孤立的滤镜脚本随过期时间清理"""
+    max_size_mb = float(os.getenv("MERGE_CACHE_MAX_SIZE_MB", "2048"))
+    ttl = cache_ttl_seconds()
+    try:
+        prune_files(cache_dir, "*.mp4", int(max_size_mb * 1024 * 1024), ttl)
+        prune_files(cache_dir, "*.filter.txt", int(max_size_mb * 1024 * 1024), ttl)
+    except OSError as e:
+        logger.warning(f"清理转场拼接缓存失败: {e}")
+
+
+def _merge_settings() -> Tuple[str, float, int]:
+    transition = (os.getenv("MERGE_TRANSITION") or "none").strip().lower()
+    return (
+        transition,
+        float(os.getenv("MERGE_TRANSITION_DURATION", "0.5")),
+        max(1, int(os.getenv("MERGE_DOWNLOAD_CONCURRENCY", "4"))),
+    )
+
+
+# ==================== 增量拼接器 ====================
+
+
+@dataclass
+class _Clip:
+    index: int
+    url: str
+    path: Optional[str] = None
+    source: Optional[ClipParams] = None
+    duration: float = 0.0
+    failed: bool = False
+    done: bool = False
+
+
+class IncrementalMerger:
+    """片段到达即下载 / 归一化，按序增量维护 concat 列表"""
+
+    def __init__(
+        self,
+        work_dir: Optional[str] = None,
+        expected_indexes: Optional[List[int]] = None,
+        transition: Optional[str] = None,
+    ):
+        """
+        Args:
+            work_dir: 工作目录（默认新建临时目录）
+            expected_indexes: 预期的分镜序号（用于按序增量写 concat 列表；
+                未提供时在 finalize 时一次性写入）
+            transition: 转场类型（默认读 MERGE_TRANSITION，none 表示直接拼接）
+        """
+        self._own_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="video_recreation_")
+        self.created = time.monotonic()
+        self.expected = sorted(expected_indexes) if expected_indexes else None
+        self.transition, self.transition_duration, concurrency = _merge_settings()
+        if transition:
+            self.transition = transition
+        self.ffmpeg_bin, self.ffprobe_bin = _resolve_ffmpeg_bins()
+
+        self.list_file = os.path.join(self.work_dir, "concat.list.txt")
+        self.clips: Dict[int, _Clip] = {}
+        self.target: Optional[ClipParams] = None
+        self.normalized = 0
+        self._listed = 0  # concat 列表中已写入的 expected 前缀长度
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: List[asyncio.Task] = []
+        self._session = None
+        self._target_ready = asyncio.Event()
+        self._closed = False  # finalize 后不再有新片段，未登记的预期分镜视为失败
+        open(self.list_file, "w").close()
+
+    @property
+    def urls(self) -> Set[str]:
+        return {clip.url for clip in self.clips.values()}
+
+    def add(self, index: int, url: str) -> None:
+        """登记片段（URL 或本地路径）并立即在后台开始下载 / 归一化"""
+        if index in self.clips:
+            return
+        clip = _Clip(index=index, url=url)
+        self.clips[index] = clip
+        self._tasks.append(asyncio.create_task(self._prepare(clip)))
+
+    async def _get_session(self):
+        if self._session is None:
+            import aiohttp
+
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=8, keepalive_timeout=60)
+            )
+        return self._session
+
+    async def _prepare(self, clip: _Clip) -> None:
+        try:
+            if os.path.isfile(clip.url):
+                local_path = clip.url
+            else:
+                local_path = os.path.join(self.work_dir, f"segment_{clip.index}.mp4")
+                async with self._semaphore:
+                    if not await download_video(
+                        clip.url, local_path, await self._get_session()
+                    ):
+                        clip.failed = True
+                        logger.error(
+                            f"下载segment_{clip.index}失败，拼接将不包含此片段"
+                        )
+                        return
+
+            params, duration = await asyncio.to_thread(
+                probe_clip, self.ffmpeg_bin, self.ffprobe_bin, local_path
+            )
+            clip.source, clip.duration = params, duration
+            self._maybe_set_target()
+            await self._target_ready.wait()
+            if self.target is None:
+                raise RuntimeError("没有可作为基准的片段")
+
+            if params != self.target:
+                normalized_path = os.path.join(
+                    self.work_dir, f"segment_{clip.index}.norm.mp4"
+                )
+                logger.info(
+                    f"segment_{clip.index} 参数与基准不一致，转码归一化: "
+                    f"{params} → {self.target}"
+                )
+                async with self._semaphore:
+                    await asyncio.to_thread(
+                        subprocess.run,
+                        _normalize_cmd(
+                            self.ffmpeg_bin,
+                            local_path,
+                            normalized_path,
+                            params,
+                            self.target,
+                        ),
+                        capture_output=True,
+                        check=True,
+                    )
+                local_path = normalized_path
+                self.normalized += 1
+
+            clip.path = local_path
+        except Exception as e:
+            clip.failed = True
+            logger.error(f"segment_{clip.index} 处理失败，拼接将不包含此片段: {e}")
+        finally:
+            clip.done = True
+            self._maybe_set_target()
+            self._flush_list()
+
+    def _maybe_set_target(self) -> None:
+        """
+        以分镜顺序中第一个可用片段的参数为基准（通常是首个分镜），
+        更靠前的片段尚未探测完成时，其余片段等待，避免小分辨率 / 无音轨片段成为基准。
+        """
+        if self.target is not None:
+            return
+        order = list(self.expected or sorted(self.clips))
+        order += [i for i in sorted(self.clips) if i not in order]
+        for index in order:
+            clip = self.clips.get(index)
+            if clip is None:
+                if self._closed:
+                    continue
+                return
+            if clip.source is None:
+                if clip.failed or clip.done:
+                    continue
+                return
+            # 不可 copy 的编码统一归一化为 H.264 / AAC
+            target = clip.source
+            if target.vcodec not in _VIDEO_ENCODERS:
+                target = replace(target, vcodec="h264")
+            if target.acodec and target.acodec not in _AUDIO_ENCODERS:
+                target = replace(target, acodec="aac")
+            self.target = target
+            self._target_ready.set()
+            return
+
+        # 已登记片段全部结束仍无基准（均失败）：放行等待方，避免 finalize 挂起
+        if self._closed or all(c.done for c in self.clips.values()):
+            self._target_ready.set()
+
+    def _flush_list(self) -> None:
+        """把已就绪的连续前缀追加到 concat 列表（失败片段跳过）"""
+        if self.expected is None:
+            return
+        lines = []
+        while self._listed < len(self.expected):
+            clip = self.clips.get(self.expected[self._listed])
+            if clip is None and self._closed:
+                self._listed += 1
+                continue
+            if clip is None or not clip.done:
+                break
+            if clip.path:
+                lines.append(_concat_line(clip.path))
+            self._listed += 1
+        if lines:
+            with open(self.list_file, "a") as f:
+                f.writelines(lines)
+
+    def ready_clips(self) -> List[_Clip]:
+        return [
+            self.clips[i] for i in sorted(self.clips) if self.clips[i].path is not None
+        ]
+
+    async def finalize(self, output_path: str) -> List[_Clip]:
+        """
+        等待所有片段就绪并输出拼接结果
+
+        Returns:
+            实际拼接的片段（按分镜顺序）；为空表示全部失败
+
+        Raises:
+            RuntimeError: FFmpeg 拼接失败
+        """
+        self._closed = True
+        self._maybe_set_target()
+        try:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+
+        clips = self.ready_clips()
+        if not clips:
+            return clips
+
+        # 未提供预期顺序、或有片段不在预期内时，重写完整列表
+        if (
+            self.expected is None
+            or self._listed < len(self.expected)
+            or any(c.index not in self.expected for c in clips)
+        ):
+            with open(self.list_file, "w") as f:
+                f.writelines(_concat_line(c.path) for c in clips)
+
+        if self.transition != "none" and len(clips) > 1:
+            await self._merge_with_transition(clips, output_path)
+        else:
+            await _run_ffmpeg(
+                [
+                    self.ffmpeg_bin,
+                    "-hide_banner",
+                    "-loglevel",
+                    "error",
+                    "-f",
+                    "concat",
+                    "-safe",
+                    "0",
+                    "-i",
+                    self.list_file,
+                    "-c",
+                    "copy",
+                    "-movflags",
+                    "+faststart",
+                    "-y",
+                    output_path,
+                ]
+            )
+        return clips
+
+    async def aclose(self) -> None:
+        """放弃拼接：取消未完成的下载 / 转码，关闭连接并删除自建的临时目录"""
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._own_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    async def _merge_with_transition(self, clips: List[_Clip], output_path: str):
+        cache_dir = _merge_cache_dir()
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        key = _merge_cache_key(
+            [c.url for c in clips], self.transition, self.transition_duration
+        )
+        cached = cache_dir / f"{key}.mp4"
+        try:
+            shutil.copy2(cached, output_path)
+            # 刷新 mtime 作为最近访问时间，淘汰时按 LRU 保留
+            os.utime(cached)
+            logger.info(f"转场拼接命中缓存: {cached}")
+            return
+        except FileNotFoundError:
+            pass
+
+        # 转场时长不能超过最短片段的一半
+        duration = min(
+            self.transition_duration, min(c.duration for c in clips) / 2 or 0.1
+        )
+        graph = build_transition_graph(
+            tuple(round(c.duration, 3) for c in clips),
+            self.transition,
+            round(duration, 3),
+            self.target.fps,
+            bool(self.target.acodec),
+        )
+        graph_file = cache_dir / f"{key}.filter.txt"
+        graph_file.write_text(graph, encoding="utf-8")
+
+        cmd = [self.ffmpeg_bin, "-hide_banner", "-loglevel", "error"]
+        for clip in clips:
+            cmd += ["-i", clip.path]
+        cmd += [
+            "-filter_complex_script",
+            str(graph_file),
+            "-map",
+            "[vout]",
+            "-c:v",
+            _VIDEO_ENCODERS.get(self.target.vcodec, "libx264"),
+            "-preset",
+            "veryfast",
+            "-crf",
+            "18",
+        ]
+        cmd += ["-pix_fmt", self.target.pix_fmt]
+        if self.target.acodec:
+            cmd += ["-map", "[aout]", "-c:a", _AUDIO_ENCODERS[self.target.acodec]]
+        cmd += ["-movflags", "+faststart", "-y", output_path]
+        await _run_ffmpeg(cmd)
+        # 先写临时文件再替换，淘汰 / 并发命中时不会读到半个文件
+        tmp = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+        shutil.copy2(output_path, tmp)
+        os.replace(tmp, cached)
+        _prune_merge_cache(cache_dir)
+
+
+def _concat_line(path: str) -> str:
+    # FFmpeg需要转义特殊字符
+    escaped_path = path.replace("'", "'\\''")
+    return f"file '{escaped_path}'\n"
+
+
+async def _run_ffmpeg(cmd: List[str]) -> None:
+    logger.info(f"执行FFmpeg拼接: {' '.join(cmd)}")
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg拼接失败: {stderr.decode(errors='replace')[-1000:]}")
+
+
+def _session_key(tool_context: ToolContext) -> str:
+    inv = getattr(tool_context, "_invocation_context", None)
+    session = getattr(inv, "session", None)
+    return getattr(session, "id", None) or "default"
+
+
+def _discard_merger(merger: IncrementalMerger) -> None:
+    try:
+        asyncio.get_running_loop().create_task(merger.aclose())
+    except RuntimeError:
+        # 没有运行中的事件循环，后台任务已随循环结束，只需清理临时目录
+        if merger._own_dir:
+            shutil.rmtree(merger.work_dir, ignore_errors=True)
+
+
+def _evict_stale_mergers() -> None:
+    """关闭超过 MERGE_STREAMING_TTL 仍未被 merge_segments 取用的拼接器"""
+    ttl = float(os.getenv("MERGE_STREAMING_TTL", "3600"))
+    now = time.monotonic()
+    for key, merger in list(_STREAMING_MERGERS.items()):
+        if now - merger.created > ttl:
+            logger.info(f"增量拼接器超过 {ttl:.0f}s 未被使用，关闭: {key}")
+            _discard_merger(_STREAMING_MERGERS.pop(key))
+
+
+def start_streaming_merge(
+    tool_context: ToolContext, expected_indexes: List[int]
+) -> Optional[IncrementalMerger]:
+    """
+    为当前会话创建增量拼接器（video_generate 调用；MERGE_STREAMING=false 时关闭）
+
+    只有多个分镜时才需要拼接。
+    """
+    if len(expected_indexes) < 2:
+        return None
+    if os.getenv("MERGE_STREAMING", "true").strip().lower() in ("0", "false", "no"):
+        return None
+    _evict_stale_mergers()
+    merger = IncrementalMerger(expected_indexes=expected_indexes)
+    previous = _STREAMING_MERGERS.pop(_session_key(tool_context), None)
+    if previous is not None:
+        # 同一会话重新生成：上一轮的拼接器不会再被取用
+        _discard_merger(previous)
+    _STREAMING_MERGERS[_session_key(tool_context)] = merger
+    return merger
+
+
 async def merge_videos_ffmpeg(
     video_files: List[str], output_path: str, add_fade: bool = True
 ) -> bool:
     """
-    使用FFmpeg拼接视频
+    使用FFmpeg拼接本地视频文件（参数一致时 stream copy，否则归一化后拼接）
 
     Args:
         video_files: 视频文件路径列表（按顺序）
         output_path: 输出文件路径
-        add_fade: 是否添加淡入淡出转场（默认True）
+        add_fade: 保留参数；与原实现一致不添加转场，始终直接拼接
 
     Returns:
         是否拼接成功
     """
-    try:
-        # 创建临时文件列表
-        list_file = output_path + ".list.txt"
-        with open(list_file, "w") as f:
-            for video_file in video_files:
-                # FFmpeg需要转义特殊字符
-                escaped_path = video_file.replace("'", "'\\''")
-                f.write(f"file '{escaped_path}'\n")
-
-        # 构建FFmpeg命令
-        if add_fade:
-            # 添加淡入淡出转场（复杂滤镜）
-            # 简化版：直接concat（暂时不加转场，因为需要复杂的滤镜链）
-            cmd = [
-                "ffmpeg",
-                "-f",
-                "concat",
-                "-safe",
-                "0",
-                "-i",
-                list_file,
-                "-c",
-                "copy",  # 直接复制编码（最快）
-                "-y",  # 覆盖输出文件
-                output_path,
-            ]
-        else:
-            # 简单拼接
-            cmd = [
-                "ffmpeg",
-                "-f",
-                "concat",
-                "-safe",
-                "0",
-                "-i",
-                list_file,
-                "-c",
-                "copy",
-                "-y",
-                output_path,
-            ]
-
-        logger.info(f"执行FFmpeg拼接: {' '.join(cmd)}")
-
-        # 执行FFmpeg命令
-        process = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-
-        stdout, stderr = await process.communicate()
-
-        if process.returncode == 0:
-            logger.info(f"✅ 视频拼接成功: {output_path}")
-
-            # 清理临时列表文件
-            try:
-                os.remove(list_file)
-            except Exception:
-                pass
-
-            return True
-        else:
-            logger.error(f"FFmpeg拼接失败: {stderr.decode()}")
-            return False
+    merger = IncrementalMerger(
+        work_dir=os.path.dirname(output_path) or ".", transition="none"
+    )
+    for i, path in enumerate(video_files, start=1):
+        merger.add(i, path)
 
+    try:
+        return bool(await merger.finalize(output_path))
     except Exception as e:
         logger.error(f"视频拼接失败: {e}", exc_info=True)
         return False
@@ -140,6 +730,7 @@ async def merge_segments(tool_context: ToolContext) -> Dict:
 
     从session.state读取generated_videos（已生成的视频URL列表），
     下载视频文件，使用FFmpeg拼接为完整视频，上传到TOS。
+    video_generate 已为本会话启动增量拼接器时，直接复用其已下载 / 归一化的片段。
 
     Args:
         tool_context: 工具上下文
@@ -153,6 +744,9 @@ async def merge_segments(tool_context: ToolContext) -> Dict:
             "message": str
         }
     """
+    _evict_stale_mergers()
+    streaming = _STREAMING_MERGERS.pop(_session_key(tool_context), None)
+    merger = None
     try:
         # 读取已生成的视频
         generated_videos = tool_context.state.get("generated_videos")
@@ -224,88 +818,71 @@ async def merge_segments(tool_context: ToolContext) -> Dict:
 
         logger.info(f"开始拼接{len(generated_videos)}个视频片段...")
 
-        # 按segment_index排序
+        # 按segment_index排序，提取 (序号, URL)
         sorted_videos = sorted(
             generated_videos,
             key=lambda x: x.get("segment_index", 0) if isinstance(x, dict) else 0,
         )
-
-        # 创建临时目录
-        temp_dir = tempfile.mkdtemp(prefix="video_recreation_")
-        logger.info(f"临时目录: {temp_dir}")
-
-        # 下载所有视频片段
-        downloaded_files = []
-
+        segments: List[Tuple[int, str]] = []
         for idx, video_data in enumerate(sorted_videos):
-            # 提取视频URL（video_data是dict，格式：{"segment_1": "url"}）
-            segment_name = (
-                list(video_data.keys())[0]
-                if isinstance(video_data, dict) and len(video_data) > 1
-                else f"segment_{idx + 1}"
-            )
-            video_url = (
-                video_data.get(segment_name)
-                if isinstance(video_data, dict)
-                else video_data
+            # video_data是dict，格式：{"segment_1": "url", "segment_index": 1}
+            video_url = next(
+                (
+                    value
+                    for key, value in video_data.items()
+                    if key.startswith("segment_") and key != "segment_index"
+                ),
+                None,
             )
-
-            # 如果video_data直接包含segment_x作为key
-            if isinstance(video_data, dict):
-                for key in video_data.keys():
-                    if key.startswith("segment_"):
-                        segment_name = key
-                        video_url = video_data[key]
-                        break
-
             if not video_url or not isinstance(video_url, str):
                 logger.warning(f"跳过无效的视频数据: {video_data}")
                 continue
+            segments.append((video_data.get("segment_index", idx + 1), video_url))
+
+        # 复用增量拼接器（片段集合一致时），否则新建并一次性登记全部片段
+        merger = streaming
+        if merger is None or merger.urls != {url for _, url in segments}:
+            if merger is not None:
+                logger.info("生成结果与增量拼接器不一致，重新拼接")
+            merger = IncrementalMerger(expected_indexes=[i for i, _ in segments])
+            for index, url in segments:
+                merger.add(index, url)
+        else:
+            logger.info(
+                f"复用增量拼接器（已就绪 {len(merger.ready_clips())}/{len(segments)} 个片段）"
+            )
+        logger.info(f"临时目录: {merger.work_dir}")
 
-            # 下载视频
-            file_ext = ".mp4"  # 默认mp4
-            local_path = os.path.join(temp_dir, f"{segment_name}{file_ext}")
-
-            success = await download_video(video_url, local_path)
-
-            if success:
-                downloaded_files.append(local_path)
-            else:
-                logger.error(f"下载{segment_name}失败，拼接将不包含此片段")
+        # 拼接视频
+        output_filename = "recreated_video_merged.mp4"
+        output_path = os.path.join(merger.work_dir, output_filename)
 
-        if not downloaded_files:
+        try:
+            merged_clips = await merger.finalize(output_path)
+        except RuntimeError as e:
+            logger.error(str(e))
             return {
                 "status": "error",
-                "message": "所有视频片段下载失败",
+                "message": "视频拼接失败（FFmpeg错误）",
                 "merged_video_url": None,
                 "merged_video_path": None,
-                "total_segments": 0,
+                "total_segments": len(merger.ready_clips()),
             }
 
-        if len(downloaded_files) < len(generated_videos):
-            logger.warning(
-                f"部分视频下载失败：{len(downloaded_files)}/{len(generated_videos)}"
-            )
-
-        # 拼接视频
-        output_filename = "recreated_video_merged.mp4"
-        output_path = os.path.join(temp_dir, output_filename)
-
-        merge_success = await merge_videos_ffmpeg(
-            video_files=downloaded_files,
-            output_path=output_path,
-            add_fade=False,  # 暂时不加转场，直接拼接
-        )
-
-        if not merge_success:
+        if not merged_clips:
             return {
                 "status": "error",
-                "message": "视频拼接失败（FFmpeg错误）",
+                "message": "所有视频片段下载失败",
                 "merged_video_url": None,
                 "merged_video_path": None,
-                "total_segments": len(downloaded_files),
+                "total_segments": 0,
             }
 
+        if len(merged_clips) < len(generated_videos):
+            logger.warning(
+                f"部分视频下载失败：{len(merged_clips)}/{len(generated_videos)}"
+            )
+
         # TODO: 上传到TOS（需要集成TOS上传工具）
         # 暂时返回本地路径
         # from video_breakdown_agent.tools.video_upload import video_upload_to_tos
@@ -317,14 +894,17 @@ async def merge_segments(tool_context: ToolContext) -> Dict:
             f"file://{output_path}"  # 临时使用本地路径
         )
 
-        logger.info(f"✅ 视频拼接完成: {output_path}")
+        logger.info(
+            f"✅ 视频拼接完成: {output_path}（归一化 {merger.normalized} 个片段，"
+            f"转场: {merger.transition}）"
+        )
 
         return {
             "status": "success",
             "merged_video_url": f"file://{output_path}",  # TODO: 改为TOS URL
             "merged_video_path": output_path,
-            "total_segments": len(downloaded_files),
-            "message": f"成功拼接{len(downloaded_files)}个视频片段",
+            "total_segments": len(merged_clips),
+            "message": f"成功拼接{len(merged_clips)}个视频片段",
         }
 
     except Exception as e:
@@ -336,3 +916,7 @@ async def merge_segments(tool_context: ToolContext) -> Dict:
             "merged_video_path": None,
             "total_segments": 0,
         }
+    finally:
+        # 未被复用的增量拼接器（无需拼接 / 片段不一致）不会再被取用，释放连接和临时目录
+        if streaming is not None and merger is not streaming:
+            _discard_merger(streaming)
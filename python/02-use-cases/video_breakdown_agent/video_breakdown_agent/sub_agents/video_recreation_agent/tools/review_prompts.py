@@ -9,6 +9,7 @@ import logging
 from typing import Dict, List
 
 from google.adk.tools import ToolContext
+from video_breakdown_agent.utils.frame_store import is_frame_handle
 
 logger = logging.getLogger(__name__)
 
@@ -72,7 +73,9 @@ def format_prompt_preview(prompts: List[Dict]) -> str:
 
         # 参考帧（如果有）
         first_frame = prompt_data.get("first_frame")
-        if first_frame:
+        if first_frame and is_frame_handle(first_frame):
+            markdown_parts.append("**参考帧**: 本地帧图（生成时自动上传）\n\n")
+        elif first_frame:
             markdown_parts.append(f"**参考帧**: ![参考帧]({first_frame})\n\n")
 
         markdown_parts.append("---\n\n")
@@ -19,6 +19,11 @@ from google.adk.tools import ToolContext
 from veadk.config import getenv, settings
 from veadk.consts import DEFAULT_VIDEO_MODEL_API_BASE
 
+from video_breakdown_agent.utils.frame_store import resolve_frame_url
+
+from .merge_video_segments import start_streaming_merge
+from .video_task_tracker import VideoTaskTracker, task_callback_url
+
 logger = logging.getLogger(__name__)
 
 # 默认视频生成模型（按场景区分）
@@ -210,6 +215,12 @@ async def generate_single_video(
     # 构建请求内容（按官方格式）
     content = [{"type": "text", "text": prompt}]
 
+    # 本地帧句柄（TOS 不可用时 process_video 的输出）→ data URL，随后按 base64 流程上传
+    first_frame_image = resolve_frame_url(first_frame_image)
+    last_frame_image = resolve_frame_url(last_frame_image)
+    if reference_images:
+        reference_images = [resolve_frame_url(img) for img in reference_images]
+
     # 处理首帧图片（如果提供）
     if first_frame_image:
         # 如果是 base64 data URL，先上传到 TOS
@@ -332,6 +343,11 @@ async def generate_single_video(
     if generate_audio and "1-5-pro" in model:
         request_body["generate_audio"] = True
 
+    # 回调模式：任务状态变化时由方舟推送到 VIDEO_TASK_CALLBACK_URL
+    callback_url = task_callback_url()
+    if callback_url:
+        request_body["callback_url"] = callback_url
+
     # 发送请求
     async with aiohttp.ClientSession() as session:
         headers = {
@@ -383,84 +399,35 @@ async def generate_single_video(
             return result
 
 
+def _video_api_config() -> tuple[str, str]:
+    api_key = getenv(
+        "MODEL_VIDEO_API_KEY", getenv("MODEL_AGENT_API_KEY", settings.model.api_key)
+    )
+    base_url = getenv("MODEL_VIDEO_API_BASE", DEFAULT_VIDEO_MODEL_API_BASE)
+    return api_key, base_url
+
+
 async def poll_task_status(
     task_id: str,
     max_wait_time: int = 600,  # 最大等待10分钟
-    poll_interval: int = 10,  # 每10秒轮询一次
+    poll_interval: Optional[int] = None,
 ) -> Dict:
     """
-    轮询任务状态直到完成
+    轮询单个任务状态直到完成（批量场景请直接使用 VideoTaskTracker 共享连接）
 
     Args:
         task_id: 任务ID
         max_wait_time: 最大等待时间（秒）
-        poll_interval: 轮询间隔（秒）
+        poll_interval: 最长轮询间隔（秒），默认按 VIDEO_TASK_POLL_MAX_INTERVAL 自适应
 
     Returns:
-        任务结果: {"status": "succeeded/failed", "video_url": "..."}
+        任务结果: {"status": "succeeded/failed/timeout", "video_url": "..."}
     """
-    api_key = getenv(
-        "MODEL_VIDEO_API_KEY", getenv("MODEL_AGENT_API_KEY", settings.model.api_key)
-    )
-    base_url = getenv("MODEL_VIDEO_API_BASE", DEFAULT_VIDEO_MODEL_API_BASE)
-
-    elapsed_time = 0
-
-    async with aiohttp.ClientSession() as session:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-
-        while elapsed_time < max_wait_time:
-            try:
-                async with session.get(
-                    f"{base_url.rstrip('/')}/contents/generations/tasks/{task_id}",
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=10),
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-                    status = result.get("status")
-
-                    if status == "succeeded":
-                        video_url = result.get("content", {}).get("video_url")
-                        logger.info(f"任务{task_id}生成成功: {video_url}")
-                        return {
-                            "status": "succeeded",
-                            "video_url": video_url,
-                            "task_id": task_id,
-                        }
-
-                    elif status == "failed":
-                        error_msg = result.get("error", "Unknown error")
-                        logger.error(f"任务{task_id}生成失败: {error_msg}")
-                        return {
-                            "status": "failed",
-                            "error": error_msg,
-                            "task_id": task_id,
-                        }
-
-                    else:
-                        # 仍在处理中
-                        logger.debug(
-                            f"任务{task_id}当前状态: {status}, 已等待{elapsed_time}s"
-                        )
-
-            except Exception as e:
-                logger.warning(f"查询任务{task_id}状态失败: {e}")
-
-            # 等待后再次轮询
-            await asyncio.sleep(poll_interval)
-            elapsed_time += poll_interval
-
-        # 超时
-        logger.error(f"任务{task_id}超时（{max_wait_time}s）")
-        return {
-            "status": "timeout",
-            "error": f"任务超时（超过{max_wait_time}秒）",
-            "task_id": task_id,
-        }
+    api_key, base_url = _video_api_config()
+    async with VideoTaskTracker(
+        api_key, base_url, max_wait_time=max_wait_time, max_interval=poll_interval
+    ) as tracker:
+        return await tracker.track(task_id)
 
 
 async def video_generate(
@@ -474,6 +441,9 @@ async def video_generate(
 
     从session.state读取pending_prompts，仅生成selected=True的分镜。
     使用Semaphore限制并发数，避免API限流。
+    任务提交后立即交给共享的 VideoTaskTracker 追踪，每个分镜完成即写入
+    state["generated_videos"]，并交给增量拼接器提前下载，后续拼接/评估可以
+    先处理已完成的分镜。
 
     Args:
         tool_context: 工具上下文
@@ -551,12 +521,46 @@ async def video_generate(
 
         success_list = []
         error_list = []
-        task_dict = {}  # task_id: segment_info
+        api_key, base_url = _video_api_config()
+
+        # 多分镜时启动增量拼接：分镜完成即开始下载，merge_segments 只需最后一步 concat
+        merger = start_streaming_merge(
+            tool_context, [p["segment_index"] for p in selected_prompts]
+        )
+
+        def record_result(result: Dict, segment_info: Dict) -> None:
+            segment_name = segment_info["segment_name"]
+            if result["status"] == "succeeded":
+                video_url = result["video_url"]
+
+                # 存入session state
+                tool_context.state[f"{segment_name}_video_url"] = video_url
+
+                success_list.append(
+                    {
+                        segment_name: video_url,
+                        "segment_index": segment_info["segment_index"],
+                    }
+                )
+                # 完成一个写一个，下游可提前读取已完成的分镜
+                tool_context.state["generated_videos"] = sorted(
+                    success_list, key=lambda x: x["segment_index"]
+                )
+                if merger is not None:
+                    merger.add(segment_info["segment_index"], video_url)
+                logger.info(
+                    f"✅ {segment_name}生成成功（耗时{result.get('elapsed', '?')}s，"
+                    f"查询{result.get('polls', '?')}次）"
+                )
+            else:
+                error_msg = result.get("error", "Unknown error")
+                error_list.append({"segment_name": segment_name, "error": error_msg})
+                logger.error(f"❌ {segment_name}生成失败: {error_msg}")
 
-        # 第1步：批量提交任务（使用Semaphore限流）
+        # 第1步：批量提交任务（使用Semaphore限流），提交成功即开始追踪
         semaphore = asyncio.Semaphore(batch_size)
 
-        async def submit_task(prompt_data):
+        async def submit_and_track(prompt_data, tracker: VideoTaskTracker):
             async with semaphore:
                 segment_index = prompt_data["segment_index"]
                 segment_name = prompt_data["segment_name"]
@@ -571,58 +575,41 @@ async def video_generate(
                         ratio=prompt_data.get("ratio", "9:16"),
                         generate_audio=prompt_data.get("generate_audio", False),
                     )
-
-                    task_id = response["id"]
-                    task_dict[task_id] = {
-                        "segment_name": segment_name,
-                        "segment_index": segment_index,
-                        "prompt_data": prompt_data,
-                    }
-                    logger.info(f"分镜{segment_index}任务已提交: {task_id}")
-
                 except Exception as e:
                     logger.error(f"分镜{segment_index}提交失败: {e}")
                     error_list.append({"segment_name": segment_name, "error": str(e)})
+                    return
 
-        await asyncio.gather(
-            *[submit_task(item) for item in selected_prompts], return_exceptions=True
-        )
-
-        logger.info(f"📤 任务提交完成: 成功{len(task_dict)}个, 失败{len(error_list)}个")
-
-        # 第2步：轮询任务状态（并发轮询）
-        logger.info(
-            f"⏳ 开始轮询任务状态（共{len(task_dict)}个任务，每10秒查询，最多10分钟）..."
-        )
-
-        async def poll_single_task(task_id, segment_info):
-            result = await poll_task_status(task_id)
-
-            if result["status"] == "succeeded":
-                video_url = result["video_url"]
-                segment_name = segment_info["segment_name"]
+                task_id = response["id"]
+                logger.info(f"分镜{segment_index}任务已提交: {task_id}")
+                segment_info = {
+                    "segment_name": segment_name,
+                    "segment_index": segment_index,
+                }
 
-                # 存入session state
-                tool_context.state[f"{segment_name}_video_url"] = video_url
+            # 第2步：等待任务完成（所有任务共享追踪器的一个轮询循环）
+            record_result(await tracker.track(task_id), segment_info)
 
-                success_list.append(
-                    {
-                        segment_name: video_url,
-                        "segment_index": segment_info["segment_index"],
-                    }
+        async with VideoTaskTracker(api_key, base_url) as tracker:
+            logger.info(
+                f"⏳ 提交并追踪{len(selected_prompts)}个任务（"
+                + (
+                    "回调模式"
+                    if tracker.callback_mode
+                    else f"自适应轮询 {tracker.min_interval:.0f}-{tracker.max_interval:.0f}s"
                 )
-                logger.info(f"✅ {segment_name}生成成功")
-            else:
-                error_msg = result.get("error", "Unknown error")
+                + f"，最多{tracker.max_wait_time / 60:.0f}分钟）..."
+            )
+            results = await asyncio.gather(
+                *[submit_and_track(item, tracker) for item in selected_prompts],
+                return_exceptions=True,
+            )
+        for item, result in zip(selected_prompts, results):
+            if isinstance(result, Exception):
+                logger.error(f"分镜{item['segment_index']}处理异常: {result}")
                 error_list.append(
-                    {"segment_name": segment_info["segment_name"], "error": error_msg}
+                    {"segment_name": item["segment_name"], "error": str(result)}
                 )
-                logger.error(f"❌ {segment_info['segment_name']}生成失败: {error_msg}")
-
-        await asyncio.gather(
-            *[poll_single_task(tid, info) for tid, info in task_dict.items()],
-            return_exceptions=True,
-        )
 
         # 统计结果
         total_requested = len(selected_prompts)
@@ -637,7 +624,10 @@ async def video_generate(
             success_list = []
 
         # 确保每个元素都是字典
-        validated_list = [item for item in success_list if isinstance(item, dict)]
+        validated_list = sorted(
+            (item for item in success_list if isinstance(item, dict)),
+            key=lambda x: x.get("segment_index", 0),
+        )
         if len(validated_list) != len(success_list):
             logger.warning(
                 f"⚠️ success_list 中有 {len(success_list) - len(validated_list)} 个非字典元素被过滤"
@@ -0,0 +1,304 @@
+"""
+视频生成任务追踪器
+
+替代「每个任务一个 aiohttp.ClientSession + 固定 10 秒 sleep」的轮询方式：
+
+- 所有未完成任务由一个后台循环统一轮询，共享同一个连接池 session；
+- 每个任务独立的自适应轮询间隔：刚提交时快速查询（VIDEO_TASK_POLL_MIN_INTERVAL），
+  状态未变化时按 1.5 倍逐步放缓到 VIDEO_TASK_POLL_MAX_INTERVAL，状态变化时重置；
+- 回调模式：配置 VIDEO_TASK_CALLBACK_URL 后提交请求携带 callback_url，
+  mount_task_callback_route 在 Agent 服务上注册同路径的 POST 路由，
+  服务端回调由 dispatch_task_callback 直接唤醒等待方，轮询仅作为低频兜底；
+- 每个任务对应一个 Future，调用方可用 asyncio.as_completed 按完成顺序流式处理结果。
+
+结果结构与原 poll_task_status 一致：
+  {"status": "succeeded" | "failed" | "timeout", "video_url"/"error": ..., "task_id": ...}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+from urllib.parse import parse_qsl, urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 终态
+_TERMINAL_STATUS = {"succeeded", "failed", "cancelled", "expired"}
+
+# 当前存活的追踪器（供回调入口分发）
+_ACTIVE_TRACKERS: Set["VideoTaskTracker"] = set()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def task_callback_url() -> Optional[str]:
+    """回调地址（VIDEO_TASK_CALLBACK_URL），未配置时返回 None"""
+    return os.getenv("VIDEO_TASK_CALLBACK_URL") or None
+
+
+def _parse_task_result(task_id: str, payload: Dict[str, Any]) -> Optional[Dict]:
+    """任务查询 / 回调响应 → 结果 dict；非终态返回 None"""
+    status = payload.get("status")
+    if status == "succeeded":
+        video_url = (payload.get("content") or {}).get("video_url")
+        logger.info(f"任务{task_id}生成成功: {video_url}")
+        return {"status": "succeeded", "video_url": video_url, "task_id": task_id}
+    if status in _TERMINAL_STATUS:
+        error_msg = payload.get("error") or f"任务状态: {status}"
+        logger.error(f"任务{task_id}生成失败: {error_msg}")
+        return {"status": "failed", "error": error_msg, "task_id": task_id}
+    return None
+
+
+@dataclass
+class _TrackedTask:
+    task_id: str
+    future: asyncio.Future
+    deadline: float
+    interval: float
+    next_poll: float
+    status: Optional[str] = None
+    polls: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+
+class VideoTaskTracker:
+    """批量追踪视频生成任务（异步上下文管理器）"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        max_wait_time: float = 600,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        callback_mode: Optional[bool] = None,
+        concurrency: int = 8,
+    ):
+        """
+        Args:
+            max_wait_time: 单个任务最大等待时间（秒）
+            min_interval: 最短轮询间隔（默认 VIDEO_TASK_POLL_MIN_INTERVAL，2s）
+            max_interval: 最长轮询间隔（默认 VIDEO_TASK_POLL_MAX_INTERVAL，8s）
+            callback_mode: 是否以回调为主（默认按是否配置 VIDEO_TASK_CALLBACK_URL）
+            concurrency: 单轮最多同时发出的查询数
+        """
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self.max_wait_time = max_wait_time
+        self.min_interval = min_interval or _env_float(
+            "VIDEO_TASK_POLL_MIN_INTERVAL", 2
+        )
+        self.max_interval = max_interval or _env_float(
+            "VIDEO_TASK_POLL_MAX_INTERVAL", 8
+        )
+        if callback_mode is None:
+            callback_mode = task_callback_url() is not None
+        if callback_mode:
+            # 回调为主，轮询仅兜底（回调丢失 / 回调地址不可达）
+            fallback = _env_float("VIDEO_TASK_CALLBACK_POLL_INTERVAL", 30)
+            self.min_interval = self.max_interval = max(self.max_interval, fallback)
+        self.callback_mode = callback_mode
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Dict[str, _TrackedTask] = {}
+        self._wakeup = asyncio.Event()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "VideoTaskTracker":
+        self._session = aiohttp.ClientSession(
+            headers=self.headers,
+            connector=aiohttp.TCPConnector(limit=16, keepalive_timeout=60),
+        )
+        self._loop_task = asyncio.create_task(self._run())
+        _ACTIVE_TRACKERS.add(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        _ACTIVE_TRACKERS.discard(self)
+        if self._loop_task:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+        for tracked in self._tasks.values():
+            if not tracked.future.done():
+                tracked.future.cancel()
+        if self._session:
+            await self._session.close()
+
+    # ==================== 对外接口 ====================
+
+    def track(self, task_id: str) -> asyncio.Future:
+        """登记任务，返回完成时 resolve 的 Future（重复登记返回同一个）"""
+        tracked = self._tasks.get(task_id)
+        if tracked is None:
+            now = time.monotonic()
+            tracked = _TrackedTask(
+                task_id=task_id,
+                future=asyncio.get_running_loop().create_future(),
+                deadline=now + self.max_wait_time,
+                interval=self.min_interval,
+                next_poll=now + self.min_interval,
+            )
+            self._tasks[task_id] = tracked
+            self._wakeup.set()
+        return tracked.future
+
+    def handle_callback(self, payload: Dict[str, Any]) -> bool:
+        """
+        处理任务状态回调（请求体与任务查询接口响应结构一致）
+
+        Returns:
+            是否由本追踪器处理
+        """
+        task_id = payload.get("id")
+        tracked = self._tasks.get(task_id)
+        if tracked is None or tracked.future.done():
+            return False
+        result = _parse_task_result(task_id, payload)
+        if result is not None:
+            self._resolve(tracked, result)
+        else:
+            tracked.status = payload.get("status")
+        return True
+
+    # ==================== 轮询循环 ====================
+
+    def _resolve(self, tracked: _TrackedTask, result: Dict) -> None:
+        if not tracked.future.done():
+            result["elapsed"] = round(time.monotonic() - tracked.started, 1)
+            result["polls"] = tracked.polls
+            tracked.future.set_result(result)
+
+    async def _query(self, tracked: _TrackedTask) -> None:
+        async with self._semaphore:
+            tracked.polls += 1
+            try:
+                async with self._session.get(
+                    f"{self.base_url}/contents/generations/tasks/{tracked.task_id}",
+                    timeout=aiohttp.ClientTimeout(total=10),
+                ) as response:
+                    response.raise_for_status()
+                    payload = await response.json()
+            except Exception as e:
+                logger.warning(f"查询任务{tracked.task_id}状态失败: {e}")
+                tracked.interval = min(tracked.interval * 1.5, self.max_interval)
+                return
+
+        result = _parse_task_result(tracked.task_id, payload)
+        if result is not None:
+            self._resolve(tracked, result)
+            return
+
+        status = payload.get("status")
+        if status != tracked.status:
+            # 状态推进（queued → running）说明即将完成，回到快速轮询
+            tracked.status = status
+            tracked.interval = self.min_interval
+        else:
+            tracked.interval = min(tracked.interval * 1.5, self.max_interval)
+        logger.debug(
+            f"任务{tracked.task_id}当前状态: {status}, "
+            f"下次查询 {tracked.interval:.1f}s 后"
+        )
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            due = []
+            for task_id, tracked in list(self._tasks.items()):
+                if tracked.future.done():
+                    del self._tasks[task_id]
+                elif now >= tracked.deadline:
+                    logger.error(f"任务{task_id}超时（{self.max_wait_time:.0f}s）")
+                    self._resolve(
+                        tracked,
+                        {
+                            "status": "timeout",
+                            "error": f"任务超时（超过{self.max_wait_time:.0f}秒）",
+                            "task_id": task_id,
+                        },
+                    )
+                elif now >= tracked.next_poll:
+                    due.append(tracked)
+
+            if due:
+                await asyncio.gather(*[self._query(t) for t in due])
+                now = time.monotonic()
+                for tracked in due:
+                    tracked.next_poll = now + tracked.interval
+
+            pending = [t for t in self._tasks.values() if not t.future.done()]
+            self._wakeup.clear()
+            if not pending:
+                await self._wakeup.wait()
+                continue
+            sleep_for = min(min(t.next_poll, t.deadline) for t in pending) - now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(sleep_for, 0))
+            except asyncio.TimeoutError:
+                pass
+
+
+def dispatch_task_callback(payload: Dict[str, Any]) -> bool:
+    """
+    回调入口：部署方在 VIDEO_TASK_CALLBACK_URL 对应的 HTTP 路由中调用，
+    把方舟推送的任务状态交给正在等待的追踪器。
+
+    Returns:
+        是否有追踪器处理了该任务
+    """
+    return any(tracker.handle_callback(payload) for tracker in list(_ACTIVE_TRACKERS))
+
+
+def mount_task_callback_route(app) -> Optional[str]:
+    """
+    在 Agent 的 HTTP 应用（Starlette / FastAPI）上注册回调路由
+
+    路径取 VIDEO_TASK_CALLBACK_URL 的 path；URL 中的查询参数（如 ?token=...）
+    作为校验凭据，回调请求需携带相同的参数。
+
+    Returns:
+        注册的路径，未配置回调地址时返回 None
+    """
+    callback_url = task_callback_url()
+    if not callback_url:
+        return None
+    parts = urlsplit(callback_url)
+    path = parts.path or "/"
+    expected = dict(parse_qsl(parts.query))
+
+    from starlette.responses import JSONResponse
+
+    async def video_task_callback(request):
+        for name, value in expected.items():
+            if not hmac.compare_digest(request.query_params.get(name, ""), value):
+                return JSONResponse({"detail": "invalid callback token"}, 403)
+        try:
+            payload = await request.json()
+        except ValueError:
+            return JSONResponse({"detail": "invalid json"}, 400)
+        if not isinstance(payload, dict):
+            return JSONResponse({"detail": "invalid payload"}, 400)
+        # 未命中（任务不在本进程 / 已完成）同样返回 200，避免回调方重复推送
+        return JSONResponse({"handled": dispatch_task_callback(payload)})
+
+    app.add_route(path, video_task_callback, methods=["POST"])
+    logger.info(f"已注册视频任务回调路由: POST {path}")
+    return path
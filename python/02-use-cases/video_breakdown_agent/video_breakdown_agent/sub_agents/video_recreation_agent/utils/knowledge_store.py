@@ -0,0 +1,282 @@
+"""
+提示词知识库存储（版本化 + 倒排索引 + 确定性排序）
+
+源文件为 JSONL（默认随包分发的 prompt_knowledge.jsonl，可通过 PROMPT_KNOWLEDGE_PATH 替换）：
+  第 1 行：{"version": "...", "description": "..."}        元信息
+  其余行：{"id", "category", "tags": [...], "text", "weight"?, ...}  一行一个知识条目
+
+首次检索时把源文件编译为磁盘格式（按源文件内容哈希缓存，多进程 / 多次启动复用）：
+  <cache>/v<格式版本>/<sha1前16位>/
+    manifest.json   → {"format", "version", "count", "source_sha1"}
+    entries.jsonl   → 条目正文（按 id 序号排列）
+    offsets.bin     → 各条目在 entries.jsonl 中的字节偏移（uint64，count+1 个）
+    weights.bin     → 各条目权重（float64）
+    postings.json   → {category: {tag: [[条目序号, ...], ...]}}  倒排索引，按权重降序分层
+
+- 导入模块不读取任何文件；检索时只加载索引和偏移表，条目正文通过 mmap 按需读取；
+- 排序：命中标签的查询权重之和 × 条目权重，同分条目按
+  sha1(PROMPT_KNOWLEDGE_SEED | 调用方种子 | 查询) 确定性轮选，
+  同一版本 + 同一种子 + 同一输入始终得到相同结果（便于 A/B 对比）。
+- PROMPT_KNOWLEDGE_PATH 也可直接指向已编译的目录（含 manifest.json）。
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from video_breakdown_agent.utils.media_cache import media_temp_base
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT = 1
+BUILTIN_SOURCE = Path(__file__).with_name("prompt_knowledge.jsonl")
+
+_STORE: Optional["KnowledgeStore"] = None
+_STORE_LOCK = threading.Lock()
+
+
+# ==================== 编译 ====================
+
+
+def _source_sha1(path: Path) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compile_store(source: Path, out_dir: Path) -> Path:
+    """
+    JSONL 源文件 → 磁盘索引格式（先写临时目录再 rename，并发编译互不干扰）
+
+    Returns:
+        编译结果目录
+    """
+    source = Path(source)
+    out_dir = Path(out_dir)
+    meta: Dict = {}
+    entries: List[Dict] = []
+    with open(source, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "id" not in record:
+                if entries:
+                    raise ValueError(f"{source}:{line_no} 缺少 id 字段")
+                meta = record
+                continue
+            if not record.get("category") or not record.get("text"):
+                raise ValueError(f"{source}:{line_no} 缺少 category / text 字段")
+            entries.append(record)
+
+    postings: Dict[str, Dict[str, List[int]]] = {}
+    offsets = array("Q", [0])
+    weights = array("d")
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=out_dir.parent))
+    with open(tmp_dir / "entries.jsonl", "wb") as f:
+        for position, entry in enumerate(entries):
+            by_tag = postings.setdefault(entry["category"], {})
+            for tag in dict.fromkeys(entry.get("tags") or []):
+                by_tag.setdefault(tag, []).append(position)
+            weights.append(float(entry.get("weight", 1.0)))
+            f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+            offsets.append(f.tell())
+
+    # 每个标签的倒排列表按条目权重降序分层：单标签查询直接取第一层，无需逐条打分
+    tiered: Dict[str, Dict[str, List[List[int]]]] = {}
+    for category, by_tag in postings.items():
+        for tag, positions in by_tag.items():
+            tiers: List[List[int]] = []
+            last_weight = None
+            for position in sorted(positions, key=lambda p: (-weights[p], p)):
+                if weights[position] != last_weight:
+                    tiers.append([])
+                    last_weight = weights[position]
+                tiers[-1].append(position)
+            tiered.setdefault(category, {})[tag] = tiers
+
+    with open(tmp_dir / "offsets.bin", "wb") as f:
+        offsets.tofile(f)
+    with open(tmp_dir / "weights.bin", "wb") as f:
+        weights.tofile(f)
+    (tmp_dir / "postings.json").write_text(
+        json.dumps(tiered, ensure_ascii=False), encoding="utf-8"
+    )
+    manifest = {
+        "format": STORE_FORMAT,
+        "version": str(meta.get("version") or "unversioned"),
+        "count": len(entries),
+        "source_sha1": _source_sha1(source),
+    }
+    (tmp_dir / "manifest.json").write_text(
+        json.dumps(manifest, ensure_ascii=False), encoding="utf-8"
+    )
+
+    try:
+        os.replace(tmp_dir, out_dir)
+    except OSError:
+        # 其他进程已编译完成（目标目录非空），使用已有结果
+        for child in tmp_dir.iterdir():
+            child.unlink()
+        tmp_dir.rmdir()
+    logger.info(
+        f"[knowledge_store] 已编译知识库 v{manifest['version']}："
+        f"{manifest['count']} 条 → {out_dir}"
+    )
+    return out_dir
+
+
+# ==================== 存储 ====================
+
+
+class KnowledgeStore:
+    """已编译知识库的只读视图"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        manifest = json.loads((self.root / "manifest.json").read_text("utf-8"))
+        if manifest.get("format") != STORE_FORMAT:
+            raise ValueError(f"不支持的知识库格式: {manifest.get('format')}")
+        self.version: str = manifest["version"]
+        self.count: int = manifest["count"]
+        self._postings: Dict[str, Dict[str, List[List[int]]]] = json.loads(
+            (self.root / "postings.json").read_text("utf-8")
+        )
+        self._offsets = array("Q")
+        self._weights = array("d")
+        with open(self.root / "offsets.bin", "rb") as f:
+            self._offsets.fromfile(f, self.count + 1)
+        with open(self.root / "weights.bin", "rb") as f:
+            self._weights.fromfile(f, self.count)
+        self._entries: Dict[int, Dict] = {}
+        self._data: Optional[mmap.mmap] = None
+
+    def entry(self, position: int) -> Dict:
+        """按序号读取条目（mmap 按需解析，解析结果常驻内存）"""
+        cached = self._entries.get(position)
+        if cached is None:
+            if self._data is None:
+                with open(self.root / "entries.jsonl", "rb") as f:
+                    self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            raw = self._data[self._offsets[position] : self._offsets[position + 1]]
+            cached = self._entries[position] = json.loads(raw)
+        return cached
+
+    def query(
+        self,
+        category: str,
+        tags: Dict[str, float],
+        seed: str = "",
+        k: int = 1,
+    ) -> List[Dict]:
+        """
+        检索某一类别下命中标签的前 k 个条目
+
+        Args:
+            category: 条目类别（如 camera_movements）
+            tags: {标签: 查询权重}，多个标签命中时权重累加
+            seed: 调用方种子（如分镜序号），与查询内容一起决定同分条目的选择
+
+        Returns:
+            条目 dict 列表（无命中时为空）
+        """
+        by_tag = self._postings.get(category)
+        if not by_tag:
+            return []
+
+        matched = {tag: by_tag[tag] for tag in tags if tag in by_tag}
+        if not matched:
+            return []
+
+        if len(matched) == 1:
+            # 单标签：查询权重为常数，预先分好的权重层即为排序结果
+            ranked_tiers = next(iter(matched.values()))
+        else:
+            weights = self._weights
+            scores: Dict[int, float] = {}
+            for tag, tiers in matched.items():
+                boost = tags[tag]
+                for tier in tiers:
+                    for position in tier:
+                        scores[position] = scores.get(position, 0.0) + boost
+            ranked: Dict[float, List[int]] = {}
+            for position, score in scores.items():
+                ranked.setdefault(score * weights[position], []).append(position)
+            ranked_tiers = [sorted(ranked[key]) for key in sorted(ranked, reverse=True)]
+
+        query_key = json.dumps([category, sorted(tags.items())], ensure_ascii=False)
+        digest = hashlib.sha1(f"{seed}|{query_key}".encode("utf-8")).digest()
+        rotation = int.from_bytes(digest[:8], "big")
+
+        picked: List[Dict] = []
+        for tier in ranked_tiers:
+            start = rotation % len(tier)
+            for offset in range(min(k - len(picked), len(tier))):
+                picked.append(self.entry(tier[(start + offset) % len(tier)]))
+            if len(picked) >= k:
+                break
+        return picked
+
+
+# ==================== 全局实例 ====================
+
+
+def knowledge_seed() -> str:
+    """全局排序种子（PROMPT_KNOWLEDGE_SEED，默认 0）"""
+    return os.getenv("PROMPT_KNOWLEDGE_SEED", "0")
+
+
+def _compiled_root(source: Path) -> Path:
+    cache_dir = Path(
+        os.getenv("PROMPT_KNOWLEDGE_CACHE_DIR") or media_temp_base() / "knowledge"
+    )
+    return cache_dir / f"v{STORE_FORMAT}" / _source_sha1(source)[:16]
+
+
+def open_store(path: Path) -> KnowledgeStore:
+    """打开知识库：已编译目录直接加载，JSONL 源文件按内容哈希编译后加载"""
+    path = Path(path)
+    if path.is_dir():
+        return KnowledgeStore(path)
+
+    root = _compiled_root(path)
+    if not (root / "manifest.json").exists():
+        try:
+            compile_store(path, root)
+        except OSError as e:
+            logger.warning(f"[knowledge_store] 缓存目录不可写，编译到临时目录: {e}")
+            root = compile_store(path, Path(tempfile.mkdtemp()) / "store")
+    return KnowledgeStore(root)
+
+
+def get_knowledge_store() -> KnowledgeStore:
+    """
+    进程级知识库实例（首次调用时加载）
+
+    环境变量（VeADK 扁平化 prompt_knowledge.* → PROMPT_KNOWLEDGE_*）：
+      PROMPT_KNOWLEDGE_PATH       JSONL 源文件或已编译目录，默认内置知识库
+      PROMPT_KNOWLEDGE_CACHE_DIR  编译结果目录，默认 <媒体临时目录>/knowledge
+      PROMPT_KNOWLEDGE_SEED       排序种子，默认 0
+    """
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                path = Path(os.getenv("PROMPT_KNOWLEDGE_PATH") or BUILTIN_SOURCE)
+                _STORE = open_store(path)
+                logger.info(
+                    f"[knowledge_store] 加载知识库 v{_STORE.version}"
+                    f"（{_STORE.count} 条）: {path}"
+                )
+    return _STORE
@@ -1,13 +1,14 @@
 """
 前三秒分镜提取工具
 兼容新格式（process_video + analyze_segments_vision 输出）和旧格式
-支持从 tool_context.state 读取完整的 base64 frame_urls
+支持从 tool_context.state 读取完整的 frame_urls（本地帧句柄在此解析为 base64）
 """
 
 import logging
 from typing import Dict, List
 
 from google.adk.tools import ToolContext
+from video_breakdown_agent.utils.frame_store import resolve_frame_url
 
 logger = logging.getLogger(__name__)
 
@@ -134,7 +135,8 @@ def analyze_hook_segments(tool_context: ToolContext = None) -> dict:
             # 构建标准的 image_url 格式（豆包 vision API 支持）
             segment_info["frame_images"] = [
                 {"type": "image_url", "image_url": {"url": url}}
-                for url in frame_urls[:3]  # 最多 3 帧
+                for url in map(resolve_frame_url, frame_urls[:3])  # 最多 3 帧
+                if url
             ]
         else:
             segment_info["frame_images"] = []
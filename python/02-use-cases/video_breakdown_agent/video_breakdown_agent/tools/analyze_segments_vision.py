@@ -14,7 +14,11 @@ import os
 from typing import Any, Dict, Optional
 
 from google.adk.tools import ToolContext
-from video_breakdown_agent.utils.doubao_client import call_doubao_text
+from video_breakdown_agent.utils.doubao_client import (
+    call_doubao_text,
+    get_doubao_metrics,
+)
+from video_breakdown_agent.utils.frame_store import is_frame_handle, resolve_frame_url
 
 logger = logging.getLogger(__name__)
 
@@ -323,6 +327,10 @@ async def _analyze_single_segment(
 ) -> Dict[str, Any]:
     """分析单个分镜（使用豆包官方 vision API）"""
     prompt_data = _build_segment_prompt(segment)
+    # 本地帧句柄在此处才编码为 data URL（只进请求体，不回写 state）
+    image_urls = [
+        url for url in map(resolve_frame_url, segment.get("frame_urls", [])[:6]) if url
+    ]
     messages = [
         {
             "role": "system",
@@ -336,10 +344,7 @@ async def _analyze_single_segment(
                     "text": json.dumps(prompt_data["instruction"], ensure_ascii=False),
                 },
             ]
-            + [
-                {"type": "image_url", "image_url": {"url": url}}
-                for url in segment.get("frame_urls", [])[:6]
-            ],
+            + [{"type": "image_url", "image_url": {"url": url}} for url in image_urls],
         },
     ]
 
@@ -509,19 +514,28 @@ async def analyze_segments_vision(
     valid_results.sort(key=lambda x: x["index"])
 
     logger.info(f"[analyze_segments_vision] 分析完成: {len(valid_results)} 个分镜")
+    # 连接池 / 排队指标，用于按实际数据调整 VISION_CONCURRENCY
+    for client_metrics in get_doubao_metrics():
+        model_stats = client_metrics["models"].get(model_name)
+        if model_stats:
+            logger.info(
+                f"[analyze_segments_vision] 豆包调用指标 (VISION_CONCURRENCY={concurrency}): {model_stats}"
+            )
 
     # 存入 session state（tool_context 可能为 None，如单元测试场景）
     if tool_context is not None:
         tool_context.state["vision_analysis_result"] = valid_results
 
-    # 精简返回数据：移除 base64 frame_urls 以避免 LLM context 超限
+    # 精简返回数据：移除 base64 / 本地帧句柄以避免 LLM context 超限
     # 注意：完整数据已存入 session state，后续工具（如 hook_analyzer）可从 state 读取
     for result in valid_results:
         if "frame_urls" in result:
             frame_urls = result["frame_urls"]
-            # 如果是 base64 data URL，替换为占位符以减少数据量
+            # 如果是 base64 data URL 或本地帧句柄，替换为占位符以减少数据量
             result["frame_urls"] = [
-                "（base64图片已省略）" if url and url.startswith("data:") else url
+                "（base64图片已省略）"
+                if url and (url.startswith("data:") or is_frame_handle(url))
+                else url
                 for url in frame_urls
             ]
             logger.debug(
@@ -17,6 +17,7 @@ import logging
 import shutil
 import subprocess
 import tempfile
+import time
 import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -30,6 +31,23 @@ import tos
 from tos import HttpMethodType
 from google.adk.tools import ToolContext
 
+from video_breakdown_agent.utils.frame_store import (
+    is_frame_handle,
+    make_handle,
+    persist_frames,
+)
+from video_breakdown_agent.utils.media_cache import (
+    MediaCache,
+    get_media_cache,
+    hash_file,
+    is_signature_fresh,
+    variant_key,
+)
+from video_breakdown_agent.utils.shot_segmenter import (
+    resolve_segmenter_config,
+    segment_bounds,
+)
+
 logger = logging.getLogger(__name__)
 
 # ==================== 数据结构 ====================
@@ -44,8 +62,10 @@ class SegmentAsset:
     end: float
     frame_paths: List[Path] = field(default_factory=list)
     frame_urls: List[str] = field(default_factory=list)
+    frame_keys: List[str] = field(default_factory=list)
     clip_path: Optional[Path] = None
     clip_url: Optional[str] = None
+    clip_key: Optional[str] = None
     is_speech: bool = True
     speech_text: Optional[str] = None
 
@@ -247,38 +267,12 @@ def _extract_audio_sync(ffmpeg_bin: str, video_path: Path) -> Optional[Path]:
         return None
 
 
-def _build_segments(duration: float) -> List[SegmentAsset]:
-    """
-    固定时长分镜方案：
-    - 0-3s, 3-5s, 5-10s, 10-20s, 之后每10s一段
-    """
-    segments: List[SegmentAsset] = []
-    idx = 1
-
-    breakpoints = [0.0, 3.0, 5.0, 10.0, 20.0]
-
-    for i in range(len(breakpoints) - 1):
-        start = breakpoints[i]
-        end = breakpoints[i + 1]
-        if duration <= start:
-            break
-        actual_end = min(end, duration)
-        if actual_end - start < 0.5:
-            break
-        segments.append(SegmentAsset(index=idx, start=start, end=actual_end))
-        idx += 1
-
-    if duration > 20.0:
-        cursor = 20.0
-        while cursor < duration:
-            candidate_end = min(duration, cursor + 10.0)
-            if candidate_end - cursor < 0.5:
-                break
-            segments.append(SegmentAsset(index=idx, start=cursor, end=candidate_end))
-            idx += 1
-            cursor = candidate_end
-
-    return segments
+def _segments_from_bounds(bounds: List[tuple[float, float]]) -> List[SegmentAsset]:
+    """分镜区间列表 → SegmentAsset 列表（index 从 1 开始）"""
+    return [
+        SegmentAsset(index=idx, start=start, end=end)
+        for idx, (start, end) in enumerate(bounds, start=1)
+    ]
 
 
 def _assign_asr_text_to_segments(
@@ -306,23 +300,44 @@ def _assign_asr_text_to_segments(
             segment.speech_text = None
 
 
+def _frame_max_width() -> int:
+    """关键帧最大宽度（FFMPEG_FRAME_MAX_WIDTH，0 表示保持原分辨率）"""
+    return int(os.getenv("FFMPEG_FRAME_MAX_WIDTH", "0") or 0)
+
+
+def _frame_scale_args() -> List[str]:
+    """关键帧缩放参数：提取时直接输出缩小版本，不做二次解码/编码"""
+    max_width = _frame_max_width()
+    if max_width <= 0:
+        return []
+    return ["-vf", f"scale='min(iw,{max_width})':-2"]
+
+
+def _frame_offsets(segment: SegmentAsset, frames_per_segment: int) -> List[float]:
+    """计算分镜内均匀分布的关键帧采样时间点（秒）"""
+    seg_duration = max(segment.end - segment.start, 0.5)
+    safe_margin = 0.1
+
+    offsets = []
+    for i in range(frames_per_segment):
+        ratio = i / max(frames_per_segment - 1, 1)
+        raw_offset = segment.start + ratio * seg_duration
+        offset = min(raw_offset, segment.end - safe_margin)
+        offsets.append(max(offset, segment.start))
+    return offsets
+
+
 def _extract_segment_frames(
     ffmpeg_bin: str,
     video_path: Path,
     segment: SegmentAsset,
     frames_per_segment: int = 3,
 ) -> None:
-    """提取单个分镜的关键帧"""
+    """提取单个分镜的关键帧（逐帧独立解码，单次解码引擎失败时的回退方案）"""
     frames_dir = video_path.parent / "frames"
     frames_dir.mkdir(exist_ok=True)
-    seg_duration = max(segment.end - segment.start, 0.5)
-    safe_margin = 0.1
 
-    for i in range(frames_per_segment):
-        ratio = i / max(frames_per_segment - 1, 1)
-        raw_offset = segment.start + ratio * seg_duration
-        offset = min(raw_offset, segment.end - safe_margin)
-        offset = max(offset, segment.start)
+    for i, offset in enumerate(_frame_offsets(segment, frames_per_segment)):
         output_path = frames_dir / f"seg{segment.index:03d}_frame_{i}.jpg"
 
         cmd = [
@@ -334,6 +349,7 @@ def _extract_segment_frames(
             str(video_path),
             "-frames:v",
             "1",
+            *_frame_scale_args(),
             "-q:v",
             "8",  # 降低质量减小文件体积（2=最高质量，31=最低质量）
             str(output_path),
@@ -352,7 +368,7 @@ def _extract_single_clip(
     segment: SegmentAsset,
     clips_dir: Path,
 ) -> None:
-    """切割单个视频片段"""
+    """切割单个视频片段（独立重编码；单次解码引擎失败或 copy 切点未对齐时使用）"""
     duration = segment.end - segment.start
     output_path = clips_dir / f"seg{segment.index:03d}_clip.mp4"
 
@@ -385,6 +401,269 @@ def _extract_single_clip(
         segment.clip_path = None
 
 
+# ==================== 单次解码提取引擎 ====================
+# 一个 FFmpeg 进程只解码一次源视频，同时写出所有分镜的关键帧与片段：
+#   - 关键帧：每帧一个输出，输出侧 -ss 丢弃采样点之前的帧，-frames:v 1 取一帧
+#   - 片段（reencode）：每段一个输出，输出侧 -ss/-t 精确切割并重编码
+#   - 片段（copy）：segment muxer 按分镜起点流复制切割，落在关键帧上，无需解码；
+#     切点只能落在关键帧上，按 segment_list 记录的实际起止时间回填到分镜，
+#     对不上的分镜（多个切点落在同一关键帧前 / 分镜短于 GOP）逐段重新提取
+
+# copy 模式下实际切点与分镜起止时间的最大允许偏差（秒）
+_COPY_CUT_TOLERANCE = 0.5
+
+
+def _resolve_clip_mode() -> str:
+    """片段切割模式：reencode（帧精确，默认）/ copy（按关键帧流复制，极快）"""
+    mode = (os.getenv("FFMPEG_CLIP_MODE") or "reencode").strip().lower()
+    if mode not in ("reencode", "copy"):
+        logger.warning(f"未知 FFMPEG_CLIP_MODE={mode}，使用 reencode")
+        return "reencode"
+    return mode
+
+
+def _single_pass_enabled() -> bool:
+    """是否启用单次解码提取引擎（FFMPEG_SINGLE_PASS=false 时回退逐段提取）"""
+    return os.getenv("FFMPEG_SINGLE_PASS", "true").strip().lower() not in (
+        "0",
+        "false",
+        "no",
+    )
+
+
+def _segments_are_contiguous(segments: List[SegmentAsset]) -> bool:
+    """分镜是否从 0 开始首尾相接（segment muxer 按切点顺序输出，需满足此条件）"""
+    if not segments or segments[0].start > 0.01:
+        return False
+    return all(
+        abs(segments[i].start - segments[i - 1].end) < 0.01
+        for i in range(1, len(segments))
+    )
+
+
+def _extract_all_single_pass(
+    ffmpeg_bin: str,
+    video_path: Path,
+    segments: List[SegmentAsset],
+    frames_per_segment: int,
+    clips_dir: Path,
+    clip_mode: str = "reencode",
+) -> None:
+    """
+    单次解码提取全部分镜的关键帧和视频片段。
+
+    Args:
+        clip_mode: reencode（libx264 帧精确切割）或 copy（流复制，切点对齐关键帧）
+
+    Raises:
+        subprocess.CalledProcessError: FFmpeg 执行失败（由调用方回退逐段提取）
+    """
+    frames_dir = video_path.parent / "frames"
+    frames_dir.mkdir(exist_ok=True)
+
+    cmd = [
+        ffmpeg_bin,
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        str(video_path),
+    ]
+
+    frame_outputs: List[tuple[SegmentAsset, Path]] = []
+    for seg in segments:
+        for i, offset in enumerate(_frame_offsets(seg, frames_per_segment)):
+            output_path = frames_dir / f"seg{seg.index:03d}_frame_{i}.jpg"
+            cmd += [
+                "-ss",
+                f"{offset:.2f}",
+                "-map",
+                "0:v:0",
+                "-frames:v",
+                "1",
+                *_frame_scale_args(),
+                "-q:v",
+                "8",
+                str(output_path),
+            ]
+            frame_outputs.append((seg, output_path))
+
+    chunk_list = clips_dir / "chunks.csv"
+    if clip_mode == "copy":
+        # 切点 = 除第一个分镜外各分镜起点；输出编号不一定与分镜一一对应，按 chunk_list 回填
+        segment_times = ",".join(f"{seg.start:.3f}" for seg in segments[1:])
+        cmd += [
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c",
+            "copy",
+            "-f",
+            "segment",
+            "-segment_list",
+            str(chunk_list),
+            "-segment_list_type",
+            "csv",
+            "-reset_timestamps",
+            "1",
+            "-segment_format_options",
+            "movflags=+faststart",
+        ]
+        if segment_times:
+            cmd += ["-segment_times", segment_times]
+        cmd.append(str(clips_dir / "chunk%03d.mp4"))
+    else:
+        for seg in segments:
+            cmd += [
+                "-ss",
+                f"{seg.start:.2f}",
+                "-t",
+                f"{seg.end - seg.start:.2f}",
+                "-map",
+                "0:v:0",
+                "-map",
+                "0:a:0?",
+                "-c:v",
+                "libx264",
+                "-c:a",
+                "aac",
+                "-b:v",
+                "1000k",
+                "-b:a",
+                "128k",
+                "-movflags",
+                "+faststart",
+                str(clips_dir / f"seg{seg.index:03d}_clip.mp4"),
+            ]
+
+    _run_command(cmd)
+
+    for seg, output_path in frame_outputs:
+        if output_path.exists():
+            seg.frame_paths.append(output_path)
+        else:
+            logger.warning(f"片段 {seg.index} 关键帧缺失: {output_path.name}")
+
+    if clip_mode == "copy":
+        unmatched = _assign_copy_chunks(clips_dir, chunk_list, segments)
+        for seg in unmatched:
+            logger.warning(
+                f"片段 {seg.index} 切点未对齐关键帧（{seg.start:.2f}-{seg.end:.2f}s），"
+                f"单独重新提取"
+            )
+            _extract_single_clip(ffmpeg_bin, video_path, seg, clips_dir)
+        return
+
+    for seg in segments:
+        clip_path = clips_dir / f"seg{seg.index:03d}_clip.mp4"
+        seg.clip_path = clip_path if clip_path.exists() else None
+
+
+def _assign_copy_chunks(
+    clips_dir: Path, chunk_list: Path, segments: List[SegmentAsset]
+) -> List[SegmentAsset]:
+    """
+    按 segment muxer 输出的实际起止时间把片段文件回填到分镜
+
+    Returns:
+        没有对应片段文件的分镜
+    """
+    chunks = []
+    if chunk_list.exists():
+        for line in chunk_list.read_text(encoding="utf-8").splitlines():
+            parts = line.rsplit(",", 2)
+            if len(parts) == 3:
+                chunks.append((parts[0], float(parts[1]), float(parts[2])))
+
+    unmatched = []
+    used = set()
+    for seg in segments:
+        seg.clip_path = None
+        for name, start, end in chunks:
+            if (
+                name not in used
+                and abs(start - seg.start) <= _COPY_CUT_TOLERANCE
+                and abs(end - seg.end) <= _COPY_CUT_TOLERANCE
+            ):
+                used.add(name)
+                clip_path = clips_dir / f"seg{seg.index:03d}_clip.mp4"
+                (clips_dir / name).replace(clip_path)
+                seg.clip_path = clip_path
+                break
+        else:
+            unmatched.append(seg)
+
+    for name, _, _ in chunks:
+        if name not in used:
+            (clips_dir / name).unlink(missing_ok=True)
+    chunk_list.unlink(missing_ok=True)
+    return unmatched
+
+
+async def _extract_segment_assets(
+    ffmpeg_bin: str,
+    video_path: Path,
+    segments: List[SegmentAsset],
+    frames_per_segment: int,
+    clips_dir: Path,
+) -> str:
+    """
+    提取全部分镜的关键帧和视频片段，优先使用单次解码引擎。
+
+    Returns:
+        实际使用的提取模式：single_pass_reencode / single_pass_copy / per_segment
+    """
+    if _single_pass_enabled():
+        clip_mode = _resolve_clip_mode()
+        if clip_mode == "copy" and not _segments_are_contiguous(segments):
+            logger.warning("分镜不连续，copy 模式无法按切点对齐，改用 reencode")
+            clip_mode = "reencode"
+        try:
+            await asyncio.to_thread(
+                _extract_all_single_pass,
+                ffmpeg_bin,
+                video_path,
+                segments,
+                frames_per_segment,
+                clips_dir,
+                clip_mode,
+            )
+            return f"single_pass_{clip_mode}"
+        except subprocess.CalledProcessError as exc:
+            logger.warning(
+                f"单次解码提取失败，回退逐段提取: "
+                f"{exc.stderr[:300] if exc.stderr else exc}"
+            )
+            for seg in segments:
+                seg.frame_paths.clear()
+                seg.clip_path = None
+
+    # 回退：每帧/每段独立 FFmpeg 进程（并发）
+    await asyncio.gather(
+        *[
+            asyncio.to_thread(
+                _extract_segment_frames,
+                ffmpeg_bin,
+                video_path,
+                seg,
+                frames_per_segment,
+            )
+            for seg in segments
+        ]
+    )
+    await asyncio.gather(
+        *[
+            asyncio.to_thread(
+                _extract_single_clip, ffmpeg_bin, video_path, seg, clips_dir
+            )
+            for seg in segments
+        ]
+    )
+    return "per_segment"
+
+
 # ==================== ASR 辅助函数 ====================
 
 
@@ -515,6 +794,9 @@ def _parse_asr_result(response_json: Dict[str, Any]) -> Optional[Dict[str, Any]]
 
 # ==================== TOS 上传辅助 ====================
 
+# 签名 URL 有效期（秒），TOS 允许的最长 7 天
+_TOS_URL_EXPIRES = 604800
+
 
 def _get_tos_client() -> Optional[tos.TosClientV2]:
     """创建 TOS 客户端（凭证不全时返回 None）"""
@@ -552,19 +834,323 @@ async def _upload_to_tos(
             content=content,
             content_type=content_type,
         )
-        signed = await asyncio.to_thread(
-            client.pre_signed_url,
-            http_method=HttpMethodType.Http_Method_Get,
-            bucket=bucket,
-            key=key,
-            expires=604800,
-        )
-        return signed.signed_url
+        return await asyncio.to_thread(_sign_url, client, bucket, key)
     except Exception as exc:
         logger.warning(f"TOS 上传失败 key={key}: {exc}")
         return None
 
 
+def _sign_url(client: tos.TosClientV2, bucket: str, key: str) -> str:
+    """为已上传对象生成 GET 签名 URL（本地计算，不发起网络请求）"""
+    signed = client.pre_signed_url(
+        http_method=HttpMethodType.Http_Method_Get,
+        bucket=bucket,
+        key=key,
+        expires=_TOS_URL_EXPIRES,
+    )
+    return signed.signed_url
+
+
+# ==================== 缓存辅助 ====================
+
+
+async def _fetch_cache_validator(video_url: str) -> Optional[str]:
+    """
+    HEAD 请求获取远程视频的版本标识（ETag，缺失时用 Last-Modified + Content-Length）。
+
+    拿不到任何标识时返回 None，此时不按 URL 查缓存，只在下载后按内容哈希查找，
+    避免同一 URL 内容变更后命中旧结果。
+    """
+    try:
+        async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
+            resp = await client.head(video_url)
+        if resp.status_code >= 400:
+            return None
+        etag = resp.headers.get("ETag")
+        if etag:
+            return etag
+        last_modified = resp.headers.get("Last-Modified")
+        length = resp.headers.get("Content-Length")
+        if last_modified and length:
+            return f"{last_modified}|{length}"
+    except httpx.HTTPError as exc:
+        logger.debug(f"[process_video] HEAD 获取 ETag 失败: {exc}")
+    return None
+
+
+def _cached_url(
+    tos_client: Optional[tos.TosClientV2], bucket: str, asset: Dict[str, Any]
+) -> Optional[str]:
+    """
+    取缓存资源的可用 URL：签名未临近过期直接复用，否则按 TOS key 重新签名。
+
+    重新签名会原地更新 asset（url / signed_at），调用方需回写 manifest。
+    """
+    if asset.get("url") and is_signature_fresh(
+        asset.get("signed_at"), _TOS_URL_EXPIRES
+    ):
+        return asset["url"]
+    if tos_client and asset.get("tos_key"):
+        try:
+            url = _sign_url(tos_client, asset.get("bucket") or bucket, asset["tos_key"])
+        except Exception as exc:
+            logger.warning(f"TOS 重新签名失败 key={asset['tos_key']}: {exc}")
+            return None
+        asset["url"] = url
+        asset["signed_at"] = time.time()
+        return url
+    return None
+
+
+def _asset_record(
+    rel_file: str, upload: Optional[tuple[str, Optional[str]]], bucket: str
+) -> Dict[str, Any]:
+    """缓存 manifest 中单个文件的记录：本地相对路径 + TOS key + 签名 URL"""
+    key, url = upload or (None, None)
+    return {
+        "file": rel_file,
+        "tos_key": key if url else None,
+        "bucket": bucket,
+        "url": url,
+        "signed_at": time.time() if url else None,
+    }
+
+
+def _restore_segments(
+    entry_dir: Path,
+    variant_entry: Dict[str, Any],
+    tos_client: Optional[tos.TosClientV2],
+    bucket: str,
+) -> Optional[List[SegmentAsset]]:
+    """
+    从缓存条目恢复分镜资源；任一文件缺失（被部分清理），或 TOS 可用但条目
+    缺少 TOS key（写入时未上传）时返回 None 视为未命中
+    """
+    segments: List[SegmentAsset] = []
+    for seg_entry in variant_entry.get("segments", []):
+        assets = seg_entry.get("frames", []) + [seg_entry.get("clip") or {}]
+        if tos_client and not all(asset.get("tos_key") for asset in assets):
+            return None
+        seg = SegmentAsset(
+            index=seg_entry["index"], start=seg_entry["start"], end=seg_entry["end"]
+        )
+        for frame in seg_entry.get("frames", []):
+            path = entry_dir / frame["file"]
+            if not path.exists():
+                return None
+            seg.frame_paths.append(path)
+            url = _cached_url(tos_client, bucket, frame)
+            if url:
+                seg.frame_urls.append(url)
+                seg.frame_keys.append(frame["tos_key"])
+        clip = seg_entry.get("clip")
+        if clip:
+            path = entry_dir / clip["file"]
+            if not path.exists():
+                return None
+            seg.clip_path = path
+            seg.clip_url = _cached_url(tos_client, bucket, clip)
+            seg.clip_key = clip.get("tos_key") if seg.clip_url else None
+        segments.append(seg)
+    return segments
+
+
+def _extraction_complete(
+    segments: List[SegmentAsset],
+    frames_per_segment: int,
+    uploads: Dict[Path, tuple[str, Optional[str]]],
+    require_urls: bool,
+) -> bool:
+    """全部分镜的帧 / 片段均已提取（require_urls 时还需均已上传成功）"""
+    for seg in segments:
+        if len(seg.frame_paths) < frames_per_segment or not seg.clip_path:
+            return False
+        if require_urls and not all(
+            (uploads.get(path) or (None, None))[1]
+            for path in [*seg.frame_paths, seg.clip_path]
+        ):
+            return False
+    return True
+
+
+def _save_to_cache(
+    cache: MediaCache,
+    content_hash: str,
+    manifest: Dict[str, Any],
+    variant: str,
+    extract_params: Dict[str, Any],
+    extract_mode: str,
+    segmenter: str,
+    segments: List[SegmentAsset],
+    uploads: Dict[Path, tuple[str, Optional[str]]],
+    bucket: str,
+    require_urls: bool,
+) -> None:
+    """
+    把本次提取的帧/片段复制进缓存条目并写入 manifest，随后执行 LRU 淘汰。
+
+    仅缓存成功结果：有帧 / 片段提取失败或（TOS 可用时）上传失败时不写入分镜结果，
+    只保存探测元数据等已成功的部分，下次重新提取，避免临时错误被缓存复用。
+    segments 中的 frame_paths / clip_path 会改指向缓存内的副本。
+    """
+    if not _extraction_complete(
+        segments, extract_params["frames_per_segment"], uploads, require_urls
+    ):
+        logger.warning(
+            "[process_video] 存在提取 / 上传失败的帧或片段，本次分镜结果不写入缓存"
+        )
+        cache.save(content_hash, manifest)
+        return
+
+    seg_entries = []
+    for seg in segments:
+        frames = []
+        frame_paths = []
+        for fp in seg.frame_paths:
+            rel = f"{variant}/frames/{fp.name}"
+            frame_paths.append(cache.store_file(content_hash, fp, rel))
+            frames.append(_asset_record(rel, uploads.get(fp), bucket))
+        clip = None
+        if seg.clip_path and seg.clip_path.exists():
+            rel = f"{variant}/clips/{seg.clip_path.name}"
+            clip = _asset_record(rel, uploads.get(seg.clip_path), bucket)
+            seg.clip_path = cache.store_file(content_hash, seg.clip_path, rel)
+        # 后续本地帧句柄直接引用缓存内文件
+        seg.frame_paths = frame_paths
+        seg_entries.append(
+            {
+                "index": seg.index,
+                "start": seg.start,
+                "end": seg.end,
+                "frames": frames,
+                "clip": clip,
+            }
+        )
+
+    manifest.setdefault("variants", {})[variant] = {
+        "params": extract_params,
+        "extract_mode": extract_mode,
+        "segmenter": segmenter,
+        "segments": seg_entries,
+    }
+    cache.save(content_hash, manifest)
+    cache.evict()
+
+
+# ==================== 输出构建 ====================
+
+
+def _finalize_result(
+    tool_context: ToolContext,
+    *,
+    task_id: str,
+    duration: float,
+    resolution: str,
+    metadata: Dict[str, Any],
+    audio_url_out: Optional[str],
+    audio_path: Optional[Path],
+    asr_result: Optional[Dict[str, Any]],
+    segments: List[SegmentAsset],
+    temp_dir: Path,
+    extract_mode: str,
+    segmenter: str,
+    cache_hit: bool,
+    timings: Dict[str, float],
+    pipeline_start: float,
+) -> dict:
+    """本地帧句柄回退 + 组装结果，写入 session state，返回给 LLM 的瘦身版本"""
+    audio_base64 = None
+
+    # ---- Step 8b: 本地帧句柄回退（TOS 不可用/上传失败时） ----
+    # state 中只保存 frame:// 句柄，下游工具需要图片时再惰性编码为 data URL
+    for seg in segments:
+        if not seg.frame_urls and seg.frame_paths:
+            local_frames = [fp for fp in seg.frame_paths if fp.exists()]
+            # 临时目录随任务结束删除，未进缓存的帧先移到帧存储目录
+            if local_frames and local_frames[0].is_relative_to(temp_dir):
+                local_frames = persist_frames(local_frames, task_id)
+            seg.frame_urls = [make_handle(fp) for fp in local_frames]
+            if seg.frame_urls:
+                logger.info(
+                    f"片段 {seg.index}: TOS 不可用，使用本地帧句柄 ({len(seg.frame_urls)} 张)"
+                )
+
+    # 音频 base64 回退
+    if not audio_url_out and audio_path and audio_path.exists():
+        audio_base64 = base64.b64encode(audio_path.read_bytes()).decode()
+        logger.info(
+            f"[process_video] TOS 不可用，音频编码为 base64 ({len(audio_base64)} chars)"
+        )
+
+    # ---- 构建输出 ----
+    full_transcript = None
+    if asr_result and asr_result.get("text"):
+        full_transcript = asr_result["text"]
+
+    segments_output = []
+    for seg in segments:
+        segments_output.append(
+            {
+                "index": seg.index,
+                "start": round(seg.start, 2),
+                "end": round(seg.end, 2),
+                "frame_urls": seg.frame_urls,
+                "clip_url": seg.clip_url,
+                "is_speech": seg.is_speech,
+                "speech_text": seg.speech_text,
+            }
+        )
+
+    timings["total"] = _elapsed(pipeline_start)
+    logger.info(f"[process_video] 各阶段耗时(s): {timings}, cache_hit={cache_hit}")
+
+    result = {
+        "task_id": task_id,
+        "duration": round(duration, 2),
+        "resolution": resolution,
+        "metadata": metadata,
+        "audio_url": audio_url_out,
+        "audio_base64": audio_base64,
+        "full_transcript": full_transcript,
+        "segment_count": len(segments_output),
+        "segments": segments_output,
+        "extract_mode": extract_mode,
+        "segmenter": segmenter,
+        "cache_hit": cache_hit,
+        "timings": timings,
+    }
+
+    # 存入 session state 供后续 sub-agent 使用（本地帧为 frame:// 句柄）
+    tool_context.state["process_video_result"] = result
+
+    # 返回给 LLM 的瘦身版本：本地帧句柄替换为占位标记，节省 context tokens
+    slim_segments = []
+    for seg_out in segments_output:
+        slim_seg = dict(seg_out)
+        frame_urls = slim_seg.get("frame_urls", [])
+        local_count = sum(1 for u in frame_urls if is_frame_handle(u))
+        if local_count > 0:
+            slim_seg["frame_urls"] = [
+                f"(本地帧图已缓存，共{local_count}张，后续工具会自动读取)"
+            ]
+        slim_segments.append(slim_seg)
+
+    slim_result = dict(result)
+    slim_result["segments"] = slim_segments
+    if audio_base64:
+        slim_result["audio_base64"] = "(音频已缓存为base64，后续工具会自动读取)"
+
+    return slim_result
+
+
+# ==================== 计时辅助 ====================
+
+
+def _elapsed(start: float) -> float:
+    """自 start（time.perf_counter）起的耗时，秒，保留两位小数"""
+    return round(time.perf_counter() - start, 2)
+
+
 # ==================== 路径判断辅助 ====================
 
 
@@ -619,7 +1205,15 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
     完整视频预处理流水线，替代原后端 breakdown 服务。
 
     流程：下载视频 -> FFprobe 元数据 -> FFmpeg 音频提取 -> 火山 ASR 语音识别
-         -> 固定时长分段 -> FFmpeg 帧提取 + 片段切割 -> TOS 上传
+         -> 镜头检测分段 -> FFmpeg 单次解码提取关键帧 + 片段 -> TOS 上传
+
+    分镜切分由 SEGMENTER_MODE 控制：scene（默认，按镜头切换）/ fixed（原固定时长）。
+
+    片段切割模式由 FFMPEG_CLIP_MODE 控制：reencode（默认，帧精确）/
+    copy（流复制，切点对齐关键帧，速度快但边界可能略有偏移）。
+
+    处理结果按视频内容哈希持久化缓存（见 utils/media_cache.py），
+    重复拆解同一视频时直接复用帧/片段/ASR，签名 URL 临近过期时自动重新签名。
 
     需要本机安装 FFmpeg（brew install ffmpeg）。
     ASR 需配置 VOLC_ASR_APP_ID + VOLC_ASR_ACCESS_KEY，未配置时跳过语音识别。
@@ -628,7 +1222,8 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
         video_url: 视频URL（公开URL / TOS 签名URL）或本地文件路径（/path/to/video.mp4）
 
     Returns:
-        dict: 包含 duration, resolution, segments, audio_url, full_transcript 等
+        dict: 包含 duration, resolution, segments, audio_url, full_transcript,
+              cache_hit, timings（各阶段耗时）等
     """
     # 自动检测 ffmpeg/ffprobe 路径（系统 → imageio-ffmpeg 回退）
     ffmpeg_bin, ffprobe_bin = _resolve_ffmpeg_paths()
@@ -651,20 +1246,97 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
     )
     tos_prefix = os.getenv("TOS_OUTPUT_PREFIX", "videobreak")
 
+    # 提取参数决定帧/片段产物，参数不同的结果在缓存中互不覆盖
+    segmenter_config = resolve_segmenter_config()
+    extract_params = {
+        "frames_per_segment": frames_per_segment,
+        "clip_mode": _resolve_clip_mode(),
+        "frame_max_width": _frame_max_width(),
+        "segmenter": segmenter_config,
+    }
+    variant = variant_key(extract_params)
+    cache = get_media_cache()
+    content_hash: Optional[str] = None
+    manifest: Dict[str, Any] = {}
+
+    # 各阶段耗时（秒），写入 process_video_result.timings 便于定位瓶颈
+    timings: Dict[str, float] = {}
+    pipeline_start = time.perf_counter()
+    tos_client = None
+
     try:
-        # ---- Step 1: 获取本地视频文件 ----
         # 支持本地路径（/path/to/video.mp4 或 file:///path/to/video.mp4）和 HTTP URL
         local_source = _resolve_local_path(video_url)
+        max_video_size = 2 * 1024 * 1024 * 1024  # 2GB 上限
         if local_source:
-            # 本地文件：直接复制到工作目录
             if not local_source.exists():
                 return {"error": f"本地文件不存在: {local_source}"}
             file_size = local_source.stat().st_size
-            max_video_size = 2 * 1024 * 1024 * 1024  # 2GB
             if file_size > max_video_size:
                 return {
                     "error": f"视频文件过大（>{max_video_size // 1024 // 1024}MB），请压缩后重试"
                 }
+
+        # TOS 客户端（帧/片段/音频上传，缓存命中时重新签名）
+        tos_client = _get_tos_client()
+
+        # ---- Step 0: 查缓存（本地文件按内容哈希，URL 按规范化 URL + ETag） ----
+        stage_start = time.perf_counter()
+        url_cache_key = None
+        if cache:
+            if local_source:
+                content_hash = await asyncio.to_thread(hash_file, local_source)
+            else:
+                validator = await _fetch_cache_validator(video_url)
+                if validator:
+                    url_cache_key = MediaCache.url_key(video_url, validator)
+                    content_hash = cache.lookup_url(url_cache_key)
+            if content_hash:
+                manifest = cache.load(content_hash) or {}
+
+        variant_entry = manifest.get("variants", {}).get(variant)
+        if content_hash and variant_entry:
+            entry_dir = cache.entry_dir(content_hash)
+            segments = _restore_segments(entry_dir, variant_entry, tos_client, bucket)
+            if segments is not None:
+                metadata = manifest["metadata"]
+                asr_result = manifest.get("asr")
+                if asr_result and asr_result.get("segments"):
+                    _assign_asr_text_to_segments(segments, asr_result["segments"])
+                audio_entry = manifest.get("audio") or {}
+                audio_path = (
+                    entry_dir / audio_entry["file"] if audio_entry.get("file") else None
+                )
+                audio_url_out = _cached_url(tos_client, bucket, audio_entry)
+                # 回写重新签名后的 URL
+                cache.save(content_hash, manifest)
+                timings["cache_lookup"] = _elapsed(stage_start)
+                logger.info(
+                    f"[process_video] 缓存命中 {content_hash[:12]}，跳过下载/FFmpeg/ASR"
+                )
+                return _finalize_result(
+                    tool_context,
+                    task_id=manifest.get("task_id", task_id),
+                    duration=float(metadata.get("duration") or 0.0),
+                    resolution=f"{metadata.get('width')}x{metadata.get('height')}",
+                    metadata=metadata,
+                    audio_url_out=audio_url_out,
+                    audio_path=audio_path,
+                    asr_result=asr_result,
+                    segments=segments,
+                    temp_dir=temp_dir,
+                    extract_mode=variant_entry.get("extract_mode", "cache"),
+                    segmenter=variant_entry.get("segmenter", "fixed"),
+                    cache_hit=True,
+                    timings=timings,
+                    pipeline_start=pipeline_start,
+                )
+        timings["cache_lookup"] = _elapsed(stage_start)
+
+        # ---- Step 1: 获取本地视频文件 ----
+        stage_start = time.perf_counter()
+        if local_source:
+            # 本地文件：直接复制到工作目录
             shutil.copy2(str(local_source), str(local_video))
             logger.info(
                 f"[process_video] 使用本地文件: {local_source} ({file_size / 1024 / 1024:.1f}MB)"
@@ -672,7 +1344,6 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
         else:
             # HTTP URL：流式下载
             logger.info(f"[process_video] 下载视频: {video_url[:100]}...")
-            max_video_size = 2 * 1024 * 1024 * 1024  # 2GB 上限
             total_downloaded = 0
             async with httpx.AsyncClient(timeout=300, follow_redirects=True) as client:
                 async with client.stream("GET", video_url) as resp:
@@ -688,11 +1359,20 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
             logger.info(
                 f"[process_video] 下载完成: {local_video} ({total_downloaded / 1024 / 1024:.1f}MB)"
             )
+            # 下载后按内容哈希二次查找：不同 URL 指向同一视频时复用探测和 ASR
+            if cache:
+                content_hash = await asyncio.to_thread(hash_file, local_video)
+                manifest = cache.load(content_hash) or {}
+                if url_cache_key:
+                    cache.link_url(url_cache_key, content_hash)
+        timings["download"] = _elapsed(stage_start)
 
         # ---- Step 2: 元数据 ----
-        metadata = await asyncio.to_thread(
+        stage_start = time.perf_counter()
+        metadata = manifest.get("metadata") or await asyncio.to_thread(
             _probe_video, ffprobe_bin, ffmpeg_bin, local_video
         )
+        timings["probe"] = _elapsed(stage_start)
         duration = float(metadata.get("duration") or 0.0)
         if duration <= 0:
             return {"error": "无法获取视频时长，请确认视频URL有效"}
@@ -700,63 +1380,92 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
         logger.info(
             f"[process_video] 元数据: 时长={duration:.1f}s, 分辨率={resolution}"
         )
+        manifest["metadata"] = metadata
+        manifest.setdefault("task_id", task_id)
 
-        # ---- Step 3: 提取音频 ----
-        audio_path = await asyncio.to_thread(
-            _extract_audio_sync, ffmpeg_bin, local_video
+        # 镜头检测需要完整解码一遍，与音频提取 / ASR 并行执行
+        segment_task = asyncio.create_task(
+            asyncio.to_thread(
+                segment_bounds,
+                ffmpeg_bin,
+                str(local_video),
+                duration,
+                segmenter_config,
+            )
         )
-        audio_url_out = None
-        audio_base64 = None
 
-        # TOS 客户端（帧/片段/音频上传）
-        tos_client = _get_tos_client()
-
-        if audio_path and tos_client:
-            key = f"{tos_prefix}/{task_id}/audio/{audio_path.name}"
-            audio_url_out = await _upload_to_tos(
-                tos_client, bucket, key, audio_path.read_bytes(), "audio/mpeg"
+        # ---- Step 3-4: 提取音频 + ASR 语音识别（缓存中已有识别结果时复用） ----
+        stage_start = time.perf_counter()
+        audio_path = None
+        audio_url_out = None
+        asr_result = manifest.get("asr")
+        audio_entry = manifest.get("audio") or {}
+        if asr_result and audio_entry.get("file"):
+            cached_audio = cache.entry_dir(content_hash) / audio_entry["file"]
+            if cached_audio.exists():
+                audio_path = cached_audio
+                audio_url_out = _cached_url(tos_client, bucket, audio_entry)
+        if not audio_path:
+            asr_result = None
+            audio_path = await asyncio.to_thread(
+                _extract_audio_sync, ffmpeg_bin, local_video
             )
-
-        # ---- Step 4: ASR 语音识别 ----
-        asr_result = None
-        asr_segments = None
-        if audio_url_out:
+            audio_key = None
+            if audio_path and tos_client:
+                audio_key = f"{tos_prefix}/{task_id}/audio/{audio_path.name}"
+                audio_url_out = await _upload_to_tos(
+                    tos_client, bucket, audio_key, audio_path.read_bytes(), "audio/mpeg"
+                )
+            # 音频上传失败时不缓存，下次重新上传
+            if (
+                cache
+                and content_hash
+                and audio_path
+                and (audio_url_out or not tos_client)
+            ):
+                cache.store_file(content_hash, audio_path, "audio.mp3")
+                manifest["audio"] = _asset_record(
+                    "audio.mp3", (audio_key, audio_url_out), bucket
+                )
+        timings["audio"] = _elapsed(stage_start)
+
+        stage_start = time.perf_counter()
+        if not asr_result and audio_url_out:
             asr_result = await _transcribe_audio(audio_url_out)
+            # 仅缓存成功结果，ASR 未配置/失败时下次仍会重试
             if asr_result:
-                asr_segments = asr_result.get("segments", [])
-                logger.info(f"[process_video] ASR 识别完成: {len(asr_segments)} 个分段")
-
-        # ---- Step 5: 构建固定时长分镜 ----
-        segments = _build_segments(duration)
+                manifest["asr"] = asr_result
+        asr_segments = asr_result.get("segments", []) if asr_result else None
+        if asr_segments:
+            logger.info(f"[process_video] ASR 识别完成: {len(asr_segments)} 个分段")
+        timings["asr"] = _elapsed(stage_start)
+
+        # ---- Step 5: 按镜头切换构建分镜（失败回退固定时长） ----
+        stage_start = time.perf_counter()
+        bounds, segmenter_used = await segment_task
+        segments = _segments_from_bounds(bounds)
+        # 只统计等待时间，检测本身与音频/ASR 重叠
+        timings["segment"] = _elapsed(stage_start)
         if asr_segments:
             _assign_asr_text_to_segments(segments, asr_segments)
-        logger.info(f"[process_video] 分镜: {len(segments)} 个片段")
-
-        # ---- Step 6: 提取关键帧（并发） ----
-        frame_tasks = [
-            asyncio.to_thread(
-                _extract_segment_frames,
-                ffmpeg_bin,
-                local_video,
-                seg,
-                frames_per_segment,
-            )
-            for seg in segments
-        ]
-        await asyncio.gather(*frame_tasks)
+        logger.info(f"[process_video] 分镜: {len(segments)} 个片段（{segmenter_used}）")
 
-        # ---- Step 7: 切割视频片段（并发） ----
+        # ---- Step 6-7: 提取关键帧 + 切割视频片段（单次解码） ----
         clips_dir = temp_dir / "clips"
         clips_dir.mkdir(exist_ok=True)
-        clip_tasks = [
-            asyncio.to_thread(
-                _extract_single_clip, ffmpeg_bin, local_video, seg, clips_dir
-            )
-            for seg in segments
-        ]
-        await asyncio.gather(*clip_tasks)
+        stage_start = time.perf_counter()
+        extract_mode = await _extract_segment_assets(
+            ffmpeg_bin, local_video, segments, frames_per_segment, clips_dir
+        )
+        timings["extract"] = _elapsed(stage_start)
+        logger.info(
+            f"[process_video] 帧/片段提取完成: mode={extract_mode}, "
+            f"耗时 {timings['extract']}s"
+        )
 
         # ---- Step 8: 并发上传到 TOS ----
+        stage_start = time.perf_counter()
+        uploads: Dict[Path, tuple[str, Optional[str]]] = {}
         if tos_client:
             upload_tasks = []
 
@@ -789,7 +1498,7 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
                 kind, seg, path, key, data, ct = item
                 async with tos_semaphore:
                     url = await _upload_to_tos(tos_client, bucket, key, data, ct)
-                    return kind, seg, url
+                    return kind, seg, path, key, url
 
             results = await asyncio.gather(
                 *[_upload_one(t) for t in upload_tasks],
@@ -800,90 +1509,58 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
                 if isinstance(r, Exception):
                     logger.warning(f"TOS 上传异常: {r}")
                     continue
-                kind, seg, url = r
+                kind, seg, path, key, url = r
+                uploads[path] = (key, url)
                 if url:
                     if kind == "frame":
                         seg.frame_urls.append(url)
+                        seg.frame_keys.append(key)
                     else:
                         seg.clip_url = url
-
-            tos_client.close()
+                        seg.clip_key = key
         else:
             logger.warning("[process_video] TOS 凭证未配置，跳过上传（帧/片段仅本地）")
-
-        # ---- Step 8b: base64 帧图回退（TOS 不可用/上传失败时） ----
-        for seg in segments:
-            if not seg.frame_urls and seg.frame_paths:
-                for fp in seg.frame_paths:
-                    if fp.exists():
-                        b64 = base64.b64encode(fp.read_bytes()).decode()
-                        seg.frame_urls.append(f"data:image/jpeg;base64,{b64}")
-                if seg.frame_urls:
-                    logger.info(
-                        f"片段 {seg.index}: TOS 不可用，使用 base64 帧图 ({len(seg.frame_urls)} 张)"
-                    )
-
-        # 音频 base64 回退
-        if not audio_url_out and audio_path and audio_path.exists():
-            audio_base64 = base64.b64encode(audio_path.read_bytes()).decode()
-            logger.info(
-                f"[process_video] TOS 不可用，音频编码为 base64 ({len(audio_base64)} chars)"
-            )
-
-        # ---- 构建输出 ----
-        full_transcript = None
-        if asr_result and asr_result.get("text"):
-            full_transcript = asr_result["text"]
-
-        segments_output = []
-        for seg in segments:
-            segments_output.append(
-                {
-                    "index": seg.index,
-                    "start": round(seg.start, 2),
-                    "end": round(seg.end, 2),
-                    "frame_urls": seg.frame_urls,
-                    "clip_url": seg.clip_url,
-                    "is_speech": seg.is_speech,
-                    "speech_text": seg.speech_text,
-                }
-            )
-
-        result = {
-            "task_id": task_id,
-            "duration": round(duration, 2),
-            "resolution": resolution,
-            "metadata": metadata,
-            "audio_url": audio_url_out,
-            "audio_base64": audio_base64,
-            "full_transcript": full_transcript,
-            "segment_count": len(segments_output),
-            "segments": segments_output,
-        }
-
-        # 存入 session state 供后续 sub-agent 使用（完整数据含 base64）
-        tool_context.state["process_video_result"] = result
-
-        # 返回给 LLM 的瘦身版本：base64 data URL 替换为占位标记，节省 context tokens
-        slim_segments = []
-        for seg_out in segments_output:
-            slim_seg = dict(seg_out)
-            frame_urls = slim_seg.get("frame_urls", [])
-            b64_count = sum(
-                1 for u in frame_urls if isinstance(u, str) and u.startswith("data:")
-            )
-            if b64_count > 0:
-                slim_seg["frame_urls"] = [
-                    f"(本地帧图已缓存，共{b64_count}张，后续工具会自动读取)"
-                ]
-            slim_segments.append(slim_seg)
-
-        slim_result = dict(result)
-        slim_result["segments"] = slim_segments
-        if audio_base64:
-            slim_result["audio_base64"] = "(音频已缓存为base64，后续工具会自动读取)"
-
-        return slim_result
+        timings["upload"] = _elapsed(stage_start)
+
+        # ---- Step 9: 写入缓存 ----
+        if cache and content_hash:
+            stage_start = time.perf_counter()
+            try:
+                await asyncio.to_thread(
+                    _save_to_cache,
+                    cache,
+                    content_hash,
+                    manifest,
+                    variant,
+                    extract_params,
+                    extract_mode,
+                    segmenter_used,
+                    segments,
+                    uploads,
+                    bucket,
+                    tos_client is not None,
+                )
+            except OSError as exc:
+                logger.warning(f"[process_video] 写入缓存失败: {exc}")
+            timings["cache_store"] = _elapsed(stage_start)
+
+        return _finalize_result(
+            tool_context,
+            task_id=task_id,
+            duration=duration,
+            resolution=resolution,
+            metadata=metadata,
+            audio_url_out=audio_url_out,
+            audio_path=audio_path,
+            asr_result=asr_result,
+            segments=segments,
+            temp_dir=temp_dir,
+            extract_mode=extract_mode,
+            segmenter=segmenter_used,
+            cache_hit=False,
+            timings=timings,
+            pipeline_start=pipeline_start,
+        )
 
     except httpx.HTTPError as exc:
         return {"error": f"视频下载失败: {exc}"}
@@ -895,6 +1572,8 @@ async def process_video(video_url: str, tool_context: ToolContext) -> dict:
         logger.error(f"[process_video] 异常: {exc}", exc_info=True)
         return {"error": f"视频预处理失败: {str(exc)}"}
     finally:
+        if tos_client:
+            tos_client.close()
         try:
             shutil.rmtree(temp_dir, ignore_errors=True)
         except Exception:
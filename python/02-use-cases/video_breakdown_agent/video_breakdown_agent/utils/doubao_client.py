@@ -8,17 +8,109 @@
   - 请求体：只有 model + input（无 temperature/parameters 等）
   - input content 类型：input_text / input_image（非 text / image_url）
   - 参考：https://www.volcengine.com/docs/82379/1541595
+
+连接复用：
+  call_doubao_text / call_doubao_vision 通过 get_doubao_client 复用进程级客户端
+  （按 api_key + api_base + 事件循环区分），连接池 keep-alive，可选 HTTP/2，
+  避免每次分镜分析都重新建立 TLS 连接。
+  每个模型独立的并发上限 + 令牌桶限速，429/5xx 自动指数退避（带抖动）重试，
+  get_doubao_metrics() 返回排队/并发/延迟指标，用于按数据调整 VISION_CONCURRENCY。
 """
 
+import asyncio
 import json
 import logging
 import os
+import random
+import time
+import weakref
+from dataclasses import asdict, dataclass
 from typing import List, Dict, Any, Optional
 
 import httpx
 
 logger = logging.getLogger(__name__)
 
+# 需要重试的 HTTP 状态码（限流 / 服务端临时错误）
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _parse_model_limits(raw: str) -> Dict[str, float]:
+    """解析 "model-a=4,model-b=8,default=6" 形式的按模型配置"""
+    limits: Dict[str, float] = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            limits[name.strip()] = float(value)
+        except ValueError:
+            logger.warning(f"忽略无效的模型限额配置: {item}")
+    return limits
+
+
+class _TokenBucket:
+    """令牌桶限速（rate 个请求/秒，允许 capacity 个突发）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class ModelStats:
+    """单个模型的调用指标"""
+
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    in_flight: int = 0
+    queued: int = 0
+    max_in_flight: int = 0
+    max_queued: int = 0
+    queue_wait_total: float = 0.0
+    latency_total: float = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = asdict(self)
+        done = max(self.requests, 1)
+        data["avg_queue_wait_ms"] = round(self.queue_wait_total / done * 1000, 1)
+        data["avg_latency_ms"] = round(self.latency_total / done * 1000, 1)
+        del data["queue_wait_total"], data["latency_total"]
+        return data
+
+
+class _ModelLimiter:
+    """按模型的并发上限 + 令牌桶"""
+
+    def __init__(self, concurrency: int, rpm: float):
+        self.semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self.bucket = _TokenBucket(rpm / 60.0, rpm / 60.0) if rpm > 0 else None
+        self.stats = ModelStats()
+
 
 class DoubaoClient:
     """豆包 API 客户端"""
@@ -28,11 +120,55 @@ class DoubaoClient:
         api_key: str,
         api_base: str = "https://ark.cn-beijing.volces.com/api/v3",
         timeout: int = 120,
+        http2: Optional[bool] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        max_retries: Optional[int] = None,
     ):
+        """
+        Args:
+            http2: 是否启用 HTTP/2（需安装 h2，默认读 DOUBAO_HTTP2）
+            max_connections: 连接池上限（默认读 DOUBAO_MAX_CONNECTIONS，20）
+            max_keepalive_connections: keep-alive 连接数（DOUBAO_MAX_KEEPALIVE，10）
+            keepalive_expiry: 空闲连接保持秒数（DOUBAO_KEEPALIVE_EXPIRY，60）
+            max_retries: 429/5xx/网络错误重试次数（DOUBAO_MAX_RETRIES，3）
+        """
         self.api_key = api_key
         self.api_base = api_base.rstrip("/")
         self.timeout = timeout
-        self.client = httpx.AsyncClient(timeout=timeout)
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else _env_int("DOUBAO_MAX_RETRIES", 3)
+        )
+
+        if http2 is None:
+            http2 = os.getenv("DOUBAO_HTTP2", "false").lower() in ("1", "true", "yes")
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("未安装 h2（pip install 'httpx[http2]'），回退 HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections or _env_int("DOUBAO_MAX_CONNECTIONS", 20),
+            max_keepalive_connections=max_keepalive_connections
+            or _env_int("DOUBAO_MAX_KEEPALIVE", 10),
+            keepalive_expiry=keepalive_expiry
+            or float(os.getenv("DOUBAO_KEEPALIVE_EXPIRY", "60")),
+        )
+        self.client = httpx.AsyncClient(
+            timeout=timeout, limits=self.limits, http2=http2
+        )
+
+        self._model_concurrency = _parse_model_limits(
+            os.getenv("DOUBAO_MODEL_CONCURRENCY", "")
+        )
+        self._model_rpm = _parse_model_limits(os.getenv("DOUBAO_MODEL_RPM", ""))
+        self._limiters: Dict[str, _ModelLimiter] = {}
 
     async def __aenter__(self):
         return self
@@ -40,6 +176,97 @@ class DoubaoClient:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.client.aclose()
 
+    # ==================== 限流 / 重试 ====================
+
+    def _limiter(self, model: str) -> _ModelLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            concurrency = self._model_concurrency.get(
+                model,
+                self._model_concurrency.get("default", self.limits.max_connections),
+            )
+            rpm = self._model_rpm.get(model, self._model_rpm.get("default", 0))
+            limiter = _ModelLimiter(int(concurrency), rpm)
+            self._limiters[model] = limiter
+        return limiter
+
+    async def _post_json(
+        self, model: str, url: str, payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        带并发/限速控制的 POST 请求，429/5xx/网络错误按指数退避 + 抖动重试。
+
+        优先遵循服务端 Retry-After 头。
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        limiter = self._limiter(model)
+        stats = limiter.stats
+
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        queued_at = time.perf_counter()
+        async with limiter.semaphore:
+            stats.queued -= 1
+            if limiter.bucket:
+                await limiter.bucket.acquire()
+            stats.queue_wait_total += time.perf_counter() - queued_at
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            started = time.perf_counter()
+            try:
+                for attempt in range(self.max_retries + 1):
+                    retry_after = None
+                    try:
+                        response = await self.client.post(
+                            url, headers=headers, json=payload
+                        )
+                        if (
+                            response.status_code not in _RETRYABLE_STATUS
+                            or attempt == self.max_retries
+                        ):
+                            response.raise_for_status()
+                            return response.json()
+                        retry_after = response.headers.get("Retry-After")
+                        reason = f"HTTP {response.status_code}"
+                    except httpx.TransportError as e:
+                        if attempt == self.max_retries:
+                            raise
+                        reason = type(e).__name__
+
+                    stats.retries += 1
+                    try:
+                        delay = float(retry_after)
+                    except (TypeError, ValueError):
+                        delay = min(0.5 * 2**attempt, 8.0) * random.uniform(0.5, 1.5)
+                    logger.warning(
+                        f"豆包 API {reason}，{delay:.1f}s 后重试 "
+                        f"({attempt + 1}/{self.max_retries}) model={model}"
+                    )
+                    await asyncio.sleep(delay)
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.in_flight -= 1
+                stats.requests += 1
+                stats.latency_total += time.perf_counter() - started
+
+    def metrics(self) -> Dict[str, Any]:
+        """连接池配置 + 各模型排队/并发/延迟指标"""
+        return {
+            "api_base": self.api_base,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "models": {
+                model: limiter.stats.snapshot()
+                for model, limiter in self._limiters.items()
+            },
+        }
+
     # ==================== 文本模型 ====================
 
     async def text_completion(
@@ -63,10 +290,6 @@ class DoubaoClient:
             标准 OpenAI 兼容格式响应
         """
         url = f"{self.api_base}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
 
         payload: Dict[str, Any] = {
             "model": model,
@@ -80,9 +303,7 @@ class DoubaoClient:
         logger.debug(f"豆包文本 API 请求: model={model}, messages={len(messages)} 条")
 
         try:
-            response = await self.client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            result = await self._post_json(model, url, payload)
             logger.debug("豆包文本 API 响应成功")
             return result
         except httpx.HTTPStatusError as e:
@@ -127,10 +348,6 @@ class DoubaoClient:
             转换为标准 OpenAI 格式的响应（方便上层代码统一处理）
         """
         url = f"{self.api_base}/responses"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
 
         # 将标准 OpenAI messages 转换为豆包 Responses API 格式
         doubao_input = self._convert_messages_to_doubao_input(messages)
@@ -144,9 +361,7 @@ class DoubaoClient:
         logger.debug(f"豆包视觉 API 请求: model={model}, input={len(doubao_input)} 条")
 
         try:
-            response = await self.client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            raw = response.json()
+            raw = await self._post_json(model, url, payload)
 
             # 转换为统一的 OpenAI 格式
             return self._convert_vision_response(raw)
@@ -324,6 +539,41 @@ class DoubaoClient:
         await self.client.aclose()
 
 
+# ==================== 进程级客户端注册表 ====================
+
+# 事件循环 → {(api_key, api_base): 长连接客户端}
+# httpx.AsyncClient 绑定创建时的事件循环，不同循环（如测试中多次 asyncio.run）各自持有；
+# 以循环对象为弱引用键：循环被回收后条目随之清除，也不会因 id() 复用拿到旧循环的客户端
+_CLIENTS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_doubao_client(api_key: str, api_base: str) -> DoubaoClient:
+    """获取（或创建）复用连接池的长连接客户端"""
+    clients = _CLIENTS.setdefault(asyncio.get_running_loop(), {})
+    key = (api_key, api_base.rstrip("/"))
+    client = clients.get(key)
+    if client is None or client.client.is_closed:
+        client = DoubaoClient(api_key=api_key, api_base=api_base)
+        clients[key] = client
+    return client
+
+
+async def close_doubao_clients() -> None:
+    """关闭当前事件循环下的全部长连接客户端（应用退出时调用）"""
+    clients = _CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def get_doubao_metrics() -> List[Dict[str, Any]]:
+    """所有长连接客户端的连接池与按模型调用指标"""
+    return [
+        client.metrics()
+        for clients in list(_CLIENTS.values())
+        for client in clients.values()
+    ]
+
+
 # ==================== 便捷函数 ====================
 
 
@@ -344,8 +594,8 @@ async def call_doubao_text(
             "MODEL_AGENT_API_BASE", "https://ark.cn-beijing.volces.com/api/v3"
         )
 
-    async with DoubaoClient(api_key=api_key, api_base=api_base) as client:
-        return await client.text_completion(model=model, messages=messages, **kwargs)
+    client = get_doubao_client(api_key=api_key, api_base=api_base)
+    return await client.text_completion(model=model, messages=messages, **kwargs)
 
 
 async def call_doubao_vision(
@@ -365,5 +615,5 @@ async def call_doubao_vision(
             "MODEL_VISION_API_BASE", "https://ark.cn-beijing.volces.com/api/v3"
         )
 
-    async with DoubaoClient(api_key=api_key, api_base=api_base) as client:
-        return await client.vision_completion(model=model, messages=messages, **kwargs)
+    client = get_doubao_client(api_key=api_key, api_base=api_base)
+    return await client.vision_completion(model=model, messages=messages, **kwargs)
@@ -0,0 +1,142 @@
+"""
+本地帧图存储（TOS 不可用时的帧图回退）
+
+TOS 不可用时，关键帧不再逐张读回、base64 编码后整体塞进 session state，
+而是以句柄形式引用本地 JPEG：
+
+  frame:///abs/path/to/.media-cache/frame-store/<task_id>/seg001_frame_0.jpg
+
+- 开启预处理缓存时句柄直接指向缓存条目中的帧文件（零拷贝）；
+  否则帧文件从临时目录 rename 到帧存储目录（FRAME_STORE_DIR），按 FRAME_STORE_TTL_HOURS 清理。
+- 生成 / 解析句柄时刷新帧所在目录的引用时间（缓存条目 pin、帧存储任务目录 mtime），
+  FRAME_STORE_TTL_HOURS 内仍在使用的句柄不会被缓存淘汰或过期清理删掉文件。
+- 需要把图片交给视觉模型 / 视频生成 API 时，调用 resolve_frame_url 惰性编码为
+  data URL；同一帧只编码一次（LRU 缓存）。
+- 句柄只允许解析到帧存储目录和缓存目录内的 JPEG，防止通过工具参数读取任意本地文件。
+"""
+
+import base64
+import logging
+import os
+import shutil
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from video_breakdown_agent.utils.media_cache import (
+    cache_root,
+    frame_handle_ttl,
+    media_temp_base,
+    pin_entry_file,
+)
+
+logger = logging.getLogger(__name__)
+
+FRAME_HANDLE_PREFIX = "frame://"
+
+_ALLOWED_SUFFIXES = {".jpg", ".jpeg"}
+
+
+def frame_store_root() -> Path:
+    """帧存储目录（FRAME_STORE_DIR，默认 <媒体临时目录>/frame-store）"""
+    return Path(os.getenv("FRAME_STORE_DIR") or media_temp_base() / "frame-store")
+
+
+def is_frame_handle(url: Optional[str]) -> bool:
+    return isinstance(url, str) and url.startswith(FRAME_HANDLE_PREFIX)
+
+
+def _pin(path: Path) -> None:
+    """刷新帧所在缓存条目 / 帧存储任务目录的引用时间"""
+    if pin_entry_file(path):
+        return
+    try:
+        task_dir = path.parent
+        if task_dir.parent.resolve() == frame_store_root().resolve():
+            os.utime(task_dir)
+    except OSError:
+        pass
+
+
+def make_handle(path: Path) -> str:
+    """本地帧文件 → 句柄（同时 pin 住帧所在目录）"""
+    _pin(path)
+    return FRAME_HANDLE_PREFIX + path.resolve().as_posix()
+
+
+def handle_path(handle: str) -> Optional[Path]:
+    """句柄 → 本地帧文件；不在允许目录内 / 不存在时返回 None"""
+    if not is_frame_handle(handle):
+        return None
+    path = Path(handle[len(FRAME_HANDLE_PREFIX) :]).resolve()
+    if path.suffix.lower() not in _ALLOWED_SUFFIXES:
+        return None
+    roots = (frame_store_root().resolve(), cache_root().resolve())
+    if not any(path.is_relative_to(root) for root in roots):
+        logger.warning(f"[frame_store] 拒绝解析存储目录之外的帧句柄: {path}")
+        return None
+    if not path.is_file():
+        return None
+    _pin(path)
+    return path
+
+
+def persist_frames(paths: List[Path], task_id: str) -> List[Path]:
+    """
+    把临时目录中的帧文件移动到帧存储目录（同一文件系统内为 rename，不复制数据）。
+
+    顺带清理超过 FRAME_STORE_TTL_HOURS 的旧任务目录。
+    """
+    root = frame_store_root()
+    dest_dir = root / task_id
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    sweep_frame_store(root)
+
+    persisted = []
+    for path in paths:
+        dest = dest_dir / path.name
+        shutil.move(str(path), str(dest))
+        persisted.append(dest)
+    return persisted
+
+
+def sweep_frame_store(root: Optional[Path] = None) -> None:
+    """删除超过 TTL 的任务目录"""
+    root = root or frame_store_root()
+    ttl = frame_handle_ttl()
+    now = time.time()
+    for task_dir in root.iterdir():
+        try:
+            if task_dir.is_dir() and now - task_dir.stat().st_mtime > ttl:
+                shutil.rmtree(task_dir, ignore_errors=True)
+        except OSError:
+            continue
+
+
+@lru_cache(maxsize=128)
+def _encode_data_url(path_str: str, mtime_ns: int) -> str:
+    # mtime_ns 仅参与缓存键：文件被替换后重新编码
+    data = Path(path_str).read_bytes()
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode()}"
+
+
+def to_data_url(handle: str) -> Optional[str]:
+    """句柄 → data URL（惰性编码，结果按文件缓存）"""
+    path = handle_path(handle)
+    if path is None:
+        return None
+    return _encode_data_url(str(path), path.stat().st_mtime_ns)
+
+
+def resolve_frame_url(url: Optional[str]) -> Optional[str]:
+    """
+    统一的帧 URL 解析入口：句柄转换为 data URL（帧已清理时返回 None），
+    HTTP / data URL 原样返回。
+    """
+    if is_frame_handle(url):
+        resolved = to_data_url(url)
+        if resolved is None:
+            logger.warning(f"[frame_store] 帧句柄已失效: {url[:120]}")
+        return resolved
+    return url
@@ -0,0 +1,352 @@
+"""
+视频预处理结果的持久化缓存（内容寻址）
+
+同一条广告视频被不同会话反复拆解时，跳过下载 / 探测 / ASR / FFmpeg / TOS 上传。
+
+目录结构（默认 ./.media-cache/store，可通过 MEDIA_CACHE_DIR 覆盖）：
+  <root>/
+    urls/<sha1(规范化URL|ETag)>.json   → {"content_hash": "..."}  URL 别名
+    entries/<content_hash>/
+      manifest.json                     → 探测元数据、ASR、音频、各提取参数下的分镜结果
+      audio.mp3
+      <variant>/frames/*.jpg
+      <variant>/clips/*.mp4
+
+- 缓存键：本地文件按内容 SHA-256；远程 URL 先用「规范化 URL + ETag」查别名，
+  未命中则下载后按内容哈希二次查找（不同 URL 指向同一视频也能复用）。
+- 提取参数（帧数、切割模式等）不同的结果以 variant 区分，探测和 ASR 结果跨 variant 复用。
+- 签名 URL 只缓存 TOS 对象 key + 签名时间，临近过期时由调用方重新签名。
+- 总体积超过 MEDIA_CACHE_MAX_SIZE_MB 时按最近访问时间（LRU）淘汰；
+  超过 MEDIA_CACHE_TTL_DAYS 未访问的条目视为过期。
+- 本地帧句柄（frame://）引用条目内的帧文件时会刷新条目的 pin 时间（.frame-pin），
+  FRAME_STORE_TTL_HOURS 内被引用过的条目不淘汰，避免句柄解析时文件已被删除。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# 签名 URL 中随每次签名变化的查询参数（TOS / S3 风格），规范化时剔除
+_SIGNATURE_PARAMS = {
+    "x-tos-algorithm",
+    "x-tos-credential",
+    "x-tos-date",
+    "x-tos-expires",
+    "x-tos-signedheaders",
+    "x-tos-signature",
+    "x-tos-security-token",
+    "x-amz-algorithm",
+    "x-amz-credential",
+    "x-amz-date",
+    "x-amz-expires",
+    "x-amz-signedheaders",
+    "x-amz-signature",
+    "x-amz-security-token",
+    "expires",
+    "signature",
+}
+
+MANIFEST_NAME = "manifest.json"
+PIN_NAME = ".frame-pin"
+
+
+def normalize_url(url: str) -> str:
+    """规范化 URL：小写 scheme/host，去掉 fragment 和签名参数，查询参数排序"""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in _SIGNATURE_PARAMS
+    )
+    return urlunsplit(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path,
+            urlencode(query),
+            "",
+        )
+    )
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """流式计算文件 SHA-256（避免大视频整体读入内存）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def variant_key(params: Dict[str, Any]) -> str:
+    """提取参数 → 稳定的 variant 标识"""
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def is_signature_fresh(
+    signed_at: Optional[float], expires: int, margin: int = 86400
+) -> bool:
+    """签名 URL 是否在有效期内（预留 margin 秒，避免下游使用时刚好过期）"""
+    if not signed_at:
+        return False
+    return time.time() < signed_at + expires - margin
+
+
+class MediaCache:
+    """基于本地目录的视频预处理缓存"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_size_bytes: int = 5 * 1024 * 1024 * 1024,
+        ttl_seconds: int = 7 * 86400,
+        pin_ttl_seconds: float = 24 * 3600,
+    ):
+        self.root = Path(root)
+        self.max_size_bytes = max_size_bytes
+        self.ttl_seconds = ttl_seconds
+        self.pin_ttl_seconds = pin_ttl_seconds
+        self.urls_dir = self.root / "urls"
+        self.entries_dir = self.root / "entries"
+        self.urls_dir.mkdir(parents=True, exist_ok=True)
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+
+    # ==================== URL 别名 ====================
+
+    @staticmethod
+    def url_key(url: str, etag: Optional[str] = None) -> str:
+        """规范化 URL + ETag 的哈希（无 ETag 时仅按规范化 URL）"""
+        etag = (etag or "").strip().removeprefix("W/").strip('"')
+        raw = normalize_url(url) + "|" + etag
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def lookup_url(self, url_key: str) -> Optional[str]:
+        """URL 别名 → 内容哈希（条目已淘汰时返回 None）"""
+        alias = self.urls_dir / f"{url_key}.json"
+        try:
+            content_hash = json.loads(alias.read_text("utf-8")).get("content_hash")
+        except (OSError, ValueError):
+            return None
+        if content_hash and (self.entry_dir(content_hash) / MANIFEST_NAME).exists():
+            return content_hash
+        alias.unlink(missing_ok=True)
+        return None
+
+    def link_url(self, url_key: str, content_hash: str) -> None:
+        """记录 URL 别名"""
+        self._write_json(
+            self.urls_dir / f"{url_key}.json", {"content_hash": content_hash}
+        )
+
+    # ==================== 条目读写 ====================
+
+    def entry_dir(self, content_hash: str) -> Path:
+        return self.entries_dir / content_hash
+
+    def load(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """读取条目 manifest 并刷新访问时间；过期或损坏时删除并返回 None"""
+        entry = self.entry_dir(content_hash)
+        manifest_path = entry / MANIFEST_NAME
+        try:
+            manifest = json.loads(manifest_path.read_text("utf-8"))
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - manifest_path.stat().st_mtime > self.ttl_seconds and not (
+            self._pinned(entry)
+        ):
+            logger.info(f"[media_cache] 条目过期，删除: {content_hash[:12]}")
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        os.utime(manifest_path)
+        return manifest
+
+    def save(self, content_hash: str, manifest: Dict[str, Any]) -> None:
+        """原子写入 manifest（先写临时文件再 rename）"""
+        entry = self.entry_dir(content_hash)
+        entry.mkdir(parents=True, exist_ok=True)
+        manifest["content_hash"] = content_hash
+        self._write_json(entry / MANIFEST_NAME, manifest)
+
+    def store_file(self, content_hash: str, src: Path, rel_path: str) -> Path:
+        """把处理产物复制进条目目录，返回缓存内路径"""
+        dest = self.entry_dir(content_hash) / rel_path
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(str(src), str(dest))
+        return dest
+
+    # ==================== LRU 淘汰 ====================
+
+    def _pinned(self, entry: Path) -> bool:
+        """条目内的帧是否仍被句柄引用（pin 时间在 pin_ttl_seconds 内）"""
+        try:
+            pinned_at = (entry / PIN_NAME).stat().st_mtime
+        except OSError:
+            return False
+        return time.time() - pinned_at < self.pin_ttl_seconds
+
+    def evict(self) -> int:
+        """
+        按最近访问时间淘汰条目，直到总体积不超过上限；同时清理过期条目。
+        仍被帧句柄引用的条目跳过。
+
+        Returns:
+            被删除的条目数
+        """
+        now = time.time()
+        entries = []
+        total = 0
+        for entry in self.entries_dir.iterdir():
+            manifest_path = entry / MANIFEST_NAME
+            try:
+                last_access = manifest_path.stat().st_mtime
+            except OSError:
+                # 写入中断的残留目录
+                last_access = 0.0
+            size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+            entries.append((last_access, size, entry))
+            total += size
+
+        removed = 0
+        for last_access, size, entry in sorted(entries, key=lambda e: e[0]):
+            expired = now - last_access > self.ttl_seconds
+            if not expired and total <= self.max_size_bytes:
+                break
+            if self._pinned(entry):
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        if removed:
+            logger.info(
+                f"[media_cache] 淘汰 {removed} 个条目，剩余 {total / 1024 / 1024:.1f}MB"
+            )
+        return removed
+
+    @staticmethod
+    def _write_json(path: Path, data: Dict[str, Any]) -> None:
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def media_temp_base() -> Path:
+    """媒体临时文件根目录（FFMPEG_MEDIA_TEMP_DIR / MEDIA_TEMP_DIR）"""
+    return Path(
+        os.getenv("FFMPEG_MEDIA_TEMP_DIR")
+        or os.getenv("MEDIA_TEMP_DIR", "./.media-cache")
+    )
+
+
+def cache_ttl_seconds() -> float:
+    """缓存过期时间（MEDIA_CACHE_TTL_DAYS，默认 7 天），单位秒"""
+    return float(os.getenv("MEDIA_CACHE_TTL_DAYS", "7")) * 86400
+
+
+def prune_files(
+    directory: Path, pattern: str, max_size_bytes: int, ttl_seconds: float
+) -> int:
+    """
+    淘汰目录下的平铺缓存文件（规则同 MediaCache.evict，按 mtime 作为最近访问时间）：
+    过期文件删除，总体积超过上限时从最久未访问的开始删除
+
+    Returns:
+        被删除的文件数
+    """
+    now = time.time()
+    files = []
+    total = 0
+    for path in Path(directory).glob(pattern):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    removed = 0
+    for last_access, size, path in sorted(files, key=lambda f: f[0]):
+        if now - last_access <= ttl_seconds and total <= max_size_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+
+    if removed:
+        logger.info(
+            f"[media_cache] {directory} 淘汰 {removed} 个文件，"
+            f"剩余 {total / 1024 / 1024:.1f}MB"
+        )
+    return removed
+
+
+def frame_handle_ttl() -> float:
+    """本地帧句柄有效期（FRAME_STORE_TTL_HOURS，默认 24 小时），单位秒"""
+    return float(os.getenv("FRAME_STORE_TTL_HOURS", "24")) * 3600
+
+
+def cache_root() -> Path:
+    """缓存根目录（MEDIA_CACHE_DIR，默认 <媒体临时目录>/store）"""
+    return Path(os.getenv("MEDIA_CACHE_DIR") or media_temp_base() / "store")
+
+
+def pin_entry_file(path: Path) -> bool:
+    """
+    帧句柄引用缓存条目内的文件时刷新条目 pin 时间
+
+    Returns:
+        path 是否位于缓存条目内
+    """
+    entries_dir = (cache_root() / "entries").resolve()
+    try:
+        content_hash = Path(path).resolve().relative_to(entries_dir).parts[0]
+    except (ValueError, IndexError):
+        return False
+    try:
+        (entries_dir / content_hash / PIN_NAME).touch()
+    except OSError as exc:
+        logger.debug(f"[media_cache] 刷新 pin 失败: {exc}")
+    return True
+
+
+def get_media_cache() -> Optional[MediaCache]:
+    """
+    按环境变量创建缓存实例（MEDIA_CACHE_ENABLED=false 时返回 None）
+
+    环境变量（VeADK 扁平化 media_cache.* → MEDIA_CACHE_*）：
+      MEDIA_CACHE_ENABLED     默认 true
+      MEDIA_CACHE_DIR         默认 <FFMPEG_MEDIA_TEMP_DIR>/store
+      MEDIA_CACHE_MAX_SIZE_MB 默认 5120
+      MEDIA_CACHE_TTL_DAYS    默认 7（与 TOS 签名 URL 最长有效期一致）
+      FRAME_STORE_TTL_HOURS   帧句柄有效期，期间被引用的条目不淘汰，默认 24
+    """
+    if os.getenv("MEDIA_CACHE_ENABLED", "true").strip().lower() in (
+        "0",
+        "false",
+        "no",
+    ):
+        return None
+
+    try:
+        return MediaCache(
+            root=cache_root(),
+            max_size_bytes=int(os.getenv("MEDIA_CACHE_MAX_SIZE_MB", "5120"))
+            * 1024
+            * 1024,
+            ttl_seconds=int(cache_ttl_seconds()),
+            pin_ttl_seconds=frame_handle_ttl(),
+        )
+    except OSError as exc:
+        logger.warning(f"[media_cache] 缓存目录不可用，禁用缓存: {exc}")
+        return None
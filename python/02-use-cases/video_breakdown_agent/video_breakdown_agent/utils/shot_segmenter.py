@@ -0,0 +1,186 @@
+"""
+镜头切换（shot boundary）感知的分镜切分
+
+固定时长分镜（0-3s / 3-5s / 5-10s / 10-20s / 之后每 10s）经常横跨真实剪辑点，
+导致同一分镜的关键帧来自两个不同镜头。本模块用 FFmpeg 的 scene 分数单次解码检测剪辑点：
+
+  ffmpeg -i video -an -vf "scale=160:-2,select='gt(scene,T)',showinfo" -f null -
+
+先缩放到 160px 宽再计算帧间差异，解码一次即可得到全部剪辑点时间戳。
+检测结果再按最短/最长分镜时长合并、拆分，保证分镜首尾相接覆盖全片。
+
+切分方式由 SEGMENTER_MODE 选择：
+  - scene（默认）：镜头检测，检测失败或未发现剪辑点时回退 fixed
+  - fixed：原固定时长方案
+"""
+
+import logging
+import os
+import re
+import subprocess
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PTS_TIME_RE = re.compile(r"pts_time:\s*([0-9]+(?:\.[0-9]+)?)")
+
+# 固定时长方案的前段切点（秒），之后每 FIXED_TAIL_WINDOW 秒一段
+FIXED_BREAKPOINTS = [0.0, 3.0, 5.0, 10.0, 20.0]
+FIXED_TAIL_WINDOW = 10.0
+
+# 短于该时长的尾段直接丢弃（与原固定方案一致）
+MIN_TAIL = 0.5
+
+
+def fixed_bounds(duration: float) -> List[Tuple[float, float]]:
+    """
+    固定时长分镜方案：
+    - 0-3s, 3-5s, 5-10s, 10-20s, 之后每10s一段
+    """
+    bounds: List[Tuple[float, float]] = []
+
+    for i in range(len(FIXED_BREAKPOINTS) - 1):
+        start = FIXED_BREAKPOINTS[i]
+        end = FIXED_BREAKPOINTS[i + 1]
+        if duration <= start:
+            break
+        actual_end = min(end, duration)
+        if actual_end - start < MIN_TAIL:
+            break
+        bounds.append((start, actual_end))
+
+    cursor = FIXED_BREAKPOINTS[-1]
+    while cursor < duration:
+        candidate_end = min(duration, cursor + FIXED_TAIL_WINDOW)
+        if candidate_end - cursor < MIN_TAIL:
+            break
+        bounds.append((cursor, candidate_end))
+        cursor = candidate_end
+
+    return bounds
+
+
+def detect_scene_cuts(
+    ffmpeg_bin: str,
+    video_path: str,
+    threshold: float = 0.3,
+    analysis_width: int = 160,
+) -> List[float]:
+    """
+    单次解码检测镜头切换时间点（秒，升序）。
+
+    Args:
+        threshold: scene 分数阈值（0-1），越小越敏感；广告快剪建议 0.25-0.4
+        analysis_width: 计算帧差前的缩放宽度，越小越快
+
+    Raises:
+        subprocess.CalledProcessError: FFmpeg 执行失败
+    """
+    vf = f"scale={analysis_width}:-2,select='gt(scene,{threshold})',showinfo"
+    cmd = [
+        ffmpeg_bin,
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        str(video_path),
+        "-an",
+        "-sn",
+        "-vf",
+        vf,
+        "-f",
+        "null",
+        "-",
+    ]
+    process = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    cuts = sorted(
+        {
+            round(float(m.group(1)), 3)
+            for line in process.stderr.splitlines()
+            if "showinfo" in line
+            for m in [_PTS_TIME_RE.search(line)]
+            if m
+        }
+    )
+    return cuts
+
+
+def plan_bounds(
+    duration: float,
+    cuts: List[float],
+    min_len: float = 1.0,
+    max_len: float = 10.0,
+) -> List[Tuple[float, float]]:
+    """
+    剪辑点 → 首尾相接的分镜区间。
+
+    - 与上一切点间隔小于 min_len 的剪辑点被合并（快闪镜头并入前一分镜）
+    - 长于 max_len 的镜头均分为多段，避免单段关键帧覆盖过长
+    - 末段短于 min_len 时并入前一分镜
+    """
+    points = [0.0]
+    for cut in cuts:
+        if cut - points[-1] >= min_len and duration - cut >= min_len:
+            points.append(cut)
+    points.append(duration)
+
+    bounds: List[Tuple[float, float]] = []
+    for start, end in zip(points, points[1:]):
+        length = end - start
+        pieces = max(1, int(-(-length // max_len)))  # ceil
+        step = length / pieces
+        for i in range(pieces):
+            piece_start = start + i * step
+            piece_end = end if i == pieces - 1 else start + (i + 1) * step
+            bounds.append((round(piece_start, 3), round(piece_end, 3)))
+
+    return bounds
+
+
+def resolve_segmenter_config() -> dict:
+    """读取切分配置（VeADK 扁平化 segmenter.* → SEGMENTER_*）"""
+    mode = (os.getenv("SEGMENTER_MODE") or "scene").strip().lower()
+    if mode not in ("scene", "fixed"):
+        logger.warning(f"未知 SEGMENTER_MODE={mode}，使用 scene")
+        mode = "scene"
+    return {
+        "mode": mode,
+        "threshold": float(os.getenv("SEGMENTER_SCENE_THRESHOLD", "0.3")),
+        "min_len": float(os.getenv("SEGMENTER_MIN_SEGMENT_SEC", "1.0")),
+        "max_len": float(os.getenv("SEGMENTER_MAX_SEGMENT_SEC", "10.0")),
+    }
+
+
+def segment_bounds(
+    ffmpeg_bin: str,
+    video_path: str,
+    duration: float,
+    config: dict,
+) -> Tuple[List[Tuple[float, float]], str]:
+    """
+    按配置切分分镜。
+
+    Returns:
+        (分镜区间列表, 实际使用的方案 scene / fixed)
+    """
+    if config["mode"] == "scene":
+        try:
+            cuts = detect_scene_cuts(ffmpeg_bin, video_path, config["threshold"])
+        except (subprocess.CalledProcessError, OSError) as exc:
+            stderr = getattr(exc, "stderr", None)
+            logger.warning(
+                f"镜头检测失败，回退固定时长分镜: {stderr[-300:] if stderr else exc}"
+            )
+            cuts = []
+        if cuts:
+            bounds = plan_bounds(duration, cuts, config["min_len"], config["max_len"])
+            logger.info(f"镜头检测: {len(cuts)} 个剪辑点 → {len(bounds)} 个分镜")
+            return bounds, "scene"
+        logger.info("未检测到剪辑点，使用固定时长分镜")
+
+    return fixed_bounds(duration), "fixed"
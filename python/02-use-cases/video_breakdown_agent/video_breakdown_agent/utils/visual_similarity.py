@@ -0,0 +1,358 @@
+"""
+本地视觉相似度评分（纯 CPU，无需 LLM）
+
+对比原片与复刻视频对应分镜的采样帧：
+  1. 感知哈希（dHash）：8×8 块均值的水平 + 垂直梯度符号，共 112 bit，按汉明距离计分
+  2. 颜色分布：RGB 4×4×4 联合直方图交集
+  3. 结构：16×16 灰度块均值的零均值归一化相关系数（全局 SSIM 的近似）
+
+各指标按「无关画面」的期望值做机会校正：无关帧 ≈ 0、相同帧 = 1。
+  - 哈希：Cohen's kappa（按两帧各自的 1 bit 比例计算偶然一致率）
+  - 结构：相关系数取正部分（无关帧相关系数 ≈ 0）
+  - 颜色：直方图交集按无关帧基线 COLOR_BASELINE 线性缩放
+未校正时两张无关随机帧的综合分约 0.6，与「差异较大」阈值重合；校正后无关帧综合分
+中位数约 0.2，裁剪 / 调色后的同一画面在 0.35 以上（WEAK_SEGMENT_SCORE）。
+
+帧统一由 FFmpeg 解码为 64×64 rgb24 原始像素（rawvideo 管道），不依赖 Pillow / OpenCV；
+所有指标在 NumPy 中对整批帧向量化计算。
+
+原片一侧直接使用 process_video 已抽取的关键帧（frame_urls），特征按帧 URL 缓存
+（内存 + <媒体临时目录>/similarity/*.npz），每轮评估只需解码新生成的复刻视频。
+内存缓存按 LRU 保留 SIMILARITY_MEMO_SIZE 组；磁盘缓存每次写入后按
+SIMILARITY_CACHE_MAX_SIZE_MB / MEDIA_CACHE_TTL_DAYS 淘汰最久未使用的文件。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import subprocess
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from video_breakdown_agent.utils.frame_store import handle_path, is_frame_handle
+from video_breakdown_agent.utils.media_cache import (
+    cache_ttl_seconds,
+    media_temp_base,
+    normalize_url,
+    prune_files,
+)
+
+logger = logging.getLogger(__name__)
+
+FRAME_SIZE = 64
+DECODE_FPS = 4
+
+# 综合得分权重：感知哈希 / 颜色 / 结构（颜色直方图不含位置信息，区分度最低）
+SCORE_WEIGHTS = {"hash": 0.4, "color": 0.2, "structure": 0.4}
+
+# 无关画面的颜色直方图交集基线（自然画面约 0.3-0.6，纯噪声约 0.9）
+COLOR_BASELINE = 0.5
+
+# 校正后综合分低于该值的分镜视为与原片差异较大
+WEAK_SEGMENT_SCORE = 0.35
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+_FEATURE_MEMO: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+
+
+# ==================== 帧解码 ====================
+
+
+def _read_raw_frames(cmd: List[str]) -> np.ndarray:
+    """执行 FFmpeg 并把 rawvideo rgb24 输出还原为 (N, H, W, 3) uint8"""
+    process = subprocess.run(cmd, capture_output=True, check=True)
+    frame_bytes = FRAME_SIZE * FRAME_SIZE * 3
+    count = len(process.stdout) // frame_bytes
+    return np.frombuffer(process.stdout[: count * frame_bytes], dtype=np.uint8).reshape(
+        count, FRAME_SIZE, FRAME_SIZE, 3
+    )
+
+
+def decode_images(ffmpeg_bin: str, sources: Sequence[str]) -> np.ndarray:
+    """
+    一次 FFmpeg 调用解码多张图片（关键帧 URL / 本地路径）
+
+    Returns:
+        (len(sources), 64, 64, 3) uint8
+    """
+    cmd = [ffmpeg_bin, "-v", "error"]
+    for src in sources:
+        cmd += ["-i", src]
+    scaled = ";".join(
+        f"[{i}:v]scale={FRAME_SIZE}:{FRAME_SIZE}:flags=area,setsar=1,format=rgb24[f{i}]"
+        for i in range(len(sources))
+    )
+    concat_inputs = "".join(f"[f{i}]" for i in range(len(sources)))
+    graph = f"{scaled};{concat_inputs}concat=n={len(sources)}:v=1:a=0[out]"
+    cmd += ["-filter_complex", graph, "-map", "[out]", "-f", "rawvideo", "-"]
+    return _read_raw_frames(cmd)
+
+
+def decode_video(
+    ffmpeg_bin: str,
+    source: str,
+    start: float = 0.0,
+    end: Optional[float] = None,
+    fps: float = DECODE_FPS,
+) -> np.ndarray:
+    """按固定帧率解码视频（或其中一段）为 64×64 小图"""
+    cmd = [ffmpeg_bin, "-v", "error"]
+    if start > 0:
+        cmd += ["-ss", f"{start:.3f}"]
+    if end is not None:
+        cmd += ["-t", f"{max(end - start, 0.1):.3f}"]
+    cmd += [
+        "-i",
+        source,
+        "-an",
+        "-vf",
+        f"fps={fps},scale={FRAME_SIZE}:{FRAME_SIZE}:flags=area,format=rgb24",
+        "-f",
+        "rawvideo",
+        "-",
+    ]
+    return _read_raw_frames(cmd)
+
+
+def pick_positions(frames: np.ndarray, positions: Sequence[float]) -> np.ndarray:
+    """按相对位置（0-1）从解码序列中取帧"""
+    if len(frames) == 0:
+        return frames
+    idx = np.clip(
+        np.rint(np.asarray(positions) * (len(frames) - 1)).astype(int),
+        0,
+        len(frames) - 1,
+    )
+    return frames[idx]
+
+
+def keyframe_positions(count: int) -> np.ndarray:
+    """与 process_video 关键帧采样一致的相对位置（首尾 + 均匀分布）"""
+    return np.linspace(0.0, 1.0, count) if count > 1 else np.array([0.5])
+
+
+# ==================== 特征提取 ====================
+
+
+def _block_mean(gray: np.ndarray, blocks: int) -> np.ndarray:
+    n, h, w = gray.shape
+    return gray.reshape(n, blocks, h // blocks, blocks, w // blocks).mean(axis=(2, 4))
+
+
+def frame_features(frames: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    批量计算帧特征
+
+    Returns:
+        hash: (N, 112) bool；color: (N, 64) float32；structure: (N, 256) float32
+    """
+    rgb = frames.astype(np.float32)
+    gray = rgb @ _LUMA
+
+    coarse = _block_mean(gray, 8)
+    dhash = np.concatenate(
+        [
+            (coarse[:, :, 1:] > coarse[:, :, :-1]).reshape(len(frames), -1),
+            (coarse[:, 1:, :] > coarse[:, :-1, :]).reshape(len(frames), -1),
+        ],
+        axis=1,
+    )
+
+    q = frames >> 6
+    bins = (q[..., 0].astype(np.int64) * 16 + q[..., 1] * 4 + q[..., 2]).reshape(
+        len(frames), -1
+    )
+    bins += np.arange(len(frames))[:, None] * 64
+    color = np.bincount(bins.ravel(), minlength=64 * len(frames)).reshape(-1, 64)
+    color = color.astype(np.float32) / (FRAME_SIZE * FRAME_SIZE)
+
+    fine = _block_mean(gray, 16).reshape(len(frames), -1)
+    fine -= fine.mean(axis=1, keepdims=True)
+    norm = np.linalg.norm(fine, axis=1, keepdims=True)
+    structure = np.divide(fine, norm, out=np.zeros_like(fine), where=norm > 1e-6)
+
+    return {"hash": dhash, "color": color, "structure": structure}
+
+
+def compare_features(
+    original: Dict[str, np.ndarray], recreated: Dict[str, np.ndarray]
+) -> Dict[str, np.ndarray]:
+    """逐帧对比两组等长特征，返回机会校正后的各指标及加权综合得分（0-1）"""
+    agree = (original["hash"] == recreated["hash"]).mean(axis=1)
+    p = original["hash"].mean(axis=1)
+    q = recreated["hash"].mean(axis=1)
+    chance = p * q + (1.0 - p) * (1.0 - q)
+    kappa = np.divide(
+        agree - chance,
+        1.0 - chance,
+        out=(agree == 1.0).astype(np.float64),
+        where=chance < 1.0 - 1e-6,
+    )
+    hash_sim = np.clip(kappa, 0.0, 1.0)
+
+    intersection = np.minimum(original["color"], recreated["color"]).sum(axis=1)
+    color_sim = np.clip(
+        (intersection - COLOR_BASELINE) / (1.0 - COLOR_BASELINE), 0.0, 1.0
+    )
+
+    corr = (original["structure"] * recreated["structure"]).sum(axis=1)
+    structure_sim = np.clip(corr, 0.0, 1.0)
+    combined = (
+        SCORE_WEIGHTS["hash"] * hash_sim
+        + SCORE_WEIGHTS["color"] * color_sim
+        + SCORE_WEIGHTS["structure"] * structure_sim
+    )
+    return {
+        "hash": hash_sim,
+        "color": color_sim,
+        "structure": structure_sim,
+        "combined": combined,
+    }
+
+
+# ==================== 原片特征缓存 ====================
+
+
+def _cache_dir() -> Path:
+    return Path(os.getenv("SIMILARITY_CACHE_DIR") or media_temp_base() / "similarity")
+
+
+def _memo_put(key: str, features: Dict[str, np.ndarray]) -> None:
+    _FEATURE_MEMO[key] = features
+    _FEATURE_MEMO.move_to_end(key)
+    limit = max(int(os.getenv("SIMILARITY_MEMO_SIZE", "128")), 1)
+    while len(_FEATURE_MEMO) > limit:
+        _FEATURE_MEMO.popitem(last=False)
+
+
+def _prune_cache(cache_dir: Path) -> None:
+    max_size_mb = float(os.getenv("SIMILARITY_CACHE_MAX_SIZE_MB", "256"))
+    try:
+        prune_files(
+            cache_dir, "*.npz", int(max_size_mb * 1024 * 1024), cache_ttl_seconds()
+        )
+    except OSError as e:
+        logger.warning(f"[visual_similarity] 清理特征缓存失败: {e}")
+
+
+def _frame_source(url: str) -> Optional[str]:
+    """帧 URL / 本地句柄 → FFmpeg 可读取的输入"""
+    if is_frame_handle(url):
+        path = handle_path(url)
+        return str(path) if path else None
+    return url
+
+
+def original_features(
+    ffmpeg_bin: str, frame_urls: Sequence[str]
+) -> Optional[Dict[str, np.ndarray]]:
+    """
+    原片关键帧特征（按规范化帧 URL 缓存，签名刷新不影响命中）
+    """
+    key_raw = json.dumps(
+        [normalize_url(u) if not is_frame_handle(u) else u for u in frame_urls]
+    )
+    key = hashlib.sha1(key_raw.encode("utf-8")).hexdigest()
+    if key in _FEATURE_MEMO:
+        _FEATURE_MEMO.move_to_end(key)
+        return _FEATURE_MEMO[key]
+
+    cache_file = _cache_dir() / f"{key}.npz"
+    if cache_file.exists():
+        try:
+            with np.load(cache_file) as data:
+                features = {name: data[name] for name in data.files}
+            # 刷新 mtime 作为最近访问时间，淘汰时按 LRU 保留
+            os.utime(cache_file)
+            _memo_put(key, features)
+            return features
+        except (OSError, ValueError) as e:
+            logger.warning(f"[visual_similarity] 缓存损坏，重新计算: {e}")
+
+    sources = [_frame_source(u) for u in frame_urls]
+    if not sources or any(s is None for s in sources):
+        return None
+    frames = decode_images(ffmpeg_bin, sources)
+    if len(frames) != len(sources):
+        return None
+
+    features = frame_features(frames)
+    _memo_put(key, features)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(cache_file, **features)
+    except OSError as e:
+        logger.warning(f"[visual_similarity] 写入特征缓存失败: {e}")
+    else:
+        _prune_cache(cache_file.parent)
+    return features
+
+
+# ==================== 分镜对比 ====================
+
+
+def score_segment(
+    ffmpeg_bin: str,
+    original_frame_urls: Sequence[str],
+    recreated_source: str,
+    start: float = 0.0,
+    end: Optional[float] = None,
+) -> Optional[Dict[str, float]]:
+    """
+    原片分镜关键帧 vs 复刻视频（或其中一段）在相同相对位置的采样帧
+
+    Returns:
+        {"hash", "color", "structure", "combined"} 各项均值（0-1），
+        附带 duration（按解码帧数估算的复刻时长）；无法对比时返回 None
+    """
+    original = original_features(ffmpeg_bin, original_frame_urls)
+    if original is None:
+        return None
+
+    frames = decode_video(ffmpeg_bin, recreated_source, start, end)
+    if len(frames) == 0:
+        return None
+    sampled = pick_positions(frames, keyframe_positions(len(original_frame_urls)))
+    scores = compare_features(original, frame_features(sampled))
+    result = {name: round(float(values.mean()), 4) for name, values in scores.items()}
+    result["duration"] = round(len(frames) / DECODE_FPS, 2)
+    return result
+
+
+def score_timeline(
+    ffmpeg_bin: str,
+    original_segments: Sequence[Dict],
+    recreated_source: str,
+) -> Optional[Dict]:
+    """
+    只有拼接后的整片时：一次解码复刻视频，按原片分镜在总时长中的比例映射位置逐段对比。
+
+    Args:
+        original_segments: [{"frame_urls": [...], "start": float, "end": float}]
+
+    Returns:
+        {"segments": {序号: 得分dict}, "duration": 复刻视频时长估算}；无法对比时返回 None
+    """
+    frames = decode_video(ffmpeg_bin, recreated_source)
+    total = max((s["end"] for s in original_segments), default=0.0)
+    if len(frames) == 0 or total <= 0:
+        return None
+
+    results = {}
+    for position, seg in enumerate(original_segments, start=1):
+        original = original_features(ffmpeg_bin, seg["frame_urls"])
+        if original is None:
+            continue
+        relative = keyframe_positions(len(seg["frame_urls"]))
+        timeline = (seg["start"] + relative * (seg["end"] - seg["start"])) / total
+        scores = compare_features(
+            original, frame_features(pick_positions(frames, timeline))
+        )
+        results[position] = {
+            name: round(float(values.mean()), 4) for name, values in scores.items()
+        }
+    return {"segments": results, "duration": len(frames) / DECODE_FPS}
@@ -13,14 +13,26 @@
 # limitations under the License.
 
 import argparse
+import hashlib
+import json
 import logging
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from urllib.parse import unquote, urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from tos.utils import Crc64
+except ImportError:  # tos SDK is optional here; CRC64 checks are skipped without it
+    Crc64 = None
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -33,20 +45,362 @@ if not logger.handlers:
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
+# Files downloaded in parallel
+DEFAULT_WORKERS = int(os.getenv("FILE_DOWNLOAD_WORKERS", 4))
+# Files at least this large are fetched as parallel byte ranges when the server supports it
+SEGMENT_THRESHOLD = int(os.getenv("FILE_DOWNLOAD_SEGMENT_THRESHOLD", 64 * 1024 * 1024))
+SEGMENTS = int(os.getenv("FILE_DOWNLOAD_SEGMENTS", 4))
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+_sessions: dict = {}
+_sessions_lock = threading.Lock()
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    index: int = 0
+    path: Optional[str] = None
+    error: Optional[str] = None
+    size: int = 0
+    seconds: float = 0.0
+    resumed: bool = False
+    segmented: bool = False
+
+
+class _RemoteChanged(IOError):
+    """The server answered a conditional range request with the full (changed) file"""
+
+
+def _get_session(url: str, pool_size: Optional[int] = None) -> requests.Session:
+    """
+    One pooled session per host; the pool is grown to pool_size, the number of
+    requests that may hit the host at once (files in parallel x segments per file)
+    """
+    host = urlparse(url).netloc
+    pool_size = max(pool_size or DEFAULT_WORKERS * SEGMENTS, 1)
+    with _sessions_lock:
+        session, size = _sessions.get(host, (None, 0))
+        if session is None:
+            session = requests.Session()
+            # Byte offsets must refer to the stored representation
+            session.headers["Accept-Encoding"] = "identity"
+        if size < pool_size:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            size = pool_size
+        _sessions[host] = (session, size)
+        return session
+
+
+def _chunk_size(total: Optional[int]) -> int:
+    """Larger chunks for larger files: ~64 chunks per file, within 64 KB - 1 MB"""
+    if not total:
+        return 4 * MIN_CHUNK_SIZE
+    return min(max(total // 64, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+
+def _resource_id(url: str) -> str:
+    # Signed URLs change their query string on every refresh
+    parsed = urlparse(url)
+    return f"{parsed.netloc}{parsed.path}"
+
+
+def _load_meta(meta_path: Path) -> dict:
+    try:
+        return json.loads(meta_path.read_text("utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_meta(meta_path: Path, meta: dict):
+    meta_path.write_text(json.dumps(meta), "utf-8")
+
+
+def _verify(path: Path, checksum: Optional[str], crc64: Optional[str]):
+    """Check an explicit "algo:hex" checksum and/or the TOS CRC64 header"""
+    digest = None
+    crc = None
+    if checksum:
+        algo, _, expected = checksum.partition(":")
+        digest = hashlib.new(algo.lower())
+    if crc64 is not None and Crc64 is not None:
+        crc = Crc64()
+    if digest is None and crc is None:
+        return
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(MAX_CHUNK_SIZE), b""):
+            if digest is not None:
+                digest.update(chunk)
+            if crc is not None:
+                crc.update(chunk)
+    if digest is not None and digest.hexdigest() != expected.lower():
+        raise ValueError(f"Checksum mismatch: expected {checksum}")
+    if crc is not None and crc.crc != int(crc64):
+        raise ValueError(f"CRC64 mismatch: expected {crc64}, got {crc.crc}")
+
+
+def _download_segments(
+    session: requests.Session, url: str, part_path: Path, meta_path: Path, meta: dict
+):
+    """Fetch the missing byte ranges in parallel into a preallocated part file"""
+    total = meta["size"]
+    if not meta.get("segments"):
+        step = -(-total // SEGMENTS)
+        meta["segments"] = [
+            [start, min(start + step, total) - 1, False]
+            for start in range(0, total, step)
+        ]
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+        _save_meta(meta_path, meta)
+    meta_lock = threading.Lock()
+
+    def fetch(segment):
+        start, end, done = segment
+        if done:
+            return
+        headers = {"Range": f"bytes={start}-{end}", "If-Range": meta["validator"]}
+        with session.get(url, headers=headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise _RemoteChanged("Remote file changed or range not honored")
+            written = 0
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=_chunk_size(total)):
+                    f.write(chunk)
+                    written += len(chunk)
+        if written != end - start + 1:
+            raise IOError(f"Incomplete range {start}-{end}: {written} bytes")
+        with meta_lock:
+            segment[2] = True
+            _save_meta(meta_path, meta)
+
+    pending = [segment for segment in meta["segments"] if not segment[2]]
+    with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as executor:
+        for future in [executor.submit(fetch, segment) for segment in pending]:
+            future.result()
+
+
+def _resume_segments(
+    session: requests.Session, url: str, part_path: Path, meta_path: Path, meta: dict
+) -> bool:
+    """
+    Finish an interrupted segmented download. If the remote file changed since,
+    drop the partial files and clear meta so the caller starts over; returns
+    whether the download was resumed
+    """
+    try:
+        _download_segments(session, url, part_path, meta_path, meta)
+    except _RemoteChanged:
+        logger.info(f"Remote file changed, restarting download: {url}")
+        part_path.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+        meta.clear()
+        return False
+    return True
+
+
+def _download_to(
+    url: str,
+    full_path: Path,
+    checksum: Optional[str] = None,
+    pool_size: Optional[int] = None,
+) -> DownloadResult:
+    """
+    Download url into full_path via "<name>.part", resuming an earlier partial
+    download when the remote file is unchanged (ETag / Last-Modified)
+    """
+    started = time.monotonic()
+    result = DownloadResult(url=url)
+    part_path = full_path.with_name(full_path.name + ".part")
+    meta_path = full_path.with_name(full_path.name + ".part.json")
+    session = _get_session(url, pool_size)
+
+    meta = _load_meta(meta_path) if part_path.exists() else {}
+    if meta.get("resource") != _resource_id(url) or not meta.get("validator"):
+        meta = {}
+
+    if meta.get("segments") and _resume_segments(
+        session, url, part_path, meta_path, meta
+    ):
+        result.resumed = result.segmented = True
+    elif meta and part_path.stat().st_size == meta.get("size"):
+        # Finished earlier but not yet moved into place
+        result.resumed = True
+    else:
+        offset = part_path.stat().st_size if meta else 0
+        headers = {}
+        if offset:
+            headers = {"Range": f"bytes={offset}-", "If-Range": meta["validator"]}
+        with session.get(url, headers=headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # Fresh download, or the file changed since the partial one
+                offset = 0
+            length = response.headers.get("Content-Length")
+            total = offset + int(length) if length is not None else None
+            meta = {
+                "resource": _resource_id(url),
+                "validator": response.headers.get("ETag")
+                or response.headers.get("Last-Modified"),
+                "size": total,
+                "crc64": response.headers.get("x-tos-hash-crc64ecma"),
+            }
+            segmented = (
+                offset == 0
+                and total is not None
+                and total >= SEGMENT_THRESHOLD
+                and SEGMENTS > 1
+                and meta["validator"]
+                and response.headers.get("Accept-Ranges") == "bytes"
+            )
+            if not segmented:
+                result.resumed = offset > 0
+                _save_meta(meta_path, meta)
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=_chunk_size(total)):
+                        f.write(chunk)
+        if segmented:
+            result.segmented = True
+            _download_segments(session, url, part_path, meta_path, meta)
+
+    size = part_path.stat().st_size
+    if meta.get("size") is not None and size != meta["size"]:
+        raise IOError(f"Incomplete download: {size} of {meta['size']} bytes")
+    try:
+        _verify(part_path, checksum, meta.get("crc64"))
+    except ValueError:
+        part_path.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+        raise
+    os.replace(part_path, full_path)
+    meta_path.unlink(missing_ok=True)
+
+    result.path = str(full_path.absolute())
+    result.size = size
+    result.seconds = round(time.monotonic() - started, 3)
+    return result
+
+
+def _resolve_target(
+    url: str, save_dir: str, filename: Optional[str], reserved: set
+) -> Path:
+    # Ensure save directory exists
+    save_path = Path(save_dir)
+    save_path.mkdir(parents=True, exist_ok=True)
+
+    # Determine filename
+    if filename is None:
+        # Extract filename from URL
+        parsed_url = urlparse(url)
+        filename = unquote(os.path.basename(parsed_url.path))
+
+        # If no filename in URL, use default name
+        if not filename or filename == "/":
+            filename = "downloaded_file"
+
+    # Full file path
+    full_path = save_path / filename
+
+    # If file exists (or another download in this batch targets it), add counter to avoid overwriting
+    counter = 1
+    original_stem = full_path.stem
+    original_suffix = full_path.suffix
+    while full_path.exists() or full_path in reserved:
+        filename = f"{original_stem}_{counter}{original_suffix}"
+        full_path = save_path / filename
+        counter += 1
+    reserved.add(full_path)
+    return full_path
+
+
+def iter_file_download(
+    url: List[str],
+    save_dir: Optional[str] = None,
+    filename: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    checksums: Optional[List[Optional[str]]] = None,
+) -> Iterator[DownloadResult]:
+    """
+    Download files concurrently and yield a DownloadResult as each one finishes
+
+    Args:
+        url: List of file URLs
+        save_dir: Save directory, defaults to /tmp
+        filename: List of filenames to save; if None, filenames will be extracted from URLs
+        workers: Files downloaded in parallel, defaults to FILE_DOWNLOAD_WORKERS (4)
+        checksums: Optional "sha256:<hex>" / "md5:<hex>" per URL (None entries are skipped)
+    """
+    save_dir = save_dir or "/tmp"
+    filenames = filename or [None] * len(url)
+    checksums = checksums or [None] * len(url)
+    reserved: set = set()
+    targets = [
+        _resolve_target(url_item, save_dir, filename_item, reserved)
+        for url_item, filename_item in zip(url, filenames)
+    ]
+
+    def run(
+        index: int, url_item: str, target: Path, checksum: Optional[str]
+    ) -> DownloadResult:
+        logger.info(f"Downloading: {url_item}")
+        try:
+            result = _download_to(url_item, target, checksum, pool_size)
+        except Exception as e:
+            return DownloadResult(
+                url=url_item, index=index, error=f"Download failed: {e}"
+            )
+        result.index = index
+        logger.info(
+            f"Downloaded: {result.path} ({result.size} bytes in {result.seconds}s"
+            + (", resumed" if result.resumed else "")
+            + (", segmented" if result.segmented else "")
+            + ")"
+        )
+        return result
+
+    workers = max(workers or DEFAULT_WORKERS, 1)
+    # Every file may fetch SEGMENTS ranges at once, all of them possibly on one host
+    pool_size = workers * max(SEGMENTS, 1)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run, index, url_item, target, checksum)
+            for index, (url_item, target, checksum) in enumerate(
+                zip(url, targets, checksums)
+            )
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
 
 def file_download(
-    url: List[str], save_dir: Optional[str] = None, filename: Optional[List[str]] = None
+    url: List[str],
+    save_dir: Optional[str] = None,
+    filename: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    checksums: Optional[List[Optional[str]]] = None,
 ) -> List[str]:
     """
     Batch download files from the internet to local storage, supporting simultaneous download of multiple URLs to avoid agent loop calls
 
+    Files are downloaded concurrently; interrupted downloads resume from their
+    ".part" file on the next call.
+
     Args:
         url: List of file URLs (can be a single-URL list or multiple URLs)
         save_dir: Save directory, defaults to /tmp
         filename: List of filenames to save; if None, filenames will be extracted from URLs
+        workers: Files downloaded in parallel, defaults to FILE_DOWNLOAD_WORKERS (4)
+        checksums: Optional "sha256:<hex>" / "md5:<hex>" per URL
 
     Returns:
-        List[str]: List of absolute paths to downloaded files
+        List[str]: List of absolute paths to downloaded files (in input order)
 
     Raises:
         requests.exceptions.RequestException: Network request failure
@@ -69,29 +423,30 @@ def file_download(
         raise ValueError("url parameter must be a list")
 
     urls = url
-    if save_dir is None:
-        # Prefer environment variable
-        save_dir = "/tmp"
 
     # Handle filename parameter
-    if filename is None:
-        filenames = [None] * len(urls)
-    elif isinstance(filename, list):
-        if len(filename) != len(urls):
-            raise ValueError(
-                f"filename list length ({len(filename)}) must match url list length ({len(urls)})"
-            )
-        filenames = filename
-    else:
+    if filename is not None and not isinstance(filename, list):
         raise ValueError("filename must be a list or None")
+    if filename is not None and len(filename) != len(urls):
+        raise ValueError(
+            f"filename list length ({len(filename)}) must match url list length ({len(urls)})"
+        )
+    if checksums is not None and len(checksums) != len(urls):
+        raise ValueError(
+            f"checksums list length ({len(checksums)}) must match url list length ({len(urls)})"
+        )
 
     # Download all files
-    downloaded_paths = []
-    for url_item, filename_item in zip(urls, filenames):
-        path = _download_single_file(url_item, save_dir, filename_item)
-        downloaded_paths.append(path)
-
-    return downloaded_paths
+    results = {
+        result.index: result
+        for result in iter_file_download(urls, save_dir, filename, workers, checksums)
+    }
+    failed = [result for result in results.values() if result.error]
+    if failed:
+        raise requests.exceptions.RequestException(
+            "; ".join(f"{result.url}: {result.error}" for result in failed)
+        )
+    return [results[index].path for index in range(len(urls))]
 
 
 def _download_single_file(
@@ -112,51 +467,12 @@ def _download_single_file(
         requests.exceptions.RequestException: Network request failure
         IOError: File write failure
     """
-    # Determine save directory
-    if save_dir is None:
-        # Prefer environment variable
-        save_dir = "/tmp"
-
-    # Ensure save directory exists
-    save_path = Path(save_dir)
-    save_path.mkdir(parents=True, exist_ok=True)
-
-    # Determine filename
-    if filename is None:
-        # Extract filename from URL
-        parsed_url = urlparse(url)
-        filename = unquote(os.path.basename(parsed_url.path))
-
-        # If no filename in URL, use default name
-        if not filename or filename == "/":
-            filename = "downloaded_file"
-
-    # Full file path
-    full_path = save_path / filename
-
-    # If file exists, add counter to avoid overwriting
-    counter = 1
-    original_stem = full_path.stem
-    original_suffix = full_path.suffix
-    while full_path.exists():
-        filename = f"{original_stem}_{counter}{original_suffix}"
-        full_path = save_path / filename
-        counter += 1
-
-    # Download file
+    full_path = _resolve_target(url, save_dir or "/tmp", filename, set())
     try:
         logger.info(f"Downloading: {url}")
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-
-        # Write file
-        with open(full_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-
-        logger.info(f"Downloaded: {full_path}")
-        return str(full_path.absolute())
+        result = _download_to(url, full_path, pool_size=max(SEGMENTS, 1))
+        logger.info(f"Downloaded: {result.path}")
+        return result.path
 
     except requests.exceptions.RequestException as e:
         raise requests.exceptions.RequestException(f"Download failed: {str(e)}")
@@ -201,12 +517,30 @@ Examples:
         help="Custom filenames for downloaded files (must match number of URLs)",
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Files downloaded in parallel (default: {DEFAULT_WORKERS})",
+    )
+
+    parser.add_argument(
+        "--checksums",
+        nargs="+",
+        default=None,
+        help="Expected checksums as algo:hex, e.g. sha256:ab12... (must match number of URLs)",
+    )
+
     args = parser.parse_args()
 
     try:
         # Call download function
         downloaded_paths = file_download(
-            url=args.urls, save_dir=args.save_dir, filename=args.filenames
+            url=args.urls,
+            save_dir=args.save_dir,
+            filename=args.filenames,
+            workers=args.workers,
+            checksums=args.checksums,
         )
 
         # Print results (one path per line for easy parsing)
@@ -15,18 +15,33 @@
 """
 TOS file/directory upload utility
 Provides functionality to upload files or directories to Volcano Engine TOS object storage and returns signed access URLs
+
+Upload engine:
+- Directory files are uploaded by a bounded worker pool (TOS_UPLOAD_WORKERS)
+- Files at or above TOS_UPLOAD_MULTIPART_THRESHOLD use multipart upload with
+  parallel parts (TOS_UPLOAD_PART_SIZE / TOS_UPLOAD_PART_WORKERS) and an SDK
+  checkpoint, so an interrupted upload resumes from the finished parts
+- Files whose size and CRC64 already match the remote object are skipped; local
+  CRCs are cached in a checkpoint file under TOS_UPLOAD_CHECKPOINT_DIR
 """
 
 import argparse
+import hashlib
+import json
 import logging
 import os
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Union
 
 import tos
 from tos import HttpMethodType
+from tos.utils import Crc64
 
 # Current directory
 sys.path.append(str(Path(__file__).resolve().parent))
@@ -45,6 +60,15 @@ if not logger.handlers:
     logger.addHandler(console_handler)
 
 
+MULTIPART_THRESHOLD = int(os.getenv("TOS_UPLOAD_MULTIPART_THRESHOLD", 32 * 1024 * 1024))
+# TOS requires parts of at least 5 MB
+PART_SIZE = max(
+    int(os.getenv("TOS_UPLOAD_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024
+)
+PART_WORKERS = int(os.getenv("TOS_UPLOAD_PART_WORKERS", 4))
+FILE_WORKERS = int(os.getenv("TOS_UPLOAD_WORKERS", 4))
+
+
 def _get_session_prefix() -> str:
     """Extract session prefix from TOOL_USER_SESSION_ID environment variable
 
@@ -60,6 +84,144 @@ def _get_session_prefix() -> str:
         return datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
+class UploadCheckpoint:
+    """Local CRC64 cache and finished-upload record for one bucket/prefix
+
+    Stored as JSON under TOS_UPLOAD_CHECKPOINT_DIR (default: system temp dir).
+    Multipart upload checkpoints written by the TOS SDK live in its parts/ subdirectory.
+    """
+
+    def __init__(self, bucket_name: str, object_key_prefix: str):
+        self.dir = Path(
+            os.getenv("TOS_UPLOAD_CHECKPOINT_DIR")
+            or Path(tempfile.gettempdir()) / "tos_upload_checkpoints"
+        )
+        digest = hashlib.sha1(
+            f"{bucket_name}/{object_key_prefix}".encode("utf-8")
+        ).hexdigest()
+        self.path = self.dir / f"{digest}.json"
+        self.files: dict = {}
+        self._lock = threading.Lock()
+        try:
+            self.files = json.loads(self.path.read_text("utf-8"))
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def parts_dir(self) -> Path:
+        return self.dir / "parts"
+
+    def local_crc64(self, file_path: str) -> int:
+        """CRC64-ECMA of a local file, cached by (size, mtime)"""
+        stat = os.stat(file_path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry = self.files.get(os.path.abspath(file_path))
+        if entry and entry.get("signature") == signature:
+            return entry["crc64"]
+
+        crc = Crc64()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                crc.update(chunk)
+        with self._lock:
+            self.files[os.path.abspath(file_path)] = {
+                "signature": signature,
+                "crc64": crc.crc,
+            }
+        return crc.crc
+
+    def save(self):
+        with self._lock:
+            try:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(self.files), "utf-8")
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to save upload checkpoint: {e}")
+
+
+class UploadStats:
+    """Aggregate counters for throughput reporting (thread-safe)"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.uploaded_files = 0
+        self.uploaded_bytes = 0
+        self.skipped_files = 0
+        self.skipped_bytes = 0
+        self.failed_files = 0
+        self._lock = threading.Lock()
+
+    def add(self, outcome: str, size: int):
+        with self._lock:
+            if outcome == "uploaded":
+                self.uploaded_files += 1
+                self.uploaded_bytes += size
+            elif outcome == "skipped":
+                self.skipped_files += 1
+                self.skipped_bytes += size
+            else:
+                self.failed_files += 1
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        mb = self.uploaded_bytes / (1024 * 1024)
+        return (
+            f"uploaded {self.uploaded_files} files ({mb:.1f} MB) in {elapsed:.1f}s "
+            f"= {mb / elapsed:.2f} MB/s, skipped {self.skipped_files} unchanged files "
+            f"({self.skipped_bytes / (1024 * 1024):.1f} MB), failed {self.failed_files}"
+        )
+
+
+def _remote_matches(
+    client, bucket_name: str, object_key: str, file_path: str, checkpoint
+) -> bool:
+    """Whether the remote object has the same size and CRC64 as the local file"""
+    try:
+        head = client.head_object(bucket_name, object_key)
+    except tos.exceptions.TosServerError as e:
+        if e.status_code == 404:
+            return False
+        raise
+    if head.content_length != os.path.getsize(file_path):
+        return False
+    if head.hash_crc64_ecma is None:
+        return False
+    return int(head.hash_crc64_ecma) == checkpoint.local_crc64(file_path)
+
+
+def _upload_one(
+    client,
+    bucket_name: str,
+    object_key: str,
+    file_path: str,
+    checkpoint: UploadCheckpoint,
+) -> str:
+    """Upload one file; returns "uploaded" or "skipped" """
+    if _remote_matches(client, bucket_name, object_key, file_path, checkpoint):
+        logger.info(f"Skipped (unchanged): {file_path} -> {object_key}")
+        return "skipped"
+
+    if os.path.getsize(file_path) >= MULTIPART_THRESHOLD:
+        checkpoint.parts_dir.mkdir(parents=True, exist_ok=True)
+        client.upload_file(
+            bucket_name,
+            object_key,
+            file_path,
+            part_size=PART_SIZE,
+            task_num=PART_WORKERS,
+            enable_checkpoint=True,
+            checkpoint_file=str(checkpoint.parts_dir / "upload.checkpoint"),
+        )
+    else:
+        client.put_object_from_file(
+            bucket=bucket_name, key=object_key, file_path=file_path
+        )
+    logger.info(f"Uploaded: {file_path} -> {object_key}")
+    return "uploaded"
+
+
 def upload_file_to_tos(
     file_path: str,
     bucket_name: str,
@@ -160,13 +322,17 @@ def upload_file_to_tos(
             else:
                 raise e
 
-        # Upload file
-        result = client.put_object_from_file(
-            bucket=bucket_name, key=object_key, file_path=file_path
+        # Upload file (multipart + resumable for large files, skipped if unchanged)
+        checkpoint = UploadCheckpoint(bucket_name, object_key)
+        stats = UploadStats()
+        stats.add(
+            _upload_one(client, bucket_name, object_key, file_path, checkpoint),
+            os.path.getsize(file_path),
         )
+        checkpoint.save()
 
         logger.info("File uploaded successfully!")
-        logger.info(f"ETag: {result.etag}")
+        logger.info(f"Upload summary: {stats.summary()}")
 
         # Generate signed URL
         signed_url_output = client.pre_signed_url(
@@ -305,7 +471,8 @@ def upload_directory_to_tos(
             else:
                 raise e
 
-        # Upload all files in directory recursively
+        # Upload all files in directory recursively with a bounded worker pool
+        jobs = []
         for root, dirs, files in os.walk(directory_path):
             for file in files:
                 file_path = os.path.join(root, file)
@@ -315,18 +482,28 @@ def upload_directory_to_tos(
 
                 # Construct object key: upload/{session_prefix}/{directory_name}/{relative_path}
                 object_key = f"{object_key_prefix}/{relative_path}"
-
-                # Upload file
+                jobs.append((file_path, object_key))
+
+        # Largest files first so they do not become the tail of the batch
+        jobs.sort(key=lambda job: os.path.getsize(job[0]), reverse=True)
+        checkpoint = UploadCheckpoint(bucket_name, object_key_prefix)
+        stats = UploadStats()
+        with ThreadPoolExecutor(max_workers=max(FILE_WORKERS, 1)) as executor:
+            futures = {
+                executor.submit(
+                    _upload_one, client, bucket_name, object_key, file_path, checkpoint
+                ): file_path
+                for file_path, object_key in jobs
+            }
+            for future in as_completed(futures):
+                file_path = futures[future]
                 try:
-                    result = client.put_object_from_file(
-                        bucket=bucket_name, key=object_key, file_path=file_path
-                    )
-                    logger.info(
-                        f"Uploaded: {file_path} -> {object_key}, result: {result}"
-                    )
-
+                    stats.add(future.result(), os.path.getsize(file_path))
                 except Exception as e:
+                    stats.add("failed", 0)
                     logger.error(f"Failed to upload {file_path}: {e}")
+        checkpoint.save()
+        logger.info(f"Upload summary: {stats.summary()}")
 
         tos_path = f"tos://{bucket_name}/{object_key_prefix} "
         logger.info(f"Directory upload completed! TOS Path: {tos_path}")
@@ -437,6 +614,11 @@ Environment Variables:
   VOLCENGINE_ACCESS_KEY     Volcano Engine access key
   VOLCENGINE_SECRET_KEY     Volcano Engine secret key
   TOOL_USER_SESSION_ID      Session ID for generating object key prefix
+  TOS_UPLOAD_WORKERS        Files uploaded in parallel (default: 4)
+  TOS_UPLOAD_MULTIPART_THRESHOLD  Multipart upload from this size in bytes (default: 32 MB)
+  TOS_UPLOAD_PART_SIZE      Multipart part size in bytes (default: 8 MB, min 5 MB)
+  TOS_UPLOAD_PART_WORKERS   Parts uploaded in parallel per file (default: 4)
+  TOS_UPLOAD_CHECKPOINT_DIR Checkpoint directory for resume (default: system temp)
         """,
     )
 
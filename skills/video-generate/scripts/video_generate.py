@@ -3,8 +3,11 @@ import asyncio
 import json
 import os
 import sys
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
 
 import httpx
 
@@ -18,6 +21,9 @@ API_BASE = os.getenv(
 ).rstrip("/")
 DEFAULT_MODEL = "doubao-seedance-2-0-260128"
 
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1200)
+
 
 @dataclass
 class VideoTaskResult:
@@ -28,6 +34,64 @@ class VideoTaskResult:
     error_detail: Optional[dict] = None
     status: str = "pending"
     execution_expires_after: Optional[int] = None
+    first_polled_at: Optional[float] = None
+    elapsed: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "video_name": self.video_name,
+            "status": self.status,
+            "task_id": self.task_id,
+            "video_url": self.video_url,
+            "error": self.error,
+            "elapsed": self.elapsed,
+        }
+
+
+class LatencyHistogram:
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.samples: List[float] = []
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.samples.append(seconds)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)], 2)
+
+        labels = [f"<={b}s" for b in self.bounds] + [f">{self.bounds[-1]}s"]
+        return {
+            "count": len(ordered),
+            "p50": percentile(0.5),
+            "p90": percentile(0.9),
+            "max": round(ordered[-1], 2),
+            "buckets": {
+                label: count for label, count in zip(labels, self.counts) if count
+            },
+        }
+
+
+@dataclass
+class VideoLatencyStats:
+    """submit: create request; first_poll: created -> first status; done: created -> final status"""
+
+    submit: LatencyHistogram = field(default_factory=LatencyHistogram)
+    first_poll: LatencyHistogram = field(default_factory=LatencyHistogram)
+    done: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def summary(self) -> dict:
+        return {
+            "submit": self.submit.summary(),
+            "first_poll": self.first_poll.summary(),
+            "done": self.done.summary(),
+        }
 
 
 @dataclass
@@ -161,22 +225,36 @@ def _build_request_body(
     return body
 
 
+@asynccontextmanager
+async def _client_scope(client: Optional[httpx.AsyncClient]):
+    if client is not None:
+        yield client
+        return
+    async with httpx.AsyncClient(timeout=60.0) as new_client:
+        yield new_client
+
+
 async def _create_video_task(
-    prompt: str, config: VideoGenerationConfig, model_name: str
+    prompt: str,
+    config: VideoGenerationConfig,
+    model_name: str,
+    client: Optional[httpx.AsyncClient] = None,
 ) -> dict:
     url = f"{API_BASE}/contents/generations/tasks"
     body = _build_request_body(prompt, config, model_name)
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    async with _client_scope(client) as client:
         response = await client.post(url, headers=_get_headers(), json=body)
         response.raise_for_status()
         return response.json()
 
 
-async def _get_task_status(task_id: str) -> dict:
+async def _get_task_status(
+    task_id: str, client: Optional[httpx.AsyncClient] = None
+) -> dict:
     url = f"{API_BASE}/contents/generations/tasks/{task_id}"
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    async with _client_scope(client) as client:
         response = await client.get(url, headers=_get_headers())
         response.raise_for_status()
         return response.json()
@@ -201,14 +279,18 @@ def _parse_item_to_config(item: dict) -> VideoGenerationConfig:
     )
 
 
-async def _process_single_item(item: dict, model_name: str) -> VideoTaskResult:
+async def _process_single_item(
+    item: dict, model_name: str, client: Optional[httpx.AsyncClient] = None
+) -> VideoTaskResult:
     video_name = item["video_name"]
     prompt = item["prompt"]
     config = _parse_item_to_config(item)
 
     try:
-        task_data = await _create_video_task(prompt, config, model_name)
+        task_data = await _create_video_task(prompt, config, model_name, client)
         task_id = task_data.get("id")
+        if not task_id:
+            raise ValueError(f"No task id in response: {task_data}")
         return VideoTaskResult(
             video_name=video_name,
             task_id=task_id,
@@ -237,52 +319,163 @@ async def _process_single_item(item: dict, model_name: str) -> VideoTaskResult:
         )
 
 
+def _terminal_result(
+    result: dict, task_id: str, video_name: str, first_polled_at: Optional[float]
+) -> Optional[VideoTaskResult]:
+    """Map a task query response to a result, or None while still running."""
+    status = result.get("status")
+    if status == "succeeded":
+        return VideoTaskResult(
+            video_name=video_name,
+            task_id=task_id,
+            video_url=result.get("content", {}).get("video_url"),
+            status="succeeded",
+            execution_expires_after=result.get("execution_expires_after"),
+            first_polled_at=first_polled_at,
+        )
+    if status == "failed":
+        error = result.get("error", {})
+        return VideoTaskResult(
+            video_name=video_name,
+            task_id=task_id,
+            error=str(error),
+            error_detail=error,
+            status="failed",
+            execution_expires_after=result.get("execution_expires_after"),
+            first_polled_at=first_polled_at,
+        )
+    return None
+
+
 async def _poll_task_status(
     task_id: str,
     video_name: str,
     max_wait_seconds: int = 1200,
     poll_interval: int = 10,
+    client: Optional[httpx.AsyncClient] = None,
 ) -> VideoTaskResult:
     max_polls = max_wait_seconds // poll_interval
     polls = 0
+    first_polled_at = None
+    result = {}
 
     while polls < max_polls:
-        result = await _get_task_status(task_id)
-        status = result.get("status")
-
-        if status == "succeeded":
-            video_url = result.get("content", {}).get("video_url")
-            return VideoTaskResult(
-                video_name=video_name,
-                task_id=task_id,
-                video_url=video_url,
-                status="succeeded",
-                execution_expires_after=result.get("execution_expires_after"),
-            )
-
-        if status == "failed":
-            error = result.get("error", {})
-            return VideoTaskResult(
-                video_name=video_name,
-                task_id=task_id,
-                error=str(error),
-                error_detail=error,
-                status="failed",
-                execution_expires_after=result.get("execution_expires_after"),
-            )
+        try:
+            result = await _get_task_status(task_id, client)
+        except httpx.HTTPError as e:
+            # A transient query error should not abort the task
+            print(f"Video {video_name} status query failed: {e}", file=sys.stderr)
+            await asyncio.sleep(poll_interval)
+            polls += 1
+            continue
+        if first_polled_at is None:
+            first_polled_at = time.monotonic()
+        done = _terminal_result(result, task_id, video_name, first_polled_at)
+        if done is not None:
+            return done
 
-        print(f"Video {video_name} status: {status}, waiting...")
+        print(
+            f"Video {video_name} status: {result.get('status')}, waiting...",
+            file=sys.stderr,
+        )
         await asyncio.sleep(poll_interval)
         polls += 1
 
-    result = await _get_task_status(task_id)
+    # One last query after the deadline: a task that finished during the
+    # final sleep should not be reported as timed out
+    try:
+        result = await _get_task_status(task_id, client)
+        done = _terminal_result(result, task_id, video_name, first_polled_at)
+        if done is not None:
+            return done
+    except httpx.HTTPError as e:
+        print(f"Video {video_name} status query failed: {e}", file=sys.stderr)
+
     return VideoTaskResult(
         video_name=video_name,
         task_id=task_id,
         error="polling_timeout",
         status="pending",
         execution_expires_after=result.get("execution_expires_after"),
+        first_polled_at=first_polled_at,
+    )
+
+
+async def _generate_single_video(
+    item: dict,
+    model_name: str,
+    max_wait_seconds: int,
+    client: httpx.AsyncClient,
+    stats: VideoLatencyStats,
+) -> VideoTaskResult:
+    started = time.monotonic()
+    created = await _process_single_item(item, model_name, client)
+    if created.status != "created":
+        created.elapsed = round(time.monotonic() - started, 2)
+        return created
+
+    submitted = time.monotonic()
+    stats.submit.observe(submitted - started)
+    result = await _poll_task_status(
+        created.task_id, created.video_name, max_wait_seconds, client=client
     )
+    if result.first_polled_at is not None:
+        stats.first_poll.observe(result.first_polled_at - submitted)
+    if result.status != "pending":
+        stats.done.observe(time.monotonic() - submitted)
+    result.elapsed = round(time.monotonic() - started, 2)
+    return result
+
+
+async def iter_video_generate(
+    params: list,
+    batch_size: int = 10,
+    max_wait_seconds: int = 1200,
+    model_name: str = None,
+    stats: Optional[VideoLatencyStats] = None,
+) -> AsyncIterator[VideoTaskResult]:
+    """
+    Keep up to batch_size videos in flight, starting the next item as soon as
+    any finishes, and yield each result in completion order.
+    """
+    model = model_name or os.getenv("MODEL_VIDEO_NAME", DEFAULT_MODEL)
+    stats = stats if stats is not None else VideoLatencyStats()
+    window = max(batch_size, 1)
+    items = iter(params)
+    running = set()
+
+    limits = httpx.Limits(max_connections=window, max_keepalive_connections=window)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+
+        def refill():
+            while len(running) < window:
+                item = next(items, None)
+                if item is None:
+                    return
+                running.add(
+                    asyncio.create_task(
+                        _generate_single_video(
+                            item, model, max_wait_seconds, client, stats
+                        )
+                    )
+                )
+
+        refill()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                running.difference_update(done)
+                # Refill before yielding so a slow consumer does not idle the window
+                refill()
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
 
 
 async def video_task_query(task_id: str) -> Dict:
@@ -312,64 +505,44 @@ async def video_generate(
     batch_size: int = 10,
     max_wait_seconds: int = 1200,
     model_name: str = None,
+    on_result: Optional[Callable[[VideoTaskResult], None]] = None,
 ) -> Dict:
-    model = model_name or os.getenv("MODEL_VIDEO_NAME", DEFAULT_MODEL)
-
     success_list = []
     error_list = []
     error_details = []
     pending_list = []
-
-    for start_idx in range(0, len(params), batch_size):
-        batch = params[start_idx : start_idx + batch_size]
-
-        task_results = await asyncio.gather(
-            *[_process_single_item(item, model) for item in batch]
-        )
-
-        created_tasks = []
-        for r in task_results:
-            if r.status == "created" and r.task_id:
-                created_tasks.append(r)
-            elif r.status == "failed":
-                error_list.append(r.video_name)
-                if r.error_detail:
-                    error_details.append(
-                        {
-                            "video_name": r.video_name,
-                            "error": r.error_detail,
-                        }
-                    )
-
-        poll_results = await asyncio.gather(
-            *[
-                _poll_task_status(r.task_id, r.video_name, max_wait_seconds)
-                for r in created_tasks
-            ]
-        )
-
-        for result in poll_results:
-            if result.status == "succeeded":
-                success_list.append({result.video_name: result.video_url})
-                print(f"Video {result.video_name} completed: {result.video_url}")
-            elif result.status == "failed":
-                error_list.append(result.video_name)
+    stats = VideoLatencyStats()
+
+    async for result in iter_video_generate(
+        params, batch_size, max_wait_seconds, model_name, stats
+    ):
+        if on_result is not None:
+            on_result(result)
+        if result.status == "succeeded":
+            success_list.append({result.video_name: result.video_url})
+            print(
+                f"Video {result.video_name} completed: {result.video_url}",
+                file=sys.stderr,
+            )
+        elif result.status == "failed":
+            error_list.append(result.video_name)
+            if result.error_detail:
                 error_details.append(
                     {
                         "video_name": result.video_name,
                         "error": result.error_detail,
                     }
                 )
-                print(f"Video {result.video_name} failed: {result.error}")
-            elif result.status == "pending":
-                pending_list.append(
-                    {
-                        "video_name": result.video_name,
-                        "task_id": result.task_id,
-                        "execution_expires_after": result.execution_expires_after,
-                        "message": f"Task still running. Use video_task_query('{result.task_id}') to check status later.",
-                    }
-                )
+            print(f"Video {result.video_name} failed: {result.error}", file=sys.stderr)
+        elif result.status == "pending":
+            pending_list.append(
+                {
+                    "video_name": result.video_name,
+                    "task_id": result.task_id,
+                    "execution_expires_after": result.execution_expires_after,
+                    "message": f"Task still running. Use video_task_query('{result.task_id}') to check status later.",
+                }
+            )
 
     if success_list and not error_list and not pending_list:
         status = "success"
@@ -384,9 +557,39 @@ async def video_generate(
         "error_list": error_list,
         "error_details": error_details,
         "pending_list": pending_list,
+        "latency": stats.summary(),
     }
 
 
+def _item_from_args(args) -> dict:
+    item = {
+        "video_name": args.name,
+        "prompt": args.prompt,
+        "ratio": args.ratio,
+        "watermark": not args.no_watermark,
+    }
+
+    if args.first_frame:
+        item["first_frame"] = args.first_frame
+    if args.last_frame:
+        item["last_frame"] = args.last_frame
+    if args.ref_images:
+        item["reference_images"] = args.ref_images
+    if args.ref_videos:
+        item["reference_videos"] = args.ref_videos
+    if args.ref_audios:
+        item["reference_audios"] = args.ref_audios
+    if args.generate_audio:
+        item["generate_audio"] = True
+    if args.duration:
+        item["duration"] = args.duration
+    if args.resolution:
+        item["resolution"] = args.resolution
+    if args.seed is not None:
+        item["seed"] = args.seed
+    return item
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate videos using Seedance models"
@@ -460,6 +663,23 @@ def main():
     parser.add_argument(
         "--query-task", "-q", default=None, help="Query task status by task_id"
     )
+    parser.add_argument(
+        "--params-file",
+        default=None,
+        help="JSON file with a list of video items (same fields as video_generate params)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        "-b",
+        type=int,
+        default=10,
+        help="Max videos generating at the same time (default: 10)",
+    )
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="Print one JSON line per finished video, then a one-line summary",
+    )
 
     args = parser.parse_args()
 
@@ -473,40 +693,36 @@ def main():
         print(json.dumps(result, indent=2, ensure_ascii=False))
         return
 
-    if not args.prompt:
-        print("Error: --prompt is required when not using --query-task")
+    if args.params_file:
+        with open(args.params_file, "r", encoding="utf-8") as f:
+            params = json.load(f)
+    elif args.prompt:
+        params = [_item_from_args(args)]
+    else:
+        print(
+            "Error: --prompt or --params-file is required when not using --query-task"
+        )
         sys.exit(1)
 
-    item = {
-        "video_name": args.name,
-        "prompt": args.prompt,
-        "ratio": args.ratio,
-        "watermark": not args.no_watermark,
-    }
+    on_result = None
+    if args.jsonl:
 
-    if args.first_frame:
-        item["first_frame"] = args.first_frame
-    if args.last_frame:
-        item["last_frame"] = args.last_frame
-    if args.ref_images:
-        item["reference_images"] = args.ref_images
-    if args.ref_videos:
-        item["reference_videos"] = args.ref_videos
-    if args.ref_audios:
-        item["reference_audios"] = args.ref_audios
-    if args.generate_audio:
-        item["generate_audio"] = True
-    if args.duration:
-        item["duration"] = args.duration
-    if args.resolution:
-        item["resolution"] = args.resolution
-    if args.seed is not None:
-        item["seed"] = args.seed
+        def on_result(result: VideoTaskResult):
+            print(json.dumps(result.to_dict(), ensure_ascii=False), flush=True)
 
     result = asyncio.run(
-        video_generate([item], max_wait_seconds=args.timeout, model_name=args.model)
+        video_generate(
+            params,
+            batch_size=args.batch_size,
+            max_wait_seconds=args.timeout,
+            model_name=args.model,
+            on_result=on_result,
+        )
     )
-    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.jsonl:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
 
 
 if __name__ == "__main__":
@@ -14,18 +14,40 @@
 
 """
 The document of this tool see: https://www.volcengine.com/docs/85508/1650263
+
+- Credentials are resolved once and reused (IAM credentials until
+  WEB_SEARCH_CREDENTIAL_TTL); the derived signing key is reused for the day.
+- Results are cached by normalized query in memory and on disk
+  (WEB_SEARCH_CACHE_DIR, WEB_SEARCH_CACHE_TTL seconds, 0 disables).
+- async_web_search / web_search_many send requests concurrently over one
+  pooled client and share identical in-flight queries.
 """
 
+import asyncio
 import datetime
+import functools
 import hashlib
 import hmac
+import json
 import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
 import warnings
-from typing import Literal
+from collections import OrderedDict
+from pathlib import Path
+from typing import Literal, Optional
 from urllib.parse import quote
 
 import requests
 
+try:
+    import httpx
+except ImportError:  # async calls fall back to the requests client in a thread
+    httpx = None
+
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings(
     "ignore",
@@ -39,6 +61,8 @@ Host = ""
 ContentType = ""
 Scheme = "https"
 
+_APIKEY_URL = "https://open.feedcoopapi.com/search_api/web_search"
+
 
 def norm_query(params):
     query = ""
@@ -71,8 +95,17 @@ def hash_sha256(content: str):
     return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
 
-# 第二步：签名请求函数
-def request(
+# 派生签名密钥只与 SK / 日期 / 区域 / 服务有关，同一天内复用
+@functools.lru_cache(maxsize=16)
+def _signing_key(secret_access_key: str, short_x_date: str, region: str, service: str):
+    k_date = hmac_sha256(secret_access_key.encode("utf-8"), short_x_date)
+    k_region = hmac_sha256(k_date, region)
+    k_service = hmac_sha256(k_region, service)
+    return hmac_sha256(k_service, "request")
+
+
+# 第二步：签名请求函数（只计算签名，返回 url / headers / params / body，不发送）
+def sign_request(
     method,
     date,
     query,
@@ -154,10 +187,12 @@ def request(
 
     # 打印最终计算的签名字符串用于调试比对
     # print(string_to_sign)
-    k_date = hmac_sha256(credential["secret_access_key"].encode("utf-8"), short_x_date)
-    k_region = hmac_sha256(k_date, credential["region"])
-    k_service = hmac_sha256(k_region, credential["service"])
-    k_signing = hmac_sha256(k_service, "request")
+    k_signing = _signing_key(
+        credential["secret_access_key"],
+        short_x_date,
+        credential["region"],
+        credential["service"],
+    )
     signature = hmac_sha256(k_signing, string_to_sign).hex()
 
     sign_result["Authorization"] = (
@@ -171,13 +206,35 @@ def request(
     if "X-Security-Token" in header and header["X-Security-Token"] == "":
         del header["X-Security-Token"]
     # header = {**header, **{"X-Security-Token": SessionToken}}
+    return (
+        f"{scheme}://{request_param['host']}{request_param['path']}",
+        header,
+        request_param["query"],
+        request_param["body"],
+    )
+
+
+def request(
+    method,
+    date,
+    query,
+    header,
+    ak,
+    sk,
+    action,
+    body,
+    scheme: Literal["http", "https"] = "https",
+):
+    url, header, params, body = sign_request(
+        method, date, query, header, ak, sk, action, body, scheme
+    )
     # 第六步：将 Signature 签名写入 HTTP Header 中，并发送 HTTP 请求。
-    r = requests.request(
+    r = _get_session().request(
         method=method,
-        url=f"{scheme}://{request_param['host']}{request_param['path']}",
+        url=url,
         headers=header,
-        params=request_param["query"],
-        data=request_param["body"],
+        params=params,
+        data=body,
     )
     try:
         return r.json()
@@ -256,7 +313,7 @@ def ve_request_with_apikey(
 
     try:
         # Use the provided API Key access URL
-        url = "https://open.feedcoopapi.com/search_api/web_search"
+        url = _APIKEY_URL
 
         # Construct headers
         headers = {**header}
@@ -268,7 +325,7 @@ def ve_request_with_apikey(
         print(f"Request Body: {json.dumps(request_body)}")
 
         # Send request
-        response = requests.request(
+        response = _get_session().request(
             method=method,
             url=url,
             headers=headers,
@@ -283,11 +340,263 @@ def ve_request_with_apikey(
         raise e
 
 
-def web_search(query: str) -> list[str]:
+_SESSION: Optional[requests.Session] = None
+_CREDENTIALS: Optional[dict] = None
+_CREDENTIALS_LOCK = threading.Lock()
+_MEMORY_CACHE: "OrderedDict[str, tuple[float, list]]" = OrderedDict()
+_MEMORY_CACHE_MAX_ENTRIES = 512
+_INFLIGHT: dict = {}
+
+_AKSK_SERVICE = {
+    "action": "WebSearch",
+    "service": "volc_torchlight_api",
+    "version": "2025-01-01",
+    "region": "cn-beijing",
+    "host": "mercury.volcengineapi.com",
+}
+
+
+def _get_session() -> requests.Session:
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+    return _SESSION
+
+
+def _resolve_credentials() -> dict:
+    """
+    Resolve credentials once: WEB_SEARCH_API_KEY, then VOLCENGINE_ACCESS_KEY /
+    VOLCENGINE_SECRET_KEY, then VeFaaS IAM (cached for WEB_SEARCH_CREDENTIAL_TTL).
+    """
+    global _CREDENTIALS
+    with _CREDENTIALS_LOCK:
+        if _CREDENTIALS and _CREDENTIALS["expires_at"] > time.time():
+            return _CREDENTIALS
+
+        api_key = os.getenv("WEB_SEARCH_API_KEY")
+        ak = None
+        sk = None
+        session_token = ""
+        expires_at = float("inf")
+
+        # Use API key if available
+        if not api_key:
+            print("WEB_SEARCH_API_KEY not found in environment variables.")
+            ak = os.getenv("VOLCENGINE_ACCESS_KEY")
+            sk = os.getenv("VOLCENGINE_SECRET_KEY")
+            if not (ak and sk):
+                print(
+                    "VOLCENGINE_ACCESS_KEY or VOLCENGINE_SECRET_KEY not found in environment variables."
+                )
+            else:
+                print("Successfully get AK/SK from environment variables.")
+        else:
+            print("Successfully get API key from environment variables.")
+
+        # Use AK/SK if API key is not available
+        if not (ak and sk) and not api_key:
+            platform = os.getenv("PLATFORM", "ecs")
+            if platform == "vefaas":
+                from veadk.auth.veauth.utils import get_credential_from_vefaas_iam
+
+                credential = get_credential_from_vefaas_iam()
+                if credential:
+                    ak = credential.access_key_id
+                    sk = credential.secret_access_key
+                    session_token = credential.session_token
+                    # Temporary credentials rotate; refresh them periodically
+                    expires_at = time.time() + int(
+                        os.getenv("WEB_SEARCH_CREDENTIAL_TTL", 900)
+                    )
+                    if not (ak and sk):
+                        print("Get AK/SK from vefaas credential failed.")
+                else:
+                    print("Get credential from vefaas failed.")
+            elif platform == "ecs":
+                # TODO: Support ecs metadata later.
+                print("Support ecs metadata later.")
+
+            if not (ak and sk):
+                print("Get AK/SK from credential failed.")
+            else:
+                print("Successfully get AK/SK from credential.")
+
+        if not (ak and sk) and not api_key:
+            raise PermissionError("no credential found")
+
+        _CREDENTIALS = {
+            "api_key": api_key,
+            "ak": ak,
+            "sk": sk,
+            "session_token": session_token,
+            "expires_at": expires_at,
+        }
+        return _CREDENTIALS
+
+
+def _request_body(query: str, count: int) -> dict:
+    return {
+        "Query": query,
+        "SearchType": "web",
+        "Count": count,
+        "NeedSummary": True,
+    }
+
+
+def _search_once(query: str, count: int) -> dict:
+    """One blocking search request over the pooled requests session"""
+    credentials = _resolve_credentials()
+    header = {"X-Security-Token": credentials["session_token"]}
+    # Use API key if available
+    if credentials["api_key"]:
+        return ve_request_with_apikey(
+            request_body=_request_body(query, count),
+            api_key=credentials["api_key"],
+            header=header,
+        )
+    return ve_request_with_aksk(
+        request_body=_request_body(query, count),
+        ak=credentials["ak"],
+        sk=credentials["sk"],
+        header=header,
+        **_AKSK_SERVICE,
+    )
+
+
+async def _search_once_async(query: str, count: int, client) -> dict:
+    """One search request over an httpx.AsyncClient (signed the same way)"""
+    credentials = _resolve_credentials()
+    body = json.dumps(_request_body(query, count))
+    if credentials["api_key"]:
+        response = await client.post(
+            _APIKEY_URL,
+            headers={
+                "Authorization": f"Bearer {credentials['api_key']}",
+                "Content-Type": "application/json",
+            },
+            content=body,
+        )
+    else:
+        url, headers, params = _sign_aksk(credentials, body)
+        response = await client.post(url, headers=headers, params=params, content=body)
+    try:
+        return response.json()
+    except Exception:
+        raise ValueError(f"Error occurred. Bad response: {response}")
+
+
+def _sign_aksk(credentials: dict, body: str):
+    """Signed (url, headers, params) for a WebSearch POST, without sending it"""
+    global Service, Version, Region, Host, ContentType
+    Service = _AKSK_SERVICE["service"]
+    Version = _AKSK_SERVICE["version"]
+    Region = _AKSK_SERVICE["region"]
+    Host = _AKSK_SERVICE["host"]
+    ContentType = "application/json"
+
+    url, headers, params, _ = sign_request(
+        "POST",
+        datetime.datetime.utcnow(),
+        {},
+        {"X-Security-Token": credentials["session_token"]},
+        credentials["ak"],
+        credentials["sk"],
+        _AKSK_SERVICE["action"],
+        body,
+    )
+    return url, headers, params
+
+
+def _parse_results(response) -> Optional[list[str]]:
+    try:
+        results: list = response["Result"]["WebResults"]
+        return [result["Summary"].strip() for result in results]
+    except Exception:
+        return None
+
+
+# ==================== 缓存 ====================
+
+
+def _normalize_query(query: str) -> str:
+    # 全角/半角、大小写、多余空白不影响命中
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip().casefold()
+
+
+def _cache_key(query: str, count: int) -> str:
+    raw = f"{count}|{_normalize_query(query)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_ttl() -> int:
+    return int(os.getenv("WEB_SEARCH_CACHE_TTL", 3600))
+
+
+def _cache_dir() -> Path:
+    return Path(
+        os.getenv("WEB_SEARCH_CACHE_DIR")
+        or Path(tempfile.gettempdir()) / "web_search_cache"
+    )
+
+
+def _cache_get(key: str) -> Optional[list[str]]:
+    if _cache_ttl() <= 0:
+        return None
+    now = time.time()
+    entry = _MEMORY_CACHE.get(key)
+    if entry is not None:
+        if entry[0] > now:
+            _MEMORY_CACHE.move_to_end(key)
+            return entry[1]
+        del _MEMORY_CACHE[key]
+    try:
+        cached = json.loads((_cache_dir() / f"{key}.json").read_text("utf-8"))
+    except (OSError, ValueError):
+        return None
+    if cached.get("expires_at", 0) <= now:
+        return None
+    _memory_put(key, cached["expires_at"], cached["results"])
+    return cached["results"]
+
+
+def _memory_put(key: str, expires_at: float, results: list[str]):
+    _MEMORY_CACHE[key] = (expires_at, results)
+    _MEMORY_CACHE.move_to_end(key)
+    while len(_MEMORY_CACHE) > _MEMORY_CACHE_MAX_ENTRIES:
+        _MEMORY_CACHE.popitem(last=False)
+
+
+def _cache_put(key: str, query: str, results: list[str]):
+    ttl = _cache_ttl()
+    if ttl <= 0:
+        return
+    expires_at = time.time() + ttl
+    _memory_put(key, expires_at, results)
+    try:
+        cache_dir = _cache_dir()
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_dir / f"{key}.{os.getpid()}.tmp"
+        tmp_path.write_text(
+            json.dumps(
+                {"query": query, "expires_at": expires_at, "results": results},
+                ensure_ascii=False,
+            ),
+            "utf-8",
+        )
+        os.replace(tmp_path, cache_dir / f"{key}.json")
+    except OSError as e:
+        print(f"Failed to write web search cache: {e}")
+
+
+# ==================== 对外接口 ====================
+
+
+def web_search(query: str, count: int = 5) -> list[str]:
     """Search a query in websites.
 
     Args:
         query: The query to search.
+        count: Max number of results.
 
     Returns:
         A list of result documents.
@@ -296,101 +605,98 @@ def web_search(query: str) -> list[str]:
         print("Query is empty.")
         return []
 
-    api_key = os.getenv("WEB_SEARCH_API_KEY")
-    ak = None
-    sk = None
-    session_token = ""
+    key = _cache_key(query, count)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
 
-    # Use API key if available
-    if not api_key:
-        print("WEB_SEARCH_API_KEY not found in environment variables.")
-        ak = os.getenv("VOLCENGINE_ACCESS_KEY")
-        sk = os.getenv("VOLCENGINE_SECRET_KEY")
-        if not (ak and sk):
-            print(
-                "VOLCENGINE_ACCESS_KEY or VOLCENGINE_SECRET_KEY not found in environment variables."
-            )
-        else:
-            print("Successfully get AK/SK from environment variables.")
-    else:
-        print("Successfully get API key from environment variables.")
-
-    # Use AK/SK if API key is not available
-    if not (ak and sk) and not api_key:
-        platform = os.getenv("PLATFORM", "ecs")
-        if platform == "vefaas":
-            from veadk.auth.veauth.utils import get_credential_from_vefaas_iam
-
-            credential = get_credential_from_vefaas_iam()
-            if credential:
-                ak = credential.access_key_id
-                sk = credential.secret_access_key
-                session_token = credential.session_token
-                if not (ak and sk):
-                    print("Get AK/SK from vefaas credential failed.")
-            else:
-                print("Get credential from vefaas failed.")
-        elif platform == "ecs":
-            # TODO: Support ecs metadata later.
-            print("Support ecs metadata later.")
+    response = _search_once(query, count)
+    results = _parse_results(response)
+    if results is None:
+        print(f"Web search failed, response body: {response}")
+        return [response]
+    _cache_put(key, query, results)
+    return results
 
-        if not (ak and sk):
-            print("Get AK/SK from credential failed.")
-        else:
-            print("Successfully get AK/SK from credential.")
 
-    if not (ak and sk) and not api_key:
-        raise PermissionError("no credential found")
+async def async_web_search(query: str, count: int = 5, client=None) -> list[str]:
+    """Async web_search; identical queries in flight share one request."""
+    if not query:
+        print("Query is empty.")
+        return []
 
-    header = {"X-Security-Token": session_token}
-    # Use API key if available
-    if api_key:
-        response = ve_request_with_apikey(
-            request_body={
-                "Query": query,
-                "SearchType": "web",
-                "Count": 5,
-                "NeedSummary": True,
-            },
-            api_key=api_key,
-            header=header,
-        )
+    key = _cache_key(query, count)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    task = _INFLIGHT.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_fetch(query, count, key, client))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _fetch(query: str, count: int, key: str, client) -> list[str]:
+    if client is None and httpx is None:
+        response = await asyncio.to_thread(_search_once, query, count)
+    elif client is None:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await _search_once_async(query, count, client)
     else:
-        response = ve_request_with_aksk(
-            request_body={
-                "Query": query,
-                "SearchType": "web",
-                "Count": 5,
-                "NeedSummary": True,
-            },
-            action="WebSearch",
-            ak=ak,
-            sk=sk,
-            service="volc_torchlight_api",
-            version="2025-01-01",
-            region="cn-beijing",
-            host="mercury.volcengineapi.com",
-            header=header,
-        )
+        response = await _search_once_async(query, count, client)
 
-    try:
-        results: list = response["Result"]["WebResults"]
-        final_results = []
-        for result in results:
-            final_results.append(result["Summary"].strip())
-        return final_results
-    except Exception as e:
-        print(f"Web search failed {e}, response body: {response}")
+    results = _parse_results(response)
+    if results is None:
+        print(f"Web search failed, response body: {response}")
         return [response]
+    _cache_put(key, query, results)
+    return results
+
+
+async def web_search_many(
+    queries: list[str], count: int = 5, concurrency: int = 8
+) -> list[list[str]]:
+    """
+    Search several queries concurrently (at most `concurrency` requests at once).
+
+    Returns:
+        Result lists in the same order as `queries`.
+    """
+    # Identical (normalized) queries are searched once
+    unique = {_cache_key(q, count): q for q in reversed(queries)}
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def search(query: str, client) -> list[str]:
+        async with semaphore:
+            return await async_web_search(query, count, client)
+
+    async def search_all(client) -> dict:
+        results = await asyncio.gather(*(search(q, client) for q in unique.values()))
+        return dict(zip(unique, results))
+
+    if httpx is None:
+        by_key = await search_all(None)
+    else:
+        limits = httpx.Limits(max_connections=max(concurrency, 1))
+        async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+            by_key = await search_all(client)
+    return [by_key[_cache_key(q, count)] for q in queries]
 
 
 if __name__ == "__main__":
     import sys
 
-    if len(sys.argv) != 2:
-        print("Usage: python web_search.py <query>")
+    if len(sys.argv) < 2:
+        print("Usage: python web_search.py <query> [<query> ...]")
         sys.exit(1)
 
-    query = sys.argv[1]
-    results = web_search(query)
-    print(results)
+    if len(sys.argv) == 2:
+        query = sys.argv[1]
+        results = web_search(query)
+        print(results)
+    else:
+        queries = sys.argv[1:]
+        results = asyncio.run(web_search_many(queries))
+        print(json.dumps(dict(zip(queries, results)), ensure_ascii=False, indent=2))